@@ -448,7 +448,7 @@ class RedisService(BaseDBService):
         :param key: (str) Key to update
         :param fields: (list) Fields of the data
         :param values: (list) Values of the fields
-        :param kwargs: (dict) "Where" options
+        :param kwargs: (dict) "Where" options ('incr', 'decr' or 'ex', seconds until the key expires)
         :return: (dict) Result of the update
         """
         self.logger.debug(f"Updating in database: {key}")
@@ -459,7 +459,7 @@ class RedisService(BaseDBService):
         elif "decr" in kwargs:
             return connection.decr(key, kwargs['decr'])
         else:
-            return connection.set(key, values)
+            return connection.set(key, values, ex=kwargs.get('ex'))
 
     def select(self, origin: str, key: str, tables: list = None, **kwargs: dict) -> list:
         """ Select data from the db
@@ -103,6 +103,17 @@ class BaseStorageService():
         """
         pass
 
+    @abstractmethod
+    def get_file_version(self, origin, file):
+        """ Return the version of the file (etag and last modification date) to know if it has changed without
+        downloading it
+
+        :param origin: Bucket to check file from
+        :param file: File to get the version
+        :return: (dict) Etag and last modification date of the file
+        """
+        pass
+
     @abstractmethod
     def list_files(self, origin, prefix=None):
         """ List all files in the bucket that start with the prefix (optional)
@@ -501,6 +512,29 @@ class S3Service(BaseStorageService):
 
         return sizes
 
+    def get_file_version(self, origin: str, file: str) -> Union[dict, bool]:
+        """ Return the version of the file (etag and last modification date) to know if it has changed without
+        downloading it
+
+        :param origin: (str) S3 Bucket to check file from
+        :param file: (str) File to get the version
+        :return: (dict) Etag and last modification date of the file
+        """
+        bucket = origin
+        bucket = self.get_bucket(bucket)
+        try:
+            self.logger.debug("Getting the version of %s..." % file)
+            file_object = bucket.Object(file)
+            return {'etag': file_object.e_tag, 'last_modified': str(file_object.last_modified)}
+        except Exception as ex:
+            try:
+                if ex.response['Error']['Code'] == "404":
+                    self.logger.warning("%s not found." % file)
+                    return False
+            except Exception as ex:
+                self.logger.error("Error while getting file version.")
+                raise ex
+
     def list_files(self, origin: str, prefix: str = "", limit: int = -1) -> list:
         """ List all files in s3
 
@@ -1057,6 +1091,27 @@ class BlobService(BaseStorageService):
 
         return sizes
 
+    def get_file_version(self, origin: str, file: str) -> Union[dict, bool]:
+        """ Return the version of the file (etag and last modification date) to know if it has changed without
+        downloading it
+
+        :param origin: (str) Blob container to get version of file from
+        :param file: (str) File to get the version
+        :return: (dict) Etag and last modification date of the file
+        """
+        file_client, container = self.get_client(origin, file)
+
+        try:
+            self.logger.debug("Getting the version of %s..." % file)
+            properties = file_client.get_blob_properties()
+        except Exception:
+            return False
+        else:
+            return {'etag': properties['etag'], 'last_modified': str(properties['last_modified'])}
+        finally:
+            file_client.close()
+            container.close()
+
     def list_files(self, origin: str, prefix: str = "", limit: int = -1) -> list:
         """ List all files in a Blob container
 
@@ -1446,6 +1501,23 @@ class FileShareService(BaseStorageService):
 
         return sizes
 
+    def get_file_version(self, origin: str, file: str) -> Union[dict, bool]:
+        """ Return the version of the file (etag and last modification date) to know if it has changed without
+        downloading it
+
+        :param origin: (str) Share to check file from
+        :param file: (str) File to get the version
+        :return: (dict) Etag and last modification date of the file
+        """
+        file_client = self.get_file_client(origin, file)
+        try:
+            self.logger.debug("Getting the version of %s..." % file)
+            properties = file_client.get_file_properties()
+            return {'etag': properties['etag'], 'last_modified': str(properties['last_modified'])}
+        except Exception:
+            self.logger.warning("%s not found." % file)
+            return False
+
     def list_files(self, origin: str, prefix: str = "", limit: int = -1):
         """ List all files in a Share that start with prefix
 
@@ -366,6 +366,23 @@ class StorageController(object):
 
         return sizes
 
+    def get_file_version(self, origin: tuple, file: str) -> dict:
+        """ Return the version of the file (etag and last modification date) to know if it has changed without
+        downloading it
+
+        :param origin: <tuple(str, str)> Origin of the data, tuple with the type of the origin
+            (i.e. aws_bucket, azure_blob, azure_fileshare) and the origin (i.e. the name of the bucket).
+        :param file: (str) File to get the version
+        :return: (dict) Etag and last modification date of the file (False if not found)
+        """
+        try:
+            if origin[0] not in self.origins:
+                self.origins[origin[0]] = self._get_origin(origin[0])
+            return self.origins[origin[0]].get_file_version(origin[1], file)
+        except Exception as ex:
+            self.logger.exception("Error while getting file version.")
+            raise ex
+
     def list_files(self, origin: tuple, prefix: str = "") -> list:
         """ List all files in remote storage that start with the prefix (optional)
 
@@ -0,0 +1,164 @@
+### This code is property of the GGAO ###
+
+
+"""
+In-process caching helpers shared by Genai services
+"""
+# Native imports
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """ Thread-safe LRU cache with an optional time to live for every entry.
+
+    The cache is bounded by 'maxsize' entries, when it is full the least recently used entry is evicted.
+    A 'maxsize' lower or equal than 0 disables the cache (nothing is stored). A 'ttl' lower or equal than 0
+    keeps the entries until they are evicted or invalidated. When 'max_weight' is greater than 0 the entries
+    are also evicted while the sum of their weights (for example their size in bytes) exceeds it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = 0, max_weight: int = 0):
+        """ Creates the cache
+
+        :param maxsize: Maximum number of entries
+        :param ttl: Seconds that an entry is valid since it was stored
+        :param max_weight: Maximum sum of the weights of the entries (0 to not limit it)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._get_alive(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Get a value from the cache and mark it as recently used
+
+        :param key: Key of the entry
+        :param default: Value returned when the key is not cached or has expired
+        :return: Cached value or default
+        """
+        with self._lock:
+            entry = self._get_alive(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, weight: int = 1):
+        """ Store a value in the cache, evicting the least recently used entries if it is full
+
+        :param key: Key of the entry
+        :param value: Value to store
+        :param weight: Weight of the entry, only used when the cache has a 'max_weight'
+        """
+        if not self.enabled or (self.max_weight > 0 and weight > self.max_weight):
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic(), value, weight)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (self.max_weight > 0 and self.weight > self.max_weight):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """ Get a value from the cache or compute it with the factory and store it
+
+        The factory is called outside the lock so slow computations do not block other threads.
+
+        :param key: Key of the entry
+        :param factory: Function without arguments that computes the value
+        :return: Cached or computed value
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> bool:
+        """ Remove an entry from the cache
+
+        :param key: Key of the entry
+        :return: True if the entry was cached
+        """
+        with self._lock:
+            return self._pop(key) is not None
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """ Remove all the entries whose key matches the predicate
+
+        :param predicate: Function that receives a key and returns True if it must be removed
+        :return: Number of entries removed
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._pop(key)
+            return len(keys)
+
+    def clear(self):
+        """ Remove all the entries from the cache """
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def get_stats(self) -> dict:
+        """ Get the usage counters of the cache
+
+        :return: Dictionary with size, limits and counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "weight": self.weight,
+                "max_weight": self.max_weight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _get_alive(self, key: Hashable):
+        """ Get the entry of a key removing it if it has expired (lock must be held) """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+            self._pop(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _pop(self, key: Hashable):
+        """ Remove an entry keeping the weight updated (lock must be held) """
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+        return entry
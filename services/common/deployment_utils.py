@@ -247,6 +247,71 @@ class BaseDeployment(ABC):
             except TypeError:
                 self.logger.debug("Waiting messages.", exc_info=get_exc_info())
 
+    def process_batch(self, json_inputs: List[dict]) -> List[Tuple[bool, dict, str]]:
+        """ Process the messages read at once. By default every message is processed alone
+
+        :param json_inputs: Request JSON of every message
+        :return: Output of every message (as process)
+        """
+        return [self.process(json_input) for json_input in json_inputs]
+
+    def async_batch_deployment(self):
+        """ Deploy service in async way processing together the messages read at once (up to max_num_queue) with
+        process_batch. Every message is sent to the next service and deleted from the queue by itself, so a failed
+        message does not affect the rest of the batch """
+        delete_on_read = eval(os.getenv('QUEUE_DELETE_ON_READ', "False"))
+        while not self.killer.kill_now:
+            try:
+                # Reading from queue
+                data, entries = read_from_queue(self.Q_IN, max_num=self.max_num_queue, delete=delete_on_read)
+                if data is None or entries is None:
+                    continue
+                s_time = time.time()
+
+                messages = []
+                for dat, entry in zip(data, entries):
+                    try:
+                        dat = self.send_tracking_message(dat, self.service_name, "INPUT")
+                        raw_input, dat = self.propagate_queue_message_input(dat)
+                        self.logger.info(f"[Process {get_dataset_status_key(json_input=dat)}] Request received")
+                        messages.append((raw_input, dat, entry))
+                    except Exception:
+                        self.logger.exception(f"Exception for {dat}.", exc_info=get_exc_info())
+                        if not delete_on_read:
+                            delete_from_queue(self.Q_IN, [entry])
+
+                try:
+                    outputs = self.process_batch([dat for _, dat, _ in messages])  # Process data
+                except Exception:
+                    self.logger.exception(f"Exception processing a batch of {len(messages)} messages.",
+                                          exc_info=get_exc_info())
+                    outputs = [None] * len(messages)
+
+                for (raw_input, dat, entry), result in zip(messages, outputs):
+                    try:
+                        if result is not None:
+                            must_continue, output, next_service = result
+                            output = self.propagate_queue_message_output(raw_input, output)
+                            output = self.send_tracking_message(output, self.service_name, "OUTPUT")
+
+                            if must_continue:
+                                # Async mode - Convert next_service to queue
+                                next_queue = (provider, convert_service_to_queue(next_service, provider))
+                                set_queue(next_queue)
+                                write_to_queue(next_queue, output)
+
+                            self.logger.info(f"[Process {get_dataset_status_key(json_input=dat)}] Request finished")
+                    except Exception:
+                        self.logger.exception(f"Exception for {dat}.", exc_info=get_exc_info())
+                    finally:
+                        # Every message is deleted from the queue by itself
+                        if not delete_on_read:
+                            delete_from_queue(self.Q_IN, [entry])
+
+                self.logger.info(f"Batch of {len(messages)} messages Time: {time.time() - s_time}.")
+            except TypeError:
+                self.logger.debug("Waiting messages.", exc_info=get_exc_info())
+
     def sync_deployment(self, dat: GenaiInput) -> Tuple[str, Union[int, Any]]:
         """ Deploy service in a sync way. """
         s_time = time.time()
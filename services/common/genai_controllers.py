@@ -30,7 +30,9 @@ data_bunch_c = DataBunchController()
 db_credentials_redis = {
     'status': os.getenv('REDIS_DB_STATUS'),
     'timeout': os.getenv('REDIS_DB_TIMEOUT'),
-    'session': os.getenv('REDIS_DB_SESSION')
+    'session': os.getenv('REDIS_DB_SESSION'),
+    'retrieval_cache': os.getenv('REDIS_DB_RETRIEVAL_CACHE'),
+    'embedding_cache': os.getenv('REDIS_DB_EMBEDDING_CACHE')
 }
 
 # Global variables
@@ -131,6 +133,16 @@ def get_sizes(origin:  Union[str, List[str]], files: list) -> list:
     return sc.get_size_of_files(origin, files)
 
 
+def get_file_version(origin: Union[str, List[str]], file: str) -> Union[dict, bool]:
+    """ Get the version of a file (etag and last modification date) without downloading it
+
+    :param origin: <tuple(str, str)> uhis_sdk_service.StorageController origin
+    :param file: Path to the file
+    :return: Etag and last modification date of the file (False if not found)
+    """
+    return sc.get_file_version(origin, file)
+
+
 def list_files(origin: Union[str, List[str]], prefix: str) -> List[str]:
     """ List files in a Storage
 
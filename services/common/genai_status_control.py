@@ -151,14 +151,18 @@ def persist_images(origin: Union[str, str], key: str, msg: str):
     dbc.insert(origin, key, None, msg)
 
 
-def update_status(origin: Union[str, str], key: str, msg: str):
+def update_status(origin: Union[str, str], key: str, msg: str, ex: int = None):
     """ Update a status entry
 
     :param origin: <tuple(str, str)> uhis_sdk_service.DBController origin
     :param key: Key of the entry to be updated
     :param msg: New value of the entry
+    :param ex: Seconds until the entry expires (it never expires by default)
     """
-    dbc.update(origin, key, None, msg)
+    if ex:
+        dbc.update(origin, key, None, msg, ex=ex)
+    else:
+        dbc.update(origin, key, None, msg)
 
 
 def compose_status_key(process_id, key, counter=False):
@@ -3,8 +3,11 @@
 
 # Native imports
 from abc import ABC
-from typing import List
+from typing import List, Iterator
+import os
 import json
+import time
+from itertools import islice, product
 from collections import Counter
 
 # Installed imports
@@ -76,6 +79,18 @@ class Connector(ABC):
         """
         pass
 
+    def scan_index(self, index: str, filters: dict = None, page_size: int = None, source: list = None) -> Iterator[dict]:
+        """ Method to stream all the chunks of an index (page by page) without loading them at once
+
+        :param index: Index to scan
+        :param filters: Dictionary of desired metadata to get chunks
+        :param page_size: Number of chunks requested in every round trip
+        :param source: Fields of the chunks to return (all if not passed)
+
+        return: Generator of chunks
+        """
+        pass
+
     def get_index_mapping(self, index: str):
         """ Method to get the index mapping
 
@@ -101,6 +116,34 @@ class Connector(ABC):
         """
         pass
 
+    def delete_documents_bulk(self, index_names: List[str], filters_list: List[dict]) -> dict:
+        """ Method to delete the documents that match any of the filters from several indexes with a few requests
+
+        :param index_names: Indexes to delete the documents from
+        :param filters_list: List of dictionaries of desired metadata to delete documents (one by document)
+        :return: Deleted chunks, failures and number of requests by index
+        """
+        pass
+
+    def get_chunks_metadata(self, index_name: str, filters_list: List[dict], fields: List[str]) -> dict:
+        """ Method to get in a single lookup the metadata of the chunks of several documents
+
+        :param index_name: Index to get the chunks from
+        :param filters_list: List of dictionaries of desired metadata to get chunks (one by document)
+        :param fields: Metadata fields to return
+        :return: Metadata of the chunks by chunk id
+        """
+        pass
+
+    def delete_chunks(self, index_name: str, ids: List[str]) -> int:
+        """ Method to delete chunks from an index by their ids
+
+        :param index_name: Index to delete the chunks from
+        :param ids: Ids of the chunks
+        :return: Number of chunks deleted
+        """
+        pass
+
     def create_empty_index(self, index: str):
         """ Method to create an empty index
 
@@ -128,6 +171,22 @@ class Connector(ABC):
 
         """
         pass
+
+    def ping(self) -> bool:
+        """ Method to check if the connection to the vector storage database is alive
+
+        """
+        return self.connection is not None
+
+    def get_index_version(self, index: str):
+        """ Method to get a value that changes every time the content of an index changes (chunks indexed or
+        deleted), used to know if the structures built over an index are still valid
+
+        :param index: Index to get the version from
+        :return: Version of the index or None if it can not be known (structures must not be cached)
+        """
+        return None
+
     @classmethod
     def is_connector_type(cls, model_type):
         """Checks if a given model type is equel to the model format and thus it must be the one to use.
@@ -145,6 +204,11 @@ class ElasticSearchConnector(Connector):
         self.password = vector_storage.get('vector_storage_password', '')
         self.scheme = vector_storage.get('vector_storage_scheme', 'https')
         self.port = vector_storage.get('vector_storage_port', 9200)
+        self.scan_page_size = int(os.getenv('ELASTIC_SCAN_PAGE_SIZE', 1000))
+        self.scan_keep_alive = os.getenv('ELASTIC_SCAN_KEEP_ALIVE', "1m")
+        self.delete_batch_size = int(os.getenv('ELASTIC_DELETE_BATCH_SIZE', 1000))
+        self.task_poll_interval = float(os.getenv('ELASTIC_TASK_POLL_INTERVAL', 1))
+        self.task_timeout = float(os.getenv('ELASTIC_TASK_TIMEOUT', 600))
 
     def connect(self):
         """ Method to connect to the vector storage database
@@ -168,7 +232,7 @@ class ElasticSearchConnector(Connector):
         :param docs: Documents to check
         :param vector_storage_keys: Keys redundant
         """
-        extra_metadata = ["snippet_number", "snippet_id","_header_mapping", "_csv_path"] # meatadata added by us
+        extra_metadata = ["snippet_number", "snippet_id","_header_mapping", "_csv_path", "content_hash"] # meatadata added by us
         new_index = not self.exist_index(index)
         try:
             index_mapping = self.get_index_mapping(index)[index]['mappings']['properties']['metadata']['properties'] if not new_index else {}
@@ -282,24 +346,55 @@ class ElasticSearchConnector(Connector):
             raise PrintableGenaiError(400, f"Error the connection has not been established")
         return self.connection.indices.delete(index=index)
 
-    def get_full_index(self, index: str, filters: dict, offset: int = 0, size: int = 25) -> list:
+    def scan_index(self, index: str, filters: dict = None, page_size: int = None, source: list = None,
+                   query: dict = None) -> Iterator[dict]:
+        """ Method to stream all the chunks of an index using a point in time and search_after, so the pagination
+        cost does not grow with the offset and the 'max_result_window' limit does not apply
+
+        :param index: Index to scan
+        :param filters: Dictionary of desired metadata to get chunks
+        :param page_size: Number of chunks requested in every round trip (ELASTIC_SCAN_PAGE_SIZE by default)
+        :param source: Fields of the chunks to return (all if not passed)
+        :param query: Query of the chunks (instead of the filters)
+
+        return: Generator of chunks
+        """
+        if self.connection is None:
+            raise PrintableGenaiError(400, "Error the connection has not been established")
+        page_size = page_size or self.scan_page_size
+        if query is None:
+            query = {"bool": {"filter": self._generate_filters(filters or {}), "must": {"match_all": {}}}}
+        extra_params = {} if source is None else {"source": source}
+
+        pit_id = self.connection.open_point_in_time(index=index, keep_alive=self.scan_keep_alive)['id']
+        try:
+            search_after = None
+            while True:
+                if search_after is not None:
+                    extra_params['search_after'] = search_after
+                result = self.connection.search(query=query, size=page_size, sort=["_shard_doc"],
+                                                pit={"id": pit_id, "keep_alive": self.scan_keep_alive},
+                                                track_total_hits=False, **extra_params)
+                # The point in time id can change between searches
+                pit_id = result.get('pit_id', pit_id)
+                hits = result.get('hits', {}).get('hits', [])
+                yield from hits
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]['sort']
+        finally:
+            self.connection.close_point_in_time(id=pit_id)
+
+    def get_full_index(self, index: str, filters: dict, offset: int = 0, size: int = None) -> list:
         """ Method to get an index with all chunks
 
         :param index: Index to get
         :param offset: Documents starting point
-        :param size: Size of documents
+        :param size: Number of chunks requested in every round trip
 
         return: List of documents from the index
         """
-        chunks = []
-        while True:
-            result = self.connection.search(index=index,
-                                            query={"bool": {"filter": self._generate_filters(filters), "must": {"match_all": {}}}},
-                                            size=size, from_=offset)
-            if len(result.get('hits', {}).get('hits', [])) == 0:
-                break
-            chunks.extend([chunk for chunk in result["hits"]["hits"]])
-            offset += size
+        chunks = list(islice(self.scan_index(index, filters, page_size=size), offset, None))
         if len(chunks) == 0:
             raise PrintableGenaiError(400, f"Error the index '{index}' is empty so retrieval cannot be done.")
         return chunks
@@ -368,30 +463,22 @@ class ElasticSearchConnector(Connector):
             raise PrintableGenaiError(400, f"Error the connection has not been established")
         return self.connection.indices.get_mapping(index=index)
 
-    def get_documents(self, index_name: str, filters: dict, offset: int = 0, size: int = 25):
+    def get_documents(self, index_name: str, filters: dict, offset: int = 0, size: int = None):
         """ Method to get a document from an index
 
         :param index_name: Index to get the document from
         :param filters: Dictionary of desired metadata to retrieve documents
         :param offset: Documents starting point
-        :param size: Size of documents
+        :param size: Number of chunks requested in every round trip
         """
         if self.connection is None:
             raise PrintableGenaiError(400, "Error the connection has not been established")
 
-        chunks = []
-        while True:
-            try:
-                result = self.connection.search(index=index_name,
-                                                query={"bool": {"filter": self._generate_filters(filters), "must": {"match_all": {}}}},
-                                                size=size, from_=offset)
-            except RequestError as e:
-                return "error", (f"Error: {e.info['error']['reason']} caused by: "
-                                 f"{e.info['error']['caused_by']['reason']}"), 400
-            if len(result.get('hits', {}).get('hits', [])) == 0:
-                break
-            chunks.extend([chunk for chunk in result["hits"]["hits"]])
-            offset += size
+        try:
+            chunks = list(islice(self.scan_index(index_name, filters, page_size=size), offset, None))
+        except RequestError as e:
+            return "error", (f"Error: {e.info['error']['reason']} caused by: "
+                             f"{e.info['error']['caused_by']['reason']}"), 400
         if len(chunks) == 0:
             return "error", f"Document not found for filters: {filters}", 400
 
@@ -405,28 +492,20 @@ class ElasticSearchConnector(Connector):
             chunks_per_file[file] = sorted(chunks, key=lambda x: x.get('meta').get('snippet_number'))
         return "finished", chunks_per_file, 200
 
-    def get_all_documents(self, index_name: str, offset: int = 0, size: int = 25):
+    def get_all_documents(self, index_name: str, offset: int = 0, size: int = None):
         """ Method to get all documents from an index
 
         :param index_name: Index to get the document from
         :param offset: Documents starting point
-        :param size: Size of documents
+        :param size: Number of chunks requested in every round trip
 
         return: List of documents from the index
         """
-        chunks = []
-        while True:
-            try:
-                result = self.connection.search(index=index_name,
-                                                query={"bool": {"must": {"match_all":{}}}},
-                                                size=size, from_=offset)
-            except RequestError as e:
-                return "error", (f"Error: {e.info['error']['reason']} caused by: "
-                                 f"{e.info['error']['caused_by']['reason']}"), 400
-            if len(result.get('hits', {}).get('hits', [])) == 0:
-                break
-            chunks.extend([chunk for chunk in result["hits"]["hits"]])
-            offset += size
+        try:
+            chunks = list(islice(self.scan_index(index_name, page_size=size), offset, None))
+        except RequestError as e:
+            return "error", (f"Error: {e.info['error']['reason']} caused by: "
+                             f"{e.info['error']['caused_by']['reason']}"), 400
         if len(chunks) == 0:
             return "error", f"Index is empty", 400
         return self._parse_response(chunks)
@@ -446,12 +525,115 @@ class ElasticSearchConnector(Connector):
 
         return result, failures, deleted
 
+    def delete_documents_bulk(self, index_names: List[str], filters_list: List[dict]) -> dict:
+        """ Method to delete the documents that match any of the filters from several indexes. The filters are
+        collapsed in a few 'terms' queries (up to ELASTIC_DELETE_BATCH_SIZE values each), all the delete by query
+        requests are sent without waiting for their completion and then their tasks are polled until all of them end
+
+        :param index_names: Indexes to delete the documents from
+        :param filters_list: List of dictionaries of desired metadata to delete documents (one by document)
+        :return: Deleted chunks, failures and number of requests by index
+        """
+        if self.connection is None:
+            raise PrintableGenaiError(400, f"Error the connection has not been established")
+
+        queries = self._generate_bulk_filters(filters_list, self.delete_batch_size)
+        results = {index_name: {"deleted": 0, "failures": [], "requests": len(queries)} for index_name in index_names}
+        tasks = {}
+        for index_name in index_names:
+            for query in queries:
+                response = self.connection.delete_by_query(index=index_name, query=query, conflicts="proceed",
+                                                           wait_for_completion=False)
+                tasks[response['task']] = index_name
+
+        deadline = time.monotonic() + self.task_timeout
+        while tasks:
+            for task_id, index_name in list(tasks.items()):
+                task = self.connection.tasks.get(task_id=task_id)
+                if not task.get('completed'):
+                    continue
+                response = task.get('response', {})
+                results[index_name]['deleted'] += response.get('deleted', 0)
+                results[index_name]['failures'].extend(response.get('failures', []))
+                if task.get('error'):
+                    results[index_name]['failures'].append(task['error'])
+                del tasks[task_id]
+            if tasks and time.monotonic() > deadline:
+                # The pending deletions must not remove the documents indexed afterwards
+                for task_id in tasks:
+                    self.connection.tasks.cancel(task_id=task_id)
+                raise PrintableGenaiError(500, f"Error deleting documents, {len(tasks)} delete by query task(s) "
+                                               f"not finished after {self.task_timeout} seconds")
+            if tasks:
+                time.sleep(self.task_poll_interval)
+        return results
+
+    def get_chunks_metadata(self, index_name: str, filters_list: List[dict], fields: List[str]) -> dict:
+        """ Method to get in a single lookup the metadata of the chunks of several documents, scanning the index
+        with the filters of all the documents collapsed in 'terms' queries
+
+        :param index_name: Index to get the chunks from
+        :param filters_list: List of dictionaries of desired metadata to get chunks (one by document)
+        :param fields: Metadata fields to return
+        :return: Metadata of the chunks by chunk id
+        """
+        queries = self._generate_bulk_filters(filters_list, self.delete_batch_size)
+        if not queries:
+            return {}
+        query = {"bool": {"should": queries, "minimum_should_match": 1}}
+        chunks = self.scan_index(index_name, source=[f"metadata.{field}" for field in fields], query=query)
+        return {chunk['_id']: chunk.get('_source', {}).get('metadata', {}) for chunk in chunks}
+
+    def delete_chunks(self, index_name: str, ids: List[str]) -> int:
+        """ Method to delete chunks from an index by their ids with bulk requests of up to ELASTIC_DELETE_BATCH_SIZE
+
+        :param index_name: Index to delete the chunks from
+        :param ids: Ids of the chunks
+        :return: Number of chunks deleted
+        """
+        if self.connection is None:
+            raise PrintableGenaiError(400, f"Error the connection has not been established")
+        deleted = 0
+        for i in range(0, len(ids), self.delete_batch_size):
+            operations = [{"delete": {"_index": index_name, "_id": chunk_id}}
+                          for chunk_id in ids[i:i + self.delete_batch_size]]
+            response = self.connection.bulk(operations=operations, refresh=True)
+            deleted += sum(1 for item in response['items'] if item.get('delete', {}).get('result') == "deleted")
+        return deleted
+
     def close(self):
         """ Method to close the connection to the vector storage database
         """
         if self.connection:
             self.connection.close()
 
+    def ping(self) -> bool:
+        """ Method to check if the connection to the vector storage database is alive
+        """
+        try:
+            return bool(self.connection and self.connection.ping())
+        except Exception:
+            return False
+
+    def get_index_version(self, index: str):
+        """ Method to get a value that changes every time the content of an index changes, built from the
+        uuid of the index (recreations) and the indexing, deletion and refresh counters of its primary shards
+
+        :param index: Index to get the version from
+        :return: Version of the index or None if it can not be known
+        """
+        if self.connection is None:
+            raise PrintableGenaiError(400, f"Error the connection has not been established")
+        try:
+            stats = self.connection.indices.stats(index=index, metric="docs,indexing,refresh")
+            index_stats = stats['indices'][index]
+            primaries = index_stats['primaries']
+            return (f"{index_stats.get('uuid', '')}:{primaries['indexing']['index_total']}:"
+                    f"{primaries['indexing']['delete_total']}:{primaries['refresh']['total']}:"
+                    f"{primaries['docs']['count']}")
+        except Exception:
+            return None
+
     def get_documents_filenames(self, index_name: str, size: int = 10000):
         """
         Retrieve filenames and their corresponding document counts from a specified index.
@@ -524,6 +706,36 @@ class ElasticSearchConnector(Connector):
                 raise PrintableGenaiError(400, f"Error the value '{value}' for the key '{key}' must be a string or a list containing strings.")
         return {"bool": {"must": operands}}
 
+    @staticmethod
+    def _generate_bulk_filters(filters_list: List[dict], batch_size: int) -> List[dict]:
+        """ Collapse the filters of several documents in 'terms' queries. The filters with a single key are merged in
+        a 'terms' query by key and the ones with several keys (AND) in 'should' queries, both split by batch size """
+        single_key, several_keys = {}, []
+        for filters in filters_list:
+            terms = []
+            for key, value in filters.items():
+                if isinstance(value, str):
+                    value = [value]
+                elif not (isinstance(value, list) and all([isinstance(val, str) for val in value])):
+                    raise PrintableGenaiError(400, f"Error the value '{value}' for the key '{key}' must be a string or a list containing strings.")
+                terms.append((f"metadata.{key}.keyword", value))
+            if len(terms) == 1:
+                field, values = terms[0]
+                single_key.setdefault(field, {}).update(dict.fromkeys(values))
+            elif terms and terms not in several_keys:
+                several_keys.append(terms)
+
+        queries = []
+        for field, values in single_key.items():
+            values = list(values)
+            for i in range(0, len(values), batch_size):
+                queries.append({"terms": {field: values[i:i + batch_size]}})
+        for i in range(0, len(several_keys), batch_size):
+            queries.append({"bool": {"minimum_should_match": 1, "should": [
+                {"bool": {"filter": [{"terms": {field: values}} for field, values in terms]}}
+                for terms in several_keys[i:i + batch_size]]}})
+        return queries
+
     @staticmethod
     def _parse_response(chunks: list):
         result = []
@@ -550,6 +762,8 @@ class AiSearchConnector(Connector):
         self.host = vector_storage.get('vector_storage_host', '')
         self.key = vector_storage.get('vector_storage_key', '')
         self.scheme = vector_storage.get('vector_storage_scheme', 'https')
+        # Azure AI Search accepts up to 1000 documents in every indexing batch
+        self.delete_batch_size = min(int(os.getenv('AI_SEARCH_DELETE_BATCH_SIZE', 1000)), 1000)
 
     def connect(self):
         """Method to connect to Azure AI Search"""
@@ -808,6 +1022,93 @@ class AiSearchConnector(Connector):
         except Exception as e:
             raise PrintableGenaiError(400, f"Error deleting documents: {str(e)}")
 
+    def delete_documents_bulk(self, index_names: List[str], filters_list: List[dict]) -> dict:
+        """ Method to delete the documents that match any of the filters from several indexes. The metadata is
+        stored as a string (it can not be filtered in the search), so every index is read once to get the ids of the
+        chunks that match any filter and they are deleted in batches of up to AI_SEARCH_DELETE_BATCH_SIZE documents
+
+        :param index_names: Indexes to delete the documents from
+        :param filters_list: List of dictionaries of desired metadata to delete documents (one by document)
+        :return: Deleted chunks, failures and number of requests by index
+        """
+        if not self.connection:
+            raise PrintableGenaiError(400, "Error: the connection has not been established")
+
+        matches = self._generate_bulk_filters(filters_list)
+        results = {}
+        for index_name in index_names:
+            try:
+                search_client = SearchClient(
+                    endpoint=f"{self.scheme}://{self.host}",
+                    index_name=index_name,
+                    credential=self.credential
+                )
+                ids_to_delete = []
+                for doc in search_client.search("*", select=["metadata", "id"]):
+                    metadata = json.loads(doc['metadata'])
+                    if any(tuple(str(metadata.get(key)) for key in keys) in values for keys, values in matches.items()):
+                        ids_to_delete.append(doc['id'])
+
+                results[index_name] = {"deleted": 0, "failures": [], "requests": 0}
+                for i in range(0, len(ids_to_delete), self.delete_batch_size):
+                    batch = ids_to_delete[i:i + self.delete_batch_size]
+                    for result in search_client.delete_documents(documents=[{"id": doc_id} for doc_id in batch]):
+                        if result.succeeded:
+                            results[index_name]['deleted'] += 1
+                        else:
+                            results[index_name]['failures'].append(result.key)
+                    results[index_name]['requests'] += 1
+            except Exception as e:
+                raise PrintableGenaiError(400, f"Error deleting documents: {str(e)}")
+        return results
+
+    def get_chunks_metadata(self, index_name: str, filters_list: List[dict], fields: List[str]) -> dict:
+        """ Method to get in a single lookup the metadata of the chunks of several documents, reading the index
+        once (the metadata is stored as a string and it can not be filtered in the search)
+
+        :param index_name: Index to get the chunks from
+        :param filters_list: List of dictionaries of desired metadata to get chunks (one by document)
+        :param fields: Metadata fields to return
+        :return: Metadata of the chunks by chunk id
+        """
+        if not self.connection:
+            raise PrintableGenaiError(400, "Error: the connection has not been established")
+
+        matches = self._generate_bulk_filters(filters_list)
+        search_client = SearchClient(
+            endpoint=f"{self.scheme}://{self.host}",
+            index_name=index_name,
+            credential=self.credential
+        )
+        chunks = {}
+        for doc in search_client.search("*", select=["metadata", "id"]):
+            metadata = json.loads(doc['metadata'])
+            if any(tuple(str(metadata.get(key)) for key in keys) in values for keys, values in matches.items()):
+                chunks[doc['id']] = {field: metadata[field] for field in fields if field in metadata}
+        return chunks
+
+    def delete_chunks(self, index_name: str, ids: List[str]) -> int:
+        """ Method to delete chunks from an index by their ids in batches of up to AI_SEARCH_DELETE_BATCH_SIZE
+
+        :param index_name: Index to delete the chunks from
+        :param ids: Ids of the chunks
+        :return: Number of chunks deleted
+        """
+        if not self.connection:
+            raise PrintableGenaiError(400, "Error: the connection has not been established")
+
+        search_client = SearchClient(
+            endpoint=f"{self.scheme}://{self.host}",
+            index_name=index_name,
+            credential=self.credential
+        )
+        deleted = 0
+        for i in range(0, len(ids), self.delete_batch_size):
+            results = search_client.delete_documents(documents=[{"id": chunk_id}
+                                                                for chunk_id in ids[i:i + self.delete_batch_size]])
+            deleted += sum(1 for result in results if result.succeeded)
+        return deleted
+
     
     def get_documents_filenames(self, index_name: str, size: int = 10000):
         """
@@ -877,6 +1178,26 @@ class AiSearchConnector(Connector):
         
         return " and ".join(filter_parts) if filter_parts else None
 
+    @staticmethod
+    def _generate_bulk_filters(filters_list: List[dict]) -> dict:
+        """Group the filters of several documents by their keys in sets of the accepted values (every combination of
+        values when a key has a list of them)"""
+        matches = {}
+        for filters in filters_list:
+            keys = tuple(sorted(filters))
+            values = []
+            for key in keys:
+                value = filters[key]
+                if isinstance(value, str):
+                    values.append([value])
+                elif isinstance(value, list) and all([isinstance(val, str) for val in value]):
+                    values.append(value)
+                else:
+                    raise PrintableGenaiError(400, f"Error: the value '{value}' for key '{key}' must be a string or list of strings")
+            if keys:
+                matches.setdefault(keys, set()).update(product(*values))
+        return matches
+
     @staticmethod
     def _parse_response(chunks: list):
         """Parse Azure AI Search response into common format"""
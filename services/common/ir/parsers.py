@@ -87,6 +87,7 @@ class ParserInfoindexing(Parser):
     }
 
     INDEXING_MODES = ["simple", "recursive", "surrounding_context_window"]
+    AVAILABLE_EXECUTION_MODES = ["sequential", "concurrent"]
 
     MODEL_FORMAT = "infoindexing"
 
@@ -131,6 +132,7 @@ class ParserInfoindexing(Parser):
 
         try:
             self.get_index_conf()
+            self.get_execution_mode()
             self.get_chunking_method()
             self.get_metadata()
             self.get_index_metadata()
@@ -175,12 +177,18 @@ class ParserInfoindexing(Parser):
     def get_index_conf(self):
         self.index_conf = self.generic['indexation_conf']
 
+    def get_execution_mode(self):
+        self.execution_mode = self.index_conf.get("execution_mode", os.getenv('INDEXING_EXECUTION_MODE', "sequential"))
+        if self.execution_mode not in self.AVAILABLE_EXECUTION_MODES:
+            raise PrintableGenaiError(400, f"Execution mode '{self.execution_mode}' not supported, the available ones are {self.AVAILABLE_EXECUTION_MODES}")
+
     def get_vector_storage_conf(self, vector_storages):
         vector_storage_conf = self.index_conf['vector_storage_conf']
         self.index = vector_storage_conf['index']
         self.metadata_primary_keys = self.get_metadata_primary_keys(vector_storage_conf)
         self.vector_storage = self.get_vector_storage(vector_storages, vector_storage_conf)
         self.override = self.get_override(vector_storage_conf)
+        self.incremental = self.get_incremental(vector_storage_conf)
 
     def get_override(self, vector_storage_conf):
         """Get and validate the override parameter"""
@@ -197,6 +205,20 @@ class ParserInfoindexing(Parser):
         
         return override
 
+    def get_incremental(self, vector_storage_conf):
+        """Get and validate the incremental parameter (only the new or changed chunks of the documents are indexed)"""
+        incremental = vector_storage_conf.get('incremental', False)
+
+        if not isinstance(incremental, bool):
+            raise PrintableGenaiError(400, "Parameter 'incremental' must be a boolean value")
+
+        # The chunks already indexed of every document are found by its metadata_primary_keys
+        if incremental and not self.metadata_primary_keys:
+            raise PrintableGenaiError(400,
+                "Parameter 'metadata_primary_keys' is required when 'incremental' is True")
+
+        return incremental
+
     def get_metadata_primary_keys(self, vector_storage_conf):
         metadata_primary_keys = vector_storage_conf.get('metadata_primary_keys')
         if not isinstance(metadata_primary_keys, list) and metadata_primary_keys:
@@ -277,6 +299,8 @@ class ParserInforetrieval(Parser):
     LLAMAINDEX_STRATEGIES = ["llamaindex_fusion"]
     AVAILABLE_STRATEGIES = GENAI_STRATEGIES + LLAMAINDEX_STRATEGIES
     AVAILABLE_RESCORING_FUNCTIONS = ["mean", "length", "loglength", "pos", "posnorm", "norm", "nll", "rrf"]
+    AVAILABLE_EXECUTION_MODES = ["sequential", "concurrent"]
+    AVAILABLE_SEARCH_MODES = ["per_retriever", "msearch"]
 
     MODEL_FORMAT = "inforetrieval"
     @staticmethod
@@ -304,6 +328,8 @@ class ParserInforetrieval(Parser):
             self.get_strategy_mode(self.index_conf)
             self.get_top_k(self.index_conf)
             self.get_rescoring_function(self.index_conf)
+            self.get_execution_mode(self.index_conf)
+            self.get_search_mode(self.index_conf)
             self.get_models(self.index_conf, available_pools, available_models, models_credentials)
             self.get_query(self.index_conf)
             self.get_vector_storage(self.index_conf)
@@ -362,6 +388,21 @@ class ParserInforetrieval(Parser):
             raise PrintableGenaiError(400, f"Rescoring function '{self.rescoring_function}' not supported, the available ones are {self.AVAILABLE_RESCORING_FUNCTIONS}")
 
 
+    def get_execution_mode(self, index_conf):
+        if self.strategy in self.LLAMAINDEX_STRATEGIES and "execution_mode" in index_conf:
+            raise PrintableGenaiError(400, f"Strategy '{self.strategy}' does not use 'execution_mode' parameter, use one in '{self.GENAI_STRATEGIES}' instead")
+        self.execution_mode = index_conf.get("execution_mode", os.getenv('RETRIEVAL_EXECUTION_MODE', "sequential"))
+        if self.execution_mode not in self.AVAILABLE_EXECUTION_MODES:
+            raise PrintableGenaiError(400, f"Execution mode '{self.execution_mode}' not supported, the available ones are {self.AVAILABLE_EXECUTION_MODES}")
+
+    def get_search_mode(self, index_conf):
+        if self.strategy in self.LLAMAINDEX_STRATEGIES and "search_mode" in index_conf:
+            raise PrintableGenaiError(400, f"Strategy '{self.strategy}' does not use 'search_mode' parameter, use one in '{self.GENAI_STRATEGIES}' instead")
+        self.search_mode = index_conf.get("search_mode", os.getenv('RETRIEVAL_SEARCH_MODE', "per_retriever"))
+        if self.search_mode not in self.AVAILABLE_SEARCH_MODES:
+            raise PrintableGenaiError(400, f"Search mode '{self.search_mode}' not supported, the available ones are {self.AVAILABLE_SEARCH_MODES}")
+
+
     def get_x_reporting(self, project_conf):
         self.x_reporting = project_conf['x-reporting']
 
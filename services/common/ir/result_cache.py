@@ -0,0 +1,167 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import json
+import math
+import hashlib
+import threading
+from typing import Optional
+
+# Custom imports
+from common.cache_utils import TTLCache
+from common.genai_controllers import dbc, db_dbs
+from common.genai_status_control import get_value, update_status, incr_status_count
+
+
+GENERATION_KEY = lambda index: f"retrieval_generation:{index}"
+RESULT_KEY = lambda index, generation, digest: f"retrieval_result:{index}:{generation}:{digest}"
+
+
+def get_redis_origin() -> Optional[tuple]:
+    """ Get the redis database shared by the retrieval cache and the index generations (None if not configured) """
+    origin = db_dbs.get('retrieval_cache')
+    return origin if origin and origin[1] is not None else None
+
+
+def bump_index_generation(index: str, redis_origin: tuple = None) -> Optional[int]:
+    """ Increase the generation of an index in redis, so the retrieval results cached for it are not used anymore.
+    It must be called every time the content of an index changes (documents indexed or deleted). The results of
+    older generations are not deleted, redis expires them after the ttl of the cache
+
+    :param index: Index modified
+    :param redis_origin: Redis database of the generations (by default the configured one)
+    :return: New generation or None if the generations are not shared in redis
+    """
+    redis_origin = redis_origin or get_redis_origin()
+    if redis_origin is None:
+        return None
+    return incr_status_count(redis_origin, GENERATION_KEY(index))
+
+
+class RetrievalResultCache(object):
+    """ Cache of the documents returned by a retrieval request, keyed by the index, the generation of the index
+    and a canonical hash of the request.
+
+    The results are stored in process memory ('memory' backend) or in redis ('redis' backend, shared by all the
+    replicas). The generation of every index is a counter increased when the index is modified, by infoindexing
+    and by the deletions of inforetrieval, so a change in an index makes all its cached results unreachable.
+    The generations are kept in redis when the redis database is configured (shared with infoindexing), if not,
+    they are kept in the process and only the deletions of this process are seen (the ttl bounds the staleness).
+    """
+    BACKENDS = ["memory", "redis"]
+
+    def __init__(self, backend: str = "", maxsize: int = 1024, ttl: float = 300, redis_origin: tuple = None):
+        """ Creates the cache
+
+        :param backend: 'memory' or 'redis', other value disables the cache
+        :param maxsize: Max number of results kept in memory
+        :param ttl: Seconds a result is valid
+        :param redis_origin: Redis database of the results and the generations
+        """
+        self.redis_origin = redis_origin
+        self.backend = backend if backend in self.BACKENDS else ""
+        if self.backend == "redis" and redis_origin is None:
+            raise ValueError("The redis backend of the retrieval cache needs a redis database")
+        if self.redis_origin:
+            dbc.set_credentials(self.redis_origin)
+
+        self.ttl = ttl
+        self.results = TTLCache(maxsize=maxsize if self.backend == "memory" else 0, ttl=ttl)
+        self.generations = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backend)
+
+    @staticmethod
+    def get_request_hash(input_object) -> str:
+        """ Canonical hash of the parameters of a retrieval request that change its result
+
+        :param input_object: Parsed request
+        """
+        request = {
+            "index": input_object.index,
+            "query": " ".join(input_object.query.split()),
+            "filters": input_object.filters,
+            "top_k": input_object.top_k,
+            "strategy": input_object.strategy,
+            "strategy_mode": getattr(input_object, 'strategy_mode', None),
+            "rescoring_function": input_object.rescoring_function,
+            "execution_mode": getattr(input_object, 'execution_mode', None),
+            "search_mode": getattr(input_object, 'search_mode', None),
+            "models": [model.get('embedding_model') for model in input_object.models]
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_generation(self, index: str) -> int:
+        """ Get the current generation of an index
+
+        :param index: Index to get the generation from
+        """
+        if self.redis_origin:
+            value = get_value(self.redis_origin, GENERATION_KEY(index))[0]['values']
+            return int(value) if value else 0
+        with self._lock:
+            return self.generations.get(index, 0)
+
+    def bump_generation(self, index: str):
+        """ Increase the generation of an index, invalidating its results
+
+        :param index: Index modified
+        """
+        if self.redis_origin:
+            bump_index_generation(index, self.redis_origin)
+        else:
+            with self._lock:
+                self.generations[index] = self.generations.get(index, 0) + 1
+        self.results.invalidate_where(lambda key: key[0] == index)
+
+    def get(self, index: str, digest: str, generation: int = None) -> Optional[list]:
+        """ Get the result of a request if it is cached for the current generation of the index
+
+        :param index: Index of the request
+        :param digest: Hash of the request
+        :param generation: Generation of the index got before retrieving (the current one by default)
+        :return: Cached documents or None
+        """
+        generation = self.get_generation(index) if generation is None else generation
+        if self.backend == "memory":
+            docs = self.results.get((index, generation, digest))
+        else:
+            entry = get_value(self.redis_origin, RESULT_KEY(index, generation, digest), format_json=True)
+            docs = entry.get('docs') if entry else None
+
+        with self._lock:
+            self.stats["hits" if docs is not None else "misses"] += 1
+        return docs
+
+    def set(self, index: str, digest: str, docs: list, generation: int = None):
+        """ Store the result of a request for a generation of the index
+
+        :param index: Index of the request
+        :param digest: Hash of the request
+        :param docs: Documents returned
+        :param generation: Generation of the index got before retrieving, so a result retrieved while the index
+            was modified is not stored for the new generation (the current one by default)
+        """
+        generation = self.get_generation(index) if generation is None else generation
+        if self.backend == "memory":
+            self.results.set((index, generation, digest), docs)
+        elif self.ttl > 0:
+            # Redis expires the result, the ones of old generations are never deleted explicitly
+            update_status(self.redis_origin, RESULT_KEY(index, generation, digest), json.dumps({"docs": docs}),
+                          ex=math.ceil(self.ttl))
+
+    def get_stats(self) -> dict:
+        """ Get the usage counters of the cache """
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                "backend": self.backend or "disabled",
+                **self.stats,
+                "hit_ratio": self.stats["hits"] / total if total else 0.0,
+                "results": self.results.get_stats() if self.backend == "memory" else None
+            }
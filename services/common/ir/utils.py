@@ -22,12 +22,13 @@ EMBED_MODEL = None
 
 
 
-def get_connector(index: str, workspace, vector_storages) -> Connector:
-    """ Get the connector from the vector storage
+def get_indexed_connector_name(index: str, workspace) -> str:
+    """ Get the name of the vector storage written in the index storage file of an index
 
-    param: index: index to get the connector from
+    param: index: index to get the vector storage name from
+    param: workspace: workspace where the index storage files are
+    return: name of the vector storage, empty if the index has not been indexed yet
     """
-    # Get the connector name
     try:
         state_dict = load_file(workspace, INDEX_STORAGE(index))
         if len(state_dict) == 0:
@@ -36,8 +37,41 @@ def get_connector(index: str, workspace, vector_storages) -> Connector:
             connector_name = json.loads(state_dict).get('vector_storage')
     except Exception:
         connector_name = ""
-    if not connector_name:
-        connector_name = os.getenv('VECTOR_STORAGE', f"elastic-{os.getenv('TENANT')}")
+    return connector_name or ""
+
+
+def get_default_connector_name() -> str:
+    """ Get the name of the vector storage of the indices without index storage file """
+    return os.getenv('VECTOR_STORAGE', f"elastic-{os.getenv('TENANT')}")
+
+
+def get_connector_name(index: str, workspace) -> str:
+    """ Get the name of the vector storage where the index was indexed
+
+    param: index: index to get the vector storage name from
+    param: workspace: workspace where the index storage files are
+    """
+    return get_indexed_connector_name(index, workspace) or get_default_connector_name()
+
+
+def get_vector_storage(connector_name: str, vector_storages: list) -> dict:
+    """ Get the configuration of a vector storage by its name
+
+    param: connector_name: name of the vector storage
+    param: vector_storages: list of vector storages configurations
+    """
+    for vs in vector_storages:
+        if vs.get("vector_storage_name") == connector_name:
+            return vs
+    raise ValueError(f"Connector {connector_name} not found in vector storages")
+
+
+def get_connector(index: str, workspace, vector_storages) -> Connector:
+    """ Get the connector from the vector storage
+
+    param: index: index to get the connector from
+    """
+    connector_name = get_connector_name(index, workspace)
 
     for vs in vector_storages:
         if vs.get("vector_storage_name") == connector_name:
@@ -12,7 +12,7 @@ import time
 import pandas as pd
 
 # Custom imports
-from common.genai_controllers import load_file, get_dataset, list_files, upload_object, delete_file
+from common.genai_controllers import load_file, get_dataset, list_files, upload_object, delete_file, get_file_version
 from common.logging_handler import LoggerHandler
 from common.errors.genaierrors import PrintableGenaiError
 from common.langfuse_manager import LangFuseManager
@@ -82,6 +82,14 @@ class BaseStorageManager(ABC):
         """ Load templates from LLMStorage """
         pass
 
+    def get_template_names(self):
+        """ Get the names of the templates files of LLMStorage """
+        pass
+
+    def get_template_version(self, name):
+        """ Get the version of a templates file of LLMStorage without loading it """
+        pass
+
     @classmethod
     def is_file_storage_type(cls, model_type):
         """Checks if a given model type is equel to the model format and thus it must be the one to use.
@@ -261,6 +269,25 @@ class LLMStorageManager(BaseStorageManager):
 
         return templates, list(templates.keys())
 
+    def get_template_names(self, force_azure: bool = False) -> List[str]:
+        """ Get the names of the templates files (the prompts of Langfuse or the json files of the storage) """
+        if os.getenv("LANGFUSE", "").lower() == "true" and not force_azure:
+            return self.langfuse_m.get_list_templates(label="llm_template") or []
+
+        return [file.split("/")[-1][:-len(".json")] for file in list_files(self.workspace, self.prompts_path)
+                if file.endswith(".json")]
+
+    def get_template_version(self, name: str, force_azure: bool = False):
+        """
+        Gets the version of the template file without loading it (etag and last modification date in the storage),
+        None if it is not available. Langfuse only gives the version of a prompt by fetching it entirely, so in that
+        mode there is no version and the templates are loaded again when they are needed.
+        """
+        if os.getenv("LANGFUSE", "").lower() == "true" and not force_azure:
+            return None
+
+        return get_file_version(self.workspace, f"{self.prompts_path}{name}.json") or None
+
     def upload_template(self, dat: dict):
         try:
             template_name = dat['name']
@@ -0,0 +1,84 @@
+### This code is property of the GGAO ###
+
+import pytest
+from unittest.mock import patch, MagicMock
+from cache_utils import TTLCache
+
+
+def test_get_set():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("b", "default") == "default"
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 1
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    cache = TTLCache(maxsize=2, ttl=10)
+    with patch('cache_utils.time.monotonic', return_value=100):
+        cache.set("a", 1)
+    with patch('cache_utils.time.monotonic', return_value=105):
+        assert cache.get("a") == 1
+    with patch('cache_utils.time.monotonic', return_value=111):
+        assert cache.get("a") is None
+    assert cache.get_stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_disabled():
+    cache = TTLCache(maxsize=0)
+    cache.set("a", 1)
+    assert not cache.enabled
+    assert cache.get("a") is None
+
+
+def test_get_or_set():
+    cache = TTLCache(maxsize=2)
+    factory = MagicMock(return_value=[0.1, 0.2])
+    assert cache.get_or_set("a", factory) == [0.1, 0.2]
+    assert cache.get_or_set("a", factory) == [0.1, 0.2]
+    factory.assert_called_once()
+
+
+def test_invalidate():
+    cache = TTLCache(maxsize=5)
+    cache.set(("index1", "m1"), 1)
+    cache.set(("index1", "m2"), 2)
+    cache.set(("index2", "m1"), 3)
+    assert cache.invalidate(("index2", "m1"))
+    assert not cache.invalidate(("index2", "m1"))
+    assert cache.invalidate_where(lambda key: key[0] == "index1") == 2
+    assert len(cache) == 0
+    cache.set("a", 1)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_max_weight():
+    cache = TTLCache(maxsize=10, max_weight=100)
+    cache.set("a", 1, weight=60)
+    cache.set("b", 2, weight=30)
+    cache.set("c", 3, weight=30)  # "a" is evicted to keep the weight under the limit
+    assert "a" not in cache
+    assert cache.get_stats()["weight"] == 60
+    cache.set("d", 4, weight=101)  # Bigger than the whole cache, not stored
+    assert "d" not in cache
+    cache.set("b", 5, weight=10)
+    assert cache.get_stats()["weight"] == 40
+    cache.invalidate("b")
+    assert cache.get_stats()["weight"] == 30
@@ -0,0 +1,149 @@
+### This code is property of the GGAO ###
+
+# Native imports
+import json
+
+# Installed imports
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Local imports
+from common.ir.connectors import ElasticSearchConnector, AiSearchConnector
+from common.errors.genaierrors import PrintableGenaiError
+
+
+def get_hits(start, end):
+    return [{"_id": str(i), "_source": {"content": f"chunk {i}", "metadata": {"filename": "test.pdf", "snippet_number": i}},
+             "sort": [i]} for i in range(start, end)]
+
+
+@pytest.fixture
+def connector():
+    connector = ElasticSearchConnector({"vector_storage_host": "localhost"})
+    connector.connection = MagicMock()
+    connector.connection.open_point_in_time.return_value = {"id": "pit_1"}
+    connector.connection.search.side_effect = [
+        {"pit_id": "pit_2", "hits": {"hits": get_hits(0, 2)}},
+        {"pit_id": "pit_2", "hits": {"hits": get_hits(2, 4)}},
+        {"pit_id": "pit_3", "hits": {"hits": get_hits(4, 5)}}
+    ]
+    return connector
+
+
+def test_scan_index(connector):
+    chunks = connector.scan_index("test_index", {"filename": "test.pdf"}, page_size=2, source=["content"])
+    assert [chunk["_id"] for chunk in chunks] == ["0", "1", "2", "3", "4"]
+
+    calls = connector.connection.search.call_args_list
+    assert len(calls) == 3
+    assert "search_after" not in calls[0].kwargs
+    assert calls[1].kwargs["search_after"] == [1]
+    assert calls[2].kwargs["pit"] == {"id": "pit_2", "keep_alive": "1m"}
+    assert all(call.kwargs["source"] == ["content"] and call.kwargs["size"] == 2 for call in calls)
+    connector.connection.close_point_in_time.assert_called_once_with(id="pit_3")
+
+
+def test_scan_index_lazy(connector):
+    chunks = connector.scan_index("test_index", page_size=2)
+    assert next(chunks)["_id"] == "0"
+    assert connector.connection.search.call_count == 1
+    # The point in time is released even if the generator is not consumed
+    chunks.close()
+    connector.connection.close_point_in_time.assert_called_once_with(id="pit_2")
+
+
+def test_get_full_index(connector):
+    assert len(connector.get_full_index("test_index", {}, size=2)) == 5
+
+    connector.connection.search.side_effect = [{"hits": {"hits": []}}]
+    with pytest.raises(PrintableGenaiError):
+        connector.get_full_index("test_index", {})
+
+
+def test_get_documents(connector):
+    status, result, status_code = connector.get_documents("test_index", {"filename": "test.pdf"}, size=2)
+    assert status_code == 200
+    assert [chunk["meta"]["snippet_number"] for chunk in result["test.pdf"]] == [0, 1, 2, 3, 4]
+
+
+def test_get_index_version(connector):
+    connector.connection.indices.stats.return_value = {"indices": {"test_index": {
+        "uuid": "abc", "primaries": {"docs": {"count": 5}, "indexing": {"index_total": 7, "delete_total": 2},
+                                     "refresh": {"total": 3}}}}}
+    assert connector.get_index_version("test_index") == "abc:7:2:3:5"
+
+    connector.connection.indices.stats.side_effect = Exception("Not available")
+    assert connector.get_index_version("test_index") is None
+
+
+def test_delete_documents_bulk(connector):
+    connector.delete_batch_size = 2
+    connector.task_poll_interval = 0
+    connector.connection.delete_by_query.side_effect = [{"task": f"node:{i}"} for i in range(6)]
+    polls = {f"node:{i}": iter([{"completed": False}, {"completed": True, "response": {"deleted": i, "failures": []}}])
+             for i in range(6)}
+    connector.connection.tasks.get.side_effect = lambda task_id: next(polls[task_id])
+    filters = [{"filename": "a.pdf"}, {"filename": "b.pdf"}, {"filename": ["c.pdf", "a.pdf"]},
+               {"filename": "d.pdf", "department": "IT"}]
+
+    results = connector.delete_documents_bulk(["index_a", "index_b"], filters)
+
+    queries = [call.kwargs["query"] for call in connector.connection.delete_by_query.call_args_list[:3]]
+    assert queries[:2] == [{"terms": {"metadata.filename.keyword": ["a.pdf", "b.pdf"]}},
+                           {"terms": {"metadata.filename.keyword": ["c.pdf"]}}]
+    assert queries[2]["bool"]["should"] == [{"bool": {"filter": [{"terms": {"metadata.filename.keyword": ["d.pdf"]}},
+                                                                 {"terms": {"metadata.department.keyword": ["IT"]}}]}}]
+    assert all(call.kwargs["wait_for_completion"] is False for call in connector.connection.delete_by_query.call_args_list)
+    assert results == {"index_a": {"deleted": 3, "failures": [], "requests": 3},
+                       "index_b": {"deleted": 12, "failures": [], "requests": 3}}
+    # All the tasks are sent before polling
+    assert connector.connection.tasks.get.call_count == 12
+
+
+def test_delete_documents_bulk_timeout(connector):
+    connector.task_timeout = 0
+    connector.task_poll_interval = 0
+    connector.connection.delete_by_query.return_value = {"task": "node:1"}
+    connector.connection.tasks.get.return_value = {"completed": False}
+
+    with pytest.raises(PrintableGenaiError):
+        connector.delete_documents_bulk(["index_a"], [{"filename": "a.pdf"}])
+    connector.connection.tasks.cancel.assert_called_once_with(task_id="node:1")
+
+
+def test_delete_documents_bulk_ai_search():
+    connector = AiSearchConnector({"vector_storage_host": "localhost"})
+    connector.connection, connector.credential, connector.delete_batch_size = True, None, 2
+    docs = [{"id": str(i), "metadata": json.dumps({"filename": f"doc{i % 3}.pdf", "department": "IT"})} for i in range(6)]
+    with patch("common.ir.connectors.SearchClient") as mock_client:
+        mock_client.return_value.search.return_value = docs
+        mock_client.return_value.delete_documents.side_effect = lambda documents: [
+            MagicMock(succeeded=document["id"] != "3", key=document["id"]) for document in documents]
+        results = connector.delete_documents_bulk(["index_a"], [{"filename": "doc0.pdf"},
+                                                                {"filename": "doc1.pdf", "department": "IT"}])
+
+    deleted = [[document["id"] for document in call.kwargs["documents"]]
+               for call in mock_client.return_value.delete_documents.call_args_list]
+    assert deleted == [["0", "1"], ["3", "4"]]
+    assert results == {"index_a": {"deleted": 3, "failures": ["3"], "requests": 2}}
+
+
+def test_get_chunks_metadata(connector):
+    connector.scan_page_size = 2
+    chunks = connector.get_chunks_metadata("test_index", [{"filename": "test.pdf"}], ["snippet_id", "content_hash"])
+
+    assert list(chunks) == ["0", "1", "2", "3", "4"]
+    assert chunks["1"] == {"filename": "test.pdf", "snippet_number": 1}
+    call = connector.connection.search.call_args_list[0]
+    assert call.kwargs["query"] == {"bool": {"should": [{"terms": {"metadata.filename.keyword": ["test.pdf"]}}],
+                                             "minimum_should_match": 1}}
+    assert call.kwargs["source"] == ["metadata.snippet_id", "metadata.content_hash"]
+
+
+def test_delete_chunks(connector):
+    connector.delete_batch_size = 2
+    connector.connection.bulk.side_effect = lambda operations, refresh: {"items": [
+        {"delete": {"_id": operation["delete"]["_id"], "result": "deleted"}} for operation in operations]}
+
+    assert connector.delete_chunks("test_index", ["a", "b", "c"]) == 3
+    assert connector.connection.bulk.call_count == 2
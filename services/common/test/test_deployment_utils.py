@@ -243,4 +243,30 @@ def test_report_api(deployment, mocker):
 def test_report_api_error(deployment, mocker):
     mock_post = mocker.patch("requests.post")
     mock_post.side_effect = Exception
-    deployment.report_api(1, "test_id", "test_url", "resource", "process_id", "PAGS")
\ No newline at end of file
+    deployment.report_api(1, "test_id", "test_url", "resource", "process_id", "PAGS")
+
+@patch("deployment_utils.read_from_queue")
+@patch("deployment_utils.delete_from_queue")
+def test_async_batch_deployment(mock_delete, mock_read, deployment):
+    def read_once(*args, **kwargs):
+        deployment.killer.kill_now = True
+        return [{"data": 1}, {"data": 2}, {"data": 3}], ["entry_1", "entry_2", "entry_3"]
+
+    mock_read.side_effect = read_once
+    deployment.send_tracking_message = MagicMock(side_effect=lambda message, *args: message)
+    outputs = [(True, {"status": "success"}, "next_service"), (True, None, "next_service"),
+               (False, {"status": "error"}, "next_service")]
+    with patch.object(TestDeployment, "process_batch", return_value=outputs) as mock_process_batch, \
+            patch("deployment_utils.set_queue"), patch("deployment_utils.write_to_queue") as mock_write:
+        deployment.async_batch_deployment()
+
+    mock_process_batch.assert_called_once_with([{"data": 1}, {"data": 2}, {"data": 3}])
+    mock_read.assert_called_once_with(deployment.Q_IN, max_num=5, delete=False)
+    # The output of the second message fails, the rest are sent and every message is deleted by itself
+    mock_write.assert_called_once()
+    assert mock_delete.call_args_list == [call(deployment.Q_IN, ["entry_1"]), call(deployment.Q_IN, ["entry_2"]),
+                                          call(deployment.Q_IN, ["entry_3"])]
+
+
+def test_process_batch(deployment):
+    assert deployment.process_batch([{"data": 1}, {"data": 2}]) == [(True, {"status": "success"}, "next_service")] * 2
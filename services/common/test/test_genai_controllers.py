@@ -8,7 +8,7 @@ from genai_controllers import (
     set_db, set_queue, write_to_queue, read_from_queue, delete_from_queue, 
     set_storage, check_file, list_files, download_files, upload_files, 
     delete_files, delete_file, get_mimetype, get_number_pages, extract_ocr_files,
-    get_dataset, get_sizes, download_file, download_directory, load_file, upload_object, delete_folder,
+    get_dataset, get_sizes, get_file_version, download_file, download_directory, load_file, upload_object, delete_folder,
     get_texts_from_file, get_images_from_file, select_athena, create_athena, partition_athena, execute_query_athena,
     get_query_athena, delete_athena
 )
@@ -94,6 +94,11 @@ def test_get_sizes(mock_controllers):
     with patch('genai_sdk_services.storage.StorageController.get_size_of_files'):
         get_sizes('s3://origin', 'prefix')
 
+def test_get_file_version(mock_controllers):
+    with patch('genai_sdk_services.storage.StorageController.get_file_version') as mock_version:
+        mock_version.return_value = {'etag': '"0x1"', 'last_modified': '2024-01-01 00:00:00+00:00'}
+        assert get_file_version('s3://origin', 'file.json') == {'etag': '"0x1"', 'last_modified': '2024-01-01 00:00:00+00:00'}
+
 def test_download_filesss(mock_controllers):
     with patch('genai_sdk_services.storage.StorageController.download_file'):
         files = [('remote1', 'local1')]
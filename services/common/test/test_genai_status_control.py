@@ -176,6 +176,8 @@ def test_update_status(origin, key):
     msg = "New status message"
     update_status(origin, key, msg)
     mock_dbc.update.assert_called_with(origin, key, None, msg)
+    update_status(origin, key, msg, ex=60)
+    mock_dbc.update.assert_called_with(origin, key, None, msg, ex=60)
 
 # Tests for persist_images
 def test_persist_images(origin, key):
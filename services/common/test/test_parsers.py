@@ -100,6 +100,36 @@ class TestParserInforetrieval:
         retrieval_object = ManagerParser.get_parsed_object(conf_input)
         assert isinstance(retrieval_object, ParserInforetrieval)
 
+    def test_execution_mode(self):
+        conf_input = copy.deepcopy(self.conf)
+        retrieval_object = ManagerParser.get_parsed_object(conf_input)
+        assert retrieval_object.execution_mode == "sequential"
+
+        conf_input = copy.deepcopy(self.conf)
+        conf_input['json_input']['indexation_conf']['execution_mode'] = "concurrent"
+        retrieval_object = ManagerParser.get_parsed_object(conf_input)
+        assert retrieval_object.execution_mode == "concurrent"
+
+        conf_input = copy.deepcopy(self.conf)
+        conf_input['json_input']['indexation_conf']['execution_mode'] = "parallel"
+        with pytest.raises(PrintableGenaiError):
+            ManagerParser.get_parsed_object(conf_input)
+
+    def test_search_mode(self):
+        conf_input = copy.deepcopy(self.conf)
+        retrieval_object = ManagerParser.get_parsed_object(conf_input)
+        assert retrieval_object.search_mode == "per_retriever"
+
+        conf_input = copy.deepcopy(self.conf)
+        conf_input['json_input']['indexation_conf']['search_mode'] = "msearch"
+        retrieval_object = ManagerParser.get_parsed_object(conf_input)
+        assert retrieval_object.search_mode == "msearch"
+
+        conf_input = copy.deepcopy(self.conf)
+        conf_input['json_input']['indexation_conf']['search_mode'] = "single"
+        with pytest.raises(PrintableGenaiError):
+            ManagerParser.get_parsed_object(conf_input)
+
 class TestParserInfoindexing:
     json_input = {
         "generic": {
@@ -193,3 +223,35 @@ class TestParserInfoindexing:
         conf_input = copy.deepcopy(self.conf)
         with pytest.raises(PrintableGenaiError):
             ManagerParser.get_parsed_object(conf_input)
+
+    def test_execution_mode(self):
+        parser = ParserInfoindexing.__new__(ParserInfoindexing)
+        parser.index_conf = {}
+        parser.get_execution_mode()
+        assert parser.execution_mode == "sequential"
+
+        parser.index_conf = {"execution_mode": "concurrent"}
+        parser.get_execution_mode()
+        assert parser.execution_mode == "concurrent"
+
+        with patch.dict(os.environ, {"INDEXING_EXECUTION_MODE": "concurrent"}):
+            parser.index_conf = {}
+            parser.get_execution_mode()
+            assert parser.execution_mode == "concurrent"
+
+        parser.index_conf = {"execution_mode": "parallel"}
+        with pytest.raises(PrintableGenaiError):
+            parser.get_execution_mode()
+
+    def test_incremental(self):
+        parser = ParserInfoindexing.__new__(ParserInfoindexing)
+        parser.metadata_primary_keys = ["filename"]
+        assert parser.get_incremental({}) is False
+        assert parser.get_incremental({"incremental": True}) is True
+
+        with pytest.raises(PrintableGenaiError):
+            parser.get_incremental({"incremental": "yes"})
+
+        parser.metadata_primary_keys = None
+        with pytest.raises(PrintableGenaiError):
+            parser.get_incremental({"incremental": True})
@@ -0,0 +1,129 @@
+### This code is property of the GGAO ###
+
+# Native imports
+import json
+from types import SimpleNamespace
+
+# Installed imports
+import pytest
+from unittest.mock import patch
+
+# Local imports
+from common.ir.result_cache import RetrievalResultCache, bump_index_generation
+
+
+REDIS_ORIGIN = ("redis", "retrieval_cache")
+
+
+def get_input_object(**kwargs):
+    params = {"index": "test_index", "query": "What is  the revenue?", "filters": {"filename": "a.pdf"}, "top_k": 5,
+              "strategy": "genai_retrieval", "rescoring_function": "mean",
+              "models": [{"alias": "bm25", "embedding_model": "bm25"}, {"alias": "ada", "embedding_model": "ada-002"}]}
+    params.update(kwargs)
+    return SimpleNamespace(**params)
+
+
+class FakeRedis(object):
+    """ Replaces the redis functions of genai_status_control with a dict """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def get_value(self, origin, key, format_json=False):
+        value = self.data.get(key)
+        if format_json:
+            return json.loads(value) if value else {}
+        return [{'key': key, 'values': value.encode() if isinstance(value, str) else value}]
+
+    def update_status(self, origin, key, msg, ex=None):
+        self.data[key] = msg
+        self.expires[key] = ex
+
+    def incr_status_count(self, origin, key, count=1):
+        self.data[key] = str(int(self.data.get(key, 0)) + count)
+        return int(self.data[key])
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch('common.ir.result_cache.get_value', fake.get_value), \
+            patch('common.ir.result_cache.update_status', fake.update_status), \
+            patch('common.ir.result_cache.incr_status_count', fake.incr_status_count), \
+            patch('common.ir.result_cache.dbc') as mock_dbc:
+        yield fake
+        mock_dbc.delete.assert_not_called()
+
+
+def test_request_hash():
+    request_hash = RetrievalResultCache.get_request_hash(get_input_object())
+    # Whitespaces in the query and the order of the filters do not change the hash
+    assert request_hash == RetrievalResultCache.get_request_hash(get_input_object(query="What is the revenue? "))
+    assert request_hash == RetrievalResultCache.get_request_hash(get_input_object(filters={"filename": "a.pdf"}))
+    for changes in [{"top_k": 6}, {"filters": {}}, {"rescoring_function": "rrf"}, {"index": "other"},
+                    {"execution_mode": "concurrent"}, {"search_mode": "msearch"},
+                    {"models": [{"alias": "bm25", "embedding_model": "bm25"}]}]:
+        assert request_hash != RetrievalResultCache.get_request_hash(get_input_object(**changes))
+
+
+def test_memory_cache():
+    cache = RetrievalResultCache("memory", maxsize=10, ttl=60)
+    assert cache.enabled
+    assert cache.get("test_index", "hash") is None
+    cache.set("test_index", "hash", [{"id_": "1"}])
+    cache.set("other_index", "hash", [{"id_": "2"}])
+    assert cache.get("test_index", "hash") == [{"id_": "1"}]
+
+    cache.bump_generation("test_index")
+    assert cache.get("test_index", "hash") is None
+    assert cache.get("other_index", "hash") == [{"id_": "2"}]
+    assert cache.get_stats()["hits"] == 2 and cache.get_stats()["misses"] == 2
+
+
+def test_disabled_cache():
+    cache = RetrievalResultCache("")
+    assert not cache.enabled
+    assert cache.get_stats()["backend"] == "disabled"
+    with pytest.raises(ValueError):
+        RetrievalResultCache("redis")
+
+
+def test_redis_cache(redis):
+    cache = RetrievalResultCache("redis", ttl=59.5, redis_origin=REDIS_ORIGIN)
+    cache.set("test_index", "hash", [{"id_": "1"}])
+    assert cache.get("test_index", "hash") == [{"id_": "1"}]
+    # Redis expires the results
+    assert redis.expires["retrieval_result:test_index:0:hash"] == 60
+
+    # Infoindexing bumps the shared generation after indexing, the old results are left to expire
+    assert bump_index_generation("test_index", REDIS_ORIGIN) == 1
+    assert cache.get("test_index", "hash") is None
+    assert "retrieval_result:test_index:0:hash" in redis.data
+
+    cache.ttl = -1
+    cache.set("test_index", "hash", [{"id_": "1"}])
+    assert cache.get("test_index", "hash") is None
+
+
+def test_result_of_old_generation(redis):
+    cache = RetrievalResultCache("redis", ttl=60, redis_origin=REDIS_ORIGIN)
+    generation = cache.get_generation("test_index")
+    assert cache.get("test_index", "hash", generation) is None
+    # The index is modified while the request retrieves
+    bump_index_generation("test_index", REDIS_ORIGIN)
+    cache.set("test_index", "hash", [{"id_": "1"}], generation)
+    assert cache.get("test_index", "hash") is None
+
+
+def test_memory_cache_shared_generations(redis):
+    cache = RetrievalResultCache("memory", redis_origin=REDIS_ORIGIN)
+    cache.set("test_index", "hash", [{"id_": "1"}])
+    assert cache.get("test_index", "hash") == [{"id_": "1"}]
+    bump_index_generation("test_index", REDIS_ORIGIN)
+    assert cache.get("test_index", "hash") is None
+
+
+def test_bump_without_redis():
+    with patch('common.ir.result_cache.db_dbs', {'retrieval_cache': ("redis", None)}):
+        assert bump_index_generation("test_index") is None
@@ -316,6 +316,34 @@ def test_delete_template(mock_delete_file, storage_manager):
         assert response["status"] == "error"
         mock_error.assert_called_once()
 
+@patch.dict(os.environ, {}, clear=True)
+@patch("storage_manager.list_files")
+def test_get_template_names(mock_list_files, storage_manager):
+    mock_list_files.return_value = [PROMPTS_PATH + "template1.json", PROMPTS_PATH + "readme.txt", "template2.json"]
+    assert storage_manager.get_template_names() == ["template1", "template2"]
+
+    with patch.dict(os.environ, {"LANGFUSE": "true"}):
+        storage_manager.langfuse_m = MagicMock()
+        storage_manager.langfuse_m.get_list_templates.return_value = ["template3"]
+        assert storage_manager.get_template_names() == ["template3"]
+
+@patch.dict(os.environ, {}, clear=True)
+@patch("storage_manager.get_file_version")
+def test_get_template_version(mock_get_file_version, storage_manager):
+    mock_get_file_version.return_value = {"etag": "0x1", "last_modified": "2024-01-01"}
+    assert storage_manager.get_template_version("template1") == {"etag": "0x1", "last_modified": "2024-01-01"}
+    mock_get_file_version.assert_called_once_with(WORKSPACE, PROMPTS_PATH + "template1.json")
+
+    # File not found
+    mock_get_file_version.return_value = False
+    assert storage_manager.get_template_version("template1") is None
+
+    # Langfuse prompts are not fetched to get their version
+    with patch.dict(os.environ, {"LANGFUSE": "true"}):
+        storage_manager.langfuse_m = MagicMock()
+        assert storage_manager.get_template_version("template1") is None
+        storage_manager.langfuse_m.load_template.assert_not_called()
+
 @patch("common.genai_controllers.load_file")
 def test_init_load_file_fallback(mock_load_file):
     # Test fallback mechanism
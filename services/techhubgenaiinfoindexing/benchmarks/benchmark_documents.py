@@ -0,0 +1,106 @@
+### This code is property of the GGAO ###
+"""Benchmark of the conversion of the dataframe of a csv dataset to llama-index Documents
+(VectorDB._get_documents_from_dataframe) against the previous row by row conversion (iterrows, kept here as reference).
+
+Modes:
+    conversion: the language detection is replaced by a constant in both, only the conversion is measured
+    language_column: the rows have a 'language' column, the row by row conversion detects the language anyway
+    detection: the language is detected in both (langdetect dominates the time)
+
+Usage (from the service folder): python benchmarks/benchmark_documents.py [--sizes 10000 100000]
+    [--modes conversion language_column]
+"""
+
+
+# Native imports
+import os
+import sys
+import time
+import random
+import argparse
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Installed imports
+import pandas as pd
+import langdetect
+from llama_index.core import Document
+
+# Custom imports
+from vector_storages import LlamaIndexElastic
+
+
+WORDS = ("la compañía aumentó sus ingresos en el último trimestre gracias a la energía y el agua "
+         "the revenue of the quarter grew in every market and the costs were reduced").split()
+JAPANESE = "今期の売上高はすべての市場で増加しました"
+
+
+def get_dataframe(n_rows: int, language_column: bool) -> pd.DataFrame:
+    rng = random.Random(n_rows)
+    texts = [JAPANESE if i % 20 == 0 else " ".join(rng.choices(WORDS, k=60)) for i in range(n_rows)]
+    df = pd.DataFrame({"Url": [f"doc_{i}.txt" for i in range(n_rows)], "CategoryId": "", "text": texts,
+                       "author": [f"author_{i % 50}" for i in range(n_rows)], "year": [2000 + i % 25 for i in range(n_rows)],
+                       "score": [i / 7 for i in range(n_rows)]})
+    if language_column:
+        df["language"] = ["ja" if i % 20 == 0 else "es" for i in range(n_rows)]
+    return df
+
+
+def get_documents_iterrows(vector_db, df: pd.DataFrame, markdown_txts: list, txt_path: str, csv: bool,
+                           do_titles: bool, do_tables: bool) -> list:
+    """Previous conversion: a row at a time, detecting the language of every row"""
+    chars_origin = "áéíóúÁÉÍÓÚàèìòùÀÈÌÒÙäëïöüÄËÏÖÜâêîôûÂÊÎÔÛ"
+    chars_parsed = "aeiouAEIOUaeiouAEIOUaeiouAEIOUaeiouAEIOU"
+    elastic_docs = [
+        {
+            'content': row['text'],
+            'meta': {column: str(row[column]) for column in row.index if
+                     column not in ['Url', 'CategoryId', 'text']}
+        } for index, row in df.iterrows() if row['text']
+    ]
+
+    final_docs = []
+    for i, doc in enumerate(elastic_docs):
+        if langdetect.detect(doc['content']) != 'ja':
+            doc['content'] = doc['content'].translate(str.maketrans(chars_origin, chars_parsed))
+        do_titles = do_titles and markdown_txts[i] is not None
+        do_tables = do_tables and markdown_txts[i] is not None
+        vector_db._initialize_metadata(doc, txt_path, doc_url=df['Url'].iloc[i], csv=csv, do_titles=do_titles, do_tables=do_tables)
+        final_docs.append(Document(text=doc['content'], metadata=doc['meta']))
+    return final_docs
+
+
+def detect_constant(text: str) -> str:
+    return "ja" if text == JAPANESE else "es"
+
+
+def run(function, df: pd.DataFrame, detect) -> tuple:
+    vector_db = LlamaIndexElastic(MagicMock(), "workspace", "origin", {})
+    with patch("vector_storages.langdetect.detect", detect), patch(f"{__name__}.langdetect.detect", detect):
+        start = time.perf_counter()
+        docs = function(vector_db, df, [], "", True, False, False)
+    return time.perf_counter() - start, [(doc.text, doc.metadata) for doc in docs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Rows of the dataframe")
+    parser.add_argument("--modes", nargs="+", default=["conversion", "language_column"],
+                        choices=["conversion", "language_column", "detection"])
+    args = parser.parse_args()
+
+    new = lambda vector_db, *arguments: vector_db._get_documents_from_dataframe(*arguments)
+    print(f"{'mode':<18}{'rows':>8}{'iterrows (s)':>14}{'columnar (s)':>14}{'speedup':>9}  same documents")
+    for mode in args.modes:
+        for n_rows in args.sizes:
+            detect = detect_constant if mode == "conversion" else langdetect.detect
+            df = get_dataframe(n_rows, language_column=mode == "language_column")
+            baseline_time, baseline_docs = run(get_documents_iterrows, df, detect)
+            new_time, new_docs = run(new, df, detect)
+            print(f"{mode:<18}{n_rows:>8}{baseline_time:>14.2f}{new_time:>14.2f}{baseline_time / new_time:>8.1f}x  "
+                  f"{new_docs == baseline_docs}")
+
+
+if __name__ == "__main__":
+    main()
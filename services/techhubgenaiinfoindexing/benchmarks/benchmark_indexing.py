@@ -0,0 +1,246 @@
+### This code is property of the GGAO ###
+"""Offline throughput benchmark of the indexation of documents, without cloud services: every document is indexed as
+the worker does with a message (get_specific_files -> get_processed_data -> index_documents), reading the preprocessed
+txt files from a local folder, embedding with a deterministic fake model and writing in an in-process fake
+Elasticsearch with the same BulkNodeWriter used by the service.
+
+Every corpus (language x number of documents x chunking method) runs in its own process, so the peak RSS is the one
+of that corpus. The time is split in phases:
+    load: reading the txt files from the storage (get_specific_files)
+    process: conversion to Documents and metadata checks (get_processed_data, langdetect included)
+    chunking: chunking method (ManagerChunkingMethods)
+    embedding: calls to the embedding model (--embedding-latency simulates the latency of a remote model by batch)
+    write: bulk requests to the vector store
+    other: the rest of index_documents (token counting, embedding cache, reports)
+
+Usage (from the service folder): python benchmarks/benchmark_indexing.py [--docs 10 100] [--languages en es ja]
+    [--methods simple recursive surrounding_context_window] [--words 2000] [--embedding-latency 0]
+"""
+
+
+# Native imports
+import os
+import sys
+import time
+import random
+import hashlib
+import resource
+import argparse
+import tempfile
+import warnings
+from types import SimpleNamespace
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Only the results are printed (no logs of every document nor progress bars)
+os.environ.setdefault('LOG_LEVEL', "WARNING")
+os.environ.setdefault('TQDM_DISABLE', "1")
+warnings.simplefilter('ignore')
+
+# Installed imports
+from llama_index.core import MockEmbedding
+
+# Custom imports
+from common.storage_manager import IRStorageManager
+from chunking_methods import ChunkingMethod, ManagerChunkingMethods
+from bulk_writer import BulkNodeWriter
+from vector_storages import LlamaIndexElastic
+
+
+WORDS = {
+    "en": ("the revenue of the quarter grew in every market while the operating costs were reduced and the company "
+           "invested in renewable energy water networks and digital services for its customers").split(),
+    "es": ("la compañía aumentó sus ingresos en el último trimestre gracias a la energía renovable el agua y los "
+           "servicios digitales mientras reducía los costes de operación en todos los mercados").split(),
+    "ja": ["今期の", "売上高は", "すべての", "市場で", "増加し", "営業費用は", "削減されました", "再生可能", "エネルギー",
+           "水道", "デジタル", "サービスに", "投資しました"]
+}
+CHUNKING_METHODS = {
+    "simple": {"method": "simple", "window_length": 300, "window_overlap": 10},
+    "recursive": {"method": "recursive", "window_length": 300, "window_overlap": 10, "sub_window_length": 100,
+                  "sub_window_overlap": 10},
+    "surrounding_context_window": {"method": "surrounding_context_window", "window_length": 300, "window_overlap": 10,
+                                   "windows": 1}
+}
+GET_CHUNKING_METHOD = ManagerChunkingMethods.get_chunking_method
+PHASES = ["load", "process", "chunking", "embedding", "write", "other"]
+EMBED_DIM = 256
+
+
+class FakeEmbedding(MockEmbedding):
+    """Deterministic embedding model: the embedding depends only on the text, every batch waits the latency"""
+
+    def __init__(self, latency: float, **kwargs):
+        super().__init__(embed_dim=EMBED_DIM, **kwargs)
+        self.__dict__["latency"] = latency
+
+    def embed_text(self, text: str) -> list:
+        seed = hashlib.sha256(text.encode()).digest()
+        return [(seed[i % len(seed)] - 128) / 128 for i in range(EMBED_DIM)]
+
+    def _get_text_embeddings(self, texts):
+        time.sleep(self.latency)
+        return [self.embed_text(text) for text in texts]
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query):
+        return self.embed_text(query)
+
+
+class FakeIndices(object):
+    def __init__(self):
+        self.mappings = {}
+
+    def exists(self, index):
+        return index in self.mappings
+
+    def create(self, index, mappings, settings):
+        self.mappings[index] = mappings
+
+    def refresh(self, index):
+        pass
+
+
+class FakeElasticsearch(object):
+    """In-process Elasticsearch with the bulk requests used by BulkNodeWriter"""
+
+    def __init__(self):
+        self.indices = FakeIndices()
+        self.documents = {}
+
+    def bulk(self, operations):
+        items = []
+        for header, source in zip(operations[::2], operations[1::2]):
+            action = header["index"]
+            self.documents.setdefault(action["_index"], {})[action["_id"]] = source
+            items.append({"index": {"_id": action["_id"], "status": 201}})
+        return {"errors": False, "items": items}
+
+
+class FakeConnector(object):
+    MODEL_FORMAT = "elastic"
+
+    def __init__(self):
+        self.connection = FakeElasticsearch()
+
+    def assert_correct_index_metadata(self, index_name, docs, extra_metadata):
+        pass
+
+
+def timed(phase: str, times: dict, function):
+    """Wrap a function to add its time to a phase"""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            times[phase] += time.perf_counter() - start
+    return wrapper
+
+
+def write_corpus(folder: str, language: str, n_docs: int, n_words: int) -> list:
+    """Write the preprocessed txt files of the documents (url, text, language and pages separated by tabs)"""
+    rng = random.Random(f"{language}-{n_docs}-{n_words}")
+    paths = []
+    for i in range(n_docs):
+        sentences = []
+        for _ in range(n_words // 15):
+            sentence = rng.choices(WORDS[language], k=15)
+            sentences.append(("" if language == "ja" else " ").join(sentence) + ("。" if language == "ja" else "."))
+        path = f"benchmark/ir_index_benchmark/txt/{language}/doc_{i}.txt"
+        os.makedirs(os.path.dirname(os.path.join(folder, path)), exist_ok=True)
+        with open(os.path.join(folder, path), "w", encoding="utf-8") as file:
+            file.write("\t".join([f"{language}/doc_{i}.pdf", " ".join(sentences), language, "1"]))
+        paths.append(path)
+    return paths
+
+
+def get_input_object(txt_path: str, chunking_method: dict) -> SimpleNamespace:
+    """Parsed input of the indexation of a document"""
+    return SimpleNamespace(index="benchmark", models=[{"embedding_model": "fake-embedding", "platform": "fake"}],
+                           txt_path=txt_path, csv=False, dataset_csv_path="", do_titles=False, do_tables=False,
+                           department="benchmark", process_id="ir_index_benchmark", process_type="ir_index",
+                           chunking_method=dict(chunking_method), metadata_primary_keys=None, index_metadata=False,
+                           specific={"document": {"n_pags": 1}}, vector_storage={"vector_storage_name": "fake"},
+                           override=False, execution_mode="sequential")
+
+
+def run_corpus(language: str, n_docs: int, n_words: int, method: str, embedding_latency: float) -> dict:
+    """Index a corpus document by document and measure the time of every phase (run in its own process)"""
+    times = dict.fromkeys(PHASES, 0.0)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_corpus(folder, language, n_docs, n_words)
+
+        def load_file(origin, file):
+            with open(os.path.join(folder, file), "rb") as local_file:
+                return local_file.read()
+
+        embed_model = FakeEmbedding(embedding_latency)
+        connector = FakeConnector()
+        vector_db = LlamaIndexElastic(connector, "workspace", "origin", {})
+        with patch("common.storage_manager.load_file", load_file), \
+                patch.object(LlamaIndexElastic, "_get_embed_model", lambda self, model: embed_model), \
+                patch.object(FakeEmbedding, "_get_text_embeddings",
+                             timed("embedding", times, FakeEmbedding._get_text_embeddings)), \
+                patch.object(BulkNodeWriter, "send", timed("write", times, BulkNodeWriter.send)), \
+                patch.object(ManagerChunkingMethods, "get_chunking_method",
+                             lambda conf: get_timed_chunking_method(conf, times)):
+            file_loader = IRStorageManager("workspace", "origin")
+            start = time.perf_counter()
+            index_time = 0.0
+            for path in paths:
+                io = get_input_object(path, CHUNKING_METHODS[method])
+                dataframe_file, markdowns_file = timed("load", times, file_loader.get_specific_files)(io)
+                docs = timed("process", times, vector_db.get_processed_data)(io, dataframe_file, markdowns_file)
+                index_start = time.perf_counter()
+                vector_db.index_documents(docs, io)
+                index_time += time.perf_counter() - index_start
+            total = time.perf_counter() - start
+
+    times["other"] = max(index_time - times["chunking"] - times["embedding"] - times["write"], 0.0)
+    n_chunks = sum(len(documents) for documents in connector.connection.documents.values())
+    return {"language": language, "docs": n_docs, "method": method, "chunks": n_chunks, "seconds": total,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "times": times}
+
+
+def get_timed_chunking_method(conf: dict, times: dict) -> ChunkingMethod:
+    """Chunking method of the configuration with its get_chunks timed"""
+    chunking_method = GET_CHUNKING_METHOD(conf)
+    chunking_method.get_chunks = timed("chunking", times, chunking_method.get_chunks)
+    return chunking_method
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[10, 100], help="Documents of every corpus")
+    parser.add_argument("--languages", nargs="+", default=["en", "es", "ja"], choices=list(WORDS))
+    parser.add_argument("--methods", nargs="+", default=["simple"], choices=list(CHUNKING_METHODS))
+    parser.add_argument("--words", type=int, default=2000, help="Words of every document")
+    parser.add_argument("--embedding-latency", type=float, default=0.0,
+                        help="Seconds waited by every call to the fake embedding model")
+    args = parser.parse_args()
+
+    print(f"{'language':<9}{'method':<28}{'docs':>6}{'chunks':>8}{'seconds':>9}{'docs/s':>9}{'chunks/s':>10}"
+          f"{'peak RSS MB':>13}  " + "  ".join(f"{phase:>9}" for phase in PHASES))
+    for method in args.methods:
+        for language in args.languages:
+            for n_docs in args.docs:
+                # A new process by corpus, so the peak RSS is not the one of the previous corpora
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    result = executor.submit(run_corpus, language, n_docs, args.words, method,
+                                             args.embedding_latency).result()
+                seconds = result["seconds"]
+                phases = "  ".join(f"{result['times'][phase] / seconds:>8.1%}" for phase in PHASES)
+                print(f"{language:<9}{method:<28}{n_docs:>6}{result['chunks']:>8}{seconds:>9.2f}"
+                      f"{n_docs / seconds:>9.1f}{result['chunks'] / seconds:>10.1f}{result['peak_rss_mb']:>13.1f}  "
+                      f"{phases}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import json
+import math
+import time
+import random
+import logging
+from typing import Iterator, List
+
+# Installed imports
+from httpx import TimeoutException
+from openai import RateLimitError
+from elastic_transport import TransportError
+from elasticsearch import ApiError
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch.helpers.vectorstore import DenseVectorStrategy, DistanceMetric
+from llama_index.core.indices.utils import embed_nodes
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+
+class BulkNodeWriter(object):
+    """ Writes llama-index nodes in an elastic index with bulk requests. The nodes of all the documents are grouped
+    in batches bounded by number of nodes and by bytes, every batch is embedded once and only its failed items are
+    sent again, waiting an exponential backoff with jitter between tries. The documents have the same format as the
+    ones written by the llama-index ElasticsearchStore (content, metadata and embedding fields) """
+
+    # Item status that can succeed if they are sent again (rejected by a full queue or unavailable shards)
+    RETRYABLE_STATUS = [429, 500, 502, 503, 504]
+    # Keyword metadata added by the llama-index ElasticsearchStore to the mapping
+    METADATA_MAPPINGS = {"document_id": {"type": "keyword"}, "doc_id": {"type": "keyword"},
+                         "ref_doc_id": {"type": "keyword"}}
+
+    def __init__(self, client, index_name: str, max_nodes: int = 500, max_bytes: int = 10485760,
+                 max_retries: int = 5, backoff: float = 1.0, max_backoff: float = 30.0, logger=None):
+        """ Creates the writer
+
+        :param client: Sync elasticsearch client
+        :param index_name: Index to write the nodes in
+        :param max_nodes: Max number of nodes of a bulk request
+        :param max_bytes: Max size in bytes of a bulk request
+        :param max_retries: Max number of retries of a batch (embedding or failed items)
+        :param backoff: Seconds to wait before the first retry, doubled in every retry
+        :param max_backoff: Max seconds to wait before a retry
+        :param logger: Logger to report the throughput of the batches
+        """
+        self.client = client
+        self.index_name = index_name
+        self.max_nodes = max(1, max_nodes)
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.logger = logger or logging.getLogger(__name__)
+
+    def get_backoff(self, attempt: int) -> float:
+        """ Seconds to wait before a retry: random between 0 and the exponential backoff (full jitter), so the
+        workers that failed at the same time do not retry at the same time
+
+        :param attempt: Number of the retry (starting in 0)
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get_action(self, node: BaseNode, embedding: list) -> dict:
+        """ Bulk action of a node with its embedding """
+        return {
+            "_id": node.node_id,
+            "content": node.get_content(metadata_mode=MetadataMode.NONE),
+            "metadata": node_to_metadata_dict(node, remove_text=True),
+            "embedding": embedding
+        }
+
+    def split_by_bytes(self, actions: List[dict]) -> Iterator[List[tuple]]:
+        """ Split the actions in groups of (action, bytes) that do not exceed the max bytes of a request (an action
+        bigger than the limit is sent alone) """
+        batch, batch_bytes = [], 0
+        for action in actions:
+            n_bytes = len(json.dumps(action, ensure_ascii=False).encode())
+            if batch and batch_bytes + n_bytes > self.max_bytes:
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append((action, n_bytes))
+            batch_bytes += n_bytes
+        if batch:
+            yield batch
+
+    def create_index_if_not_exists(self, num_dimensions: int):
+        """ Create the index with the same mappings as the llama-index ElasticsearchStore
+
+        :param num_dimensions: Dimensions of the embeddings
+        """
+        if self.client.indices.exists(index=self.index_name):
+            return
+        mappings, settings = DenseVectorStrategy(distance=DistanceMetric.COSINE).es_mappings_settings(
+            text_field="content", vector_field="embedding", num_dimensions=num_dimensions)
+        mappings["properties"]["metadata"] = {"properties": dict(self.METADATA_MAPPINGS)}
+        self.client.indices.create(index=self.index_name, mappings=mappings, settings=settings)
+
+    def embed(self, nodes: List[BaseNode], embed_model) -> tuple:
+        """ Get the embeddings of the nodes, retrying with backoff when the embedding model is not available
+
+        :param nodes: Nodes to embed
+        :param embed_model: Embedding model
+        :return: Embeddings by node id and number of tries
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return embed_nodes(nodes, embed_model), attempt + 1
+            except (TimeoutException, RateLimitError) as ex:
+                if attempt == self.max_retries:
+                    raise
+                wait = self.get_backoff(attempt)
+                self.logger.warning(f"{type(ex).__name__} embedding {len(nodes)} nodes, retrying in {wait:.1f}s, "
+                                    f"try {attempt + 1}/{self.max_retries}")
+                time.sleep(wait)
+
+    def send(self, batch: List[tuple], failed_items: list = None) -> int:
+        """ Send a bulk request with the actions, sending again only the failed ones while they can succeed
+
+        :param batch: Actions with their size in bytes
+        :param failed_items: When it is passed, the items that can not be written are added to it instead of raising
+            a BulkIndexError (the rest of the batch is still written)
+        :return: Number of retries needed
+        """
+        pending = [action for action, _ in batch]
+        for attempt in range(self.max_retries + 1):
+            failed = []
+            try:
+                operations = []
+                for action in pending:
+                    operations.append({"index": {"_index": self.index_name, "_id": action["_id"]}})
+                    operations.append({key: value for key, value in action.items() if key != "_id"})
+                response = self.client.bulk(operations=operations)
+                if not response["errors"]:
+                    return attempt
+                for action, item in zip(pending, response["items"]):
+                    result = item.get("index", {})
+                    if result.get("error"):
+                        failed.append((action, result))
+                errors = [result for _, result in failed if result.get("status") not in self.RETRYABLE_STATUS]
+                if errors:
+                    if failed_items is None:
+                        raise BulkIndexError(f"{len(errors)} document(s) failed to index.", errors)
+                    failed_items.extend(errors)
+                    failed = [(action, result) for action, result in failed if result.get("status") in self.RETRYABLE_STATUS]
+                    if not failed:
+                        return attempt
+                pending = [action for action, _ in failed]
+                reason = f"{len(pending)} items rejected"
+            except ApiError as ex:
+                if ex.status_code not in self.RETRYABLE_STATUS:
+                    if failed_items is None:
+                        raise
+                    failed_items.extend({"_id": action["_id"], "status": ex.status_code, "error": str(ex)}
+                                        for action in pending)
+                    return attempt
+                reason = f"{type(ex).__name__} {ex.status_code}"
+            except TransportError as ex:
+                reason = type(ex).__name__
+
+            if attempt == self.max_retries:
+                if failed_items is None:
+                    raise BulkIndexError(f"{len(pending)} document(s) failed to index after {self.max_retries} retries.",
+                                         [result for _, result in failed])
+                results = {result["_id"]: result for _, result in failed if "_id" in result}
+                failed_items.extend(results.get(action["_id"], {"_id": action["_id"], "error": reason})
+                                    for action in pending)
+                return attempt
+            wait = self.get_backoff(attempt)
+            self.logger.warning(f"Bulk request to {self.index_name} failed ({reason}), retrying {len(pending)} "
+                                f"nodes in {wait:.1f}s, try {attempt + 1}/{self.max_retries}")
+            time.sleep(wait)
+
+    def refresh(self):
+        """ Refresh the index so the written nodes can be searched (and deleted). A failed refresh is only logged, so
+        it does not replace the error of the writing when the index is refreshed after it """
+        try:
+            self.client.indices.refresh(index=self.index_name)
+        except Exception as ex:
+            self.logger.warning(f"Index {self.index_name} not refreshed: {type(ex).__name__}; {ex.args}")
+
+    def write(self, nodes_per_doc: List[List[BaseNode]], embed_model, isolate_failures: bool = False) -> dict:
+        """ Embed and write the nodes of all the documents
+
+        :param nodes_per_doc: Nodes by document
+        :param embed_model: Embedding model
+        :param isolate_failures: If True, the nodes that can not be embedded or written do not stop the writing, their
+            ids are returned in 'failed_ids'
+        :return: Stats of the writing: nodes, bytes, batches, retries, embedding tries, seconds, throughput and the
+            ids of the failed nodes
+        """
+        nodes = [node for nodes in nodes_per_doc for node in nodes]
+        stats = {"nodes": len(nodes), "bytes": 0, "batches": 0, "retries": 0, "embedded_nodes": 0, "failed_ids": []}
+        failed_items = [] if isolate_failures else None
+        index_checked = False
+        start = time.perf_counter()
+        try:
+            for i in range(0, len(nodes), self.max_nodes):
+                group = nodes[i:i + self.max_nodes]
+                try:
+                    id_to_embedding, tries = self.embed(group, embed_model)
+                except Exception as ex:
+                    if not isolate_failures:
+                        raise
+                    self.logger.warning(f"{len(group)} nodes not written in {self.index_name}, embedding failed: "
+                                        f"{type(ex).__name__}; {ex.args}")
+                    stats["failed_ids"].extend(node.node_id for node in group)
+                    continue
+                stats["embedded_nodes"] += len(group) * tries
+                if not index_checked:
+                    self.create_index_if_not_exists(len(next(iter(id_to_embedding.values()))))
+                    index_checked = True
+
+                for batch in self.split_by_bytes([self.get_action(node, id_to_embedding[node.node_id]) for node in group]):
+                    batch_start = time.perf_counter()
+                    stats["retries"] += self.send(batch, failed_items)
+                    elapsed = max(time.perf_counter() - batch_start, 1e-9)
+                    batch_bytes = sum(n_bytes for _, n_bytes in batch)
+                    stats["batches"] += 1
+                    stats["bytes"] += batch_bytes
+                    self.logger.debug(f"Bulk batch {stats['batches']} to {self.index_name}: {len(batch)} nodes, "
+                                      f"{batch_bytes} bytes in {elapsed:.2f}s ({len(batch) / elapsed:.1f} nodes/s, "
+                                      f"{batch_bytes / elapsed:.1f} bytes/s)")
+        finally:
+            # Also when the writing fails, so the nodes already written are visible to the deletion of the rollback
+            if index_checked:
+                self.refresh()
+        if failed_items:
+            stats["failed_ids"].extend(item["_id"] for item in failed_items)
+        stats["seconds"] = max(time.perf_counter() - start, 1e-9)
+        stats["nodes_per_second"] = stats["nodes"] / stats["seconds"]
+        stats["bytes_per_second"] = stats["bytes"] / stats["seconds"]
+        # Equivalent number of complete embedding passes (for the tokens report)
+        stats["tries"] = math.ceil(stats["embedded_nodes"] / stats["nodes"]) if nodes else 1
+        return stats
@@ -2,20 +2,24 @@
 
 
 # Native imports
-from typing import List
+from typing import List, Optional
 from abc import ABC, abstractmethod
 import uuid
 import os
 import re
 import json
+import math
 import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 
 # Installed imports
 from llama_index.core.node_parser import SentenceSplitter, SentenceWindowNodeParser
-from llama_index.core.schema import IndexNode
+from llama_index.core.schema import IndexNode, TextNode, NodeRelationship
 from llama_index.core import Document
 import mmh3
+import tiktoken
 
 
 # Custom imports
@@ -26,6 +30,137 @@ from common.services import CHUNKING_SERVICE
 from common.ir.parsers import Parser
 
 
+def get_node_parser(splitter: tuple, tokenizer):
+    """
+    Builds the node parser of a chunking method.
+
+    Args:
+        splitter (tuple): ("sentence", window_length, window_overlap) or ("window", window_length, window_overlap, windows).
+        tokenizer: The function used to count the tokens of the text.
+
+    Returns:
+        The SentenceSplitter or SentenceWindowNodeParser.
+    """
+    kind, window_length, window_overlap, *windows = splitter
+    sentence_splitter = SentenceSplitter(chunk_size=window_length, chunk_overlap=window_overlap,
+                                         tokenizer=tokenizer, paragraph_separator="\\n\\n")
+    if kind == "window":
+        return SentenceWindowNodeParser.from_defaults(sentence_splitter=sentence_splitter.split_text,
+                                                      window_size=windows[0], window_metadata_key="window",
+                                                      original_text_metadata_key="original_text")
+    return sentence_splitter
+
+
+_worker_parsers = {}
+
+
+def _split_sources(job: tuple) -> list:
+    """
+    Task of the chunking engine workers: splits a shard of sources with a node parser kept in the worker.
+
+    Args:
+        job (tuple): The encoding name, the splitter and the sources as (text, metadata, excluded embed keys,
+            excluded llm keys).
+
+    Returns:
+        list: The nodes of every source as (text, start char, end char, metadata added, excluded embed keys,
+            excluded llm keys).
+    """
+    encoding_name, splitter, sources = job
+    if (encoding_name, splitter) not in _worker_parsers:
+        _worker_parsers[(encoding_name, splitter)] = get_node_parser(splitter, tiktoken.get_encoding(encoding_name).encode)
+    parser = _worker_parsers[(encoding_name, splitter)]
+
+    splits = []
+    for text, metadata, excluded_embed_metadata_keys, excluded_llm_metadata_keys in sources:
+        source = TextNode(text=text, metadata=metadata, excluded_embed_metadata_keys=excluded_embed_metadata_keys,
+                          excluded_llm_metadata_keys=excluded_llm_metadata_keys)
+        splits.append([(node.text, node.start_char_idx, node.end_char_idx,
+                        {key: value for key, value in node.metadata.items() if key not in metadata},
+                        node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys)
+                       for node in parser.get_nodes_from_documents([source])])
+    return splits
+
+
+class ChunkingEngine(object):
+    """
+    Process pool that splits the documents of big batches using all the cores. The workers keep their node parsers
+    and tokenizers between batches and send the nodes back as tuples, rebuilt as the nodes of the serial split
+    (same metadata and relationships) so the ids generated afterwards and the order of the nodes do not change.
+    It is used when INDEXING_CHUNKING_WORKERS is greater than 1.
+    """
+    _instance = None
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        # Spawned processes, the worker threads of the parent are not copied
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @classmethod
+    def get_instance(cls) -> Optional["ChunkingEngine"]:
+        """
+        Gets the engine shared by the process (created the first time).
+
+        Returns:
+            ChunkingEngine: The engine, or None if the chunking is serial.
+        """
+        workers = int(os.environ.get('INDEXING_CHUNKING_WORKERS', 0))
+        if workers < 2:
+            return None
+        if cls._instance is None or cls._instance.workers != workers:
+            if cls._instance is not None:
+                cls._instance.executor.shutdown(wait=False)
+            cls._instance = cls(workers)
+        return cls._instance
+
+    @staticmethod
+    def rebuild_nodes(source, splits: list) -> list:
+        """
+        Builds the nodes of a source as the node parser does.
+
+        Args:
+            source: The document or node that was split.
+            splits (list): The nodes returned by the worker.
+
+        Returns:
+            list: The TextNodes with the metadata of the source and the source, previous and next relationships.
+        """
+        source_info = source.as_related_node_info()
+        nodes = []
+        for text, start_char_idx, end_char_idx, metadata, excluded_embed_metadata_keys, excluded_llm_metadata_keys in splits:
+            nodes.append(TextNode(text=text, start_char_idx=start_char_idx, end_char_idx=end_char_idx,
+                                  metadata={**source.metadata, **metadata},
+                                  excluded_embed_metadata_keys=excluded_embed_metadata_keys,
+                                  excluded_llm_metadata_keys=excluded_llm_metadata_keys,
+                                  metadata_seperator=source.metadata_separator,
+                                  metadata_template=source.metadata_template, text_template=source.text_template,
+                                  relationships={NodeRelationship.SOURCE: source_info}))
+        for previous, node in zip(nodes, nodes[1:]):
+            node.relationships[NodeRelationship.PREVIOUS] = previous.as_related_node_info()
+            previous.relationships[NodeRelationship.NEXT] = node.as_related_node_info()
+        return nodes
+
+    def split(self, sources: list, encoding_name: str, splitter: tuple) -> list:
+        """
+        Splits the sources in the workers, in contiguous shards so the order is kept.
+
+        Args:
+            sources (list): The documents or nodes to split.
+            encoding_name (str): The tiktoken encoding used to count the tokens.
+            splitter (tuple): The splitter of the chunking method (see get_node_parser).
+
+        Returns:
+            list: The nodes of every source.
+        """
+        shard_size = math.ceil(len(sources) / (self.workers * 4))
+        jobs = [(encoding_name, splitter, [(source.text, source.metadata, source.excluded_embed_metadata_keys,
+                                            source.excluded_llm_metadata_keys)
+                                           for source in sources[i:i + shard_size]])
+                for i in range(0, len(sources), shard_size)]
+        splits = [source_splits for shard in self.executor.map(_split_sources, jobs) for source_splits in shard]
+        return [self.rebuild_nodes(source, source_splits) for source, source_splits in zip(sources, splits)]
+
+
 class ChunkingMethod(ABC):
     CHUNKING_FORMAT = "ChunkingMethod"
 
@@ -92,6 +227,25 @@ class ChunkingMethod(ABC):
             id = "{:02x}".format(mmh3.hash128(str(node.text), signed=False))
         return id
 
+    def _get_nodes(self, sources: list, encoding, splitter: tuple, show_progress: bool = True) -> list:
+        """
+        Splits the sources in nodes, in the chunking engine when it is enabled and there are several sources.
+
+        Args:
+            sources (list): The documents or nodes to split.
+            encoding: The encoding used to count the tokens.
+            splitter (tuple): The splitter of the chunking method (see get_node_parser).
+            show_progress (bool): Whether to show the progress of the serial split.
+
+        Returns:
+            list: The nodes of every source.
+        """
+        engine = ChunkingEngine.get_instance()
+        if engine and len(sources) > 1 and isinstance(getattr(encoding, "name", None), str):
+            return engine.split(sources, encoding.name, splitter)
+        node_parser = get_node_parser(splitter, encoding.encode)
+        return [node_parser.get_nodes_from_documents([source], show_progress=show_progress) for source in sources]
+
     def _add_nodes_metadata(self, nodes, origin, io: Parser):
         """
         Enhances each node with additional metadata and prepares it for further processing.
@@ -116,8 +270,9 @@ class ChunkingMethod(ABC):
             "original_text", "index_id", "sections_headers", "tables"
         ]
 
+        files = self._prefetch_titles_and_tables(nodes, origin)
         for counter, node in enumerate(nodes):
-            titles_tables_node, sections = self._add_titles_and_tables(node, sections, origin)
+            titles_tables_node, sections = self._add_titles_and_tables(node, sections, origin, files)
             ids_node = self._add_ids(titles_tables_node, counter, io.metadata_primary_keys)
 
             if isinstance(io.index_metadata, list):
@@ -149,7 +304,38 @@ class ChunkingMethod(ABC):
         node.id_ = id
         return node
 
-    def _add_titles_and_tables(self, node, sections: str, origin):
+    def _prefetch_titles_and_tables(self, nodes, origin) -> dict:
+        """
+        Loads at once the headers mappings and the table csvs referenced by the nodes of a document, so they are
+        downloaded and parsed only once instead of once per node. The files are loaded concurrently with
+        INDEXING_STORAGE_CONCURRENCY threads.
+
+        Args:
+            nodes (list): The nodes of a document.
+            origin: The origin information used for loading the files.
+
+        Returns:
+            dict: The headers mappings (parsed) and the tables (decoded) by path.
+        """
+        mapping_paths, table_paths = set(), set()
+        for node in nodes:
+            if node.metadata.get('_header_mapping'):
+                mapping_paths.add(node.metadata['_header_mapping'])
+            if node.metadata.get('_csv_path'):
+                table_paths.update(node.metadata['_csv_path'] + t + ".csv"
+                                   for t in re.findall(r"<(pag_\d+_table_\d+)>", node.text))
+        paths = sorted(mapping_paths | table_paths)
+        if not paths:
+            return {}
+
+        def load(path):
+            content = load_file(origin, path)
+            return json.loads(content) if path in mapping_paths else content.decode()
+
+        with ThreadPoolExecutor(max_workers=min(len(paths), int(os.getenv('INDEXING_STORAGE_CONCURRENCY', 8)))) as executor:
+            return dict(zip(paths, executor.map(load, paths)))
+
+    def _add_titles_and_tables(self, node, sections: str, origin, files: dict = None):
         """
         Processes a node's text to replace placeholders with actual titles and tables.
 
@@ -157,15 +343,20 @@ class ChunkingMethod(ABC):
             node: The node whose text is to be processed.
             sections (str): The current sections string to be updated.
             origin: The origin information used for loading additional data.
+            files (dict): The headers mappings and tables already loaded by path (see _prefetch_titles_and_tables),
+                the ones not found are loaded from storage.
 
         Returns:
             tuple: The updated node and sections string.
         """
+        files = files if files is not None else {}
         text = node.text
         meta = node.metadata
         mapping_path = meta.pop('_header_mapping', "")
         if mapping_path:
-            headers_mapping = json.loads(load_file(origin, mapping_path))
+            if mapping_path not in files:
+                files[mapping_path] = json.loads(load_file(origin, mapping_path))
+            headers_mapping = files[mapping_path]
             titles = re.findall(r"<(pag_\d+_header_\d+)>", text)
             if not titles:
                 meta['sections_headers'] = sections.split("||")[-1]
@@ -181,8 +372,10 @@ class ChunkingMethod(ABC):
         if csv_path:
             tables = re.findall(r"<(pag_\d+_table_\d+)>", text)
             for t in tables:
-                csv = load_file(origin, csv_path + t + ".csv").decode()
-                text = text.replace(f"<{t}>", csv)
+                table_path = csv_path + t + ".csv"
+                if table_path not in files:
+                    files[table_path] = load_file(origin, table_path).decode()
+                text = text.replace(f"<{t}>", files[table_path])
             meta['tables'] = True if tables else False
         else:
             meta['tables'] = ""
@@ -209,14 +402,13 @@ class Simple(ChunkingMethod):
         Returns:
             list: A list of nodes representing the chunks of each document.
         """
-        nodes_per_doc = []
         for doc in docs:
             doc.metadata.setdefault('document_id', str(uuid.uuid4()))
             doc.excluded_llm_metadata_keys = list(doc.metadata.keys())
             doc.excluded_embed_metadata_keys = list(doc.metadata.keys())
-            nodes = SentenceSplitter(chunk_size=self.window_length, chunk_overlap=self.window_overlap,
-                                     tokenizer=encoding.encode, paragraph_separator="\\n\\n").get_nodes_from_documents([doc], show_progress=True)
 
+        nodes_per_doc = []
+        for nodes in self._get_nodes(docs, encoding, ("sentence", self.window_length, self.window_overlap)):
             if eval(os.getenv('TESTING', "False")):
                 final_nodes = self._add_nodes_metadata(nodes, self.origin, io)
             else:
@@ -285,26 +477,28 @@ class Recursive(ChunkingMethod):
         Returns:
             list: A list of nodes representing the chunks of each document.
         """
-        nodes_per_doc = []
         for doc in docs:
             doc.metadata.setdefault('document_id', str(uuid.uuid4()))
             doc.excluded_llm_metadata_keys = list(doc.metadata.keys())
             doc.excluded_embed_metadata_keys = list(doc.metadata.keys())
 
-            base_nodes = SentenceSplitter(chunk_size=self.window_length, chunk_overlap=self.window_overlap,
-                                          tokenizer=encoding.encode, paragraph_separator="\\n\\n").get_nodes_from_documents([doc], show_progress=True)
-
+        base_nodes_per_doc = []
+        for base_nodes in self._get_nodes(docs, encoding, ("sentence", self.window_length, self.window_overlap)):
             if eval(os.getenv('TESTING', "False")):
-                base_nodes = self._add_nodes_metadata(base_nodes, self.origin, io)
+                base_nodes_per_doc.append(self._add_nodes_metadata(base_nodes, self.origin, io))
             else:
-                base_nodes = self._add_nodes_metadata(base_nodes, self.workspace, io)
+                base_nodes_per_doc.append(self._add_nodes_metadata(base_nodes, self.workspace, io))
 
-            sub_node_splitter = SentenceSplitter(chunk_size=self.sub_window_length, chunk_overlap=self.sub_window_overlap,
-                                                 tokenizer=encoding.encode, paragraph_separator="\\n\\n")
+        # The sub-chunks of the base chunks of all the documents are split at once
+        sub_nodes_per_base_node = iter(self._get_nodes([base_node for base_nodes in base_nodes_per_doc for base_node in base_nodes],
+                                                       encoding, ("sentence", self.sub_window_length, self.sub_window_overlap),
+                                                       show_progress=False))
+        nodes_per_doc = []
+        for base_nodes in base_nodes_per_doc:
             nodes = []
             for i, base_node in enumerate(base_nodes):
                 self.logger.debug(f"Doing recursive children of node {i}")
-                sub_nodes = sub_node_splitter.get_nodes_from_documents([base_node])
+                sub_nodes = next(sub_nodes_per_base_node)
                 for child_number, sub_node in enumerate(sub_nodes):
                     id = self._get_id(sub_node, io.metadata_primary_keys)
                     sub_node.id_ = id
@@ -335,18 +529,13 @@ class SurroundingContextWindow(ChunkingMethod):
         Returns:
             list: A list of nodes representing the chunks of each document.
         """
-        nodes_per_doc = []
         for doc in docs:
             doc.metadata.setdefault('document_id', str(uuid.uuid4()))
             doc.excluded_llm_metadata_keys = list(doc.metadata.keys())
             doc.excluded_embed_metadata_keys = list(doc.metadata.keys())
 
-            sentence_splitter = SentenceSplitter(chunk_size=self.window_length, chunk_overlap=self.window_overlap,
-                                                 tokenizer=encoding.encode, paragraph_separator="\\n\\n")
-            nodes = SentenceWindowNodeParser.from_defaults(sentence_splitter=sentence_splitter.split_text,
-                                                           window_size=self.windows, window_metadata_key="window",
-                                                           original_text_metadata_key="original_text").get_nodes_from_documents([doc], show_progress=True)
-
+        nodes_per_doc = []
+        for nodes in self._get_nodes(docs, encoding, ("window", self.window_length, self.window_overlap, self.windows)):
             if eval(os.getenv('TESTING', "False")):
                 final_nodes = self._add_nodes_metadata(nodes, self.origin, io)
             else:
@@ -0,0 +1,276 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from array import array
+from typing import Any, List, Optional
+
+# Installed imports
+from pydantic import Field, PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+
+# Custom imports
+from common.genai_controllers import dbc, db_dbs
+
+
+def encode_embedding(embedding: list) -> bytes:
+    """ Embedding as 32 bits floats (the precision of the embeddings of the providers), 4 bytes by dimension """
+    return array('f', embedding).tobytes()
+
+
+def decode_embedding(value: bytes) -> list:
+    embedding = array('f')
+    embedding.frombytes(value)
+    return embedding.tolist()
+
+
+class SQLiteBackend(object):
+    """ Embeddings stored in a local SQLite file (shared by the processes of the same machine). When there are more
+    than max_entries, the least recently used ones are deleted """
+    MAX_VARIABLES = 500
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                                    "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def get_many(self, keys: List[str]) -> dict:
+        embeddings = {}
+        with self._lock, self.connection:
+            for i in range(0, len(keys), self.MAX_VARIABLES):
+                batch = keys[i:i + self.MAX_VARIABLES]
+                rows = self.connection.execute(f"SELECT key, embedding FROM embeddings WHERE key IN "
+                                               f"({','.join('?' * len(batch))})", batch).fetchall()
+                embeddings.update({key: decode_embedding(value) for key, value in rows})
+            now = time.time()
+            self.connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                        [(now, key) for key in embeddings])
+        return embeddings
+
+    def set_many(self, embeddings: dict):
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                                        [(key, encode_embedding(embedding), now) for key, embedding in embeddings.items()])
+            excess = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.connection.execute("DELETE FROM embeddings WHERE key IN "
+                                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class RedisBackend(object):
+    """ Embeddings stored in redis (shared by all the replicas). The last use of every key is kept in a sorted set,
+    so the least recently used ones are deleted when there are more than max_entries """
+    INDEX_KEY = "embedding_cache_index"
+
+    def __init__(self, redis_origin: tuple, max_entries: int):
+        self.max_entries = max_entries
+        dbc.set_credentials(redis_origin)
+        # A single connection, the batches of keys are read and written with mget and pipelines
+        self.connection = dbc.origins[redis_origin[0]]._get_db_connection(redis_origin[1])
+
+    def get_many(self, keys: List[str]) -> dict:
+        if not keys:
+            return {}
+        embeddings = {key: decode_embedding(value) for key, value in zip(keys, self.connection.mget(keys))
+                      if value is not None}
+        if embeddings:
+            self.connection.zadd(self.INDEX_KEY, {key: time.time() for key in embeddings})
+        return embeddings
+
+    def set_many(self, embeddings: dict):
+        now = time.time()
+        pipeline = self.connection.pipeline()
+        for key, embedding in embeddings.items():
+            pipeline.set(key, encode_embedding(embedding))
+        pipeline.zadd(self.INDEX_KEY, {key: now for key in embeddings})
+        pipeline.zcard(self.INDEX_KEY)
+        excess = pipeline.execute()[-1] - self.max_entries
+        if excess > 0:
+            old_keys = self.connection.zrange(self.INDEX_KEY, 0, excess - 1)
+            pipeline.delete(*old_keys)
+            pipeline.zrem(self.INDEX_KEY, *old_keys)
+            pipeline.execute()
+
+    def __len__(self) -> int:
+        return self.connection.zcard(self.INDEX_KEY)
+
+
+class EmbeddingCache(object):
+    """ Cache of the embeddings of the chunks shared by the indexations, keyed by the embedding model and the
+    sha256 of the normalized text, so the repeated texts (disclaimers, headers, footers...) are embedded only once.
+
+    The embeddings are stored in a local SQLite file ('sqlite' backend) or in redis ('redis' backend, shared by
+    all the replicas and tenants), both bounded by a max number of entries (least recently used deleted first).
+    """
+    BACKENDS = ["sqlite", "redis"]
+    _instance = None
+
+    def __init__(self, backend: str, max_entries: int = 100000, path: str = None, redis_origin: tuple = None):
+        """ Creates the cache
+
+        :param backend: 'sqlite' or 'redis'
+        :param max_entries: Max number of embeddings kept
+        :param path: File of the sqlite backend
+        :param redis_origin: Redis database of the redis backend
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Embedding cache backend '{backend}' not supported, the available ones are {self.BACKENDS}")
+        if backend == "redis":
+            if redis_origin is None:
+                raise ValueError("The redis backend of the embedding cache needs a redis database")
+            self.store = RedisBackend(redis_origin, max_entries)
+        else:
+            self.store = SQLiteBackend(path or os.path.join(tempfile.gettempdir(), "embedding_cache.sqlite"),
+                                       max_entries)
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def get_instance(cls) -> Optional["EmbeddingCache"]:
+        """ Cache of the process configured with INDEXING_EMBEDDING_CACHE (None if it is not enabled) """
+        backend = os.environ.get('INDEXING_EMBEDDING_CACHE', "")
+        if backend not in cls.BACKENDS:
+            return None
+        if cls._instance is None or cls._instance.backend != backend:
+            redis_origin = db_dbs.get('embedding_cache')
+            cls._instance = cls(backend, max_entries=int(os.environ.get('INDEXING_EMBEDDING_CACHE_MAX_ENTRIES', 100000)),
+                                path=os.environ.get('INDEXING_EMBEDDING_CACHE_PATH'),
+                                redis_origin=redis_origin if redis_origin and redis_origin[1] is not None else None)
+        return cls._instance
+
+    @staticmethod
+    def get_key(model_name: str, text: str) -> str:
+        """ Key of the embedding of a text: the model and the sha256 of the text with the unicode and the whitespaces
+        normalized """
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return f"embedding_cache:{model_name}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[list]]:
+        """ Get the cached embeddings of the texts
+
+        :param model_name: Embedding model
+        :param texts: Texts to embed
+        :return: Embedding of every text or None if it is not cached
+        """
+        keys = [self.get_key(model_name, text) for text in texts]
+        embeddings = self.store.get_many(list(dict.fromkeys(keys)))
+        result = [embeddings.get(key) for key in keys]
+        hits = sum(1 for embedding in result if embedding is not None)
+        with self._lock:
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(result) - hits
+        return result
+
+    def set_many(self, model_name: str, texts: List[str], embeddings: List[list]):
+        """ Store the embeddings of the texts
+
+        :param model_name: Embedding model
+        :param texts: Texts embedded
+        :param embeddings: Embedding of every text
+        """
+        self.store.set_many({self.get_key(model_name, text): embedding for text, embedding in zip(texts, embeddings)})
+
+    def get_stats(self, since: dict = None) -> dict:
+        """ Get the usage counters of the cache
+
+        :param since: Stats got before (at the start of an indexation), to count only the hits and misses from then
+        """
+        since = since or {}
+        with self._lock:
+            hits = self.stats["hits"] - since.get("hits", 0)
+            misses = self.stats["misses"] - since.get("misses", 0)
+        return {
+            "backend": self.backend,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": len(self.store)
+        }
+
+    def wrap(self, embed_model: BaseEmbedding, model_name: str) -> "CachedEmbedding":
+        """ Embed model that uses the cache in front of another one
+
+        :param embed_model: llama-index embed model
+        :param model_name: Name of the embedding model (part of the keys)
+        """
+        return CachedEmbedding(embed_model=embed_model, cache=self, model_name=model_name)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """ llama-index embed model that gets the embeddings of the texts from the cache and only sends the missing ones
+    (once each) to the wrapped model. The queries are not cached """
+
+    embed_model: BaseEmbedding = Field(description="Wrapped embed model")
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, model_name: str, **kwargs: Any):
+        super().__init__(embed_model=embed_model, model_name=model_name, embed_batch_size=embed_model.embed_batch_size,
+                         callback_manager=embed_model.callback_manager, num_workers=embed_model.num_workers, **kwargs)
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self.embed_model.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.get_text_embedding_batch([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self.aget_text_embedding_batch([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self.aget_text_embedding_batch(texts)
+
+    def _get_missing(self, texts: List[str]) -> tuple:
+        """ Cached embeddings of the texts and the texts not cached (without repetitions) """
+        embeddings = self._cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        return embeddings, missing
+
+    def _merge(self, texts: List[str], embeddings: list, missing: List[str], new_embeddings: list) -> List[Embedding]:
+        if missing:
+            self._cache.set_many(self.model_name, missing, new_embeddings)
+        by_text = dict(zip(missing, new_embeddings))
+        return [embedding if embedding is not None else by_text[text] for text, embedding in zip(texts, embeddings)]
+
+    def get_text_embedding_batch(self, texts: List[str], show_progress: bool = False, **kwargs: Any) -> List[Embedding]:
+        """ Get the embeddings of the texts, looking up all of them in the cache at once """
+        embeddings, missing = self._get_missing(texts)
+        new_embeddings = self.embed_model.get_text_embedding_batch(missing, show_progress=show_progress,
+                                                                   **kwargs) if missing else []
+        return self._merge(texts, embeddings, missing, new_embeddings)
+
+    async def aget_text_embedding_batch(self, texts: List[str], show_progress: bool = False) -> List[Embedding]:
+        """ Asynchronously get the embeddings of the texts, looking up all of them in the cache at once """
+        embeddings, missing = self._get_missing(texts)
+        new_embeddings = await self.embed_model.aget_text_embedding_batch(missing, show_progress=show_progress) \
+            if missing else []
+        return self._merge(texts, embeddings, missing, new_embeddings)
@@ -5,6 +5,7 @@ from __future__ import annotations
 
 # Native imports
 import os
+import json
 
 # Installed imports
 
@@ -19,6 +20,7 @@ from common.status_codes import PROCESS_FINISHED, ERROR
 from common.ir.connectors import ManagerConnector
 from common.storage_manager import ManagerStorage
 from common.ir.parsers import ManagerParser
+from common.ir.result_cache import bump_index_generation
 
 from vector_storages import ManagerVectorDB
 
@@ -62,68 +64,164 @@ class InfoIndexationDeployment(BaseDeployment):
     @property
     def max_num_queue(self) -> int:
         """ Max number of messages to read from queue at once """
-        return 1
+        return int(os.getenv('INDEXING_BATCH_SIZE', 1))
 
-    def process(self, json_input: dict):
-        self.logger.debug(f"Data entry: {json_input}")
-        try:
-            input_object = ManagerParser().get_parsed_object({'type': "infoindexing", 'json_input': json_input,
-                                                              'available_pools': self.available_pools,
-                                                              'available_models': self.available_models,
-                                                              'vector_storages': self.vector_storages,
-                                                              'models_credentials': self.models_credentials})
+    def _prepare_indexation(self, json_input: dict) -> tuple:
+        """ Parse the message, connect to its vector storage and get its processed documents
 
-            self.logger.info(f"Input parsed for index {input_object.index}")
+        :param json_input: Message of the indexation
+        :return: Parsed input, connector, vector database and documents to index
+        """
+        input_object = ManagerParser().get_parsed_object({'type': "infoindexing", 'json_input': json_input,
+                                                          'available_pools': self.available_pools,
+                                                          'available_models': self.available_models,
+                                                          'vector_storages': self.vector_storages,
+                                                          'models_credentials': self.models_credentials})
 
-            if eval(os.getenv('TESTING', "False")):
-                file_loader = ManagerStorage().get_file_storage(
-                    {'type': "IRStorage", 'workspace': self.origin, 'origin': self.origin})
-            else:
-                file_loader = ManagerStorage().get_file_storage(
-                    {'type': "IRStorage", 'workspace': self.workspace, 'origin': self.origin})
+        self.logger.info(f"Input parsed for index {input_object.index}")
 
-            self.connector = ManagerConnector().get_connector(input_object.vector_storage)
-            self.connector.connect()
+        if eval(os.getenv('TESTING', "False")):
+            file_loader = ManagerStorage().get_file_storage(
+                {'type': "IRStorage", 'workspace': self.origin, 'origin': self.origin})
+        else:
+            file_loader = ManagerStorage().get_file_storage(
+                {'type': "IRStorage", 'workspace': self.workspace, 'origin': self.origin})
 
+        connector = ManagerConnector().get_connector(input_object.vector_storage)
+        connector.connect()
+        try:
             # check if the models used are the same
-            self.connector.assert_correct_index_conf(input_object.index, input_object.chunking_method['method'], self.all_models, input_object.models)
-            vector_db = ManagerVectorDB.get_vector_database({'type': self.connector.MODEL_FORMAT, 'connector': self.connector,
+            connector.assert_correct_index_conf(input_object.index, input_object.chunking_method['method'], self.all_models, input_object.models)
+            vector_db = ManagerVectorDB.get_vector_database({'type': connector.MODEL_FORMAT, 'connector': connector,
                                                              'workspace': self.workspace, 'origin': self.origin,
                                                              'aws_credentials': self.aws_credentials})
 
             dataframe_file, markdowns_file = file_loader.get_specific_files(input_object)
             # Here the first connection with the connector is made
             docs = vector_db.get_processed_data(input_object, dataframe_file, markdowns_file)
-            self.logger.info(
-                f"Connection in {self.connector.MODEL_FORMAT} was successful and the documents were processed for indexation")
+        except Exception:
+            connector.close()
+            raise
+        self.logger.info(
+            f"Connection in {connector.MODEL_FORMAT} was successful and the documents were processed for indexation")
+        return input_object, connector, vector_db, docs
 
-            tokens_used = vector_db.index_documents(docs=docs, io=input_object)
+    def _finish_indexation(self, input_object, vector_db, tokens_used: list) -> str:
+        """ Invalidate the cached results of the index and report the tokens of an indexation
 
-            self.logger.info("Documents have been written correctly")
+        :return: Status message of the indexation
+        """
+        self.logger.info("Documents have been written correctly")
 
-            if not eval(os.getenv('TESTING', "False")):
-                for model_tokens in tokens_used:
-                    for r, p in model_tokens.items():
-                        self.report_api(p.get('num'), input_object.dataset_status_key, input_object.url, r,
-                                        input_object.process_id, p.get('type'))
+        try:
+            # The retrieval results cached by inforetrieval for this index are not valid anymore
+            bump_index_generation(input_object.index)
+        except Exception as ex:
+            self.logger.warning(f"Generation of index {input_object.index} not updated: {ex}")
+
+        if not eval(os.getenv('TESTING', "False")):
+            for model_tokens in tokens_used:
+                for r, p in model_tokens.items():
+                    self.report_api(p.get('num'), input_object.dataset_status_key, input_object.url, r,
+                                    input_object.process_id, p.get('type'))
+
+        message = "Indexing finished"
+        if getattr(input_object, 'incremental', False) is True:
+            message += " (incremental): " + "; ".join(
+                f"{model} {stats['written']} chunks written, {stats['skipped']} unchanged chunks skipped "
+                f"and {stats['deleted']} deleted" for model, stats in vector_db.incremental_stats.items())
+        return message
+
+    def _update_status(self, json_input: dict, status_code: int, message: str):
+        specific = get_specific(json_input)
+        dataset_status_key = get_dataset_status_key(specific=specific)
+        update_full_status(self.redis_status, dataset_status_key, status_code, message)
+
+    def process(self, json_input: dict):
+        self.logger.debug(f"Data entry: {json_input}")
+        try:
+            input_object, self.connector, vector_db, docs = self._prepare_indexation(json_input)
+
+            tokens_used = vector_db.index_documents(docs=docs, io=input_object)
 
             status_code = PROCESS_FINISHED
-            message = "Indexing finished"
+            message = self._finish_indexation(input_object, vector_db, tokens_used)
         except Exception as ex:
             self.logger.error(f"{str(ex)} for process: {json_input.get('dataset_status_key')}", exc_info=get_exc_info())
 
             status_code = ERROR
             message = str(ex)
 
-        specific = get_specific(json_input)
-        dataset_status_key = get_dataset_status_key(specific=specific)
         if hasattr(self, "connector") and self.connector:
             self.connector.close()
 
-        update_full_status(self.redis_status, dataset_status_key, status_code, message)
+        self._update_status(json_input, status_code, message)
         return self.must_continue, json_input, FLOWMGMT_CHECKEND_SERVICE
 
+    def process_batch(self, json_inputs: list) -> list:
+        """ Index the messages read at once. The ones with the same vector storage, index and models are indexed
+        together (shared embedding and bulk requests), the incremental ones are indexed alone. Every message gets
+        its own status and report, and a failed one does not fail the rest
+
+        :param json_inputs: Messages of the indexations
+        :return: Output of every message
+        """
+        if len(json_inputs) <= 1:
+            return [self.process(json_input) for json_input in json_inputs]
+
+        statuses = {}
+        groups = {}
+        connectors = []
+        for position, json_input in enumerate(json_inputs):
+            self.logger.debug(f"Data entry: {json_input}")
+            try:
+                input_object, connector, vector_db, docs = self._prepare_indexation(json_input)
+                connectors.append(connector)
+                if getattr(input_object, 'incremental', False) is True:
+                    key = position
+                else:
+                    key = (input_object.vector_storage.get('vector_storage_name'), input_object.index,
+                           json.dumps(input_object.models, sort_keys=True, default=str))
+                groups.setdefault(key, []).append((position, input_object, vector_db, docs))
+            except Exception as ex:
+                self.logger.error(f"{str(ex)} for process: {json_input.get('dataset_status_key')}", exc_info=get_exc_info())
+                statuses[position] = (ERROR, str(ex))
+
+        for group in groups.values():
+            # The first vector database of the group indexes the documents of all its messages
+            vector_db = group[0][2]
+            try:
+                results = vector_db.index_documents_batch([(docs, input_object) for _, input_object, _, docs in group])
+            except Exception as ex:
+                results = [ex] * len(group)
+            for (position, input_object, _, _), result in zip(group, results):
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    statuses[position] = (PROCESS_FINISHED, self._finish_indexation(input_object, vector_db, result))
+                except Exception as ex:
+                    self.logger.error(f"{str(ex)} for process: {json_inputs[position].get('dataset_status_key')}",
+                                      exc_info=get_exc_info())
+                    statuses[position] = (ERROR, str(ex))
+            self.logger.info(f"{len(group)} indexations of index {group[0][1].index} done together")
+
+        for connector in connectors:
+            connector.close()
+
+        outputs = []
+        for position, json_input in enumerate(json_inputs):
+            status_code, message = statuses[position]
+            try:
+                self._update_status(json_input, status_code, message)
+            except Exception as ex:
+                self.logger.error(f"Status not updated: {ex}", exc_info=get_exc_info())
+            outputs.append((self.must_continue, json_input, FLOWMGMT_CHECKEND_SERVICE))
+        return outputs
+
 
 if __name__ == "__main__":
     deploy = InfoIndexationDeployment()
-    deploy.async_deployment()
+    if deploy.max_num_queue > 1:
+        deploy.async_batch_deployment()
+    else:
+        deploy.async_deployment()
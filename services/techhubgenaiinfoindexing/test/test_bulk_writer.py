@@ -0,0 +1,167 @@
+### This code is property of the GGAO ###
+
+
+import unittest
+from unittest.mock import patch, MagicMock
+
+from elasticsearch.helpers import BulkIndexError
+from elastic_transport import ConnectionTimeout
+from httpx import TimeoutException
+from llama_index.core import MockEmbedding
+from llama_index.core.schema import TextNode
+
+from bulk_writer import BulkNodeWriter
+
+
+def get_response(operations: list, statuses: dict = None) -> dict:
+    """Bulk response with the status of every document by id (201 by default)"""
+    statuses = statuses or {}
+    items = []
+    for header in operations[::2]:
+        status = statuses.get(header["index"]["_id"], 201)
+        item = {"_id": header["index"]["_id"], "status": status}
+        if status >= 300:
+            item["error"] = {"type": "es_rejected_execution_exception" if status == 429 else "mapper_parsing_exception"}
+        items.append({"index": item})
+    return {"errors": any("error" in item["index"] for item in items), "items": items}
+
+
+@patch("bulk_writer.time.sleep", return_value=None)
+class TestBulkNodeWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.indices.exists.return_value = False
+        self.client.bulk.side_effect = lambda operations: get_response(operations)
+        self.embed_model = MockEmbedding(embed_dim=4)
+        self.nodes_per_doc = [[TextNode(text=f"chunk {doc} {i}", id_=f"{doc}-{i}", metadata={"filename": f"doc{doc}.pdf"})
+                               for i in range(n)] for doc, n in enumerate([3, 1, 2])]
+
+    def get_written_ids(self) -> list:
+        return [[header["index"]["_id"] for header in call.kwargs["operations"][::2]]
+                for call in self.client.bulk.call_args_list]
+
+    def test_write_batches_across_documents(self, mock_sleep):
+        writer = BulkNodeWriter(self.client, "test_index_model", max_nodes=4, logger=MagicMock())
+        stats = writer.write(self.nodes_per_doc, self.embed_model)
+
+        # The nodes of the documents are grouped in batches of at most 4 nodes
+        self.assertEqual(self.get_written_ids(), [["0-0", "0-1", "0-2", "1-0"], ["2-0", "2-1"]])
+        self.assertEqual((stats["nodes"], stats["batches"], stats["retries"], stats["tries"]), (6, 2, 0, 1))
+        self.assertGreater(stats["bytes_per_second"], 0)
+        source = self.client.bulk.call_args_list[0].kwargs["operations"][1]
+        self.assertEqual(source["content"], "chunk 0 0")
+        self.assertEqual(source["metadata"]["filename"], "doc0.pdf")
+        self.assertEqual(len(source["embedding"]), 4)
+        # Index created once with the mappings of the llama-index store
+        mappings = self.client.indices.create.call_args.kwargs["mappings"]
+        self.assertEqual(mappings["properties"]["embedding"]["dims"], 4)
+        self.assertEqual(mappings["properties"]["metadata"]["properties"]["doc_id"], {"type": "keyword"})
+        self.client.indices.refresh.assert_called_once_with(index="test_index_model")
+        mock_sleep.assert_not_called()
+
+    def test_write_batches_by_bytes(self, mock_sleep):
+        writer = BulkNodeWriter(self.client, "test_index_model", max_nodes=10, logger=MagicMock())
+        action_bytes = next(writer.split_by_bytes([writer.get_action(self.nodes_per_doc[0][0], [0.0] * 4)]))[0][1]
+        writer.max_bytes = action_bytes * 2 + 10
+        stats = writer.write(self.nodes_per_doc, self.embed_model)
+
+        self.assertEqual([len(ids) for ids in self.get_written_ids()], [2, 2, 2])
+        self.assertEqual(stats["batches"], 3)
+
+    def test_retry_only_failed_items(self, mock_sleep):
+        responses = iter([{"0-1": 429, "1-0": 503}, {"1-0": 429}, {}])
+        self.client.bulk.side_effect = lambda operations: get_response(operations, next(responses))
+        writer = BulkNodeWriter(self.client, "test_index_model", max_nodes=10, backoff=1, max_backoff=3,
+                                logger=MagicMock())
+        stats = writer.write(self.nodes_per_doc, self.embed_model)
+
+        self.assertEqual(self.get_written_ids(), [["0-0", "0-1", "0-2", "1-0", "2-0", "2-1"], ["0-1", "1-0"], ["1-0"]])
+        self.assertEqual(stats["retries"], 2)
+        # The nodes are not embedded again
+        self.assertEqual(stats["tries"], 1)
+        # Exponential backoff with jitter: a random wait up to 1s and then up to 2s
+        waits = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertTrue(0 <= waits[0] <= 1 and 0 <= waits[1] <= 2)
+
+    def test_retry_transport_error(self, mock_sleep):
+        self.client.bulk.side_effect = [ConnectionTimeout("Timeout"), {"errors": False, "items": []}]
+        writer = BulkNodeWriter(self.client, "test_index_model", logger=MagicMock())
+        stats = writer.write(self.nodes_per_doc[:1], self.embed_model)
+
+        self.assertEqual(self.client.bulk.call_count, 2)
+        self.assertEqual(stats["retries"], 1)
+
+    def test_not_retryable_error(self, mock_sleep):
+        self.client.bulk.side_effect = lambda operations: get_response(operations, {"0-1": 400, "0-2": 429})
+        writer = BulkNodeWriter(self.client, "test_index_model", logger=MagicMock())
+
+        with self.assertRaises(BulkIndexError) as cm:
+            writer.write(self.nodes_per_doc, self.embed_model)
+        self.assertEqual([error["_id"] for error in cm.exception.errors], ["0-1"])
+        self.assertEqual(self.client.bulk.call_count, 1)
+
+    def test_max_retries(self, mock_sleep):
+        self.client.bulk.side_effect = lambda operations: get_response(operations, {"0-1": 429})
+        writer = BulkNodeWriter(self.client, "test_index_model", max_retries=2, logger=MagicMock())
+
+        with self.assertRaises(BulkIndexError):
+            writer.write(self.nodes_per_doc, self.embed_model)
+        self.assertEqual(self.client.bulk.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.client.indices.refresh.assert_called_once_with(index="test_index_model")
+
+    def test_refresh_error_does_not_replace_write_error(self, mock_sleep):
+        self.client.bulk.side_effect = lambda operations: get_response(operations, {"0-1": 400})
+        self.client.indices.refresh.side_effect = ConnectionError("Cluster unreachable")
+        logger = MagicMock()
+        writer = BulkNodeWriter(self.client, "test_index_model", logger=logger)
+
+        # The error of the writing is raised, the failed refresh is only logged
+        with self.assertRaises(BulkIndexError):
+            writer.write(self.nodes_per_doc, self.embed_model)
+        self.client.indices.refresh.assert_called_once_with(index="test_index_model")
+        self.assertIn("not refreshed", logger.warning.call_args.args[0])
+
+    def test_embedding_retry(self, mock_sleep):
+        embed_model = MagicMock(wraps=self.embed_model)
+        writer = BulkNodeWriter(self.client, "test_index_model", max_nodes=3, logger=MagicMock())
+        with patch("bulk_writer.embed_nodes", side_effect=[TimeoutException("Timeout"),
+                                                          {f"0-{i}": [0.1] * 4 for i in range(3)},
+                                                          {"1-0": [0.1] * 4, "2-0": [0.1] * 4, "2-1": [0.1] * 4}]):
+            stats = writer.write(self.nodes_per_doc, embed_model)
+
+        # Only the first batch is embedded again
+        self.assertEqual(stats["embedded_nodes"], 9)
+        self.assertEqual(stats["tries"], 2)
+        self.assertEqual(self.client.bulk.call_count, 2)
+
+    def test_isolate_failures(self, mock_sleep):
+        self.client.bulk.side_effect = lambda operations: get_response(operations, {"0-1": 400})
+        writer = BulkNodeWriter(self.client, "test_index_model", max_nodes=3, logger=MagicMock())
+        with patch("bulk_writer.embed_nodes", side_effect=[{f"0-{i}": [0.1] * 4 for i in range(3)},
+                                                          TimeoutException("Timeout")]):
+            writer.max_retries = 0
+            stats = writer.write(self.nodes_per_doc, self.embed_model, isolate_failures=True)
+
+        # The nodes of the batch not embedded and the rejected node are returned, the rest are written
+        self.assertEqual(stats["failed_ids"], ["1-0", "2-0", "2-1", "0-1"])
+        self.assertEqual(self.get_written_ids(), [["0-0", "0-1", "0-2"]])
+        self.client.indices.refresh.assert_called_once_with(index="test_index_model")
+
+    def test_isolate_failures_retries(self, mock_sleep):
+        responses = iter([{"0-1": 400, "1-0": 429}, {}])
+        self.client.bulk.side_effect = lambda operations: get_response(operations, next(responses))
+        writer = BulkNodeWriter(self.client, "test_index_model", max_nodes=10, logger=MagicMock())
+        stats = writer.write(self.nodes_per_doc, self.embed_model, isolate_failures=True)
+
+        # The retryable items are still retried
+        self.assertEqual(self.get_written_ids(), [["0-0", "0-1", "0-2", "1-0", "2-0", "2-1"], ["1-0"]])
+        self.assertEqual((stats["failed_ids"], stats["retries"]), (["0-1"], 1))
+
+    def test_write_empty(self, mock_sleep):
+        stats = BulkNodeWriter(self.client, "test_index_model").write([[]], self.embed_model)
+
+        self.assertEqual((stats["nodes"], stats["tries"]), (0, 1))
+        self.client.bulk.assert_not_called()
+        self.client.indices.refresh.assert_not_called()
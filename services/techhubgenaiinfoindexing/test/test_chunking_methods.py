@@ -4,8 +4,8 @@ from unittest.mock import MagicMock, patch
 import tiktoken
 import json
 
-from chunking_methods import Simple, Recursive, SurroundingContextWindow, ManagerChunkingMethods, ChunkingMethod
-from llama_index.core.schema import Document
+from chunking_methods import Simple, Recursive, SurroundingContextWindow, ManagerChunkingMethods, ChunkingMethod, ChunkingEngine
+from llama_index.core.schema import Document, TextNode
 from common.errors.genaierrors import PrintableGenaiError
 
 class TestChunkingMethods(unittest.TestCase):
@@ -209,6 +209,73 @@ class TestChunkingMethods(unittest.TestCase):
 
         mock_load_file.assert_called_once_with(origin, "header_mapping.json")
 
+    @patch("chunking_methods.load_file")
+    def test_add_nodes_metadata_loads_files_once(self, mock_load_file):
+        files = {"header_mapping.json": json.dumps({"pag_1_header_1": "Header 1", "pag_2_header_1": "Header 2"}).encode(),
+                 "csv_data/pag_1_table_1.csv": b"Table 1", "csv_data/pag_2_table_1.csv": b"Table 2"}
+        mock_load_file.side_effect = lambda origin, path: files[path]
+        texts = ["<pag_1_header_1> Intro <pag_1_table_1>", "More text", "<pag_2_header_1> <pag_2_table_1> <pag_1_table_1>"]
+        nodes = [TextNode(text=text, metadata={"_header_mapping": "header_mapping.json", "_csv_path": "csv_data/"})
+                 for text in texts]
+        io = MagicMock(index_metadata=None, metadata_primary_keys=None)
+
+        method = Simple(window_length=5, window_overlap=1, origin=("origin"), workspace=("workspace"))
+        result = method._add_nodes_metadata(nodes, "origin_path", io)
+
+        self.assertEqual([node.text for node in result], [" Intro Table 1", "More text", " Table 2 Table 1"])
+        self.assertEqual([node.metadata["sections_headers"] for node in result], ["Header 1", "Header 1", "Header 2"])
+        self.assertEqual([node.metadata["tables"] for node in result], [True, False, True])
+        # Every file is loaded only once for all the nodes of the document
+        self.assertEqual(sorted(call.args[1] for call in mock_load_file.call_args_list), sorted(files))
+
+
+class TestChunkingEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.io = MagicMock(index_metadata=["filename"], metadata_primary_keys=None)
+        sentences = ["The revenue of the quarter grew in every market.", "Costs were reduced by the new contracts.",
+                     "The board approved the dividend.", "Water and energy prices were stable."]
+        self.texts = [" ".join(sentences[(i + j) % 4] for j in range(8 + i)) for i in range(5)]
+
+    def tearDown(self):
+        if ChunkingEngine._instance is not None:
+            ChunkingEngine._instance.executor.shutdown()
+            ChunkingEngine._instance = None
+
+    def get_docs(self):
+        return [Document(text=text, metadata={"filename": f"doc_{i}.txt", "document_id": f"doc_{i}"})
+                for i, text in enumerate(self.texts)]
+
+    def get_chunks(self, method, workers: str) -> list:
+        with patch.dict("os.environ", {"INDEXING_CHUNKING_WORKERS": workers}):
+            nodes_per_doc = method.get_chunks(self.get_docs(), self.encoding, self.io)
+        return [[(node.node_id, node.text, node.metadata, node.start_char_idx, node.excluded_embed_metadata_keys)
+                 for node in nodes] for nodes in nodes_per_doc]
+
+    def test_same_nodes_as_serial(self):
+        methods = [Simple(window_length=20, window_overlap=5, origin="origin", workspace="workspace"),
+                   Recursive(window_length=30, window_overlap=5, origin="origin", workspace="workspace",
+                             sub_window_length=12, sub_window_overlap=2),
+                   SurroundingContextWindow(window_length=20, window_overlap=5, origin="origin", workspace="workspace",
+                                            windows=1)]
+        for method in methods:
+            serial = self.get_chunks(method, "0")
+            # Same ids (mmh3 of the text), order, text and metadata
+            self.assertEqual(self.get_chunks(method, "2"), serial, method.CHUNKING_FORMAT)
+        self.assertEqual(ChunkingEngine._instance.workers, 2)
+
+    def test_rebuild_nodes(self):
+        doc = Document(text="First sentence. Second sentence.", metadata={"filename": "doc.txt"})
+        nodes = ChunkingEngine.rebuild_nodes(doc, [("First sentence.", 0, 15, {}, [], []),
+                                                   ("Second sentence.", 16, 32, {"window": "w"}, ["window"], [])])
+
+        self.assertEqual([node.metadata for node in nodes], [{"filename": "doc.txt"},
+                                                             {"filename": "doc.txt", "window": "w"}])
+        self.assertEqual(nodes[0].ref_doc_id, doc.doc_id)
+        self.assertEqual(nodes[0].next_node.node_id, nodes[1].node_id)
+        self.assertEqual(nodes[1].prev_node.node_id, nodes[0].node_id)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,159 @@
+### This code is property of the GGAO ###
+
+
+import os
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+from llama_index.core import MockEmbedding
+
+from embedding_cache import EmbeddingCache, CachedEmbedding, RedisBackend, encode_embedding, decode_embedding
+
+
+class CountingEmbedding(MockEmbedding):
+    """Mock embed model with a different embedding by text that keeps the texts sent"""
+
+    def __init__(self, **kwargs):
+        super().__init__(embed_dim=3, **kwargs)
+        self.__dict__["texts"] = []
+
+    def vector_of(self, text: str) -> list:
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 0.5]
+
+    def _get_text_embeddings(self, texts):
+        self.texts.extend(texts)
+        return [self.vector_of(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts):
+        return self._get_text_embeddings(texts)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "embeddings.sqlite")
+        self.cache = EmbeddingCache("sqlite", max_entries=100, path=self.path)
+        self.inner = CountingEmbedding()
+        self.embed_model = self.cache.wrap(self.inner, "test-model")
+
+    def tearDown(self):
+        self.cache.store.connection.close()
+        self.tmp_dir.cleanup()
+
+    def test_only_missing_texts_are_embedded(self):
+        texts = ["disclaimer", "chunk 1", "disclaimer", "chunk 2"]
+        first = self.embed_model.get_text_embedding_batch(texts)
+
+        # The repeated text is sent once
+        self.assertEqual(self.inner.texts, ["disclaimer", "chunk 1", "chunk 2"])
+        self.assertEqual(first, [self.inner.vector_of(text) for text in texts])
+
+        second = self.embed_model.get_text_embedding_batch(["chunk 2", "chunk 3", "disclaimer"])
+        self.assertEqual(self.inner.texts, ["disclaimer", "chunk 1", "chunk 2", "chunk 3"])
+        self.assertEqual(second[0], first[3])
+        self.assertEqual(self.cache.get_stats(), {"backend": "sqlite", "hits": 2, "misses": 5, "hit_ratio": 2 / 7,
+                                                  "entries": 4})
+
+    def test_stats_since(self):
+        self.embed_model.get_text_embedding_batch(["a", "b"])
+        since = self.cache.get_stats()
+        self.embed_model.get_text_embedding_batch(["a", "c"])
+
+        # Only the usage after the snapshot (of an indexation) is counted
+        self.assertEqual(self.cache.get_stats(since), {"backend": "sqlite", "hits": 1, "misses": 1, "hit_ratio": 0.5,
+                                                       "entries": 3})
+
+    def test_float32_encoding(self):
+        embedding = [0.1, -0.2, 0.3]
+        # 4 bytes by dimension, with the precision of a 32 bits float
+        self.assertEqual(len(encode_embedding(embedding)), 12)
+        for value, decoded in zip(embedding, decode_embedding(encode_embedding(embedding))):
+            self.assertAlmostEqual(value, decoded, places=6)
+
+    def test_shared_between_processes_and_models(self):
+        self.embed_model.get_text_embedding_batch(["footer"])
+        other_cache = EmbeddingCache("sqlite", max_entries=100, path=self.path)
+        other_inner = CountingEmbedding()
+
+        other_cache.wrap(other_inner, "test-model").get_text_embedding_batch(["footer"])
+        self.assertEqual(other_inner.texts, [])
+        # The embeddings of other models are not used
+        other_cache.wrap(other_inner, "other-model").get_text_embedding_batch(["footer"])
+        self.assertEqual(other_inner.texts, ["footer"])
+        other_cache.store.connection.close()
+
+    def test_normalized_key(self):
+        self.assertEqual(EmbeddingCache.get_key("model", "Terms and\n conditions "),
+                         EmbeddingCache.get_key("model", "Terms and conditions"))
+        self.assertNotEqual(EmbeddingCache.get_key("model", "Terms"), EmbeddingCache.get_key("model", "terms"))
+
+    def test_max_entries(self):
+        self.cache.store.max_entries = 2
+        self.embed_model.get_text_embedding_batch(["a"])
+        self.embed_model.get_text_embedding_batch(["b"])
+        # "a" is used again, so "b" is the least recently used
+        self.embed_model.get_text_embedding_batch(["a"])
+        self.embed_model.get_text_embedding_batch(["c"])
+
+        self.assertEqual(len(self.cache.store), 2)
+        self.inner.texts.clear()
+        self.embed_model.get_text_embedding_batch(["a", "b", "c"])
+        self.assertEqual(self.inner.texts, ["b"])
+
+    def test_async(self):
+        loop = asyncio.new_event_loop()
+        embeddings = loop.run_until_complete(self.embed_model.aget_text_embedding_batch(["header", "header", "body"]))
+
+        self.assertEqual(self.inner.texts, ["header", "body"])
+        self.assertEqual(embeddings[0], embeddings[1])
+        self.assertEqual(loop.run_until_complete(self.embed_model.aget_text_embedding("body")), embeddings[2])
+        loop.close()
+
+    def test_queries_not_cached(self):
+        self.embed_model.get_query_embedding("query")
+        self.assertEqual(self.cache.get_stats()["hits"] + self.cache.get_stats()["misses"], 0)
+
+    def test_get_instance(self):
+        with patch.dict(os.environ, {"INDEXING_EMBEDDING_CACHE": ""}):
+            self.assertIsNone(EmbeddingCache.get_instance())
+        with patch.dict(os.environ, {"INDEXING_EMBEDDING_CACHE": "sqlite", "INDEXING_EMBEDDING_CACHE_PATH": self.path,
+                                     "INDEXING_EMBEDDING_CACHE_MAX_ENTRIES": "10"}), \
+                patch.object(EmbeddingCache, "_instance", None):
+            cache = EmbeddingCache.get_instance()
+            self.assertIs(EmbeddingCache.get_instance(), cache)
+            self.assertEqual((cache.store.path, cache.store.max_entries), (self.path, 10))
+            self.assertIsInstance(cache.wrap(self.inner, "test-model"), CachedEmbedding)
+            cache.store.connection.close()
+
+        with self.assertRaises(ValueError):
+            EmbeddingCache("redis")
+
+
+class TestRedisBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        with patch("embedding_cache.dbc") as mock_dbc:
+            mock_dbc.origins = {"redis": MagicMock()}
+            mock_dbc.origins["redis"]._get_db_connection.return_value = self.connection
+            self.backend = RedisBackend(("redis", "3"), max_entries=2)
+
+    def test_get_many(self):
+        self.connection.mget.return_value = [encode_embedding([0.5, 0.25]), None]
+
+        self.assertEqual(self.backend.get_many(["a", "b"]), {"a": [0.5, 0.25]})
+        self.assertEqual(list(self.connection.zadd.call_args.args[1]), ["a"])
+
+    def test_set_many_evicts_least_recently_used(self):
+        pipeline = self.connection.pipeline.return_value
+        pipeline.execute.return_value = [True, True, True, 3]
+        self.connection.zrange.return_value = ["old"]
+
+        self.backend.set_many({"a": [0.1], "b": [0.2]})
+
+        self.connection.zrange.assert_called_once_with(RedisBackend.INDEX_KEY, 0, 0)
+        pipeline.delete.assert_called_once_with("old")
+        pipeline.zrem.assert_called_once_with(RedisBackend.INDEX_KEY, "old")
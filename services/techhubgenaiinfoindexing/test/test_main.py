@@ -266,3 +266,36 @@ class TestInfoIndexationDeployment():
 
                             assert indexation_response[1] == 200
                             assert indexation_response[2] == "Indexing finished"
+
+    def test_max_num_queue_batch(self):
+        with patch.dict("os.environ", {"INDEXING_BATCH_SIZE": "8"}):
+            assert self.deployment.max_num_queue == 8
+
+    def test_process_batch(self):
+        json_inputs = [copy.deepcopy(self.json_input) for _ in range(3)]
+        for i, json_input in enumerate(json_inputs):
+            json_input["specific"]["dataset"]["dataset_key"] = f"process_{i}:process_{i}"
+        input_objects = [MagicMock(index="test_indexing", incremental=False, models=[{"embedding_model": "ada"}],
+                                   vector_storage={"vector_storage_name": "elastic-test"}) for _ in range(2)]
+        connectors = [get_connector(), get_connector()]
+        vector_database = MagicMock()
+        vector_database.get_processed_data.side_effect = [["doc1"], ["doc3"]]
+        vector_database.index_documents_batch.return_value = [[], ConnectionError("Nodes not written")]
+        with patch('common.storage_manager.ManagerStorage.get_file_storage') as mock_get_file_storage, \
+                patch('common.ir.parsers.ManagerParser.get_parsed_object',
+                      side_effect=[input_objects[0], Exception("Wrong message"), input_objects[1]]), \
+                patch('vector_storages.ManagerVectorDB.get_vector_database', return_value=vector_database), \
+                patch('common.ir.connectors.ManagerConnector.get_connector', side_effect=connectors), \
+                patch('main.bump_index_generation'), patch.object(self.deployment, 'report_api'), \
+                patch('main.update_full_status') as mock_update_full_status:
+            mock_get_file_storage.return_value.get_specific_files.return_value = MagicMock(), []
+            outputs = self.deployment.process_batch(json_inputs)
+
+        # The valid messages are indexed together and every message gets its own status
+        vector_database.index_documents_batch.assert_called_once_with([(["doc1"], input_objects[0]),
+                                                                       (["doc3"], input_objects[1])])
+        statuses = [call.args[1:] for call in mock_update_full_status.call_args_list]
+        assert statuses == [("process_0:process_0", 200, "Indexing finished"), ("process_1:process_1", 500, "Wrong message"),
+                            ("process_2:process_2", 500, "Nodes not written")]
+        assert [output[1] for output in outputs] == json_inputs
+        assert all(connector.close.called for connector in connectors)
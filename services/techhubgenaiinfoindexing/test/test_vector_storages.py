@@ -1,21 +1,29 @@
 ### This code is property of the GGAO ###
 
 
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
 
 from elasticsearch.helpers import BulkIndexError
 from httpx import TimeoutException
+from openai import RateLimitError
 
-from vector_storages import VectorDB, LlamaIndexElastic, ManagerVectorDB, LlamaIndexAzureAI
+from vector_storages import VectorDB, LlamaIndexElastic, ManagerVectorDB, LlamaIndexAzureAI, provider
+from bulk_writer import BulkNodeWriter
 from elasticsearch.exceptions import ConnectionError as ElasticConnectionError
 from common.errors.genaierrors import PrintableGenaiError
 from common.ir.connectors import Connector
 from common.ir.parsers import Parser
 import pandas as pd
 from typing import List
-from llama_index.core import Document
+from llama_index.core import Document, MockEmbedding, Settings
+from llama_index.core.schema import TextNode, MetadataMode
+
+BULK_STATS = {"nodes": 2, "bytes": 100, "batches": 1, "retries": 0, "embedded_nodes": 2, "seconds": 0.5,
+              "nodes_per_second": 4.0, "bytes_per_second": 200.0, "tries": 1}
+
 
 class MockVectorDB(VectorDB):
     def get_processed_data(self, io: Parser, df: pd.DataFrame, markdown_files: List) -> List:
@@ -40,6 +48,7 @@ class TestLlamaIndex(unittest.TestCase):
         self.workspace = "workspace_path"
         self.origin = "origin_path"
         self.aws_credentials = {"key": "dummy_key", "secret": "dummy_secret"}
+        self.connector.connection = MagicMock()
         self.vector_db = LlamaIndexElastic(self.connector, self.workspace, self.origin, self.aws_credentials)
         self.vector_db.logger = MagicMock()
 
@@ -163,11 +172,9 @@ class TestLlamaIndex(unittest.TestCase):
         self.assertIn("Index test_index connection to elastic", str(cm.exception))
 
     @patch("vector_storages.get_embed_model")
-    @patch("vector_storages.ElasticsearchStore")
     @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
-    @patch("vector_storages.VectorStoreIndex")
-    @patch("vector_storages.StorageContext.from_defaults")
-    def test_index_documents_with_override(self, mock_storage_context, mock_vector_index, mock_get_chunking, mock_es_store, mock_embed_model):
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_with_override(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
         """Test the index_documents method with override functionality."""
 
         io = MagicMock(spec=Parser)
@@ -195,10 +202,7 @@ class TestLlamaIndex(unittest.TestCase):
 
         mock_embed_model.return_value = None
 
-        mock_storage_context.return_value = MagicMock()
-        mock_vector_index.return_value.insert_nodes = MagicMock()
-
-        mock_es_store.return_value = MagicMock()
+        mock_bulk_writer.return_value.write.return_value = BULK_STATS
 
         self.vector_db._handle_document_override = MagicMock()
 
@@ -216,11 +220,9 @@ class TestLlamaIndex(unittest.TestCase):
             self.assertIn(key, result[0].keys())
 
     @patch("vector_storages.get_embed_model")
-    @patch("vector_storages.ElasticsearchStore")
     @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
-    @patch("vector_storages.VectorStoreIndex")
-    @patch("vector_storages.StorageContext.from_defaults")
-    def test_index_documents_without_override_false(self, mock_storage_context, mock_vector_index, mock_get_chunking, mock_es_store, mock_embed_model):
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_without_override_false(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
         """Test that override is not called when override=False."""
         io = MagicMock(spec=Parser)
         io.models = [{"embedding_model": "test_model"}]
@@ -241,9 +243,7 @@ class TestLlamaIndex(unittest.TestCase):
         self.vector_db.encoding.encode = MagicMock(return_value=["token1", "token2"])
         mock_get_chunking.return_value.get_chunks.return_value = [["chunk1"], ["chunk2"]]
         mock_embed_model.return_value = None
-        mock_storage_context.return_value = MagicMock()
-        mock_vector_index.return_value.insert_nodes = MagicMock()
-        mock_es_store.return_value = MagicMock()
+        mock_bulk_writer.return_value.write.return_value = BULK_STATS
 
         with patch.object(self.vector_db, '_handle_document_override') as mock_override:
             result = self.vector_db.index_documents(docs, io)
@@ -251,11 +251,9 @@ class TestLlamaIndex(unittest.TestCase):
             mock_override.assert_not_called()
 
     @patch("vector_storages.get_embed_model")
-    @patch("vector_storages.ElasticsearchStore")
     @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
-    @patch("vector_storages.VectorStoreIndex")
-    @patch("vector_storages.StorageContext.from_defaults")
-    def test_index_documents_without_override_no_metadata_keys(self, mock_storage_context, mock_vector_index, mock_get_chunking, mock_es_store, mock_embed_model):
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_without_override_no_metadata_keys(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
         """Test that override is not called when metadata_primary_keys is None."""
         io = MagicMock(spec=Parser)
         io.models = [{"embedding_model": "test_model"}]
@@ -276,15 +274,14 @@ class TestLlamaIndex(unittest.TestCase):
         self.vector_db.encoding.encode = MagicMock(return_value=["token1", "token2"])
         mock_get_chunking.return_value.get_chunks.return_value = [["chunk1"], ["chunk2"]]
         mock_embed_model.return_value = None
-        mock_storage_context.return_value = MagicMock()
-        mock_vector_index.return_value.insert_nodes = MagicMock()
-        mock_es_store.return_value = MagicMock()
+        mock_bulk_writer.return_value.write.return_value = BULK_STATS
 
         with patch.object(self.vector_db, '_handle_document_override') as mock_override:
             result = self.vector_db.index_documents(docs, io)
 
             mock_override.assert_not_called()
 
+    @patch.dict("os.environ", {"INDEXING_OVERRIDE_BULK": "False"})
     @patch("vector_storages.get_exc_info", return_value=True)
     @patch("vector_storages.INDEX_NAME", return_value="test_index_model")
     def test_handle_document_override_success(self, mock_index_name, mock_get_exc_info):
@@ -353,6 +350,7 @@ class TestLlamaIndex(unittest.TestCase):
         self.vector_db.logger.info.assert_called_with("Override: Index test_index_model does not exist, skipping override deletion")
         self.vector_db.connector.delete_documents.assert_not_called()
 
+    @patch.dict("os.environ", {"INDEXING_OVERRIDE_BULK": "False"})
     @patch("vector_storages.get_exc_info", return_value=True)
     @patch("vector_storages.INDEX_NAME", return_value="test_index_model")
     def test_handle_document_override_deletion_error(self, mock_index_name, mock_get_exc_info):
@@ -372,6 +370,44 @@ class TestLlamaIndex(unittest.TestCase):
 
         self.vector_db.logger.warning.assert_called_with("Override: Error during deletion in test_index_model with filters {'filename': 'test.txt'}: Delete failed")
 
+    def test_handle_document_override_bulk(self):
+        """Test that the override deletes the documents of all the models at once."""
+        docs = [MagicMock(metadata={"filename": f"doc{i}.txt"}) for i in range(3)]
+        io = MagicMock()
+        io.metadata_primary_keys = ["filename"]
+        io.models = [{"embedding_model": "model_a"}, {"embedding_model": "model_b"}, {"embedding_model": "model_c"}]
+        io.index = "test_index"
+
+        self.vector_db.connector.exist_index = MagicMock(side_effect=[True, False, True])
+        self.vector_db.connector.delete_documents_bulk = MagicMock(return_value={
+            "test_index_model_a": {"deleted": 12, "failures": [], "requests": 1},
+            "test_index_model_c": {"deleted": 10, "failures": [{"id": "chunk"}], "requests": 1}
+        })
+
+        with patch("vector_storages.INDEX_NAME", side_effect=lambda index, model: f"{index}_{model}"):
+            self.vector_db._handle_document_override(docs, io)
+
+        self.vector_db.connector.delete_documents_bulk.assert_called_once_with(
+            ["test_index_model_a", "test_index_model_c"],
+            [{"filename": "doc0.txt"}, {"filename": "doc1.txt"}, {"filename": "doc2.txt"}])
+        self.vector_db.connector.delete_documents.assert_not_called()
+        self.vector_db.logger.info.assert_any_call("Override: 12 chunks of 3 documents deleted in test_index_model_a with 1 requests")
+        self.vector_db.logger.warning.assert_called_with("Override: 1 failures during bulk deletion in test_index_model_c: [{'id': 'chunk'}]")
+
+    @patch("vector_storages.INDEX_NAME", return_value="test_index_model")
+    def test_handle_document_override_bulk_error(self, mock_index_name):
+        """Test override when the bulk deletion fails."""
+        io = MagicMock()
+        io.metadata_primary_keys = ["filename"]
+        io.models = [{"embedding_model": "test_model"}]
+
+        self.vector_db.connector.exist_index = MagicMock(return_value=True)
+        self.vector_db.connector.delete_documents_bulk = MagicMock(side_effect=Exception("Task timeout"))
+
+        self.vector_db._handle_document_override([MagicMock(metadata={"filename": "test.txt"})], io)
+
+        self.vector_db.logger.warning.assert_called_with("Override: Error during bulk deletion in ['test_index_model'] of 1 documents: Task timeout")
+
     @patch("vector_storages.get_exc_info", return_value=True)
     def test_handle_document_override_general_exception(self, mock_get_exc_info):
         """Test override when general exception occurs."""
@@ -439,11 +475,9 @@ class TestLlamaIndex(unittest.TestCase):
         self.vector_db.logger.warning.assert_has_calls(expected_calls)
 
     @patch("vector_storages.get_embed_model")
-    @patch("vector_storages.ElasticsearchStore")
     @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
-    @patch("vector_storages.VectorStoreIndex")
-    @patch("vector_storages.StorageContext.from_defaults")
-    def test_index_documents(self, mock_storage_context, mock_vector_index, mock_get_chunking, mock_es_store, mock_embed_model):
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
         """Test the index_documents method."""
 
         io = MagicMock(spec=Parser)
@@ -471,10 +505,7 @@ class TestLlamaIndex(unittest.TestCase):
 
         mock_embed_model.return_value = None
 
-        mock_storage_context.return_value = MagicMock()
-        mock_vector_index.return_value.insert_nodes = MagicMock()
-
-        mock_es_store.return_value = MagicMock()
+        mock_bulk_writer.return_value.write.return_value = BULK_STATS
 
         result = self.vector_db.index_documents(docs, io)
 
@@ -529,64 +560,64 @@ class TestLlamaIndex(unittest.TestCase):
         self.assertTrue(len(result) > 0)
         mock_document.assert_called()
 
+    @patch("vector_storages.langdetect.detect", side_effect=lambda text: "ja" if text.startswith("日本") else "es")
+    def test_get_documents_from_dataframe_columns(self, mock_langdetect):
+        """Test the metadata, languages and accents of the documents of a csv dataset."""
+        df = pd.DataFrame({"Url": ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt"], "CategoryId": "",
+                           "text": ["Energía ñ", "", "日本語 á", "Canción", "日本 é"],
+                           "language": ["es", "es", None, "ja", ""], "year": [2020, 2021, 2022, 2023, 2024]})
 
-    @patch("vector_storages.time.sleep", return_value=None)
-    @patch("vector_storages.VectorStoreIndex")
-    @patch("vector_storages.StorageContext.from_defaults")
-    def test_write_nodes(self, mock_storage_context, mock_vector_index, mock_sleep):
-        """Test the _write_nodes method."""
-        nodes_per_doc = [["node1", "node2"]]
-        embed_model = MagicMock()
-        vector_store = MagicMock()
-        models = []
-        index_name = "test_index"
-
-        result = self.vector_db._write_nodes(nodes_per_doc, embed_model, vector_store, models, index_name)
-
-        self.assertEqual(result, 1)
-        mock_vector_index.return_value.insert_nodes.assert_called()
+        result = self.vector_db._get_documents_from_dataframe(df, [], "", True, False, False)
 
-    @patch("time.sleep", return_value=None)
-    def test_write_nodes_connection_error(self, mock_sleep):
-        instance = self.vector_db
-        nodes_per_doc = []
-        embed_model = MagicMock()
-        vector_store = MagicMock()
-        models = []
-        index_name = "test_index"
+        # The empty texts are skipped and the language is only detected when the row does not have it
+        self.assertEqual([doc.text for doc in result], ["Energia ñ", "日本語 á", "Canción", "日本 é"])
+        self.assertEqual(mock_langdetect.call_count, 2)
+        self.assertEqual([doc.metadata["year"] for doc in result], ["2020", "2022", "2023", "2024"])
+        self.assertEqual(result[1].metadata["language"], str(df["language"][2]))
+        self.assertEqual(result[0].metadata["uri"], f"{LlamaIndexElastic.URI_BASEPATH[provider]}a.txt")
+        self.assertNotIn("CategoryId", result[0].metadata)
 
-        with pytest.raises(ConnectionError, match="Max num of retries reached while indexing"):
-            instance._write_nodes(nodes_per_doc, embed_model, vector_store, models, index_name, delta=3, max_retries=3)
+    @patch("vector_storages.langdetect.detect")
+    def test_get_documents_from_dataframe_no_detection(self, mock_langdetect):
+        df = pd.DataFrame({"Url": ["a.txt"], "text": ["Árbol"]})
 
-    @patch("time.sleep", return_value=None)
-    def test_write_nodes_bulk_index_error(self, mock_sleep):
-        nodes_per_doc = [[MagicMock(metadata={'filename': 'file1'})]]
-        embed_model = MagicMock()
-        vector_store = MagicMock()
-        models = MagicMock()
-        index_name = "test_index"
+        with patch.dict("os.environ", {"INDEXING_DETECT_LANGUAGE": "False"}):
+            result = self.vector_db._get_documents_from_dataframe(df, [], "", True, False, False)
 
-        with patch("vector_storages.VectorStoreIndex.insert_nodes", side_effect=BulkIndexError("Test", [])):
-            with self.assertRaises(ConnectionError):
-                self.vector_db._write_nodes(nodes_per_doc, embed_model, vector_store, models, index_name)
+        self.assertEqual(result[0].text, "Arbol")
+        mock_langdetect.assert_not_called()
 
-        self.vector_db.logger.warning.assert_called()
-        mock_sleep.assert_called()
 
-    @patch("time.sleep", return_value=None)
-    def test_write_nodes_timeout_exception(self, mock_sleep):
-        nodes_per_doc = [[MagicMock(metadata={'filename': 'file3'})]]
+    @patch("vector_storages.BulkNodeWriter")
+    def test_write_nodes(self, mock_bulk_writer):
+        """Test the _write_nodes method."""
+        nodes_per_doc = [[TextNode(text="chunk 1", metadata={"filename": "file1"})],
+                         [TextNode(text="chunk 2", metadata={"filename": "file2"})]]
         embed_model = MagicMock()
-        vector_store = MagicMock()
-        models = MagicMock()
-        index_name = "test_index"
+        mock_bulk_writer.return_value.write.return_value = {**BULK_STATS, "tries": 2}
+
+        with patch.dict("os.environ", {"INDEXING_BULK_MAX_NODES": "100", "INDEXING_BULK_MAX_BYTES": "2048"}):
+            result = self.vector_db._write_nodes(nodes_per_doc, embed_model, "test_index_model", [], "test_index")
+
+        self.assertEqual(result, 2)
+        self.assertEqual(mock_bulk_writer.call_args.args, (self.connector.connection, "test_index_model"))
+        self.assertEqual(mock_bulk_writer.call_args.kwargs["max_nodes"], 100)
+        self.assertEqual(mock_bulk_writer.call_args.kwargs["max_bytes"], 2048)
+        # The nodes of all the documents are written at once
+        mock_bulk_writer.return_value.write.assert_called_once_with(nodes_per_doc, embed_model)
+
+    @patch("vector_storages.LlamaIndexElastic._manage_indexing_exception")
+    @patch("vector_storages.BulkNodeWriter")
+    def test_write_nodes_bulk_index_error(self, mock_bulk_writer, mock_manage_exception):
+        nodes_per_doc = [[TextNode(text="chunk", metadata={'filename': 'file1'})]]
+        models = [{"embedding_model": "test_model"}]
+        mock_bulk_writer.return_value.write.side_effect = BulkIndexError("Test", [])
 
-        with patch("vector_storages.VectorStoreIndex.insert_nodes", side_effect=TimeoutException("Timeout")):
-            with self.assertRaises(ConnectionError):
-                self.vector_db._write_nodes(nodes_per_doc, embed_model, vector_store, models, index_name)
+        with self.assertRaises(ConnectionError):
+            self.vector_db._write_nodes(nodes_per_doc, MagicMock(), "test_index_test_model", models, "test_index")
 
+        mock_manage_exception.assert_called_once_with("test_index", models, ["file1"])
         self.vector_db.logger.warning.assert_called()
-        mock_sleep.assert_called_with(50)
 
     @patch("time.sleep", return_value=None)
     def test_manage_indexing_exception(self, mock_sleep):
@@ -598,6 +629,7 @@ class TestLlamaIndex(unittest.TestCase):
         self.vector_db._manage_indexing_exception(index_name, models, docs_filenames)
 
         self.connector.delete_documents.assert_called()
+        mock_sleep.assert_not_called()
 
     @patch("time.sleep", return_value=None)
     def test_manage_indexing_exception_with_failures(self, mock_sleep):
@@ -621,6 +653,346 @@ class TestLlamaIndex(unittest.TestCase):
         self.logger_mock.debug.assert_called_with("Result deleting documents in index test_index_test_model: Documents not found")
 
 
+    def get_incremental_nodes(self, texts: list) -> list:
+        nodes = []
+        for i, text in enumerate(texts):
+            node = TextNode(text=text, id_=f"id_{text}", metadata={"filename": "doc.pdf", "snippet_number": i})
+            node.excluded_embed_metadata_keys = ["snippet_number"]
+            node.excluded_llm_metadata_keys = ["filename", "snippet_number"]
+            nodes.append(node)
+        return [nodes]
+
+    @patch("vector_storages.get_embed_model")
+    @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_incremental(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
+        """Test that the incremental indexing only writes the new or changed chunks and deletes the vanished ones."""
+        io = MagicMock(spec=Parser)
+        io.models = [{"embedding_model": "test_model"}]
+        io.index = "test_index"
+        io.process_type = "process_type"
+        io.specific = {"document": {"n_pags": 1}}
+        io.chunking_method = {}
+        io.incremental = True
+        io.metadata_primary_keys = ["filename"]
+        doc = Document(text="text", metadata={"filename": "doc.pdf"})
+
+        # The hashes of the chunks indexed previously
+        indexed_nodes = self.get_incremental_nodes(["a", "b", "c"])
+        VectorDB._add_content_hashes(indexed_nodes)
+        self.assertNotIn("content_hash", indexed_nodes[0][0].get_content(metadata_mode=MetadataMode.EMBED))
+        existing = {node.node_id: {"content_hash": node.metadata["content_hash"], "document_id": "doc_1",
+                                   "filename": "doc.pdf"} for node in indexed_nodes[0]}
+        existing["id_old"] = {"content_hash": "1234", "document_id": "doc_1", "filename": "doc.pdf"}
+
+        self.connector.exist_index.return_value = True
+        self.connector.get_chunks_metadata.return_value = existing
+        self.connector.delete_chunks.return_value = 1
+        # Chunk "b" changes its metadata and "d" is new
+        nodes_per_doc = self.get_incremental_nodes(["a", "b", "c", "d"])
+        nodes_per_doc[0][1].metadata["snippet_number"] = 7
+        mock_get_chunking.return_value.get_chunks.return_value = nodes_per_doc
+        mock_bulk_writer.return_value.write.return_value = BULK_STATS
+
+        with patch.object(self.vector_db, "encoding") as mock_encoding:
+            mock_encoding.encode.return_value = ["token"] * 100
+            result = self.vector_db.index_documents([doc], io)
+
+        self.connector.get_chunks_metadata.assert_called_once_with(
+            "test_index_test_model", [{"filename": "doc.pdf"}], ["snippet_id", "content_hash", "document_id", "filename"])
+        written = mock_bulk_writer.return_value.write.call_args.args[0]
+        self.assertEqual([node.node_id for nodes in written for node in nodes], ["id_b", "id_d"])
+        self.connector.delete_chunks.assert_called_once_with("test_index_test_model", ["id_old"])
+        self.assertEqual(self.vector_db.incremental_stats, {"test_model": {"written": 2, "skipped": 2, "deleted": 1}})
+        # The document keeps its document_id and only the tokens of the written chunks are reported
+        self.assertEqual(doc.metadata["document_id"], "doc_1")
+        self.assertEqual(result[0]["process_type/test_model/tokens"]["num"], 50)
+
+    @patch("vector_storages.get_embed_model")
+    @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_batch(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
+        """Test that the indexations of a batch share the bulk writes and a failed one does not fail the rest."""
+        ios = []
+        for i in range(3):
+            io = MagicMock(spec=Parser)
+            io.models = [{"embedding_model": "model_1"}, {"embedding_model": "model_2"}]
+            io.index = "test_index"
+            io.process_type = "process_type"
+            io.specific = {"document": {"n_pags": i + 1}}
+            io.chunking_method = {"method": "simple", "window_length": i}
+            io.override = False
+            ios.append(io)
+        batch = [([Document(text="text")], io) for io in ios]
+        nodes = [[[TextNode(text=f"chunk {i}", id_=f"{i}-0", metadata={"filename": f"doc{i}.pdf"})]] for i in range(3)]
+        mock_get_chunking.return_value.get_chunks.side_effect = [nodes[0], ValueError("Wrong chunking"), nodes[2]]
+        # A chunk of the third indexation is rejected by the index of the first model, also when it is sent alone
+        mock_bulk_writer.return_value.write.side_effect = [{**BULK_STATS, "failed_ids": ["2-0"]},
+                                                           ConnectionError("Rejected"),
+                                                           {**BULK_STATS, "failed_ids": []}]
+
+        with patch.object(self.vector_db, "encoding") as mock_encoding:
+            mock_encoding.encode.return_value = ["token"] * 10
+            results = self.vector_db.index_documents_batch(batch)
+
+        # Every indexation is chunked with its own configuration
+        self.assertEqual([call.args[0]["window_length"] for call in mock_get_chunking.call_args_list], [0, 1, 2])
+        writes = mock_bulk_writer.return_value.write.call_args_list
+        self.assertEqual([[node.node_id for nodes in call.args[0] for node in nodes] for call in writes],
+                         [["0-0", "2-0"], ["2-0"], ["0-0"]])
+        self.assertEqual([call.kwargs.get("isolate_failures", False) for call in writes], [True, False, True])
+        self.assertEqual(results[0][1]["process_type/model_2/tokens"]["num"], 10)
+        self.assertEqual(results[0][0]["process_type/model_1/pages"]["num"], 1)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[2], ConnectionError)
+        # The nodes of the failed indexation are deleted by id from the indexes of all the models
+        self.assertEqual([call.args for call in self.connector.delete_chunks.call_args_list],
+                         [("test_index_model_1", ["2-0"]), ("test_index_model_2", ["2-0"])])
+        self.connector.delete_documents.assert_not_called()
+
+    def get_batch(self, n_indexations, override=False):
+        ios = []
+        for i in range(n_indexations):
+            io = MagicMock(spec=Parser)
+            io.models = [{"embedding_model": "model_1"}]
+            io.index = "test_index"
+            io.process_type = "process_type"
+            io.specific = {"document": {"n_pags": 1}}
+            io.chunking_method = {"method": "simple"}
+            io.override = override
+            io.metadata_primary_keys = ["filename"]
+            ios.append(io)
+        nodes = [[[TextNode(text=f"chunk {i}", id_=f"{i}-0", metadata={"filename": f"doc{i}.pdf"})]]
+                 for i in range(n_indexations)]
+        return [([Document(text="text")], io) for io in ios], nodes
+
+    @patch("vector_storages.get_embed_model")
+    @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_batch_embedding_error(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
+        """Test that a chunk that can not be embedded only fails its own indexation."""
+        batch, nodes = self.get_batch(3)
+        mock_get_chunking.return_value.get_chunks.side_effect = nodes
+        # The embedding of the shared group fails, then the indexations are written alone
+        mock_bulk_writer.return_value.write.side_effect = [{**BULK_STATS, "failed_ids": ["0-0", "1-0", "2-0"]},
+                                                           BULK_STATS, ValueError("Too many tokens"), BULK_STATS]
+
+        with patch.object(self.vector_db, "encoding") as mock_encoding:
+            mock_encoding.encode.return_value = ["token"] * 10
+            results = self.vector_db.index_documents_batch(batch)
+
+        writes = mock_bulk_writer.return_value.write.call_args_list
+        self.assertEqual([[node.node_id for nodes in call.args[0] for node in nodes] for call in writes],
+                         [["0-0", "1-0", "2-0"], ["0-0"], ["1-0"], ["2-0"]])
+        self.assertEqual(results[0][0]["process_type/model_1/tokens"]["num"], 20)
+        self.assertIsInstance(results[1], ConnectionError)
+        self.assertEqual(results[2][0]["process_type/model_1/tokens"]["num"], 20)
+        self.connector.delete_chunks.assert_called_once_with("test_index_model_1", ["1-0"])
+
+    @patch("vector_storages.get_embed_model")
+    @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_batch_resent_file(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
+        """Test that the rollback of a failed indexation keeps the chunks of a resent file of the same batch."""
+        batch, _ = self.get_batch(2)
+        nodes = [[[TextNode(text="chunk", id_=f"{i}-{j}", metadata={"filename": "doc.pdf"}) for j in range(2)]]
+                 for i in range(2)]
+        # The second indexation shares a chunk id with the first one
+        nodes[1][0][0].id_ = "0-0"
+        mock_get_chunking.return_value.get_chunks.side_effect = nodes
+        mock_bulk_writer.return_value.write.side_effect = [{**BULK_STATS, "failed_ids": ["1-1"]}, ValueError("Rejected")]
+
+        with patch.object(self.vector_db, "encoding") as mock_encoding:
+            mock_encoding.encode.return_value = ["token"] * 10
+            results = self.vector_db.index_documents_batch(batch)
+
+        self.assertIsInstance(results[0], list)
+        self.assertIsInstance(results[1], ConnectionError)
+        # Only the chunks of the failed indexation are deleted, not every chunk of the filename
+        self.connector.delete_chunks.assert_called_once_with("test_index_model_1", ["1-1"])
+        self.connector.delete_documents.assert_not_called()
+
+    @patch("vector_storages.get_embed_model")
+    @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
+    @patch("vector_storages.BulkNodeWriter")
+    def test_index_documents_batch_override_order(self, mock_bulk_writer, mock_get_chunking, mock_embed_model):
+        """Test that the override of an indexation runs after the writing of the previous ones of the batch."""
+        batch, nodes = self.get_batch(3, override=True)
+        batch[2][1].override = False
+        mock_get_chunking.return_value.get_chunks.side_effect = nodes
+        calls = []
+        mock_bulk_writer.return_value.write.side_effect = lambda nodes_per_doc, *args, **kwargs: \
+            calls.append(("write", [node.node_id for nodes in nodes_per_doc for node in nodes])) or {**BULK_STATS, "failed_ids": []}
+
+        with patch.object(self.vector_db, "encoding") as mock_encoding, \
+                patch.object(self.vector_db, "_handle_document_override",
+                             side_effect=lambda docs, io: calls.append(("override", batch.index((docs, io))))):
+            mock_encoding.encode.return_value = ["token"] * 10
+            self.vector_db.index_documents_batch(batch)
+
+        self.assertEqual(calls, [("override", 0), ("write", ["0-0"]), ("override", 1), ("write", ["1-0", "2-0"])])
+
+    @patch.object(LlamaIndexElastic, "index_documents", return_value=["report"])
+    def test_index_documents_batch_incremental(self, mock_index_documents):
+        """Test that the incremental indexations of a batch are indexed alone."""
+        io = MagicMock(spec=Parser)
+        io.incremental = True
+        results = self.vector_db.index_documents_batch([(["doc"], io)])
+
+        mock_index_documents.assert_called_once_with(["doc"], io)
+        self.assertEqual(results, [["report"]])
+
+    def test_get_existing_chunks_new_index(self):
+        """Test that the incremental indexing does not look up the chunks in the indexes that do not exist."""
+        io = MagicMock()
+        io.models = [{"embedding_model": "test_model"}]
+        io.index = "test_index"
+        io.metadata_primary_keys = ["filename"]
+        self.connector.exist_index.return_value = False
+
+        existing = self.vector_db._get_existing_chunks([Document(text="text", metadata={"filename": "doc.pdf"})], io)
+
+        self.assertEqual(existing, {"test_model": ("test_index_test_model", {})})
+        self.connector.get_chunks_metadata.assert_not_called()
+
+
+class TestLlamaIndexElasticConcurrent(unittest.TestCase):
+
+    def setUp(self):
+        self.vector_db = LlamaIndexElastic(MagicMock(), "workspace", "origin", {})
+        self.vector_db.logger = MagicMock()
+        self.io = MagicMock(spec=Parser)
+        self.io.models = [{"embedding_model": "model-a"}, {"embedding_model": "model-b"}]
+        self.io.index = "test_index"
+        self.io.process_type = "ir_index"
+        self.io.specific = {"document": {"n_pags": 2}}
+        self.io.chunking_method = {}
+        self.io.execution_mode = "concurrent"
+        self.nodes_per_doc = [[TextNode(text=f"chunk {i}", id_=f"{doc}-{i}", metadata={"filename": doc})
+                               for i in range(3)] for doc in ["doc1.pdf", "doc2.pdf"]]
+        self.stores = {}
+        self.failing_index = None
+
+    def get_store(self, index_name, es_client):
+        self.stores[index_name] = MagicMock()
+        self.stores[index_name].async_add = AsyncMock(side_effect=lambda nodes: [node.node_id for node in nodes])
+        if index_name == self.failing_index:
+            self.stores[index_name].async_add.side_effect = ValueError("Mapping error")
+        return self.stores[index_name]
+
+    def index_documents(self):
+        with patch("vector_storages.ManagerChunkingMethods.get_chunking_method") as mock_get_chunking, \
+                patch("vector_storages.get_embed_model", side_effect=lambda model, *args, **kwargs:
+                      MockEmbedding(embed_dim=4 if model["embedding_model"] == "model-a" else 8)), \
+                patch("vector_storages.ElasticsearchStore", side_effect=self.get_store), \
+                patch("vector_storages.AsyncElasticsearch", return_value=MagicMock(close=AsyncMock())):
+            mock_get_chunking.return_value.get_chunks.return_value = self.nodes_per_doc
+            return self.vector_db.index_documents([Document(text="chunk")], self.io)
+
+    def test_index_documents_concurrent(self):
+        global_embed_model = Settings._embed_model
+        result = self.index_documents()
+
+        self.assertEqual([list(report) for report in result],
+                         [["ir_index/model-a/pages", "ir_index/model-a/tokens"],
+                          ["ir_index/model-b/pages", "ir_index/model-b/tokens"]])
+        # Every model writes all the nodes with its own embeddings and the shared nodes are not modified
+        for index_name, dim in [("test_index_model-a", 4), ("test_index_model-b", 8)]:
+            written = [node for call in self.stores[index_name].async_add.call_args_list for node in call.args[0]]
+            self.assertEqual(len(written), 6)
+            self.assertTrue(all(len(node.embedding) == dim for node in written))
+        self.assertTrue(all(node.embedding is None for nodes in self.nodes_per_doc for node in nodes))
+        self.assertIs(Settings._embed_model, global_embed_model)
+
+    @patch("vector_storages.LlamaIndexElastic._manage_indexing_exception")
+    def test_index_documents_concurrent_model_error(self, mock_manage_exception):
+        self.failing_index = "test_index_model-b"
+        with self.assertRaises(ConnectionError) as cm:
+            self.index_documents()
+
+        # The error of a model does not stop the other one, then the nodes are deleted from every index
+        self.assertEqual(self.stores["test_index_model-a"].async_add.call_count, 2)
+        self.assertIn("model-b", str(cm.exception))
+        self.assertNotIn("model-a", str(cm.exception))
+        mock_manage_exception.assert_called_once_with("test_index", self.io.models, unittest.mock.ANY)
+
+    def test_index_documents_concurrent_model_error_cleanup(self):
+        self.failing_index = "test_index_model-b"
+        self.vector_db.connector.delete_documents.return_value = MagicMock(body={"failures": [], "deleted": 6})
+        with self.assertRaises(ConnectionError):
+            self.index_documents()
+
+        # The index of the model that succeeded does not keep the nodes of the failed indexation
+        deleted = {call.args[0]: sorted(call.args[1]["filename"])
+                   for call in self.vector_db.connector.delete_documents.call_args_list}
+        self.assertEqual(deleted, {"test_index_model-a": ["doc1.pdf", "doc2.pdf"],
+                                   "test_index_model-b": ["doc1.pdf", "doc2.pdf"]})
+
+    def awrite_nodes(self, nodes_per_doc, vector_store, max_retries=3):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.vector_db._awrite_nodes(
+                nodes_per_doc, MockEmbedding(embed_dim=4), vector_store, asyncio.Semaphore(2),
+                BulkNodeWriter(MagicMock(), "test_index_model-a", max_retries=max_retries, backoff=2)))
+        finally:
+            loop.close()
+
+    @patch("vector_storages.asyncio.sleep", new_callable=AsyncMock)
+    def test_awrite_nodes_retries(self, mock_sleep):
+        written = []
+
+        async def add(nodes):
+            if nodes[0].node_id == "doc1.pdf-0" and "doc1.pdf-0" not in [node.node_id for node in written]:
+                written.extend(nodes)
+                raise TimeoutException("Timeout")
+            written.extend(nodes)
+            return [node.node_id for node in nodes]
+
+        vector_store = MagicMock()
+        vector_store.async_add = AsyncMock(side_effect=add)
+        retries = self.awrite_nodes(self.nodes_per_doc, vector_store)
+
+        # Only the failed document is sent again, after a jittered backoff
+        self.assertEqual(retries, 2)
+        self.assertEqual(vector_store.async_add.await_count, 3)
+        self.assertEqual([node.node_id for node in written].count("doc2.pdf-0"), 1)
+        mock_sleep.assert_awaited_once()
+        self.assertTrue(0 <= mock_sleep.await_args.args[0] <= 2)
+
+    @patch("vector_storages.asyncio.sleep", new_callable=AsyncMock)
+    def test_awrite_nodes_max_retries(self, mock_sleep):
+        vector_store = MagicMock()
+        vector_store.async_add = AsyncMock(side_effect=RateLimitError("Rate limit", response=MagicMock(), body=None))
+
+        with self.assertRaises(RateLimitError):
+            self.awrite_nodes(self.nodes_per_doc[:1], vector_store, max_retries=2)
+        self.assertEqual(vector_store.async_add.await_count, 3)
+        self.assertEqual(mock_sleep.await_count, 2)
+
+    def test_awrite_nodes_cancels_documents(self):
+        cancelled = []
+        started = asyncio.Event()
+
+        async def add(nodes):
+            if nodes[0].metadata["filename"] == "doc1.pdf":
+                await started.wait()
+                raise ValueError("Mapping error")
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(nodes[0].metadata["filename"])
+                raise
+
+        vector_store = MagicMock()
+        vector_store.async_add = AsyncMock(side_effect=add)
+
+        # The document being written is cancelled when another one fails without retries
+        with self.assertRaises(ValueError):
+            self.awrite_nodes(self.nodes_per_doc, vector_store)
+        self.assertEqual(cancelled, ["doc2.pdf"])
+
+
 class TestManagerVectorDB(unittest.TestCase):
     def setUp(self):
         self.conf_invalid = {"type": "InvalidType", "connector": MagicMock(), "workspace": "workspace", "origin": "origin", "aws_credentials": {}}
@@ -703,6 +1075,27 @@ class TestLlamaIndexAzureAI(unittest.TestCase):
         for key in expected_keys:
             self.assertIn(key, result[0].keys())
 
+    @patch("vector_storages.get_embed_model")
+    @patch("vector_storages.AzureAISearchVectorStore")
+    @patch("vector_storages.ManagerChunkingMethods.get_chunking_method")
+    def test_index_documents_azure_with_override(self, mock_get_chunking, mock_azure_store, mock_embed_model):
+        """Test that the override is done before indexing in Azure AI."""
+        io = MagicMock()
+        io.models = [{"embedding_model": "test_model"}]
+        io.override = True
+        io.metadata_primary_keys = ["filename"]
+        docs = [MagicMock()]
+
+        self.vector_db.encoding.encode = MagicMock(return_value=["token1", "token2"])
+        mock_get_chunking.return_value.get_chunks.return_value = [["chunk1"]]
+        mock_embed_model.return_value = MockEmbedding(embed_dim=4)
+        self.vector_db._handle_document_override = MagicMock()
+        self.vector_db._write_nodes = MagicMock(return_value=1)
+
+        self.vector_db.index_documents(docs, io)
+
+        self.vector_db._handle_document_override.assert_called_once_with(docs, io)
+
     @patch("vector_storages.get_exc_info", return_value=True)
     def test_get_processed_data_azure_connection_error(self, mock_get_exc_info):
         """Test the exception handling in get_processed_data when ServiceRequestError is raised."""
@@ -4,15 +4,20 @@
 # Native imports
 from abc import ABC
 from typing import List
+import asyncio
 import logging
+import json
 import os
 import time
 
 # Installed imports
+import mmh3
 import pandas as pd
 import langdetect
 import tiktoken
 from llama_index.core import StorageContext, VectorStoreIndex, Settings, Document
+from llama_index.core.indices.utils import async_embed_nodes
+from llama_index.core.schema import MetadataMode
 from httpx import TimeoutException
 from openai import RateLimitError
 
@@ -28,6 +33,8 @@ from common.utils import INDEX_NAME
 from common.errors.genaierrors import PrintableGenaiError
 
 from chunking_methods import ManagerChunkingMethods
+from bulk_writer import BulkNodeWriter
+from embedding_cache import EmbeddingCache
 
 from elasticsearch.exceptions import ConnectionError as ElasticConnectionError
 from elasticsearch.helpers.errors import BulkIndexError
@@ -41,6 +48,8 @@ from llama_index.vector_stores.azureaisearch import IndexManagement
 
 class VectorDB(ABC):
     MODEL_FORMAT = "VectorDB"
+    # Metadata of the indexed chunks needed by the incremental indexing
+    INCREMENTAL_FIELDS = ["snippet_id", "content_hash", "document_id"]
 
     def __init__(self, connector: Connector, workspace, origin, aws_credentials):
         self.connector = connector
@@ -52,6 +61,7 @@ class VectorDB(ABC):
 
         logger_handler = LoggerHandler(VECTOR_DB_SERVICE, level=os.environ.get('LOG_LEVEL', "INFO"))
         self.logger = logger_handler.logger
+        self.incremental_stats = {}
 
     @classmethod
     def is_vector_database_type(cls, model_type):
@@ -59,14 +69,16 @@ class VectorDB(ABC):
         """
         return model_type == cls.MODEL_FORMAT
 
+    # Built once, the documents of a csv dataset can have tens of thousands of rows
+    ACCENTS_TABLE = str.maketrans("áéíóúÁÉÍÓÚàèìòùÀÈÌÒÙäëïöüÄËÏÖÜâêîôûÂÊÎÔÛ", "aeiouAEIOUaeiouAEIOUaeiouAEIOUaeiouAEIOU")
+    # Columns of the dataframe with the language of the row (the language is not detected)
+    LANGUAGE_COLUMNS = ["language", "lang"]
+
     @staticmethod
     def _strip_accents(s):
         """Function to delete accents
         """
-        chars_origin = "áéíóúÁÉÍÓÚàèìòùÀÈÌÒÙäëïöüÄËÏÖÜâêîôûÂÊÎÔÛ"
-        chars_parsed = "aeiouAEIOUaeiouAEIOUaeiouAEIOUaeiouAEIOU"
-
-        return s.translate(str.maketrans(chars_origin, chars_parsed))
+        return s.translate(VectorDB.ACCENTS_TABLE)
 
     def _initialize_metadata(self, doc: dict, txt_path: str, doc_url: str, csv: bool, do_titles: bool, do_tables: bool):
         meta = doc['meta']
@@ -80,7 +92,8 @@ class VectorDB(ABC):
         meta['_csv_path'] = f"{folder.replace('/txt/', '/csvs/')}/{os.path.basename(folder)}_" if do_tables and not csv else ""
 
     def _get_documents_from_dataframe(self, df: pd.DataFrame, markdown_txts: List, txt_path: str, csv: bool, do_titles: bool, do_tables: bool):
-        """ Gets the dataframe in elasticsearch format to index it
+        """ Gets the dataframe in elasticsearch format to index it. The metadata, the languages and the accents are
+        processed by column
 
         :param df: dataframe to modify the format
         :param markdown_txts: if markdowns txts were found, the model will initialize some metadata
@@ -88,32 +101,63 @@ class VectorDB(ABC):
         :param do_titles: if do_titles, the model will initialize some metadata
         :param do_tables: if do_tables, the model will initialize some metadata
         """
-        elastic_docs = [
-            {
-                'content': row['text'],
-                'meta': {column: str(row[column]) for column in row.index if
-                         column not in ['Url', 'CategoryId', 'text']}
-            } for index, row in df.iterrows() if row['text']
-        ]
+        positions = [i for i, text in enumerate(df['text']) if text]
+        rows = df.iloc[positions].reset_index(drop=True)
+        texts = rows['text']
+
+        # Language of the row if it has it, if not detected (if enabled) to not remove the accents in japanese
+        languages = pd.Series("", index=texts.index, dtype=object)
+        for column in self.LANGUAGE_COLUMNS:
+            if column in rows.columns:
+                languages = languages.mask(languages == "", rows[column].fillna("").astype(str).str.strip())
+        undetected = languages == ""
+        if undetected.any() and eval(os.getenv('INDEXING_DETECT_LANGUAGE', "True")):
+            languages[undetected] = texts[undetected].map(langdetect.detect)
+        # if language is not japanese, remove accents
+        not_japanese = languages != "ja"
+        texts = texts.where(~not_japanese, texts[not_japanese].astype(str).str.translate(self.ACCENTS_TABLE))
+
+        metadata_columns = [column for column in rows.columns if column not in ['Url', 'CategoryId', 'text']]
+        metas = pd.DataFrame({column: rows[column].map(str) for column in metadata_columns},
+                             index=rows.index).to_dict('records') if metadata_columns else [{} for _ in positions]
 
         # Add metadata
         final_docs = []
-        for i, doc in enumerate(elastic_docs):
-            # if language is not japanese, remove accents
-            if langdetect.detect(doc['content']) != 'ja':
-                doc['content'] = self._strip_accents(doc['content'])
+        urls = df['Url'].tolist()
+        for i, (text, meta) in enumerate(zip(texts, metas)):
+            doc = {'content': text, 'meta': meta}
             do_titles = do_titles and markdown_txts[i] is not None
             do_tables = do_tables and markdown_txts[i] is not None
-            self._initialize_metadata(doc, txt_path, doc_url=df['Url'].iloc[i], csv=csv, do_titles=do_titles, do_tables=do_tables)
-            llama_doc = Document(text=doc['content'], metadata=doc['meta'])
-            final_docs.append(llama_doc)
+            self._initialize_metadata(doc, txt_path, doc_url=urls[i], csv=csv, do_titles=do_titles, do_tables=do_tables)
+            final_docs.append(Document(text=doc['content'], metadata=doc['meta']))
         return final_docs
 
 
+    def _get_embed_model(self, model: dict):
+        """Embed model of a model of the indexation, behind the embedding cache when it is enabled"""
+        embed_model = get_embed_model(model, self.aws_credentials, is_retrieval=False)
+        cache = EmbeddingCache.get_instance()
+        return cache.wrap(embed_model, model['embedding_model']) if cache else embed_model
+
+    @staticmethod
+    def _get_embedding_cache_stats() -> dict:
+        """Usage counters of the embedding cache of the process at the start of an indexation"""
+        cache = EmbeddingCache.get_instance()
+        return cache.get_stats() if cache else {}
+
+    def _log_embedding_cache_stats(self, since: dict):
+        """Log the usage of the embedding cache since the start of the indexation (the counters of the cache are
+        shared by all the indexations of the process)"""
+        cache = EmbeddingCache.get_instance()
+        if cache:
+            stats = cache.get_stats(since)
+            self.logger.info(f"Embedding cache ({stats['backend']}): {stats['hits']} hits, {stats['misses']} misses "
+                             f"(hit ratio {stats['hit_ratio']:.2%}), {stats['entries']} embeddings stored")
+
     def _manage_indexing_exception(self, index_name, models, docs_filenames):
+        # The writers have finished (and refreshed the index) when they fail, the nodes are deleted without waiting
         self.logger.warning(
             f"Max retries exceeded while indexing {docs_filenames}, deleting nodes and closing connection")
-        time.sleep(50)
         for model in models:
             processed_index_name = INDEX_NAME(index_name, model.get('embedding_model'))
             # Documents deletion
@@ -126,6 +170,198 @@ class VectorDB(ABC):
                 result = f"{result.body['deleted']} chunks deleted."
             self.logger.debug(f"Result deleting documents in index {processed_index_name}: {result}")
 
+    def _handle_document_override(self, docs: List, io: Parser):
+        """Handle document override functionality by deleting existing documents with matching metadata"""
+        try:
+            # Create filters based on metadata_primary_keys and document metadata
+            filters_to_delete = self._build_override_filters(docs, io.metadata_primary_keys)
+            
+            if not filters_to_delete:
+                self.logger.info("Override: No documents to override - no matching metadata found")
+                return
+            
+            # Delete existing documents for each model
+            index_names = []
+            for model in io.models:
+                index_name = INDEX_NAME(io.index, model.get('embedding_model'))
+                
+                if not self.connector.exist_index(index_name):
+                    self.logger.info(f"Override: Index {index_name} does not exist, skipping override deletion")
+                    continue
+                index_names.append(index_name)
+
+            if index_names and eval(os.getenv('INDEXING_OVERRIDE_BULK', "True")):
+                self._delete_documents_bulk(index_names, filters_to_delete)
+                return
+
+            for index_name in index_names:
+                for filters in filters_to_delete:
+                    try:
+                        result = self.connector.delete_documents(index_name, filters)
+                        
+                        self.logger.info(f"Override: Deletion attempted in {index_name} with filters {filters}")
+                        
+                    except Exception as e:
+                        self.logger.warning(f"Override: Error during deletion in {index_name} with filters {filters}: {str(e)}")
+                        
+        except Exception as e:
+            self.logger.error(f"Override: Error in document override process: {str(e)}", exc_info=get_exc_info())
+
+    def _delete_documents_bulk(self, index_names: List[str], filters_to_delete: List[dict]):
+        """Delete the documents of all the filters from the indexes of the models with a few requests by index"""
+        try:
+            results = self.connector.delete_documents_bulk(index_names, filters_to_delete)
+        except Exception as e:
+            self.logger.warning(f"Override: Error during bulk deletion in {index_names} of {len(filters_to_delete)} "
+                                f"documents: {str(e)}")
+            return
+
+        for index_name, result in results.items():
+            self.logger.info(f"Override: {result['deleted']} chunks of {len(filters_to_delete)} documents deleted "
+                             f"in {index_name} with {result['requests']} requests")
+            if result['failures']:
+                self.logger.warning(f"Override: {len(result['failures'])} failures during bulk deletion in "
+                                    f"{index_name}: {result['failures'][:5]}")
+
+    def _build_override_filters(self, docs: List, metadata_primary_keys: List) -> List[dict]:
+        """Build filters for document deletion based on metadata_primary_keys"""
+        filters_list = []
+        
+        for doc in docs:
+            doc_filters = {}
+            
+            # Extract values for each metadata_primary_key from document metadata
+            for key in metadata_primary_keys:
+                if key in doc.metadata:
+                    doc_filters[key] = doc.metadata[key]
+                else:
+                    self.logger.warning(f"Override: Metadata key '{key}' not found in document metadata. Available keys: {list(doc.metadata.keys())}")
+            
+            # Only add filters if we found at least one matching metadata key
+            if doc_filters:
+                filters_list.append(doc_filters)
+                self.logger.debug(f"Override: Built filters for document: {doc_filters}")
+        
+        return filters_list
+
+    def _get_existing_chunks(self, docs: List, io: Parser) -> dict:
+        """Get the chunks already indexed of the documents (found by their metadata_primary_keys) with a single
+        batched lookup in the index of every model
+
+        :param docs: Documents to index
+        :param io: Parser object with the models, the index and the metadata_primary_keys
+        :return: Index name and metadata of the indexed chunks by chunk id, by embedding model
+        """
+        filters = self._build_override_filters(docs, io.metadata_primary_keys)
+        existing_chunks = {}
+        for model in io.models:
+            index_name = INDEX_NAME(io.index, model.get('embedding_model'))
+            chunks = {}
+            if filters and self.connector.exist_index(index_name):
+                chunks = self.connector.get_chunks_metadata(index_name, filters,
+                                                            self.INCREMENTAL_FIELDS + io.metadata_primary_keys)
+            existing_chunks[model['embedding_model']] = (index_name, chunks)
+        return existing_chunks
+
+    @staticmethod
+    def _reuse_document_ids(docs: List, existing_chunks: dict, metadata_primary_keys: List):
+        """Keep the document_id of the documents already indexed, so the chunks that are not written again and the
+        new ones have the same one"""
+        document_ids = {}
+        for _, chunks in existing_chunks.values():
+            for metadata in chunks.values():
+                if metadata.get('document_id'):
+                    keys = tuple(str(metadata.get(key)) for key in metadata_primary_keys)
+                    document_ids.setdefault(keys, metadata['document_id'])
+        for doc in docs:
+            document_id = document_ids.get(tuple(str(doc.metadata.get(key)) for key in metadata_primary_keys))
+            if document_id:
+                doc.metadata.setdefault('document_id', document_id)
+
+    @staticmethod
+    def _add_content_hashes(nodes_per_doc: list):
+        """Add to every chunk the hash of its text and metadata (a chunk with the same id and hash as an indexed one
+        does not need to be embedded and written again). The hash is not embedded nor sent to the LLMs"""
+        for nodes in nodes_per_doc:
+            for node in nodes:
+                metadata = {key: value for key, value in node.metadata.items() if key != 'content_hash'}
+                content = node.get_content(metadata_mode=MetadataMode.NONE) + "\n\n" + json.dumps(metadata, sort_keys=True, default=str)
+                node.metadata['content_hash'] = "{:02x}".format(mmh3.hash128(content, signed=False))
+                for excluded_keys in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+                    if 'content_hash' not in excluded_keys:
+                        excluded_keys.append('content_hash')
+
+    def _get_incremental_nodes(self, nodes_per_doc: list, existing_chunks: dict) -> dict:
+        """Compare the chunks of the documents with the indexed ones in the index of every model: only the new or
+        changed chunks are written and the indexed ones that do not exist anymore are deleted
+
+        :param nodes_per_doc: list of nodes by document
+        :param existing_chunks: Index name and metadata of the indexed chunks by chunk id, by embedding model
+        :return: Index name, nodes to write by document, number of skipped nodes and ids to delete, by embedding model
+        """
+        self._add_content_hashes(nodes_per_doc)
+        ids = {node.node_id for nodes in nodes_per_doc for node in nodes}
+        n_nodes = sum(len(nodes) for nodes in nodes_per_doc)
+        incremental_nodes = {}
+        for embedding_model, (index_name, chunks) in existing_chunks.items():
+            changed_nodes_per_doc = [[node for node in nodes
+                                      if chunks.get(node.node_id, {}).get('content_hash') != node.metadata['content_hash']]
+                                     for nodes in nodes_per_doc]
+            incremental_nodes[embedding_model] = {
+                "index_name": index_name,
+                "nodes_per_doc": changed_nodes_per_doc,
+                "skipped": n_nodes - sum(len(nodes) for nodes in changed_nodes_per_doc),
+                "vanished": [chunk_id for chunk_id in chunks if chunk_id not in ids]
+            }
+        return incremental_nodes
+
+    def _delete_vanished_chunks(self, incremental_nodes: dict):
+        """Delete the indexed chunks that do not exist anymore and keep the stats of the incremental indexing"""
+        for embedding_model, nodes in incremental_nodes.items():
+            deleted = self.connector.delete_chunks(nodes['index_name'], nodes['vanished']) if nodes['vanished'] else 0
+            written = sum(len(changed_nodes) for changed_nodes in nodes['nodes_per_doc'])
+            self.incremental_stats[embedding_model] = {"written": written, "skipped": nodes['skipped'],
+                                                       "deleted": deleted}
+            self.logger.info(f"Incremental indexing in {nodes['index_name']}: {written} chunks written, "
+                             f"{nodes['skipped']} unchanged chunks skipped and {deleted} chunks deleted")
+
+    def _get_incremental_tokens(self, n_tokens: int, embedding_model: str) -> int:
+        """Tokens of the documents in proportion to the chunks embedded by the model in the incremental indexing"""
+        stats = self.incremental_stats[embedding_model]
+        return round(n_tokens * stats['written'] / max(stats['written'] + stats['skipped'], 1))
+
+    def _get_tokens_report(self, io: Parser, n_tokens: int, retries_by_model: dict, incremental: bool = False) -> List:
+        """Pages and tokens of the indexation to report to the api by embedding model"""
+        list_report_to_api = []
+        for model in io.models:
+            model_tokens = self._get_incremental_tokens(n_tokens, model['embedding_model']) if incremental else n_tokens
+            list_report_to_api.append({
+                f"{io.process_type}/{model['embedding_model']}/pages": {
+                    "num": io.specific.get('document', {}).get('n_pags', 1),
+                    "type": "PAGS"
+                },
+                f"{io.process_type}/{model['embedding_model']}/tokens": {
+                    "num": model_tokens * retries_by_model[model['embedding_model']],  # embeddings calculation for each retry
+                    "type": "TOKENS"
+                }
+            })
+        return list_report_to_api
+
+    def index_documents_batch(self, batch: List[tuple]) -> List:
+        """Index the documents of several indexations of the same index and models. A failed indexation does not
+        stop the rest, its exception is returned in its place
+
+        :param batch: Documents and Parser object of every indexation
+        :return: Report to the api (as index_documents) or exception of every indexation
+        """
+        results = []
+        for docs, io in batch:
+            try:
+                results.append(self.index_documents(docs, io))
+            except Exception as ex:
+                results.append(ex)
+        return results
+
 
 class LlamaIndexElastic(VectorDB):
 
@@ -184,128 +420,303 @@ class LlamaIndexElastic(VectorDB):
             List: A list of dictionaries reporting the number of pages and tokens processed
                   for each embedding model.
         """
-        list_report_to_api = []
+        cache_stats = self._get_embedding_cache_stats()
         n_tokens = sum(len(self.encoding.encode(doc.text)) for doc in docs)
         chunking_method = ManagerChunkingMethods.get_chunking_method({**io.chunking_method, "origin": self.origin,
                                                                       "workspace": self.workspace})
 
+        # Only the new or changed chunks are indexed, compared with the indexed ones of the documents
+        incremental = getattr(io, 'incremental', False) is True
+        if incremental:
+            existing_chunks = self._get_existing_chunks(docs, io)
+            self._reuse_document_ids(docs, existing_chunks, io.metadata_primary_keys)
+
         nodes_per_doc = chunking_method.get_chunks(docs, self.encoding, io)
+        nodes_by_model = {}
 
+        if incremental:
+            incremental_nodes = self._get_incremental_nodes(nodes_per_doc, existing_chunks)
+            nodes_by_model = {embedding_model: nodes['nodes_per_doc'] for embedding_model, nodes in incremental_nodes.items()}
          # Handle override functionality before indexing
-        if getattr(io, 'override', False) and getattr(io, 'metadata_primary_keys', None):
+        elif getattr(io, 'override', False) and getattr(io, 'metadata_primary_keys', None):
             self._handle_document_override(docs, io)
 
         # Indexation with the embeddings generation
-        for model in io.models:
-            index_name = INDEX_NAME(io.index, model.get('embedding_model'))
-            embed_model = get_embed_model(model, self.aws_credentials, is_retrieval=False)
-            Settings.embed_model = embed_model
-            vector_store = ElasticsearchStore(index_name=index_name, es_client=AsyncElasticsearch(hosts=f"{self.connector.scheme}://{self.connector.host}:{self.connector.port}",
-                                           basic_auth=(self.connector.username, self.connector.password),
-                                           verify_certs=False, request_timeout=30))
+        if getattr(io, 'execution_mode', "sequential") == "concurrent":
+            retries_by_model = self._write_models_concurrently(nodes_per_doc, io, nodes_by_model)
+        else:
+            retries_by_model = {}
+            for model in io.models:
+                index_name = INDEX_NAME(io.index, model.get('embedding_model'))
+                embed_model = self._get_embed_model(model)
 
-            retries = self._write_nodes(nodes_per_doc, embed_model, vector_store, io.models, io.index)
+                retries_by_model[model['embedding_model']] = self._write_nodes(nodes_by_model.get(model['embedding_model'], nodes_per_doc),
+                                                                               embed_model, index_name, io.models, io.index)
 
-            self.logger.info(f"Model {model.get('embedding_model')} has been indexed in {index_name}")
+                self.logger.info(f"Model {model.get('embedding_model')} has been indexed in {index_name}")
 
-            list_report_to_api.append({
-                f"{io.process_type}/{model['embedding_model']}/pages": {
-                    "num": io.specific.get('document', {}).get('n_pags', 1),
-                    "type": "PAGS"
-                },
-                f"{io.process_type}/{model['embedding_model']}/tokens": {
-                    "num": n_tokens * retries, # embeddings calculation for each retry
-                    "type": "TOKENS"
-                }
-            })
-            vector_store.close()# AsyncElasticsearch connection close
-        return list_report_to_api
+        if incremental:
+            self._delete_vanished_chunks(incremental_nodes)
 
-    def _write_nodes(self, nodes_per_doc: list, embed_model, vector_store, models, index_name, delta=0, max_retries=3):
-        """Write documents in the document store
+        self._log_embedding_cache_stats(cache_stats)
+
+        return self._get_tokens_report(io, n_tokens, retries_by_model, incremental)
+
+    def index_documents_batch(self, batch: List[tuple]) -> List:
+        """Index the documents of several indexations of the same index and models at once: the nodes of consecutive
+        indexations are embedded and written with shared bulk requests by model. An indexation that fails (chunking,
+        override or any of its nodes not written) does not stop the rest, its nodes are deleted from the indexes of
+        all the models and its exception is returned in its place. The indexations are written in the order of the
+        batch: the previous ones are written before the override of an indexation and the incremental and concurrent
+        indexations are indexed one by one.
+
+        :param batch: Documents and Parser object of every indexation
+        :return: Report to the api (as index_documents) or exception of every indexation
+        """
+        cache_stats = self._get_embedding_cache_stats()
+        results = [None] * len(batch)
+        group = []
+        for position, (docs, io) in enumerate(batch):
+            standalone = getattr(io, 'incremental', False) is True or getattr(io, 'execution_mode', "sequential") == "concurrent"
+            override = getattr(io, 'override', False) and getattr(io, 'metadata_primary_keys', None)
+            if standalone or override:
+                self._write_batch_group(group, results)
+                group = []
+            try:
+                if standalone:
+                    results[position] = self.index_documents(docs, io)
+                    continue
+                n_tokens = sum(len(self.encoding.encode(doc.text)) for doc in docs)
+                chunking_method = ManagerChunkingMethods.get_chunking_method({**io.chunking_method, "origin": self.origin,
+                                                                              "workspace": self.workspace})
+                nodes_per_doc = chunking_method.get_chunks(docs, self.encoding, io)
+                if override:
+                    self._handle_document_override(docs, io)
+                group.append((position, io, n_tokens, nodes_per_doc))
+            except Exception as ex:
+                self.logger.warning(f"Indexation {position + 1}/{len(batch)} of the batch failed: {type(ex).__name__}; {ex.args}")
+                results[position] = ex
+        self._write_batch_group(group, results)
+
+        self._log_embedding_cache_stats(cache_stats)
+        return results
+
+    def _write_batch_group(self, group: List[tuple], results: List):
+        """Embed and write the nodes of consecutive indexations of a batch with shared bulk requests by model. When
+        the shared writing fails for some nodes, the indexations with failed nodes are written again alone, so a wrong
+        chunk only fails its own indexation. The nodes of the failed indexations are deleted at once from the indexes
+        of all the models
+
+        :param group: Position in the batch, Parser object, number of tokens and nodes by document of the indexations
+        :param results: Report or exception of every indexation of the batch, filled with the ones of the group
+        """
+        if not group:
+            return
+        # All the indexations of the batch have the same index and models
+        io = group[0][1]
+        retries = {position: {} for position, _, _, _ in group}
+        failed = {}
+        for model in io.models:
+            embedding_model = model['embedding_model']
+            index_name = INDEX_NAME(io.index, embedding_model)
+            pending = [(position, nodes_per_doc) for position, _, _, nodes_per_doc in group if position not in failed]
+            if not pending:
+                break
+            embed_model = self._get_embed_model(model)
+            writer = self._get_bulk_writer(index_name)
+            try:
+                stats = writer.write([nodes for _, nodes_per_doc in pending for nodes in nodes_per_doc], embed_model,
+                                     isolate_failures=True)
+                self._log_bulk_stats(index_name, stats)
+                failed_ids, shared_tries = set(stats['failed_ids']), stats['tries']
+            except Exception as ex:
+                self.logger.warning(f"Indexing in {index_name} failed due to: {type(ex).__name__}; {ex.args}")
+                failed_ids, shared_tries = None, 0
+
+            for position, nodes_per_doc in pending:
+                if failed_ids is not None and not any(node.node_id in failed_ids for nodes in nodes_per_doc for node in nodes):
+                    retries[position][embedding_model] = shared_tries
+                elif len(pending) == 1:
+                    failed[position] = ConnectionError(f"Nodes not written in {index_name}")
+                else:
+                    try:
+                        stats = writer.write(nodes_per_doc, embed_model)
+                        self._log_bulk_stats(index_name, stats)
+                        retries[position][embedding_model] = shared_tries + stats['tries']
+                    except Exception as ex:
+                        self.logger.warning(f"Indexation {position + 1} of the batch not written in {index_name}: "
+                                            f"{type(ex).__name__}; {ex.args}")
+                        failed[position] = ex
+            self.logger.info(f"Model {embedding_model} has been indexed in {index_name} for "
+                             f"{len([position for position, _ in pending if position not in failed])} indexations")
+
+        filenames = {position: list(set([node.metadata.get('filename') for nodes in nodes_per_doc for node in nodes]))
+                     for position, _, _, nodes_per_doc in group}
+        if failed:
+            self._delete_failed_nodes(io, group, failed)
+        for position, io, n_tokens, _ in group:
+            if position in failed:
+                results[position] = ConnectionError(f"Max num of retries reached while indexing {filenames[position]}: "
+                                                    f"{failed[position]}")
+            else:
+                results[position] = self._get_tokens_report(io, n_tokens, retries[position])
+
+    def _delete_failed_nodes(self, io: Parser, group: List[tuple], failed: dict):
+        """Delete the nodes of the failed indexations of a batch group from the indexes of all the models. They are
+        deleted by id and not by filename, so the chunks written by another indexation of the group with the same
+        filename (a resent file) are kept
+
+        :param io: Parser object with the index and the models
+        :param group: Position in the batch, Parser object, number of tokens and nodes by document of the indexations
+        :param failed: Exception by position of the failed indexations
+        """
+        kept_ids = set([node.node_id for position, _, _, nodes_per_doc in group if position not in failed
+                        for nodes in nodes_per_doc for node in nodes])
+        failed_ids = list(dict.fromkeys([node.node_id for position, _, _, nodes_per_doc in group if position in failed
+                                         for nodes in nodes_per_doc for node in nodes if node.node_id not in kept_ids]))
+        self.logger.warning(f"{len(failed)} indexations of the batch failed, deleting their {len(failed_ids)} chunks")
+        if not failed_ids:
+            return
+        for model in io.models:
+            index_name = INDEX_NAME(io.index, model.get('embedding_model'))
+            try:
+                deleted = self.connector.delete_chunks(index_name, failed_ids)
+                self.logger.debug(f"Result deleting documents in index {index_name}: {deleted} chunks deleted.")
+            except Exception as ex:
+                self.logger.warning(f"Chunks not deleted in index {index_name}: {type(ex).__name__}; {ex.args}")
+
+    def _get_async_client(self) -> AsyncElasticsearch:
+        """Creates the async client used by the llama-index store to write the nodes"""
+        return AsyncElasticsearch(hosts=f"{self.connector.scheme}://{self.connector.host}:{self.connector.port}",
+                                  basic_auth=(self.connector.username, self.connector.password),
+                                  verify_certs=False, request_timeout=30)
+
+    def _write_models_concurrently(self, nodes_per_doc: list, io: Parser, nodes_by_model: dict = None) -> dict:
+        """Embed and write the nodes in the indexes of all the models at the same time. Every model has its own
+        embed model and client (the global llama-index Settings are not used) and writes at most
+        INDEXING_MODEL_CONCURRENCY documents at once. The models are isolated: a model failing does not stop the
+        others and the outcome of every one is logged. When all of them have finished, if any failed, the nodes are
+        deleted from the indexes of all the models (as in the sequential mode) before raising the error
+
+        :param nodes_per_doc: list of nodes by document
+        :param io: Parser object with the models and the index
+        :param nodes_by_model: list of nodes by document to write by embedding model (nodes_per_doc by default)
+        :return: Number of tries by embedding model
+        """
+        max_concurrency = int(os.getenv('INDEXING_MODEL_CONCURRENCY', 4))
+        nodes_by_model = nodes_by_model or {}
+
+        async def write_model(model: dict) -> int:
+            index_name = INDEX_NAME(io.index, model.get('embedding_model'))
+            embed_model = self._get_embed_model(model)
+            es_client = self._get_async_client()
+            try:
+                vector_store = ElasticsearchStore(index_name=index_name, es_client=es_client)
+                return await self._awrite_nodes(nodes_by_model.get(model['embedding_model'], nodes_per_doc),
+                                                embed_model, vector_store, asyncio.Semaphore(max_concurrency),
+                                                self._get_bulk_writer(index_name))
+            finally:
+                await es_client.close()
+
+        async def write_all() -> list:
+            return await asyncio.gather(*[write_model(model) for model in io.models], return_exceptions=True)
+
+        results = asyncio.get_event_loop().run_until_complete(write_all())
+
+        docs_filenames = list(set([node.metadata.get('filename') for nodes in nodes_per_doc for node in nodes]))
+        failed_models = []
+        for model, result in zip(io.models, results):
+            index_name = INDEX_NAME(io.index, model.get('embedding_model'))
+            if isinstance(result, BaseException):
+                self.logger.warning(f"Model {model['embedding_model']} failed while indexing {docs_filenames} in "
+                                    f"{index_name}: {type(result).__name__}; {result.args}")
+                failed_models.append(model)
+            else:
+                self.logger.info(f"Model {model.get('embedding_model')} has been indexed in {index_name}")
+        if failed_models:
+            self._manage_indexing_exception(io.index, io.models, docs_filenames)
+            raise ConnectionError(f"Max num of retries reached while indexing {docs_filenames} "
+                                  f"with the models {[model['embedding_model'] for model in failed_models]}")
+        return {model['embedding_model']: retries for model, retries in zip(io.models, results)}
+
+    async def _awrite_nodes(self, nodes_per_doc: list, embed_model, vector_store, semaphore: asyncio.Semaphore,
+                            retry_policy: BulkNodeWriter) -> int:
+        """Write documents in the document store asynchronously. Only the documents that fail on bulk or embedding
+        errors are retried, waiting the backoff with jitter of the BulkNodeWriter. When a document can not be
+        written, the rest of documents being written are cancelled before raising the error
 
         :param nodes_per_doc: list of nodes
         :param embed_model: embed model
         :param vector_store: vector store
+        :param semaphore: Max number of documents embedded and written at once
+        :param retry_policy: Writer with the max retries and the backoff between tries
+        :return: Number of tries (the most tried document)
+        """
+        async def write_document(nodes: list) -> int:
+            for attempt in range(retry_policy.max_retries + 1):
+                try:
+                    async with semaphore:
+                        id_to_embedding = await async_embed_nodes(nodes, embed_model)
+                        # Copies as the nodes are shared by all the models
+                        await vector_store.async_add([node.model_copy(update={'embedding': id_to_embedding[node.node_id]})
+                                                      for node in nodes])
+                    return attempt + 1
+                except (BulkIndexError, ConnectionTimeout, TimeoutException, RateLimitError) as ex:
+                    if attempt == retry_policy.max_retries:
+                        raise
+                    wait = retry_policy.get_backoff(attempt)
+                    self.logger.warning(f"{type(ex).__name__} detected while indexing {nodes[0].metadata.get('filename')}, "
+                                        f"retrying in {wait:.1f}s, try {attempt + 1}/{retry_policy.max_retries}")
+                    await asyncio.sleep(wait)
+
+        tasks = [asyncio.ensure_future(write_document(nodes)) for nodes in nodes_per_doc if nodes]
+        if not tasks:
+            return 1
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in tasks:
+            if task in done and task.exception():
+                raise task.exception()
+        return max(task.result() for task in tasks)
+
+    def _write_nodes(self, nodes_per_doc: list, embed_model, model_index_name: str, models: list, index_name: str) -> int:
+        """Write the nodes of all the documents in the index of a model with size and bytes bounded bulk requests.
+        Only the failed items are retried (with exponential backoff and jitter), if they keep failing the nodes of
+        the documents are deleted from the indexes of all the models
+
+        :param nodes_per_doc: list of nodes by document
+        :param embed_model: embed model
+        :param model_index_name: index of the model to write the nodes in
+        :param models: models of the indexation (to delete the nodes on failure)
+        :param index_name: index of the indexation
+        :return: Number of embedding passes (for the tokens report)
         """
         try:
-            if delta >= max_retries:
-                raise ConnectionError("Max num of retries reached. Nodes have been deleted.")
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
-            index = VectorStoreIndex(nodes=[], storage_context=storage_context,
-                                     transformations=[embed_model])
-            for nodes in nodes_per_doc:
-                index.insert_nodes(nodes, show_progress=True)
-            return delta + 1
-        except (BulkIndexError, ConnectionTimeout):
-            docs_filenames = set([node.metadata.get('filename') for nodes in nodes_per_doc for node in nodes])
-            self.logger.warning(f"BulkingIndexError/ConnectionTimeout detected while indexing{list(docs_filenames)}, retrying, try {delta + 1}/{max_retries}")
-            time.sleep(4)
-            return self._write_nodes(nodes_per_doc, embed_model, vector_store, models, index_name, delta=delta + 1)
-        except (TimeoutException, RateLimitError):
-            docs_filenames = set([node.metadata.get('filename') for nodes in nodes_per_doc for node in nodes])
-            self.logger.warning(f"Timeout/RateLimitError detected while indexing{list(docs_filenames)}, retrying, try {delta + 1}/{max_retries}")
-            time.sleep(40)
-            return self._write_nodes(nodes_per_doc, embed_model, vector_store, models, index_name, delta=delta + 1)
+            stats = self._get_bulk_writer(model_index_name).write(nodes_per_doc, embed_model)
         except Exception as e:
             docs_filenames = list(set([node.metadata.get('filename') for nodes in nodes_per_doc for node in nodes]))
+            self.logger.warning(f"Indexing in {model_index_name} failed due to: {type(e).__name__}; {e.args}")
             self._manage_indexing_exception(index_name, models, docs_filenames)
-            vector_store.close()
-
-            self.logger.warning(f"Nodes deleted due to: {type(e).__name__}; {e.args}")
             raise ConnectionError(f"Max num of retries reached while indexing {docs_filenames}")
-        
-    def _handle_document_override(self, docs: List, io: Parser):
-        """Handle document override functionality by deleting existing documents with matching metadata"""
-        try:
-            # Create filters based on metadata_primary_keys and document metadata
-            filters_to_delete = self._build_override_filters(docs, io.metadata_primary_keys)
-            
-            if not filters_to_delete:
-                self.logger.info("Override: No documents to override - no matching metadata found")
-                return
-            
-            # Delete existing documents for each model
-            for model in io.models:
-                index_name = INDEX_NAME(io.index, model.get('embedding_model'))
-                
-                if not self.connector.exist_index(index_name):
-                    self.logger.info(f"Override: Index {index_name} does not exist, skipping override deletion")
-                    continue
-                
-                for filters in filters_to_delete:
-                    try:
-                        result = self.connector.delete_documents(index_name, filters)
-                        
-                        self.logger.info(f"Override: Deletion attempted in {index_name} with filters {filters}")
-                        
-                    except Exception as e:
-                        self.logger.warning(f"Override: Error during deletion in {index_name} with filters {filters}: {str(e)}")
-                        
-        except Exception as e:
-            self.logger.error(f"Override: Error in document override process: {str(e)}", exc_info=get_exc_info())
 
-    def _build_override_filters(self, docs: List, metadata_primary_keys: List) -> List[dict]:
-        """Build filters for document deletion based on metadata_primary_keys"""
-        filters_list = []
-        
-        for doc in docs:
-            doc_filters = {}
-            
-            # Extract values for each metadata_primary_key from document metadata
-            for key in metadata_primary_keys:
-                if key in doc.metadata:
-                    doc_filters[key] = doc.metadata[key]
-                else:
-                    self.logger.warning(f"Override: Metadata key '{key}' not found in document metadata. Available keys: {list(doc.metadata.keys())}")
-            
-            # Only add filters if we found at least one matching metadata key
-            if doc_filters:
-                filters_list.append(doc_filters)
-                self.logger.debug(f"Override: Built filters for document: {doc_filters}")
-        
-        return filters_list
+        self._log_bulk_stats(model_index_name, stats)
+        return stats['tries']
+
+    def _get_bulk_writer(self, model_index_name: str) -> BulkNodeWriter:
+        return BulkNodeWriter(self.connector.connection, model_index_name,
+                              max_nodes=int(os.getenv('INDEXING_BULK_MAX_NODES', 500)),
+                              max_bytes=int(os.getenv('INDEXING_BULK_MAX_BYTES', 10485760)),
+                              max_retries=int(os.getenv('INDEXING_BULK_MAX_RETRIES', 5)),
+                              backoff=float(os.getenv('INDEXING_BULK_BACKOFF', 1)),
+                              max_backoff=float(os.getenv('INDEXING_BULK_MAX_BACKOFF', 30)),
+                              logger=self.logger)
 
+    def _log_bulk_stats(self, model_index_name: str, stats: dict):
+        self.logger.info(f"{stats['nodes']} nodes ({stats['bytes']} bytes) written in {model_index_name} with "
+                         f"{stats['batches']} bulk requests and {stats['retries']} retries in {stats['seconds']:.2f}s "
+                         f"({stats['nodes_per_second']:.1f} nodes/s, {stats['bytes_per_second']:.1f} bytes/s)")
 
 class LlamaIndexAzureAI(VectorDB):
 
@@ -370,17 +781,32 @@ class LlamaIndexAzureAI(VectorDB):
         Returns:
             List: A list of reports for each model, detailing the number of pages and tokens processed.
         """
-        list_report_to_api = []
+        cache_stats = self._get_embedding_cache_stats()
         n_tokens = sum(len(self.encoding.encode(doc.text)) for doc in docs)
         chunking_method = ManagerChunkingMethods.get_chunking_method({**io.chunking_method, "origin": self.origin,
                                                                       "workspace": self.workspace})
 
+        # Only the new or changed chunks are indexed, compared with the indexed ones of the documents
+        incremental = getattr(io, 'incremental', False) is True
+        if incremental:
+            existing_chunks = self._get_existing_chunks(docs, io)
+            self._reuse_document_ids(docs, existing_chunks, io.metadata_primary_keys)
+
         nodes_per_doc = chunking_method.get_chunks(docs, self.encoding, io)
+        nodes_by_model = {}
+
+        if incremental:
+            incremental_nodes = self._get_incremental_nodes(nodes_per_doc, existing_chunks)
+            nodes_by_model = {embedding_model: nodes['nodes_per_doc'] for embedding_model, nodes in incremental_nodes.items()}
+        # Handle override functionality before indexing
+        elif getattr(io, 'override', False) and getattr(io, 'metadata_primary_keys', None):
+            self._handle_document_override(docs, io)
 
         # Indexation with the embeddings generation
+        retries_by_model = {}
         for model in io.models:
             index_name = INDEX_NAME(io.index, model.get('embedding_model'))
-            embed_model = get_embed_model(model, self.aws_credentials, is_retrieval=False)
+            embed_model = self._get_embed_model(model)
             Settings.embed_model = embed_model
 
             # Initialize Azure Search vector store
@@ -400,21 +826,17 @@ class LlamaIndexAzureAI(VectorDB):
                 semantic_configuration_name="mySemanticConfig",
             )
     
-            retries = self._write_nodes(nodes_per_doc, embed_model, vector_store, io.models, io.index)
+            retries_by_model[model['embedding_model']] = self._write_nodes(nodes_by_model.get(model['embedding_model'], nodes_per_doc),
+                                                                           embed_model, vector_store, io.models, io.index)
 
             self.logger.info(f"Model {model.get('embedding_model')} has been indexed in {index_name}")
 
-            list_report_to_api.append({
-                f"{io.process_type}/{model['embedding_model']}/pages": {
-                    "num": io.specific.get('document', {}).get('n_pags', 1),
-                    "type": "PAGS"
-                },
-                f"{io.process_type}/{model['embedding_model']}/tokens": {
-                    "num": n_tokens * retries,  # embeddings calculation for each retry
-                    "type": "TOKENS"
-                }
-            })
-        return list_report_to_api
+        if incremental:
+            self._delete_vanished_chunks(incremental_nodes)
+
+        self._log_embedding_cache_stats(cache_stats)
+
+        return self._get_tokens_report(io, n_tokens, retries_by_model, incremental)
 
     def _write_nodes(self, nodes_per_doc: list, embed_model, vector_store, models, index_name, delta=0, max_retries=3):
         """Write documents in Azure AI Search
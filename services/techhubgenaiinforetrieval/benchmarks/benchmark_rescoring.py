@@ -0,0 +1,79 @@
+### This code is property of the GGAO ###
+"""Micro-benchmark of the rescoring functions: per-document loops vs the vectorized engine.
+
+Usage (from the service folder): python benchmarks/benchmark_rescoring.py [--sizes 100 1000 10000] [--repeat 5]
+"""
+
+
+# Native imports
+import os
+import sys
+import copy
+import time
+import random
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Custom imports
+from rescoring import rescore_documents, mean, length, position, normalize, reciprocal_rank_fusion
+
+
+RETRIEVERS = ["bm25--score", "text-embedding-ada-002--score", "cohere-english-v3--score"]
+MODEL_FORMATS = {"bm25--score": "sparse"}
+QUERY = "How many trophies has the team won in the last ten years?"
+
+PER_DOCUMENT_FUNCTIONS = {
+    "mean": lambda docs: mean(docs, MODEL_FORMATS, RETRIEVERS),
+    "length": lambda docs: length(docs, QUERY, MODEL_FORMATS, RETRIEVERS),
+    "loglength": lambda docs: length(docs, QUERY, MODEL_FORMATS, RETRIEVERS, log2=True),
+    "pos": lambda docs: position(docs, MODEL_FORMATS, RETRIEVERS),
+    "posnorm": lambda docs: position(docs, MODEL_FORMATS, RETRIEVERS, norm=True),
+    "norm": lambda docs: normalize(docs, QUERY, MODEL_FORMATS, RETRIEVERS),
+    "nll": lambda docs: normalize(docs, QUERY, MODEL_FORMATS, RETRIEVERS, loglength=True),
+    "rrf": lambda docs: reciprocal_rank_fusion(docs, MODEL_FORMATS, RETRIEVERS)
+}
+
+
+def get_docs(n_docs: int) -> dict:
+    rng = random.Random(n_docs)
+    return {f"doc_{i}": SimpleNamespace(metadata={r: round(rng.random(), 4) for r in RETRIEVERS}, score=0.0)
+            for i in range(n_docs)}
+
+
+def measure(function, docs: dict, repeat: int) -> tuple:
+    """Best time of 'repeat' runs (each over a fresh copy of the docs, not timed) and the final scores (in the
+    order of the docs)"""
+    best, scores = float("inf"), None
+    for _ in range(repeat):
+        docs_copy = copy.deepcopy(docs)
+        start = time.perf_counter()
+        result = function(docs_copy)
+        best = min(best, time.perf_counter() - start)
+        scores = [doc.score for doc in result]
+    return best, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'function':<10}{'chunks':>8}{'per-doc (ms)':>15}{'vectorized (ms)':>18}{'speedup':>10}  same ranking")
+    for n_docs in args.sizes:
+        docs = get_docs(n_docs)
+        for name, per_document in PER_DOCUMENT_FUNCTIONS.items():
+            loop_time, loop_scores = measure(per_document, docs, args.repeat)
+            vector_time, vector_scores = measure(
+                lambda d: rescore_documents(d, QUERY, name, MODEL_FORMATS, RETRIEVERS), docs, args.repeat)
+            # Same sort used by the strategies (stable, by score descending)
+            same = sorted(range(n_docs), key=lambda i: loop_scores[i], reverse=True) == \
+                sorted(range(n_docs), key=lambda i: vector_scores[i], reverse=True)
+            print(f"{name:<10}{n_docs:>8}{loop_time * 1000:>15.3f}{vector_time * 1000:>18.3f}"
+                  f"{loop_time / vector_time:>9.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+### This code is property of the GGAO ###
+"""Benchmark of the retrieval hot path: InfoRetrievalDeployment.process with every strategy of
+ManagerRetrievalStrategies over in-memory elasticsearch clients (connector and search client) and hash embedding
+models, so it runs offline. It reports p50/p95/p99 latency and requests per second by strategy and index size.
+
+Usage (from the service folder): python benchmarks/benchmark_retrieval.py [--sizes 1000 10000] [--queries 50]
+    [--strategies genai_retrieval ...] [--latency 0.0] [--output results.json]
+"""
+
+
+# Native imports
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import statistics
+import contextlib
+from unittest.mock import patch, MagicMock
+
+os.environ.setdefault('TESTING', "True")  # The api reporting is not done
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Installed imports
+from llama_index.core.schema import TextNode, IndexNode
+
+# Custom imports
+from common.utils import INDEX_NAME
+from common.ir.connectors import ElasticSearchConnector
+from main import InfoRetrievalDeployment
+from search_client import ElasticClient
+from retrieval_strategies import ManagerRetrievalStrategies
+from fake_elasticsearch import FakeAsyncElasticsearch, FakeElasticsearch, HashEmbedding, build_node_chunk, hash_embedding
+
+
+WORDS = ("revenue growth market share product quarter report customer energy water contract risk supplier price "
+         "brand europe america asia digital factory employee tax debt cash dividend strategy plan").split()
+# Embedding model: (alias of its pool, dimension)
+MODELS = {"hash-embedding-a": ("hash-a-pool", 64), "hash-embedding-b": ("hash-b-pool", 96)}
+CHUNKS_BY_DOCUMENT = 20
+
+
+def get_node_id(*parts) -> str:
+    return hashlib.md5("-".join(map(str, parts)).encode()).hexdigest()
+
+
+def build_simple_nodes(texts: list) -> list:
+    nodes = []
+    for i, text in enumerate(texts):
+        snippet_id = get_node_id("simple", i)
+        nodes.append(TextNode(text=text, id_=snippet_id, metadata={
+            "filename": f"doc_{i // CHUNKS_BY_DOCUMENT}.pdf", "snippet_number": i, "snippet_id": snippet_id}))
+    return nodes
+
+
+def build_surrounding_nodes(texts: list) -> list:
+    nodes = build_simple_nodes(texts)
+    for i, node in enumerate(nodes):
+        node.metadata["window"] = " ".join(texts[max(0, i - 1):i + 2])
+        node.metadata["original_text"] = node.text
+    return nodes
+
+
+def build_recursive_nodes(texts: list) -> list:
+    """ Base chunks with two sub-chunks each, all of them pointing to the base chunk as infoindexing does """
+    nodes = []
+    for i, text in enumerate(texts):
+        base_id = get_node_id("recursive", i)
+        metadata = {"filename": f"doc_{i // CHUNKS_BY_DOCUMENT}.pdf", "snippet_number": i, "snippet_id": base_id,
+                    "index_id": base_id}
+        words = text.split()
+        for child, sub_text in enumerate([" ".join(words[:len(words) // 2]), " ".join(words[len(words) // 2:])]):
+            sub_id = get_node_id("recursive", i, child)
+            nodes.append(IndexNode(text=sub_text, id_=sub_id, index_id=base_id,
+                                   metadata={**metadata, "snippet_number": float(f"{i}.{child + 1}"),
+                                             "snippet_id": sub_id}))
+        nodes.append(IndexNode(text=text, id_=base_id, index_id=base_id, metadata=metadata))
+    return nodes
+
+
+CHUNKING_METHODS = {"simple": build_simple_nodes, "surrounding_context_window": build_surrounding_nodes,
+                    "recursive": build_recursive_nodes}
+
+
+def build_indices(n_chunks: int) -> dict:
+    """ An index by chunking method and embedding model with n_chunks chunks, '<chunking_method>_<n_chunks>'
+    (the recursive ones have a base chunk and two sub-chunks for every text) """
+    rng = random.Random(n_chunks)
+    texts = [" ".join(rng.choices(WORDS, k=40)) for _ in range(n_chunks)]
+    indices = {}
+    for chunking_method, build_nodes in CHUNKING_METHODS.items():
+        nodes = build_nodes(texts if chunking_method != "recursive" else texts[:n_chunks // 3])
+        for model, (_, dim) in MODELS.items():
+            indices[INDEX_NAME(f"{chunking_method}_{n_chunks}", model)] = [
+                build_node_chunk(node, hash_embedding(f"{model} {node.text}", dim)) for node in nodes]
+    return indices
+
+
+class FakeConnectionPool(object):
+    """ Gives the same connector and search client (over the in-memory clients) to every request """
+
+    def __init__(self, indices: dict, latency: float):
+        self.connector = ElasticSearchConnector({"vector_storage_host": "localhost"})
+        self.connector.connection = FakeElasticsearch(indices, latency=latency, search_cost=0)
+        self.async_client = FakeAsyncElasticsearch(indices, latency=latency, search_cost=0)
+        with patch('search_client.AsyncElasticsearch', return_value=self.async_client):
+            self.search_client = ElasticClient(self.connector, "")
+
+    def get_connector(self, index: str, vector_storages: list):
+        return self.connector
+
+    def get_search_client(self, connector, index: str):
+        return self.search_client
+
+    def get_stats(self) -> dict:
+        return {}
+
+
+def get_deployment(indices: dict, latency: float) -> InfoRetrievalDeployment:
+    available_models = [{"embedding_model_name": pool.replace("-pool", ""), "embedding_model": model,
+                         "platform": "bedrock", "zone": "local"} for model, (pool, _) in MODELS.items()]
+    with patch('main.load_secrets', return_value=({}, [], {})), \
+            patch('common.storage_manager.ManagerStorage.get_file_storage') as mock_get_file_storage:
+        file_storage = MagicMock()
+        file_storage.get_available_pools.return_value = {pool: [pool.replace("-pool", "")] for pool, _ in MODELS.values()}
+        file_storage.get_available_embedding_models.return_value = available_models
+        file_storage.get_unique_embedding_models.return_value = list(MODELS)
+        file_storage.get_embedding_equivalences.return_value = {model: pool for model, (pool, _) in MODELS.items()}
+        mock_get_file_storage.return_value = file_storage
+        deployment = InfoRetrievalDeployment()
+    deployment.connection_pool = FakeConnectionPool(indices, latency)
+    return deployment
+
+
+def get_embed_model(model: dict, aws_credentials: dict, is_retrieval: bool) -> HashEmbedding:
+    return HashEmbedding(model_name=model['embedding_model'], dim=MODELS[model['embedding_model']][1])
+
+
+def percentile(latencies: list, p: int) -> float:
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1] if len(latencies) > 1 else latencies[0]
+
+
+def run_benchmark(deployment: InfoRetrievalDeployment, strategy: str, n_chunks: int, queries: list,
+                  top_k: int) -> dict:
+    """ Run the queries through the process of the deployment and measure them
+
+    :param deployment: Deployment with the fake connection pool
+    :param strategy: Retrieval strategy
+    :param n_chunks: Size of the index to query
+    :param queries: Queries to run (the first one is run twice, as warm up)
+    :param top_k: Passages to retrieve
+    :return: Latency percentiles in ms and requests per second
+    """
+    chunking_method = deployment.STRATEGY_CHUNKING_METHOD_EQUIVALENCE[strategy]
+    latencies = []
+    with open(os.devnull, "w") as devnull:
+        for i, query in enumerate(queries[:1] + queries):
+            json_input = {"indexation_conf": {"index": f"{chunking_method}_{n_chunks}", "query": query,
+                                              "top_k": top_k, "strategy": strategy, "filters": {}},
+                          "project_conf": {"x-tenant": "develop", "x-department": "main", "x-reporting": ""}}
+            start = time.perf_counter()
+            # The recursive retriever prints its steps (verbose)
+            with contextlib.redirect_stdout(devnull):
+                _, result, _ = deployment.process(json_input)
+            if i > 0:
+                latencies.append(time.perf_counter() - start)
+            if result['status_code'] != 200 or not result['docs']:
+                raise RuntimeError(f"Wrong result for strategy {strategy}: {result}")
+
+    return {"strategy": strategy, "chunks": n_chunks, "queries": len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000, "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000, "rps": len(latencies) / sum(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Chunks of the indices")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--strategies", nargs="+", default=ManagerRetrievalStrategies.get_possible_retrieval_strategies())
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of network round trip per request")
+    parser.add_argument("--output", help="Path of a json file to save the results (to compare runs)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    queries = [" ".join(rng.choices(WORDS, k=4)) for _ in range(args.queries)]
+    results = []
+    print(f"{'strategy':<30}{'chunks':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'req/s':>9}")
+    with patch('main.get_embed_model', get_embed_model):
+        for n_chunks in args.sizes:
+            deployment = get_deployment(build_indices(n_chunks), args.latency)
+            for strategy in args.strategies:
+                result = run_benchmark(deployment, strategy, n_chunks, queries, args.top_k)
+                results.append(result)
+                print(f"{strategy:<30}{n_chunks:>8}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                      f"{result['p99_ms']:>10.2f}{result['rps']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
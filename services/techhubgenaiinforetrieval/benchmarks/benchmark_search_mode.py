@@ -0,0 +1,97 @@
+### This code is property of the GGAO ###
+"""Benchmark of the 'search_mode' of the genai strategies: a search per retriever (first retrieval and scores
+completion) vs multi search requests, over an in-memory elasticsearch with a simulated network latency.
+
+Usage (from the service folder): python benchmarks/benchmark_search_mode.py [--chunks 2000] [--queries 50] [--latency 0.005]
+"""
+
+
+# Native imports
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Installed imports
+from elasticsearch.helpers.vectorstore import AsyncBM25Strategy
+from llama_index.core import MockEmbedding
+
+# Custom imports
+from elasticsearch_adaption import ElasticsearchStoreAdaption
+from retrieval_strategies import GenaiStrategy
+from fake_elasticsearch import FakeAsyncElasticsearch, build_chunk, hash_embedding
+
+
+WORDS = ("revenue growth market share product quarter report customer energy water contract risk supplier price "
+         "brand europe america asia digital factory employee tax debt cash dividend strategy plan").split()
+DIMENSIONS = {"model-a": 64, "model-b": 96}
+
+
+def get_client(n_chunks: int, latency: float) -> FakeAsyncElasticsearch:
+    rng = random.Random(0)
+    texts = [" ".join(rng.choices(WORDS, k=40)) for _ in range(n_chunks)]
+    indices = {}
+    for model, dim in DIMENSIONS.items():
+        indices[f"bench_{model}"] = [build_chunk(text, f"doc_{i // 20}.pdf", i, hash_embedding(f"{model} {text}", dim))
+                                     for i, text in enumerate(texts)]
+    return FakeAsyncElasticsearch(indices, latency=latency)
+
+
+def get_retrievers_arguments(client: FakeAsyncElasticsearch, query: str) -> list:
+    retrievers = [(ElasticsearchStoreAdaption(index_name="bench_model-a", es_client=client,
+                                              retrieval_strategy=AsyncBM25Strategy()),
+                   MockEmbedding(embed_dim=256), query, "bm25--score")]
+    for model, dim in DIMENSIONS.items():
+        # The query embedding is precalculated (as the deployment does), the embed model is not called
+        retrievers.append((ElasticsearchStoreAdaption(index_name=f"bench_{model}", es_client=client),
+                           MockEmbedding(embed_dim=dim), hash_embedding(f"{model} {query}", dim), f"{model}--score"))
+    return retrievers
+
+
+def run(client: FakeAsyncElasticsearch, queries: list, search_mode: str, top_k: int) -> tuple:
+    strategy = GenaiStrategy()
+    latencies, rankings = [], []
+    client.requests.clear()
+    for query in queries:
+        input_object = SimpleNamespace(query=query, filters={}, top_k=top_k, rescoring_function="mean",
+                                       execution_mode="sequential", search_mode=search_mode)
+        retrievers_arguments = get_retrievers_arguments(client, query)
+        start = time.perf_counter()
+        docs = strategy.do_retrieval_strategy(input_object, retrievers_arguments)
+        latencies.append(time.perf_counter() - start)
+        rankings.append([(doc.metadata["snippet_id"], round(doc.score, 9)) for doc in docs])
+    return latencies, rankings, sum(client.requests.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds of network round trip per request")
+    args = parser.parse_args()
+
+    client = get_client(args.chunks, args.latency)
+    rng = random.Random(1)
+    queries = [" ".join(rng.choices(WORDS, k=4)) for _ in range(args.queries)]
+
+    results = {}
+    print(f"{'search_mode':<15}{'requests/query':>16}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for search_mode in ["per_retriever", "msearch"]:
+        run(client, queries[:1], search_mode, args.top_k)  # Warm up
+        latencies, rankings, requests = run(client, queries, search_mode, args.top_k)
+        results[search_mode] = rankings
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"{search_mode:<15}{requests / len(queries):>16.1f}{statistics.median(latencies) * 1000:>10.2f}"
+              f"{p95 * 1000:>10.2f}")
+    print(f"Same documents and scores: {results['per_retriever'] == results['msearch']}")
+
+
+if __name__ == "__main__":
+    main()
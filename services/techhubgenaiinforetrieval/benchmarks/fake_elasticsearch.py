@@ -0,0 +1,209 @@
+### This code is property of the GGAO ###
+"""In-memory stand-ins of the elasticsearch clients and the embedding models for the offline benchmarks.
+
+The async client answers the bm25 (match) and knn searches done by ElasticsearchStoreAdaption, with the filters built
+by the retrieval strategies, and the sync client the calls of ElasticSearchConnector (index checks, mappings, stats and
+point in time scans). A fixed latency is added to every request to simulate the network round trip.
+"""
+
+
+# Native imports
+import re
+import time
+import math
+import asyncio
+import hashlib
+import itertools
+from collections import Counter
+
+# Installed imports
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+
+def hash_embedding(text: str, dim: int = 64) -> list:
+    """Deterministic bag of words embedding (every token hashed to a dimension), normalized"""
+    vector = [0.0] * dim
+    for token in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(token.encode()).digest()
+        vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] % 2 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class HashEmbedding(BaseEmbedding):
+    """Embedding model that computes 'hash_embedding' locally, in place of the remote embedding models"""
+    dim: int = 64
+
+    def _get_query_embedding(self, query: str) -> list:
+        return hash_embedding(query, self.dim)
+
+    async def _aget_query_embedding(self, query: str) -> list:
+        return hash_embedding(query, self.dim)
+
+    def _get_text_embedding(self, text: str) -> list:
+        return hash_embedding(text, self.dim)
+
+
+def build_node_chunk(node: TextNode, embedding: list = None) -> dict:
+    """Build a chunk from a llama-index node (TextNode or IndexNode) with the same fields infoindexing stores"""
+    source = {"content": node.text, "metadata": node_to_metadata_dict(node, remove_text=True)}
+    if embedding is not None:
+        source["embedding"] = embedding
+    return {"_id": node.node_id, "_source": source}
+
+
+def build_chunk(text: str, filename: str, snippet_number: int, embedding: list = None) -> dict:
+    """Build a chunk with the same fields infoindexing stores (llama-index metadata included)"""
+    snippet_id = hashlib.md5(f"{filename}-{snippet_number}".encode()).hexdigest()
+    node = TextNode(text=text, id_=snippet_id, metadata={"filename": filename, "snippet_number": snippet_number,
+                                                         "snippet_id": snippet_id})
+    return build_node_chunk(node, embedding)
+
+
+class FakeAsyncElasticsearch(object):
+
+    def __init__(self, indices: dict, latency: float = 0.005, search_cost: float = 0.0005):
+        """
+        :param indices: Chunks (built with 'build_chunk') by index name
+        :param latency: Seconds added to every request (network round trip)
+        :param search_cost: Seconds added for every search done in a request
+        """
+        self.chunks = indices
+        self.latency = latency
+        self.search_cost = search_cost
+        self.requests = Counter()
+        self.doc_freqs = {index: Counter(token for chunk in chunks for token in set(self.tokenize(chunk["_source"]["content"])))
+                          for index, chunks in indices.items()}
+
+    @staticmethod
+    def tokenize(text: str) -> list:
+        return re.findall(r"\w+", text.lower())
+
+    def options(self, **kwargs):
+        return self
+
+    async def close(self):
+        pass
+
+    def matches(self, clause: dict, metadata: dict) -> bool:
+        """Evaluate the bool/term filters built by ElasticsearchStoreAdaption over the metadata of a chunk"""
+        if "bool" in clause:
+            # The connector sends single clauses as dicts instead of lists
+            must, should = [[c] if isinstance(c, dict) else c for c in (clause["bool"].get("must", []),
+                                                                         clause["bool"].get("should", []))]
+            return all(self.matches(c, metadata) for c in must) and (not should or any(self.matches(c, metadata) for c in should))
+        if "term" in clause:
+            field, value = next(iter(clause["term"].items()))
+            key = field.removeprefix("metadata.").removesuffix(".keyword")
+            value = value.get("value") if isinstance(value, dict) else value
+            return str(metadata.get(key)) == str(value)
+        return True
+
+    def bm25(self, index: str, query: str, content: str) -> float:
+        n_docs = len(self.chunks[index])
+        tokens = Counter(self.tokenize(content))
+        score = 0.0
+        for token in set(self.tokenize(query)):
+            if tokens[token]:
+                idf = math.log(1 + (n_docs - self.doc_freqs[index][token] + 0.5) / (self.doc_freqs[index][token] + 0.5))
+                score += idf * tokens[token] * 2.2 / (tokens[token] + 1.2)
+        return score
+
+    def run_search(self, index: str, body: dict) -> dict:
+        if "knn" in body:
+            filters, query_vector = body["knn"].get("filter", []), body["knn"]["query_vector"]
+            size = body.get("size", body["knn"]["k"])
+        else:
+            bool_query = body["query"]["bool"]
+            filters, query_vector = bool_query.get("filter", []), None
+            query = next(iter(bool_query["must"][0]["match"].values()))["query"]
+            size = body.get("size", 10)
+
+        hits = []
+        for chunk in self.chunks[index]:
+            metadata = chunk["_source"]["metadata"]
+            if not all(self.matches(f, metadata) for f in filters):
+                continue
+            if query_vector is not None:
+                cosine = sum(a * b for a, b in zip(query_vector, chunk["_source"]["embedding"]))
+                score = (1 + cosine) / 2
+            else:
+                score = self.bm25(index, query, chunk["_source"]["content"])
+                if score <= 0:
+                    continue
+            source = {"metadata": metadata, "content": chunk["_source"]["content"]}
+            hits.append({"_index": index, "_id": chunk["_id"], "_score": score, "_source": source})
+        hits.sort(key=lambda hit: hit["_score"], reverse=True)
+        return {"hits": {"hits": hits[:size]}, "status": 200}
+
+    async def search(self, index: str, size: int = 10, source=True, source_includes=None, **body):
+        self.requests["search"] += 1
+        await asyncio.sleep(self.latency + self.search_cost)
+        return self.run_search(index, {**body, "size": size})
+
+    async def msearch(self, searches: list, **kwargs):
+        self.requests["msearch"] += 1
+        # Conservative: the searches of the request are not run in parallel
+        await asyncio.sleep(self.latency + self.search_cost * (len(searches) // 2))
+        return {"responses": [self.run_search(header["index"], body) for header, body in zip(searches[::2], searches[1::2])]}
+
+
+class FakeIndicesClient(object):
+
+    def __init__(self, client: "FakeElasticsearch"):
+        self.client = client
+
+    def exists(self, index: str) -> bool:
+        return index in self.client.chunks
+
+    def get_mapping(self, index: str) -> dict:
+        keys = {key for chunk in self.client.chunks[index] for key in chunk["_source"]["metadata"]}
+        return {index: {"mappings": {"properties": {"metadata": {"properties": {key: {} for key in keys}}}}}}
+
+    def stats(self, index: str, metric: str = None) -> dict:
+        n_docs = len(self.client.chunks[index])
+        return {"indices": {index: {"uuid": index, "primaries": {"docs": {"count": n_docs},
+                                                                 "indexing": {"index_total": n_docs, "delete_total": 0},
+                                                                 "refresh": {"total": 1}}}}}
+
+
+class FakeElasticsearch(FakeAsyncElasticsearch):
+    """Sync client used by ElasticSearchConnector, over the same chunks than the async one"""
+
+    def __init__(self, indices: dict, latency: float = 0.005, search_cost: float = 0.0005):
+        super().__init__(indices, latency, search_cost)
+        self.indices = FakeIndicesClient(self)
+        self.pits = {}
+        self.pit_ids = itertools.count()
+
+    def ping(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def open_point_in_time(self, index: str, keep_alive: str = None) -> dict:
+        self.requests["open_point_in_time"] += 1
+        time.sleep(self.latency)
+        pit_id = f"pit_{next(self.pit_ids)}"
+        self.pits[pit_id] = index
+        return {"id": pit_id}
+
+    def close_point_in_time(self, id: str):
+        self.pits.pop(id, None)
+
+    def search(self, index: str = None, query: dict = None, size: int = 10, from_: int = 0, pit: dict = None,
+               search_after: list = None, **kwargs) -> dict:
+        self.requests["search"] += 1
+        time.sleep(self.latency + self.search_cost)
+        index = self.pits[pit["id"]] if pit else index
+        filters = [query["bool"]["filter"]] if "filter" in query.get("bool", {}) else []
+        chunks = [chunk for chunk in self.chunks[index]
+                  if all(self.matches(f, chunk["_source"]["metadata"]) for f in filters)]
+        # The position of the chunk is the sort value of the point in time scans
+        start = search_after[0] + 1 if search_after else from_
+        hits = [{**chunk, "_index": index, "sort": [position]}
+                for position, chunk in enumerate(chunks[start:start + size], start)]
+        return {"hits": {"hits": hits}, **({"pit_id": pit["id"]} if pit else {})}
@@ -0,0 +1,148 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import os
+import time
+import threading
+
+# Custom imports
+from common.cache_utils import TTLCache
+from common.ir.connectors import Connector, ManagerConnector
+from common.ir.utils import get_indexed_connector_name, get_default_connector_name, get_vector_storage
+from common.logging_handler import LoggerHandler
+from common.services import GENAI_INFO_RETRIEVAL_SERVICE
+from search_client import ManagerSearchClient, SearchClient
+
+
+class ConnectionPool(object):
+    """ Process-wide pool of vector storage connectors and search clients.
+
+    Connectors (sync clients, thread-safe) are shared by all the threads and keyed by vector storage name, the
+    vector storage of each indexed index is cached (the indices not indexed yet are routed to the default vector
+    storage without caching it). Search clients hold an async client bound to the event loop of the thread that
+    created it, so they are kept per thread and rebuilt when their connector changes. Connectors are rebuilt when
+    they stop answering after being idle; the health check and the connection are made outside the lock of the pool
+    so a slow vector storage does not block the requests to the rest.
+    """
+
+    def __init__(self, workspace, ping_interval: float = 60, index_ttl: float = 300):
+        """ Creates the pool
+
+        :param workspace: Workspace where the index storage files are
+        :param ping_interval: Seconds a connector can be idle before checking it is alive again
+        :param index_ttl: Seconds the vector storage name of an index is cached
+        """
+        self.workspace = workspace
+        self.ping_interval = ping_interval
+        self.index_storages = TTLCache(maxsize=1024, ttl=index_ttl)
+        self.connectors = {}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self.stats = {"connectors_created": 0, "connectors_reused": 0, "connectors_refreshed": 0,
+                      "clients_created": 0, "clients_reused": 0, "clients_refreshed": 0}
+
+        logger_handler = LoggerHandler(GENAI_INFO_RETRIEVAL_SERVICE, level=os.environ.get('LOG_LEVEL', "INFO"))
+        self.logger = logger_handler.logger
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_connector_name(self, index: str) -> str:
+        """ Get the vector storage name of an index, reading the index storage file only when it is not cached
+
+        :param index: Index to get the vector storage from
+        """
+        connector_name = self.index_storages.get(index)
+        if connector_name is None:
+            connector_name = get_indexed_connector_name(index, self.workspace)
+            if not connector_name:
+                # Not indexed yet, it is read again in the next call so the index is found once infoindexing creates it
+                return get_default_connector_name()
+            self.index_storages.set(index, connector_name)
+        return connector_name
+
+    def get_connector(self, index: str, vector_storages: list) -> Connector:
+        """ Get a connected connector for the vector storage of the index, reusing the pooled one if possible
+
+        :param index: Index to get the connector for
+        :param vector_storages: Vector storages configurations
+        :return: Connected connector (must not be closed by the caller)
+        """
+        connector_name = self.get_connector_name(index)
+        vector_storage = get_vector_storage(connector_name, vector_storages)
+
+        with self._lock:
+            entry = self.connectors.get(connector_name)
+        if entry:
+            if time.monotonic() - entry['last_used'] < self.ping_interval or entry['connector'].ping():
+                with self._lock:
+                    entry['last_used'] = time.monotonic()
+                    self.stats["connectors_reused"] += 1
+                return entry['connector']
+            self.logger.warning(f"Pooled connector '{connector_name}' is not alive, reconnecting")
+
+        connector = ManagerConnector().get_connector(vector_storage)
+        connector.connect()
+        with self._lock:
+            current = self.connectors.get(connector_name)
+            if current is not entry:
+                # Another thread replaced the connector meanwhile, the new one is discarded
+                self.stats["connectors_reused"] += 1
+                current['last_used'] = time.monotonic()
+                connector.close()
+                return current['connector']
+            if entry:
+                # The old connector is not closed here as other threads could be using it, the garbage
+                # collector releases its connections when the last request finishes
+                self.stats["connectors_refreshed"] += 1
+            self.connectors[connector_name] = {'connector': connector, 'last_used': time.monotonic()}
+            self.stats["connectors_created"] += 1
+        self.logger.debug(f"Connector '{connector_name}' added to the pool")
+        return connector
+
+    def get_search_client(self, connector: Connector, index: str) -> SearchClient:
+        """ Get the search client of the current thread for the connector
+
+        :param connector: Connector (from this pool) of the vector storage
+        :param index: Index to search in
+        :return: Search client (must not be closed by the caller)
+        """
+        key = self.get_connector_name(index)
+        if not hasattr(self._local, 'clients'):
+            self._local.clients = {}
+
+        entry = self._local.clients.get(key)
+        if entry and entry['connector'] is connector:
+            self._count("clients_reused")
+            return entry['client']
+        if entry:
+            self._count("clients_refreshed")
+            # The connector was refreshed, the old client is closed in its own thread (event loop)
+            entry['client'].close()
+
+        client = ManagerSearchClient().get_client(connector, index)
+        self._local.clients[key] = {'client': client, 'connector': connector}
+        self._count("clients_created")
+        return client
+
+    def invalidate_index(self, index: str) -> bool:
+        """ Forget the vector storage of an index (when it is deleted, created again or moved)
+
+        :param index: Index to forget
+        :return: True if the vector storage of the index was cached
+        """
+        return self.index_storages.invalidate(index)
+
+    def get_stats(self) -> dict:
+        """ Get the pool counters
+
+        :return: Dictionary with the pooled connectors and the counters
+        """
+        with self._lock:
+            return {
+                **self.stats,
+                "connectors": list(self.connectors.keys()),
+                "index_storages": self.index_storages.get_stats()
+            }
@@ -493,6 +493,44 @@ class ElasticsearchStoreAdaption(BasePydanticVectorStore):
             custom_query=custom_query,
         )
 
+        return self.parse_hits(hits)
+
+    def get_search_request(self, query: VectorStoreQuery) -> tuple:
+        """
+        Get the header and the body of the search done by 'aquery', so it can be sent
+        along with other searches in a single multi search (_msearch) request.
+
+        Args:
+            query (VectorStoreQuery): query to search.
+
+        Returns:
+            tuple: Header (index) and body of the search.
+        """
+        _mode_must_match_retrieval_strategy(query.mode, self.retrieval_strategy)
+        query_filters = [_to_elasticsearch_filter(query.filters)] if query.filters is not None else []
+
+        body = self.retrieval_strategy.es_query(
+            query=query.query_str,
+            query_vector=query.query_embedding,
+            text_field=self.text_field,
+            vector_field=self.vector_field,
+            k=query.similarity_top_k,
+            num_candidates=query.similarity_top_k * 10,
+            filter=query_filters,
+        )
+        body.update({"size": query.similarity_top_k, "_source": {"includes": ["metadata", self.text_field]}})
+        return {"index": self.index_name}, body
+
+    def parse_hits(self, hits: List[Dict[str, Any]]) -> VectorStoreQueryResult:
+        """
+        Parse the hits of a search to llama-index nodes with their similarities.
+
+        Args:
+            hits (List[Dict[str, Any]]): hits of the search response.
+
+        Returns:
+            VectorStoreQueryResult: Result of the query.
+        """
         top_k_nodes = []
         top_k_ids = []
         top_k_scores = []
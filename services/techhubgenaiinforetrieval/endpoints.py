@@ -3,7 +3,6 @@
 
 from flask import request
 from typing import Tuple, Dict
-from common.ir.utils import get_connector
 from common.utils import INDEX_NAME
 from common.genai_json_parser import get_exc_info
 import elasticsearch.exceptions 
@@ -19,7 +18,7 @@ def get_documents_filenames_handler(deploy, request) -> Tuple[Dict, int]:
     if not index:
         return {'status': "error", 'error_message': "Missing parameter: index", 'status_code': 400}, 400
 
-    connector = get_connector(index, deploy.workspace, deploy.vector_storages)
+    connector = deploy.get_connector(index)
 
     for model in deploy.all_models:
         index_name = INDEX_NAME(index, model)
@@ -27,16 +26,13 @@ def get_documents_filenames_handler(deploy, request) -> Tuple[Dict, int]:
             continue
         try:
             status, result, status_code = connector.get_documents_filenames(index_name)
-            connector.close()
             return {'status': status, 'result': {"status_code": status_code, "docs": result, "status": status}}, status_code
         except elasticsearch.NotFoundError:
             deploy.logger.debug(f"Index '{index_name}' not found")
         except Exception as ex:
             deploy.logger.error(f"Error processing operation: {str(ex)}", exc_info=get_exc_info())
-            connector.close()
             return {'status': "error", 'error_message': f"Error processing operation: {str(ex)}", 'status_code': 400}, 400
 
-    connector.close()
     return {'status': "error", 'error_message': f"Index '{index}' not found", 'status_code': 400}, 400
 
 
@@ -51,12 +47,11 @@ def retrieve_documents_handler(deploy, request) -> Tuple[Dict, int]:
     if not filters:
         return {'status': "error", 'error_message': "There must be at least one filter", 'status_code': 400}, 400
 
-    connector = get_connector(index, deploy.workspace, deploy.vector_storages)
+    connector = deploy.get_connector(index)
     for model in deploy.all_models:
         index_name = INDEX_NAME(index, model)
         try:
             status, result, status_code = connector.get_documents(index_name, filters)
-            connector.close()
             return {
                 'status': status,
                 'result': {"status_code": status_code, "docs": result, "status": status},
@@ -65,10 +60,8 @@ def retrieve_documents_handler(deploy, request) -> Tuple[Dict, int]:
             deploy.logger.debug(f"Index '{index_name}' not found")
         except Exception as ex:
             deploy.logger.error(f"Error processing operation: {str(ex)}", exc_info=get_exc_info())
-            connector.close()
             return {'status': "error", 'error_message': f"Error processing operation: {str(ex)}", 'status_code': 400}, 400
 
-    connector.close()
     return {'status': "error", 'error_message': f"Index '{index}' not found", 'status_code': 400}, 400
 
 
@@ -101,7 +94,7 @@ def delete_documents_handler(deploy, request) -> Tuple[Dict, int]:
     index = dat.pop('index', [""])[0]
     filters = dat  # All additional parameters are considered as filters
 
-    connector = get_connector(index, deploy.workspace, deploy.vector_storages)
+    connector = deploy.get_connector(index)
     deleted_count = 0
 
     for model in deploy.all_models:
@@ -124,11 +117,11 @@ def delete_documents_handler(deploy, request) -> Tuple[Dict, int]:
             deploy.logger.debug(f"Index '{index_name}' not found")
         except Exception as ex:
             deploy.logger.error(f"Error processing delete operation: {str(ex)}", exc_info=get_exc_info())
-            connector.close()
+            deploy.invalidate_index_metadata(index)
             return {'status': "error", 'error_message': f"Error processing delete operation: {str(ex)}", 'status_code': 400}, 400
 
-    connector.close()
-
+    # Invalidated after the deletion, so a query made during it is not cached for the new generation
+    deploy.invalidate_index_metadata(index)
     if deleted_count > 0:
         return {'status': "finished", 'result': f"Documents that matched the filters were deleted for '{index}'", 'status_code': 200}, 200
     return {'status': "error", 'error_message': f"Documents not found for filters: {filters}", 'status_code': 400}, 400
@@ -141,7 +134,7 @@ def delete_index_handler(deploy, request) -> Tuple[Dict, int]:
     deploy.logger.info(f"Request received with data: {dat}")
 
     index = dat.get('index', "")
-    connector = get_connector(index, deploy.workspace, deploy.vector_storages)
+    connector = deploy.get_connector(index)
     deleted_count = 0
 
     for model in deploy.all_models:
@@ -155,11 +148,13 @@ def delete_index_handler(deploy, request) -> Tuple[Dict, int]:
             deploy.logger.debug(f"Index '{index_name}' not found")
         except Exception as ex:
             deploy.logger.error(f"Error processing delete index operation: {str(ex)}", exc_info=get_exc_info())
-            connector.close()
+            deploy.invalidate_index_metadata(index)
+            deploy.connection_pool.invalidate_index(index)
             return {'status': "error", 'error_message': f"Error processing delete index operation: {str(ex)}", 'status_code': 400}, 400
 
-    connector.close()
-
+    deploy.invalidate_index_metadata(index)
+    # The index can be created again in other vector storage
+    deploy.connection_pool.invalidate_index(index)
     if deleted_count == 0:
         deploy.logger.info(f"Index '{index}' not found for any model")
         return {'status': "error", 'error_message': f"Index '{index}' not found", 'status_code': 400}, 400
@@ -170,30 +165,44 @@ def list_indices_handler(deploy) -> Tuple[Dict, int]:
     '''Handles the request to list all indices in the Elasticsearch database.'''
     deploy.logger.info("List indices request received")
     
-    connector = get_connector('', deploy.workspace, deploy.vector_storages)
-    try:
-        indices = connector.list_indices()  
-        
-        processed_indices = []
-        for index in indices:
-            parts = index.rsplit("_", 1)
-            index_name = parts[0]
-            model_name = parts[1] if len(parts) > 1 else "unknown"
-
-            existing_index = next((i for i in processed_indices if i["name"] == index_name), None)
-            if existing_index:
-                existing_index["models"].append(model_name)
-            else:
-                processed_indices.append({
-                    "name": index_name,
-                    "models": [model_name]
-                })
+    connector = deploy.connection_pool.get_connector('', deploy.vector_storages)
+    indices = deploy.list_indices(connector)
+    
+    processed_indices = []
+    for index in indices:
+        parts = index.rsplit("_", 1)
+        index_name = parts[0]
+        model_name = parts[1] if len(parts) > 1 else "unknown"
+
+        existing_index = next((i for i in processed_indices if i["name"] == index_name), None)
+        if existing_index:
+            existing_index["models"].append(model_name)
+        else:
+            processed_indices.append({
+                "name": index_name,
+                "models": [model_name]
+            })
+
+    return {
+        "status": "ok",
+        "indices": processed_indices,
+        "status_code": 200
+    }, 200
 
-        return {
-            "status": "ok",
-            "indices": processed_indices,
-            "status_code": 200
-        }, 200
 
-    finally:
-        connector.close()
+def get_cache_stats_handler(deploy) -> Tuple[Dict, int]:
+    '''Handles the request to get the usage counters of the in-process caches.'''
+    deploy.logger.info("Get cache stats request received")
+
+    return {
+        "status": "ok",
+        "result": {
+            "query_embeddings": deploy.query_embeddings_cache.get_stats(),
+            "index_metadata": deploy.index_metadata_cache.get_stats(),
+            "index_list": deploy.index_list_cache.get_stats(),
+            "recursive_structures": deploy.recursive_structures_cache.get_stats(),
+            "retrieval_results": deploy.retrieval_cache.get_stats(),
+            "connection_pool": deploy.connection_pool.get_stats()
+        },
+        "status_code": 200
+    }, 200
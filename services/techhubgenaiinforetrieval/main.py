@@ -1,6 +1,7 @@
 ### This code is property of the GGAO ###
 
 # Native imports
+import os
 
 # Installed imports
 import tiktoken
@@ -15,15 +16,18 @@ from common.genai_controllers import storage_containers, set_storage
 from common.genai_json_parser import *
 from retrieval_strategies import ManagerRetrievalStrategies
 from common.services import GENAI_INFO_RETRIEVAL_SERVICE
-from common.ir.utils import get_connector, get_embed_model 
+from common.ir.utils import get_embed_model
 from common.utils import load_secrets, INDEX_NAME
+from common.cache_utils import TTLCache
 from common.storage_manager import ManagerStorage
 from common.ir.parsers import ManagerParser, ParserInforetrieval
 from common.ir.connectors import Connector
+from common.ir.result_cache import RetrievalResultCache, get_redis_origin
 from common.errors.genaierrors import PrintableGenaiError
 
-from endpoints import get_documents_filenames_handler, retrieve_documents_handler, get_models_handler, delete_documents_handler, delete_index_handler, list_indices_handler
-from search_client import ManagerSearchClient
+from endpoints import (get_documents_filenames_handler, retrieve_documents_handler, get_models_handler,
+                       delete_documents_handler, delete_index_handler, list_indices_handler, get_cache_stats_handler)
+from connection_pool import ConnectionPool
 
 
 class InfoRetrievalDeployment(BaseDeployment):
@@ -32,6 +36,8 @@ class InfoRetrievalDeployment(BaseDeployment):
         "bm25--score": None
     }
 
+    LIST_INDICES_KEY = ("list_indices",)
+
     STRATEGY_CHUNKING_METHOD_EQUIVALENCE = {
         "genai_retrieval": "simple",
         "recursive_genai_retrieval": "recursive",
@@ -44,6 +50,25 @@ class InfoRetrievalDeployment(BaseDeployment):
         super().__init__()
         set_storage(storage_containers)
 
+        # Query embeddings by (embedding_model, normalized query), repeated questions skip the remote embedding call
+        self.query_embeddings_cache = TTLCache(maxsize=int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 1024)),
+                                               ttl=float(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 3600)))
+        # Existence of the '<index>_<model>' indices to avoid a round trip per model and request (only the existing
+        # ones, the indices are created by infoindexing) and the indices list, kept less time as it can't be validated
+        self.index_metadata_cache = TTLCache(maxsize=int(os.getenv('INDEX_METADATA_CACHE_SIZE', 4096)),
+                                             ttl=float(os.getenv('INDEX_METADATA_CACHE_TTL', 60)))
+        self.index_list_cache = TTLCache(maxsize=1, ttl=float(os.getenv('INDEX_LIST_CACHE_TTL', 10)))
+        # Nodes and retrievers of the recursive strategy by (index, retriever, filters), bounded by memory and
+        # validated against the version of the index so they are rebuilt after any indexation or deletion
+        self.recursive_structures_cache = TTLCache(maxsize=int(os.getenv('RECURSIVE_CACHE_SIZE', 64)),
+                                                   max_weight=int(os.getenv('RECURSIVE_CACHE_MAX_MB', 512)) * 1024 * 1024)
+        # Documents returned by a request (opt-in), by index generation and request hash. The generations are
+        # shared in redis with infoindexing when REDIS_DB_RETRIEVAL_CACHE is set
+        self.retrieval_cache = RetrievalResultCache(backend=os.getenv('RETRIEVAL_CACHE_BACKEND', ""),
+                                                    maxsize=int(os.getenv('RETRIEVAL_CACHE_SIZE', 1024)),
+                                                    ttl=float(os.getenv('RETRIEVAL_CACHE_TTL', 300)),
+                                                    redis_origin=get_redis_origin())
+
         try:
             self.origin = storage_containers.get('origin')
             self.workspace = storage_containers.get('workspace')
@@ -57,6 +82,11 @@ class InfoRetrievalDeployment(BaseDeployment):
             self.all_models = file_loader.get_unique_embedding_models()
             self.default_embedding_equivalences = file_loader.get_embedding_equivalences()
             self.models_credentials, self.vector_storages, self.aws_credentials = load_secrets()
+
+            # Connectors and search clients are reused between requests instead of opening new connections
+            self.connection_pool = ConnectionPool(self.workspace,
+                                                  ping_interval=float(os.getenv('CONNECTION_POOL_PING_INTERVAL', 60)),
+                                                  index_ttl=float(os.getenv('CONNECTION_POOL_INDEX_TTL', 300)))
             self.logger.info("---- Inforetrieval initialized")
         except Exception as ex:
             self.logger.error(f"Error loading files: {str(ex)}", exc_info=get_exc_info())
@@ -74,15 +104,76 @@ class InfoRetrievalDeployment(BaseDeployment):
     def max_num_queue(self) -> int:
         return 1
 
-    @staticmethod
-    def assert_correct_models(index: str, models: List, connector: Connector):
+    def exist_index(self, connector: Connector, index_name: str) -> bool:
+        """ Checks if an index exists, using the index metadata cache
+
+        :param connector: Connector to the vector storage
+        :param index_name: Name of the index ('<index>_<model>')
+
+        return: True if the index exists
+        """
+        if self.index_metadata_cache.get(index_name):
+            return True
+        # A missing index is not cached, it can be created by infoindexing at any moment
+        exists = bool(connector.exist_index(index_name))
+        if exists:
+            self.index_metadata_cache.set(index_name, True)
+            indices = self.index_list_cache.get(self.LIST_INDICES_KEY)
+            if indices is not None and index_name not in indices:
+                self.index_list_cache.invalidate(self.LIST_INDICES_KEY)
+        return exists
+
+    def get_connector(self, index: str) -> Connector:
+        """ Gets the pooled connector of the vector storage of an index. When none of the '<index>_<model>' indices
+        is in the cached vector storage, its index storage file is read again (the index could have been deleted
+        and created again by infoindexing in other vector storage)
+
+        :param index: Index to get the connector for
+
+        return: Connector (must not be closed)
+        """
+        connector = self.connection_pool.get_connector(index, self.vector_storages)
+        if not any(self.exist_index(connector, INDEX_NAME(index, model)) for model in self.all_models) \
+                and self.connection_pool.invalidate_index(index):
+            self.logger.debug(f"Index '{index}' not found in its cached vector storage, reading it again")
+            connector = self.connection_pool.get_connector(index, self.vector_storages)
+        return connector
+
+    def list_indices(self, connector: Connector) -> list:
+        """ Lists the indices of the vector storage, using the index metadata cache
+
+        :param connector: Connector to the vector storage
+
+        return: List of indices names
+        """
+        indices = self.index_list_cache.get(self.LIST_INDICES_KEY)
+        if indices is None:
+            indices = connector.list_indices()
+            self.index_list_cache.set(self.LIST_INDICES_KEY, indices)
+            for index_name in indices:
+                self.index_metadata_cache.set(index_name, True)
+        return indices
+
+    def invalidate_index_metadata(self, index: str):
+        """ Removes the cached metadata of an index (all the models) when it is modified
+
+        :param index: Index modified
+        """
+        for model in self.all_models:
+            self.index_metadata_cache.invalidate(INDEX_NAME(index, model))
+        self.index_list_cache.invalidate(self.LIST_INDICES_KEY)
+        index_names = {INDEX_NAME(index, model) for model in self.all_models}
+        self.recursive_structures_cache.invalidate_where(lambda key: key[0] in index_names)
+        self.retrieval_cache.bump_generation(index)
+
+    def assert_correct_models(self, index: str, models: List, connector: Connector):
         """ Asserts that the models are correct
 
         param: models: models to check
         """
         for model in models:
             embedding_model = model.get('embedding_model')
-            if not connector.exist_index(INDEX_NAME(index, embedding_model)) and embedding_model != "bm25":
+            if embedding_model != "bm25" and not self.exist_index(connector, INDEX_NAME(index, embedding_model)):
                 raise PrintableGenaiError(400, f"Model '{model.get('alias')}' does not exist for the index '{index}'")
 
     def get_bm25_vector_store(self, index: str, connector: Connector, es_client):
@@ -94,7 +185,7 @@ class InfoRetrievalDeployment(BaseDeployment):
         """
         for model in self.all_models:
             index_name = INDEX_NAME(index, model)
-            if connector.exist_index(index_name):
+            if self.exist_index(connector, index_name):
                 # Add bm25 retriever (with one index that matches is enough, all indexes in elastic can do this retrieval)
                 vector_store = es_client.create_store(index_name)
                 
@@ -102,6 +193,32 @@ class InfoRetrievalDeployment(BaseDeployment):
 
         raise PrintableGenaiError(400, "There is no index that matches the passed value")
 
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """ Normalize the query to be used as cache key (whitespaces collapsed)
+
+        :param query: Query to normalize
+        """
+        return " ".join(query.split())
+
+    def get_query_embedding(self, model: dict, embed_model, query: str) -> list:
+        """ Get the query embedding from the cache or calculate it with the embed model
+
+        :param model: Model data (the embedding_model identifies the vector space)
+        :param embed_model: Llamaindex embed model to calculate the embedding
+        :param query: Query to embed
+
+        return: Embedding of the query
+        """
+        key = (model.get('embedding_model'), self.normalize_query(query))
+        embed_query = self.query_embeddings_cache.get(key)
+        if embed_query is None:
+            embed_query = embed_model.get_query_embedding(query)
+            self.query_embeddings_cache.set(key, embed_query)
+        else:
+            self.logger.debug(f"Query embedding for '{key[0]}' got from cache")
+        return embed_query
+
     def get_retrievers_arguments(self, models: list, index: str, es_client,
                                  connector: Connector, query:str) -> list:
         """ Gets the retrievers that exists
@@ -122,7 +239,7 @@ class InfoRetrievalDeployment(BaseDeployment):
                 index_name = INDEX_NAME(index, model.get('embedding_model'))
                 vector_store = es_client.create_store(index_name)
                 embed_model = get_embed_model(model, self.aws_credentials, is_retrieval=True)
-                embed_query = embed_model.get_query_embedding(query)
+                embed_query = self.get_query_embedding(model, embed_model, query)
             
             retrievers.append((vector_store, embed_model, embed_query, f"{model.get('embedding_model')}--score"))
         return retrievers
@@ -136,7 +253,7 @@ class InfoRetrievalDeployment(BaseDeployment):
         """
         indexed_models = es_client.indexed_models_init()
         for model in self.all_models:
-            if connector.exist_index(INDEX_NAME(input_object.index, model)):
+            if self.exist_index(connector, INDEX_NAME(input_object.index, model)):
                 indexed_models.append(self.default_embedding_equivalences[model])
     
         # Get the model credentials
@@ -173,8 +290,8 @@ class InfoRetrievalDeployment(BaseDeployment):
                                                               "available_models": self.available_models,
                                                               "available_pools": self.available_pools,
                                                               "models_credentials": self.models_credentials})
-            connector = get_connector(input_object.index, self.workspace, self.vector_storages)
-            es_client = ManagerSearchClient().get_client(connector, input_object.index)
+            connector = self.get_connector(input_object.index)
+            es_client = self.connection_pool.get_search_client(connector, input_object.index)
 
             # If no models are passed, we will retrieve with bm25 and the models used in the indexation process
             if len(input_object.models) == 0:
@@ -182,6 +299,22 @@ class InfoRetrievalDeployment(BaseDeployment):
             else:
                 self.assert_correct_models(input_object.index, input_object.models, connector)
 
+            if self.retrieval_cache.enabled:
+                request_hash = self.retrieval_cache.get_request_hash(input_object)
+                # Got before retrieving, so a result retrieved while the index is modified is not kept as current
+                generation = self.retrieval_cache.get_generation(input_object.index)
+                docs = self.retrieval_cache.get(input_object.index, request_hash, generation)
+                if docs is not None:
+                    self.logger.debug(f"Retrieval result for '{input_object.index}' got from cache")
+                    if not eval(os.getenv('TESTING', "False")):
+                        self.report_api(1, "", input_object.x_reporting, "retrieval/process/call", "")
+                    return self.must_continue, {
+                        "status_code": 200,
+                        "docs": docs,
+                        "cache_hit": True,
+                        "status": "finished"
+                    }, ""
+
             # Check if the strategy selected can be done with the index passed
             chunking_method = self.STRATEGY_CHUNKING_METHOD_EQUIVALENCE[input_object.strategy]
             if len(input_object.models) == 1 and input_object.models[0]['alias'] == "bm25":
@@ -198,20 +331,18 @@ class InfoRetrievalDeployment(BaseDeployment):
             if input_object.strategy == "recursive_genai_retrieval":
                 # Needed to get the whole index for every retriever
                 conf["connector"] = connector
+                conf["structures_cache"] = self.recursive_structures_cache
             retrieval_strategy = ManagerRetrievalStrategies.get_retrieval_strategy(conf)
             sorted_documents = retrieval_strategy.do_retrieval_strategy(input_object, retrievers_arguments)
 
             tokens_report = {}
             for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
-                # close connections and count query tokens
+                # count query tokens (connections are kept in the pool)
                 tokenizer = self.TOKENIZER.get(retriever_type, "cl100k_base")
                 if tokenizer:
                     tokens_report[retriever_type] = len(tiktoken.get_encoding(tokenizer).encode(input_object.query))
                 else:
                     tokens_report[retriever_type] = 0
-                
-                es_client.close_vector_store()
-            connector.close()
 
             if not eval(os.getenv('TESTING', "False")):
                 for model, tokens in tokens_report.items():
@@ -221,11 +352,17 @@ class InfoRetrievalDeployment(BaseDeployment):
                 resource = "retrieval/process/call"
                 self.report_api(1, "", input_object.x_reporting, resource, "")
 
-            return self.must_continue, {
-                "status_code": 200,
-                "docs": self.parse_output(sorted_documents[:input_object.top_k], input_object.query),
-                "status": "finished"
-            }, ""
+            docs = self.parse_output(sorted_documents[:input_object.top_k], input_object.query)
+            result = {"status_code": 200, "docs": docs, "status": "finished"}
+            if self.retrieval_cache.enabled:
+                # A partial ranking (retrievers discarded by the timeout) is not served to the next requests
+                if retrieval_strategy.timed_out_retrievers:
+                    self.logger.debug(f"Result not cached, timed out retrievers: {retrieval_strategy.timed_out_retrievers}")
+                else:
+                    self.retrieval_cache.set(input_object.index, request_hash, docs, generation)
+                result["cache_hit"] = False
+
+            return self.must_continue, result, ""
 
         except Exception as ex:
             raise ex
@@ -275,5 +412,9 @@ def get_available_models() -> Tuple[Dict, int]:
 def list_indices() -> Tuple[Dict, int]:
     return list_indices_handler(deploy)
 
+@app.route('/get_cache_stats', methods=['GET'])
+def get_cache_stats() -> Tuple[Dict, int]:
+    return get_cache_stats_handler(deploy)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", debug=False, port=8888, use_reloader=False)
@@ -6,6 +6,9 @@ import re
 import math
 from copy import deepcopy
 
+# Installed imports
+import numpy as np
+
 
 def mean(unique_docs: dict, model_formats: dict, retrievers: list,) -> list:
     """Returns the mean score
@@ -153,6 +156,136 @@ def reciprocal_rank_fusion(unique_docs: dict, model_formats:dict, retrievers: li
 
     return mean(unique_docs, model_formats, retrievers)
 
+class RescoringEngine(object):
+    """Rescoring functions computed with array operations over the matrix of scores (documents x retrievers).
+
+    The scores are accumulated retriever by retriever in the same order as the per-document functions above, so
+    the results (and the rankings) are exactly the same ones.
+    """
+
+    def __init__(self, scores: np.ndarray, model_formats: dict, retrievers: list):
+        """
+        Args:
+            scores (np.ndarray): Matrix with a row by document and a column by retriever
+            model_formats (dict): Model format to identify types, whether sparse or dense vectors have different treatment in length based algorithms
+            retrievers (list): Retrievers of the columns
+        """
+        self.scores = scores
+        self.model_formats = model_formats
+        self.retrievers = retrievers
+
+    @classmethod
+    def from_docs(cls, unique_docs: dict, model_formats: dict, retrievers: list):
+        """Builds the engine with the scores of every retriever stored in the metadata of the docs
+
+        Args:
+            unique_docs (dict): Dictionary of haystack like docs
+            model_formats (dict): Model format of the retrievers
+            retrievers (list): Retrievers to get the scores from
+        """
+        docs = list(unique_docs.values())
+        scores = np.empty((len(docs), len(retrievers)), dtype=np.float64)
+        for j, retriever_type in enumerate(retrievers):
+            scores[:, j] = [doc.metadata[retriever_type] for doc in docs]
+        return cls(scores, model_formats, retrievers)
+
+    @staticmethod
+    def mean(scores: np.ndarray) -> np.ndarray:
+        """Returns the mean score of every document"""
+        total = np.zeros(scores.shape[0])
+        for j in range(scores.shape[1]):
+            total += scores[:, j]
+        return total / (scores.shape[1] + 1e-10)
+
+    def length(self, scores: np.ndarray, query: str, log2: bool = False) -> np.ndarray:
+        """Returns the score of every document based on query length (dense retrievers weighted by it)"""
+        query_len = len(re.sub(r"\W+", " ", query).split())
+        if log2:
+            query_len = math.log2(max(2, query_len))
+
+        total, norm = np.zeros(scores.shape[0]), 0
+        for j, retriever_type in enumerate(self.retrievers):
+            mf_type = self.model_formats.get(retriever_type, "dense")
+            if mf_type == "dense":
+                total += scores[:, j] * query_len
+                norm += query_len
+            elif mf_type == "sparse":
+                total += scores[:, j]
+                norm += 1
+        return total / (norm + 1e-10)
+
+    @staticmethod
+    def position(scores: np.ndarray, norm: bool = False) -> np.ndarray:
+        """Returns the scores replaced by their position in the ascending order of each retriever (ties share the
+        lowest position)"""
+        positions = np.empty_like(scores)
+        n_docs = scores.shape[0]
+        for j in range(scores.shape[1]):
+            column = scores[:, j]
+            sorted_column = np.sort(column)
+            if norm:
+                min_score = sorted_column[0]
+                factor = (1 - min_score) / (n_docs + 1e-10)
+            else:
+                min_score = 0
+                factor = 1 / (n_docs + 1e-10)
+            positions[:, j] = min_score + np.searchsorted(sorted_column, column, side="left") * factor
+        return positions
+
+    @staticmethod
+    def normalize(scores: np.ndarray) -> np.ndarray:
+        """Returns the scores of each retriever normalized to 0-1 (unless all of them are the same)"""
+        normalized = scores.copy()
+        for j in range(scores.shape[1]):
+            score_max, score_min = scores[:, j].max(), scores[:, j].min()
+            if score_max != score_min:
+                normalized[:, j] = (scores[:, j] - score_min) / (score_max - score_min + 1e-10)
+        return normalized
+
+    @staticmethod
+    def reciprocal_rank_fusion(scores: np.ndarray) -> np.ndarray:
+        """Returns the scores replaced by the reciprocal of their rank in each retriever (ties keep the docs order)"""
+        reciprocal = np.empty_like(scores)
+        ranks = np.arange(scores.shape[0])
+        for j in range(scores.shape[1]):
+            order = np.argsort(-scores[:, j], kind="stable")
+            reciprocal[order, j] = 1 / ((ranks + 1) + 1)  # RRF formula: https://plg.uwaterloo.ca/~gvcormac/cormacksigir09-rrf.pdf
+        return reciprocal
+
+    def rescore(self, rescoring_function: str, query: str) -> tuple:
+        """Computes a rescoring function
+
+        Args:
+            rescoring_function (str): String that identifies which function to use
+            query (str): Input query
+
+        Returns:
+            tuple: Final score of every document and the matrix of scores by retriever used to get it
+        """
+        if self.scores.shape[0] == 0:
+            return np.zeros(0), self.scores
+
+        if rescoring_function == "length":
+            return self.length(self.scores, query), self.scores
+        elif rescoring_function == "loglength":
+            return self.length(self.scores, query, log2=True), self.scores
+        elif rescoring_function == "mean":
+            return self.mean(self.scores), self.scores
+        elif rescoring_function in ["pos", "posnorm"]:
+            scores = self.position(self.scores, norm=rescoring_function == "posnorm")
+            return self.mean(scores), scores
+        elif rescoring_function == "norm":
+            scores = self.normalize(self.scores)
+            return self.mean(scores), scores
+        elif rescoring_function == "nll":  # norm + loglength
+            scores = self.normalize(self.scores)
+            return self.length(scores, query, log2=True), scores
+        elif rescoring_function == "rrf":
+            scores = self.reciprocal_rank_fusion(self.scores)
+            return self.mean(scores), scores
+        raise ValueError(f"Rescoring function '{rescoring_function}' not supported")
+
+
 def rescore_documents(unique_docs: dict, query: str, rescoring_function: str, model_formats: dict, retrievers: list) -> list:
     """Rescore documents based on a given
 
@@ -166,21 +299,15 @@ def rescore_documents(unique_docs: dict, query: str, rescoring_function: str, mo
         list: List of haystack like docs
     """
 
-    if rescoring_function == "length":
-        docs = length(unique_docs, query, model_formats, retrievers)
-    if rescoring_function == "loglength":
-        docs = length(unique_docs, query, model_formats, retrievers, log2=True)
-    elif rescoring_function == "mean":
-        docs = mean(unique_docs, model_formats, retrievers)
-    elif rescoring_function == "pos":
-        docs = position(unique_docs, model_formats, retrievers)
-    elif rescoring_function == "posnorm":
-        docs = position(unique_docs, model_formats, retrievers, norm=True)
-    elif rescoring_function == "norm":
-        docs = normalize(unique_docs, query, model_formats, retrievers)
-    elif rescoring_function == "nll":  # norm + loglength
-        docs = normalize(unique_docs, query, model_formats, retrievers, loglength=True)
-    elif rescoring_function == "rrf":
-        docs = reciprocal_rank_fusion(unique_docs, model_formats, retrievers)
+    engine = RescoringEngine.from_docs(unique_docs, model_formats, retrievers)
+    final_scores, scores = engine.rescore(rescoring_function, query)
+
+    docs = list(unique_docs.values())
+    if scores is not engine.scores:
+        # Same as the per-document functions, the metadata keeps the score of each retriever used
+        for doc, doc_scores in zip(docs, scores.tolist()):
+            doc.metadata.update(zip(retrievers, doc_scores))
+    for doc, score in zip(docs, final_scores.tolist()):
+        doc.score = score
 
     return docs
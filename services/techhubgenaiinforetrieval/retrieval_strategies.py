@@ -6,6 +6,8 @@ from typing import List
 from abc import ABC, abstractmethod
 import os, json
 import logging
+import asyncio
+import copy
 
 
 # Installed imports
@@ -15,7 +17,7 @@ from llama_index.core.llms.mock import MockLLM
 from llama_index.retrievers.bm25 import BM25Retriever
 from llama_index.core.retrievers import QueryFusionRetriever
 from llama_index.core.schema import QueryBundle, NodeWithScore, IndexNode, NodeRelationship, TextNode, ObjectType, RelatedNodeInfo
-from llama_index.core.vector_stores import MetadataFilter, MetadataFilters, FilterCondition
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters, FilterCondition, VectorStoreQuery
 from llama_index.core.postprocessor import MetadataReplacementPostProcessor
 from llama_index.core.retrievers import RecursiveRetriever
 
@@ -28,6 +30,7 @@ from common.logging_handler import LoggerHandler
 from common.services import RETRIEVAL_STRATEGIES
 from common.utils import INDEX_NAME
 from common.ir.connectors import Connector
+from common.cache_utils import TTLCache
 
 from rescoring import rescore_documents
 
@@ -41,6 +44,8 @@ class SimpleStrategy(ABC):
 
         logger_handler = LoggerHandler(RETRIEVAL_STRATEGIES, level=os.environ.get('LOG_LEVEL', "INFO"))
         self.logger = logger_handler.logger
+        # Retrievers discarded for exceeding the timeout, the result of the retrieval is partial if there is any
+        self.timed_out_retrievers = []
 
     @abstractmethod
     def do_retrieval_strategy(self, input_object, retrievers_arguments) -> List[NodeWithScore]:
@@ -78,6 +83,28 @@ class GenaiStrategy(SimpleStrategy):
 
     def __init__(self):
         super().__init__()
+        # Used in the 'concurrent' execution mode, the retrievers are launched at the same time in the async client
+        self.max_concurrency = int(os.getenv('RETRIEVAL_MAX_CONCURRENCY', 4))
+        self.retriever_timeout = float(os.getenv('RETRIEVAL_TIMEOUT', 10))
+
+    @staticmethod
+    def is_concurrent(input_object) -> bool:
+        """ Checks if the retrievers must be launched concurrently
+
+        :param input_object: Object with the input data
+        """
+        return getattr(input_object, 'execution_mode', "sequential") == "concurrent"
+
+    @staticmethod
+    def is_msearch(input_object, retrievers_arguments: list) -> bool:
+        """ Checks if the searches of all the retrievers must be sent in a single multi search request, only
+        possible when all the vector stores are in elasticsearch
+
+        :param input_object: Object with the input data
+        :param retrievers_arguments: List of tuples with the arguments of the retrievers
+        """
+        return getattr(input_object, 'search_mode', "per_retriever") == "msearch" and \
+            all(isinstance(vector_store, ElasticsearchStoreAdaption) for vector_store, _, _, _ in retrievers_arguments)
 
     @staticmethod
     def add_retrieved_document(docs: dict, retrieved_doc: NodeWithScore, retriever_type: str):
@@ -111,6 +138,34 @@ class GenaiStrategy(SimpleStrategy):
 
         return ids_empty_scores
 
+    def get_retriever(self, vector_store: ElasticsearchStoreAdaption, embed_model: BaseEmbedding, filters: dict,
+                      top_k: int):
+        """Get the llamaindex retriever over a vector store
+
+        :param vector_store: Vector store to use in retrieval
+        :param embed_model: Embed model to use in retrieval
+        :param filters: Filters to apply
+        :param top_k: Number of documents to retrieve
+
+        :return: Retriever
+        """
+        vector_store_index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
+        return vector_store_index.as_retriever(similarity_top_k=top_k, filters=self.generate_llama_filters(filters))
+
+    @staticmethod
+    def get_query_bundle(query: str, embed_query) -> QueryBundle:
+        """Get the query bundle to retrieve with
+
+        :param query: Query to retrieve
+        :param embed_query: Embedding of the query (the query itself for bm25)
+
+        :return: Query bundle
+        """
+        if isinstance(embed_query, list):
+            return QueryBundle(query_str=query, embedding=embed_query)
+        #bm25 does not use embeddings
+        return QueryBundle(query_str=query)
+
     def basic_genai_retrieval(self, vector_store: ElasticsearchStoreAdaption, embed_model: BaseEmbedding,
                               retriever_type: str, filters: dict, top_k: int, docs: dict, embed_query: list,
                               query: str) -> list:
@@ -127,14 +182,8 @@ class GenaiStrategy(SimpleStrategy):
 
         :return: List of documents
         """
-        vector_store_index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
-        retriever = vector_store_index.as_retriever(similarity_top_k=top_k, filters=self.generate_llama_filters(filters))
-
-        if isinstance(embed_query, list):
-            retrieved_docs = retriever.retrieve(QueryBundle(query_str=query, embedding=embed_query))
-        else:
-            #bm25 does not use embeddings
-            retrieved_docs = retriever.retrieve(QueryBundle(query_str=query))
+        retriever = self.get_retriever(vector_store, embed_model, filters, top_k)
+        retrieved_docs = retriever.retrieve(self.get_query_bundle(query, embed_query))
         self.logger.debug(f"{retriever_type} retrieved {len(retrieved_docs)} documents")
 
         for doc in retrieved_docs:
@@ -142,6 +191,130 @@ class GenaiStrategy(SimpleStrategy):
 
         return retrieved_docs
 
+    async def async_genai_retrieval(self, semaphore: asyncio.Semaphore, vector_store: ElasticsearchStoreAdaption,
+                                    embed_model: BaseEmbedding, retriever_type: str, filters: dict, top_k: int,
+                                    embed_query: list, query: str) -> list:
+        """Retrieve documents from a retriever in the async client, limited by the semaphore and the timeout
+
+        :param semaphore: Semaphore that limits the retrievers launched at the same time
+        :param vector_store: Vector store to use in retrieval
+        :param embed_model: Embed model to use in retrieval
+        :param retriever_type: Type of retriever
+        :param filters: Filters to apply
+        :param top_k: Number of documents to retrieve
+        :param embed_query: Embedding of the query
+        :param query: Query to retrieve
+
+        :return: List of documents
+        """
+        async with semaphore:
+            retriever = self.get_retriever(vector_store, embed_model, filters, top_k)
+            retrieved_docs = await asyncio.wait_for(retriever.aretrieve(self.get_query_bundle(query, embed_query)),
+                                                    timeout=self.retriever_timeout)
+        self.logger.debug(f"{retriever_type} retrieved {len(retrieved_docs)} documents")
+        return retrieved_docs
+
+    def msearch_genai_retrieval(self, retrievals: list, docs: dict) -> dict:
+        """Send the searches of all the retrievals in a single multi search (_msearch) request, with the same
+        queries the retrievers do, and merge the results in the same order they were passed
+
+        :param retrievals: List of tuples (vector_store, embed_model, retriever_type, filters, top_k, embed_query, query)
+        :param docs: Dictionary to store the retrieved documents
+
+        :return: Dictionary with the documents retrieved by each retriever
+        """
+        if not retrievals:
+            return {}
+
+        searches = []
+        for vector_store, _, _, filters, top_k, embed_query, query in retrievals:
+            query_bundle = self.get_query_bundle(query, embed_query)
+            vector_store_query = VectorStoreQuery(query_embedding=query_bundle.embedding, similarity_top_k=top_k,
+                                                  query_str=query_bundle.query_str,
+                                                  filters=self.generate_llama_filters(filters))
+            searches.extend(vector_store.get_search_request(vector_store_query))
+
+        # All the vector stores of a request share the elasticsearch client
+        client = retrievals[0][0].client
+        response = asyncio.get_event_loop().run_until_complete(client.msearch(searches=searches))
+
+        docs_by_retrieval = {}
+        for (vector_store, _, retriever_type, _, _, _, _), result in zip(retrievals, response['responses']):
+            if 'error' in result:
+                raise PrintableGenaiError(result.get('status', 500), f"Error in the {retriever_type} search: {result['error']}")
+            query_result = vector_store.parse_hits(result['hits']['hits'])
+            retrieved_docs = [NodeWithScore(node=node, score=score)
+                              for node, score in zip(query_result.nodes, query_result.similarities)]
+            self.logger.debug(f"{retriever_type} retrieved {len(retrieved_docs)} documents")
+            for doc in retrieved_docs:
+                self.add_retrieved_document(docs, doc, retriever_type)
+            docs_by_retrieval[retriever_type] = retrieved_docs
+        return docs_by_retrieval
+
+    def concurrent_genai_retrieval(self, retrievals: list, docs: dict) -> dict:
+        """Launch the retrievals concurrently and merge the results in the same order they were passed,
+        so the result is the same as doing them one after another
+
+        :param retrievals: List of tuples (vector_store, embed_model, retriever_type, filters, top_k, embed_query, query)
+        :param docs: Dictionary to store the retrieved documents
+
+        :return: Dictionary with the documents retrieved by each retriever, None if the retriever timed out
+        """
+        async def retrieve_all():
+            semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+            return await asyncio.gather(*[self.async_genai_retrieval(semaphore, *retrieval) for retrieval in retrievals],
+                                        return_exceptions=True)
+
+        results = asyncio.get_event_loop().run_until_complete(retrieve_all())
+
+        docs_by_retrieval = {}
+        for (_, _, retriever_type, _, _, _, _), result in zip(retrievals, results):
+            if isinstance(result, asyncio.TimeoutError):
+                self.logger.warning(f"{retriever_type} retrieval exceeded {self.retriever_timeout}s, discarding it")
+                self.timed_out_retrievers.append(retriever_type)
+                docs_by_retrieval[retriever_type] = None
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            for doc in result:
+                self.add_retrieved_document(docs, doc, retriever_type)
+            docs_by_retrieval[retriever_type] = result
+        return docs_by_retrieval
+
+    def first_retrieval(self, input_object, retrievers_arguments: list, unique_docs: dict) -> tuple:
+        """First retrieval to get the documents by each retriever (embedding model)
+
+        :param input_object: Object with the input data
+        :param retrievers_arguments: List of tuples with the arguments of the retrievers
+        :param unique_docs: Dictionary to store the retrieved documents
+
+        :return: Documents retrieved by each retriever and the retrievers arguments that have answered
+        """
+        docs_by_retrieval = {}
+        if self.is_msearch(input_object, retrievers_arguments):
+            retrievals = [(vector_store, embed_model, retriever_type, input_object.filters, input_object.top_k,
+                           embed_query, input_object.query)
+                          for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments]
+            return self.msearch_genai_retrieval(retrievals, unique_docs), retrievers_arguments
+
+        if not self.is_concurrent(input_object):
+            for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
+                docs_by_retrieval[retriever_type] = self.basic_genai_retrieval(vector_store, embed_model, retriever_type,
+                                                                               input_object.filters, input_object.top_k,
+                                                                               unique_docs, embed_query, input_object.query)
+            return docs_by_retrieval, retrievers_arguments
+
+        retrievals = [(vector_store, embed_model, retriever_type, input_object.filters, input_object.top_k, embed_query,
+                       input_object.query) for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments]
+        results = self.concurrent_genai_retrieval(retrievals, unique_docs)
+
+        # Retrievers that timed out are discarded for the scores completion and the rescoring
+        answered_arguments = [arguments for arguments in retrievers_arguments if results[arguments[3]] is not None]
+        if not answered_arguments:
+            raise PrintableGenaiError(504, f"All the retrievers exceeded the timeout of {self.retriever_timeout}s")
+        docs_by_retrieval = {retriever_type: docs for retriever_type, docs in results.items() if docs is not None}
+        return docs_by_retrieval, answered_arguments
+
     def complete_empty_scores(self, docs_by_retrieval, unique_docs, retrievers_arguments, input_object, retrievers):
         """
         Complete the scores of the documents that have not been retrieved by all the retrievers using
@@ -157,12 +330,28 @@ class GenaiStrategy(SimpleStrategy):
         ids_incompleted_docs = self.get_ids_empty_scores(docs_by_retrieval, set(unique_docs.keys()))
         if sum([len(docs) for docs in docs_by_retrieval.values()]) > 0:
             self.logger.debug(f"Re-scoring with {', '.join(list(zip(*retrievers_arguments))[3])} retrievers")
-            for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
-                input_object.filters['snippet_id'] = ids_incompleted_docs[retriever_type]
-                top_k_new = len(ids_incompleted_docs[retriever_type])
-                if top_k_new > 0:
-                    self.basic_genai_retrieval(vector_store, embed_model, retriever_type, input_object.filters, top_k_new,
-                                  unique_docs, embed_query, input_object.query)
+            msearch = self.is_msearch(input_object, retrievers_arguments)
+            if msearch or self.is_concurrent(input_object):
+                retrievals = []
+                for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
+                    top_k_new = len(ids_incompleted_docs[retriever_type])
+                    if top_k_new > 0:
+                        filters = {**input_object.filters, 'snippet_id': ids_incompleted_docs[retriever_type]}
+                        retrievals.append((vector_store, embed_model, retriever_type, filters, top_k_new, embed_query,
+                                           input_object.query))
+                if msearch:
+                    # The scores of all the retrievers are completed in a single request
+                    self.msearch_genai_retrieval(retrievals, unique_docs)
+                else:
+                    # A retriever that times out here keeps the scores to 0 for the missing documents
+                    self.concurrent_genai_retrieval(retrievals, unique_docs)
+            else:
+                for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
+                    input_object.filters['snippet_id'] = ids_incompleted_docs[retriever_type]
+                    top_k_new = len(ids_incompleted_docs[retriever_type])
+                    if top_k_new > 0:
+                        self.basic_genai_retrieval(vector_store, embed_model, retriever_type, input_object.filters, top_k_new,
+                                      unique_docs, embed_query, input_object.query)
 
         # Set to 0 if a document has not been retrieved when completing the scores
         for doc in unique_docs.values():
@@ -181,16 +370,10 @@ class GenaiStrategy(SimpleStrategy):
 
         :return: List of documents
         """
-        docs_by_retrieval = {}
         unique_docs = {}
-        retrievers = [retriever_type for _, _, _, retriever_type in retrievers_arguments]
-
-        # First retrieval to get the documents by each retriever (embedding model)
-        for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
-            docs_tmp = self.basic_genai_retrieval(vector_store, embed_model, retriever_type, input_object.filters,
-                                     input_object.top_k, unique_docs, embed_query, input_object.query)
 
-            docs_by_retrieval[retriever_type] = docs_tmp
+        docs_by_retrieval, retrievers_arguments = self.first_retrieval(input_object, retrievers_arguments, unique_docs)
+        retrievers = [retriever_type for _, _, _, retriever_type in retrievers_arguments]
 
         self.complete_empty_scores(docs_by_retrieval, unique_docs, retrievers_arguments, input_object, retrievers)
 
@@ -205,12 +388,83 @@ class GenaiStrategy(SimpleStrategy):
 class GenaiRecursiveStrategy(GenaiStrategy):
     STRATEGY_FORMAT = "recursive_genai_retrieval"
 
-    def __init__(self, connector: Connector):
+    def __init__(self, connector: Connector, structures_cache: TTLCache = None):
         super().__init__()
         self.connector = connector
+        # Nodes and base retrievers built over whole indexes, shared by the requests while the index does not change
+        self.structures_cache = structures_cache
+
+    @staticmethod
+    def build_base_retriever(retriever_type: str, embed_model: BaseEmbedding, all_nodes: list):
+        """Build the retriever (bm25) or the vector index (embeddings) over all the nodes of an index
+
+        :param retriever_type: Type of retriever
+        :param embed_model: Embed model to use in retrieval
+        :param all_nodes: List with all the nodes
+
+        :return: BM25Retriever or VectorStoreIndex
+        """
+        if retriever_type == "bm25--score":
+            # bm25 does not use embeddings, the default is english for Stemmer and Language
+            return BM25Retriever.from_defaults(nodes=all_nodes)
+        return VectorStoreIndex(nodes=all_nodes, embed_model=embed_model)
+
+    @staticmethod
+    def estimate_structure_size(all_nodes: list) -> int:
+        """Estimate the memory in bytes used by the structures built over the nodes (text, embeddings and metadata)
+
+        :param all_nodes: List with all the nodes
+
+        :return: Estimated size in bytes
+        """
+        return sum(2 * len(node.text) + 32 * len(node.embedding or []) + len(str(node.metadata)) + 1024
+                   for node in all_nodes)
+
+    @staticmethod
+    def copy_retrieved_document(retrieved_doc: NodeWithScore) -> NodeWithScore:
+        """Copy of a retrieved document with its own metadata (the text and embedding are not copied)
+
+        :param retrieved_doc: Retrieved document
+
+        :return: Copy of the document
+        """
+        node = retrieved_doc.node.model_copy(update={'metadata': copy.deepcopy(retrieved_doc.node.metadata)})
+        return NodeWithScore(node=node, score=retrieved_doc.score)
+
+    def get_recursive_structure(self, index_name: str, retriever_type: str, embed_model: BaseEmbedding,
+                                filters: dict) -> tuple:
+        """Get the nodes of an index and the base retriever built over them. They are cached by index, retriever
+        and filters along with the version of the index, so they are rebuilt only when the index changes
+
+        :param index_name: Name of the index to get the chunks from
+        :param retriever_type: Type of retriever
+        :param embed_model: Embed model to use in retrieval
+        :param filters: Filters to apply to the chunks
+
+        :return: Tuple with the dictionary of nodes, the list of nodes and the base retriever
+        """
+        version, key = None, None
+        if self.structures_cache is not None and self.structures_cache.enabled:
+            version = self.connector.get_index_version(index_name)
+            key = (index_name, retriever_type, json.dumps(filters, sort_keys=True, default=str))
+            structure = self.structures_cache.get(key)
+            if version is not None and structure and structure['version'] == version:
+                self.logger.debug(f"Recursive structure of '{index_name}' for {retriever_type} found in cache")
+                return structure['all_nodes_dict'], structure['all_nodes'], structure['base_retriever']
+
+        index_docs = self.connector.get_full_index(index_name, filters)
+        all_nodes_dict, all_nodes = self.get_all_nodes_parsed(index_docs)
+        base_retriever = self.build_base_retriever(retriever_type, embed_model, all_nodes)
+
+        if version is not None:
+            self.structures_cache.set(key, {'version': version, 'all_nodes_dict': all_nodes_dict,
+                                            'all_nodes': all_nodes, 'base_retriever': base_retriever},
+                                      weight=self.estimate_structure_size(all_nodes))
+        return all_nodes_dict, all_nodes, base_retriever
 
     def recursive_retrieval(self, embed_model: BaseEmbedding, retriever_type: str, top_k: int,  docs: dict,
-                            embed_query: list, query: str, all_nodes_dict: dict, all_nodes: list) -> list:
+                            embed_query: list, query: str, all_nodes_dict: dict, all_nodes: list,
+                            base_retriever=None) -> list:
         """Retrieve documents from a retriever
 
         :param embed_model: Embed model to use in retrieval
@@ -220,20 +474,21 @@ class GenaiRecursiveStrategy(GenaiStrategy):
         :param docs: Dictionary to store the retrieved documents
         :param embed_query: Embedding of the query
         :param all_nodes_dict: Dictionary with all the nodes
+        :param all_nodes: List with all the nodes
+        :param base_retriever: Retriever or vector index already built over the nodes (built if not passed)
 
         :return: List of documents
         """
+        if base_retriever is None:
+            base_retriever = self.build_base_retriever(retriever_type, embed_model, all_nodes)
+
         if retriever_type == "bm25--score":
-            #bm25 does not use embeddings
-            retriever = BM25Retriever.from_defaults(
-                nodes=all_nodes,
-                similarity_top_k=top_k,
-                # The default is english for Stemmer and Language
-            )
+            # Shallow copy to not change the top_k of the shared retriever
+            retriever = copy.copy(base_retriever)
+            retriever.similarity_top_k = top_k
             query_bundle = QueryBundle(query_str=query)
         else:
-            vector_store_index = VectorStoreIndex(nodes=all_nodes, embed_model=embed_model)
-            retriever = vector_store_index.as_retriever(similarity_top_k=top_k)
+            retriever = base_retriever.as_retriever(similarity_top_k=top_k)
             query_bundle = QueryBundle(query_str=query, embedding=embed_query)
 
         recursive_retriever = RecursiveRetriever(
@@ -242,7 +497,8 @@ class GenaiRecursiveStrategy(GenaiStrategy):
             node_dict=all_nodes_dict,
             verbose=True,
         )
-        retrieved_docs = recursive_retriever.retrieve(query_bundle)
+        # The retrieved nodes are the ones of the structure shared by the requests, the scores are written in copies
+        retrieved_docs = [self.copy_retrieved_document(doc) for doc in recursive_retriever.retrieve(query_bundle)]
 
         self.logger.debug(f"{retriever_type} retrieved {len(retrieved_docs)} documents")
 
@@ -276,12 +532,13 @@ class GenaiRecursiveStrategy(GenaiStrategy):
                 if neighbor_retriever_type:
                     index_name = INDEX_NAME(input_object.index, neighbor_retriever_type.split('--')[0])
                     
-            index_docs = self.connector.get_full_index(index_name, input_object.filters)
-            if len(index_docs) < input_object.top_k:
-                raise ValueError(f"Error, in 'recursive_genai_strategy' the top_k value '{input_object.top_k}' can not be higher than the chunks in the index '{len(index_docs)}'")
-            all_nodes_dict, all_nodes = self.get_all_nodes_parsed(index_docs)
+            all_nodes_dict, all_nodes, base_retriever = self.get_recursive_structure(index_name, retriever_type,
+                                                                                     embed_model, input_object.filters)
+            if len(all_nodes) < input_object.top_k:
+                raise ValueError(f"Error, in 'recursive_genai_strategy' the top_k value '{input_object.top_k}' can not be higher than the chunks in the index '{len(all_nodes)}'")
             docs_tmp = self.recursive_retrieval(embed_model, retriever_type, input_object.top_k, unique_docs,
-                                                embed_query, input_object.query, all_nodes_dict, all_nodes)
+                                                embed_query, input_object.query, all_nodes_dict, all_nodes,
+                                                base_retriever)
 
             docs_by_retrieval[retriever_type] = docs_tmp
 
@@ -342,17 +599,14 @@ class GenaiSurroundingStrategy(GenaiStrategy):
 
         :return: List of documents
         """
-        docs_by_retrieval = {}
         unique_docs = {}
-        retrievers = [retriever_type for _, _, _, retriever_type in retrievers_arguments]
 
-        for vector_store, embed_model, embed_query, retriever_type in retrievers_arguments:
-            docs_tmp = self.basic_genai_retrieval(vector_store, embed_model, retriever_type, input_object.filters,
-                                     input_object.top_k, unique_docs, embed_query, input_object.query)
+        docs_by_retrieval, retrievers_arguments = self.first_retrieval(input_object, retrievers_arguments, unique_docs)
+        retrievers = [retriever_type for _, _, _, retriever_type in retrievers_arguments]
 
-            # Replace the surrounding window (window metadata key) in the retrieved documents before store
+        # Replace the surrounding window (window metadata key) in the retrieved documents before store
+        for docs_tmp in docs_by_retrieval.values():
             MetadataReplacementPostProcessor(target_metadata_key="window").postprocess_nodes(docs_tmp)
-            docs_by_retrieval[retriever_type] = docs_tmp
 
         # When completing, just scores metadata are modified
         self.complete_empty_scores(docs_by_retrieval, unique_docs, retrievers_arguments, input_object, retrievers)
@@ -4,6 +4,7 @@
 # Native imports
 from abc import ABC
 from typing import List
+import asyncio
 
 from common.errors.genaierrors import PrintableGenaiError
 
@@ -22,6 +23,10 @@ class SearchClient(ABC):
     def __init__(self):
         self.connection = None
 
+    def close(self):
+        """Closes the client connections"""
+        pass
+
     @classmethod
     def is_connector_type(cls, model_type):
         """Checks if a given model type is equel to the model format and thus it must be the one to use.
@@ -47,6 +52,9 @@ class ElasticClient(SearchClient):
     def close_vector_store(self):
         self.vector_store.close()
 
+    def close(self):
+        asyncio.get_event_loop().run_until_complete(self.client.close())
+
 class AzureAiClient(SearchClient):
     SEARCH_TYPE = "ai_search"
 
@@ -76,6 +84,9 @@ class AzureAiClient(SearchClient):
     def close_vector_store(self):
         return
 
+    def close(self):
+        self.client.close()
+
 
 class ManagerSearchClient(object):
     SEARCH_TYPES = [ElasticClient, AzureAiClient]
@@ -0,0 +1,123 @@
+### This code is property of the GGAO ###
+# Native imports
+import threading
+
+# Installed imports
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Local imports
+from connection_pool import ConnectionPool
+
+
+vector_storages = [{
+    "vector_storage_name": "elastic-test",
+    "vector_storage_type": "elastic",
+    "vector_storage_host": "localhost",
+    "vector_storage_port": 9200,
+    "vector_storage_scheme": "https",
+    "vector_storage_username": "test",
+    "vector_storage_password": "test"
+}]
+
+
+@pytest.fixture
+def pool():
+    with patch('connection_pool.get_indexed_connector_name', return_value="elastic-test") as mock_get_connector_name, \
+            patch('connection_pool.ManagerConnector.get_connector') as mock_get_connector, \
+            patch('connection_pool.ManagerSearchClient.get_client') as mock_get_client:
+        mock_get_connector.side_effect = lambda vs: MagicMock()
+        mock_get_client.side_effect = lambda connector, index: MagicMock()
+        connection_pool = ConnectionPool("test_workspace")
+        connection_pool.mock_get_connector_name = mock_get_connector_name
+        connection_pool.mock_get_connector = mock_get_connector
+        yield connection_pool
+
+
+def test_connector_reused(pool):
+    connector = pool.get_connector("index1", vector_storages)
+    assert pool.get_connector("index1", vector_storages) is connector
+    assert pool.get_connector("index2", vector_storages) is connector
+    connector.connect.assert_called_once()
+    # The vector storage of every index is read once
+    assert pool.mock_get_connector_name.call_count == 2
+    pool.get_connector("index1", vector_storages)
+    assert pool.mock_get_connector_name.call_count == 2
+
+    stats = pool.get_stats()
+    assert stats["connectors_created"] == 1
+    assert stats["connectors_reused"] == 3
+    assert stats["connectors"] == ["elastic-test"]
+
+
+def test_index_not_indexed_not_cached(pool):
+    pool.mock_get_connector_name.return_value = ""
+    with patch.dict('os.environ', {'VECTOR_STORAGE': "elastic-test"}):
+        pool.get_connector("index1", vector_storages)
+        pool.get_connector("index1", vector_storages)
+    # Read again until infoindexing writes its index storage file
+    assert pool.mock_get_connector_name.call_count == 2
+    assert pool.get_stats()["index_storages"]["size"] == 0
+
+
+def test_connector_refreshed_when_not_alive(pool):
+    pool.ping_interval = 0
+    connector = pool.get_connector("index1", vector_storages)
+    connector.ping.return_value = True
+    assert pool.get_connector("index1", vector_storages) is connector
+    connector.ping.return_value = False
+    assert pool.get_connector("index1", vector_storages) is not connector
+    assert pool.get_stats()["connectors_refreshed"] == 1
+
+
+def test_ping_outside_lock(pool):
+    pool.ping_interval = 0
+    connector = pool.get_connector("index1", vector_storages)
+    results = []
+
+    def ping():
+        # Other threads can use the pool while a connector is being checked
+        thread = threading.Thread(target=lambda: results.append(pool.get_stats()))
+        thread.start()
+        thread.join(timeout=5)
+        return not thread.is_alive()
+
+    connector.ping.side_effect = ping
+    assert pool.get_connector("index1", vector_storages) is connector
+    assert len(results) == 1
+
+
+def test_connector_not_found(pool):
+    pool.mock_get_connector_name.return_value = "nonexistent"
+    with pytest.raises(ValueError):
+        pool.get_connector("index_other", vector_storages)
+
+
+def test_search_client_per_thread(pool):
+    connector = pool.get_connector("index1", vector_storages)
+    client = pool.get_search_client(connector, "index1")
+    assert pool.get_search_client(connector, "index1") is client
+
+    clients = []
+    thread = threading.Thread(target=lambda: clients.append(pool.get_search_client(connector, "index1")))
+    thread.start()
+    thread.join()
+    assert clients[0] is not client
+
+    # A refreshed connector closes the old client of the thread
+    pool.ping_interval = 0
+    connector.ping.return_value = False
+    new_connector = pool.get_connector("index1", vector_storages)
+    assert pool.get_search_client(new_connector, "index1") is not client
+    client.close.assert_called_once()
+    stats = pool.get_stats()
+    assert stats["clients_created"] == 3
+    assert stats["clients_reused"] == 1
+    assert stats["clients_refreshed"] == 1
+
+
+def test_invalidate_index(pool):
+    pool.get_connector("index1", vector_storages)
+    pool.invalidate_index("index1")
+    pool.get_connector("index1", vector_storages)
+    assert pool.mock_get_connector_name.call_count == 2
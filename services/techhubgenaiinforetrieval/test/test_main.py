@@ -2,6 +2,8 @@
 # Native imports
 import copy 
 import json
+import os
+import asyncio
 
 # Installed imports
 import pytest
@@ -14,6 +16,8 @@ import elasticsearch
 
 # Local imports
 from common.errors.genaierrors import PrintableGenaiError
+from common.utils import INDEX_NAME
+from common.ir.result_cache import RetrievalResultCache
 from main import app, InfoRetrievalDeployment
 from retrieval_strategies import SimpleStrategy
 from elasticsearch_adaption import ElasticsearchStoreAdaption
@@ -109,10 +113,15 @@ class TestMain:
     connector = get_connector()
     deployment = get_ir_deployment()
 
+    def setup_method(self):
+        # The existence of the indices is cached between calls
+        self.deployment.index_metadata_cache.clear()
+        self.deployment.index_list_cache.clear()
+
     def test_assert_correct_models(self):
         self.connector.exist_index.return_value = False
         with pytest.raises(PrintableGenaiError):
-            InfoRetrievalDeployment.assert_correct_models("test", self.models, self.connector)
+            self.deployment.assert_correct_models("test", self.models, self.connector)
 
     def test_max_num_queue(self):
         assert self.deployment.max_num_queue == 1
@@ -123,9 +132,66 @@ class TestMain:
             self.deployment.get_bm25_vector_store("test_index", self.connector, MagicMock())
 
         # Case correct
+        self.deployment.index_metadata_cache.clear()
         self.connector.exist_index.return_value = True
         self.deployment.get_bm25_vector_store("test_index", self.connector, MagicMock())
 
+    def test_exist_index_cached(self):
+        connector = get_connector()
+        assert self.deployment.exist_index(connector, "test_index_text-embedding-ada-002")
+        assert self.deployment.exist_index(connector, "test_index_text-embedding-ada-002")
+        connector.exist_index.assert_called_once_with("test_index_text-embedding-ada-002")
+
+        self.deployment.invalidate_index_metadata("test_index")
+        connector.exist_index.return_value = False
+        assert not self.deployment.exist_index(connector, "test_index_text-embedding-ada-002")
+        assert connector.exist_index.call_count == 2
+
+    def test_missing_index_not_cached(self):
+        connector = get_connector()
+        connector.exist_index.return_value = False
+        assert not self.deployment.exist_index(connector, "new_index_model1")
+        # Created by infoindexing after the miss
+        connector.exist_index.return_value = True
+        assert self.deployment.exist_index(connector, "new_index_model1")
+        assert connector.exist_index.call_count == 2
+
+    def test_get_connector_stale_route(self):
+        old_connector, new_connector = get_connector(), get_connector()
+        old_connector.exist_index.return_value = False
+        with patch.object(self.deployment, 'connection_pool') as mock_pool:
+            mock_pool.get_connector.side_effect = [old_connector, new_connector]
+            mock_pool.invalidate_index.return_value = True
+            # The index was created again in other vector storage
+            assert self.deployment.get_connector("test_index") is new_connector
+            mock_pool.invalidate_index.assert_called_once_with("test_index")
+
+            mock_pool.get_connector.side_effect = None
+            mock_pool.get_connector.return_value = new_connector
+            assert self.deployment.get_connector("test_index") is new_connector
+            mock_pool.invalidate_index.assert_called_once()
+
+    def test_invalidate_recursive_structures(self):
+        index_name = INDEX_NAME("test_index", self.deployment.all_models[0])
+        self.deployment.recursive_structures_cache.set((index_name, "ada--score", "{}"), {})
+        self.deployment.recursive_structures_cache.set(("other_index", "ada--score", "{}"), {})
+        self.deployment.invalidate_index_metadata("test_index")
+        assert (index_name, "ada--score", "{}") not in self.deployment.recursive_structures_cache
+        assert ("other_index", "ada--score", "{}") in self.deployment.recursive_structures_cache
+
+    def test_list_indices_cached(self):
+        connector = get_connector()
+        assert self.deployment.list_indices(connector) == self.deployment.list_indices(connector)
+        connector.list_indices.assert_called_once()
+        # The listed indices are known to exist
+        assert self.deployment.exist_index(connector, "index1_model1")
+        connector.exist_index.assert_not_called()
+
+        # An index not listed found afterwards refreshes the list
+        assert self.deployment.exist_index(connector, "index3_model1")
+        self.deployment.list_indices(connector)
+        assert connector.list_indices.call_count == 2
+
     def test_get_retrievers_arguments(self):
         models = [
             {
@@ -151,6 +217,26 @@ class TestMain:
             assert retrievers[0][3] == "bm25--score"
             assert retrievers[1][3] == "text-embedding-ada-002--score"
 
+    def test_get_retrievers_arguments_cached_embedding(self):
+        models = [
+            {
+                "alias": "ada",
+                "embedding_model": "text-embedding-ada-002",
+                "platform": "azure"
+            }
+        ]
+        self.deployment.query_embeddings_cache.clear()
+        with patch('main.get_embed_model') as mock_get_embed_model:
+            mock_obj = MagicMock()
+            mock_obj.get_query_embedding.return_value = [0.23424, 0.234234234, 0.455]
+            mock_get_embed_model.return_value = mock_obj
+            first = self.deployment.get_retrievers_arguments(models, "test", MagicMock(), self.connector, "query  text")
+            second = self.deployment.get_retrievers_arguments(models, "test", MagicMock(), self.connector, " query text ")
+            assert first[0][2] == second[0][2] == [0.23424, 0.234234234, 0.455]
+            mock_obj.get_query_embedding.assert_called_once()
+        stats = self.deployment.query_embeddings_cache.get_stats()
+        assert stats['hits'] >= 1
+
     def test_get_default_models(self):
         self.deployment.get_default_models(MagicMock(), self.connector, MagicMock())
 
@@ -185,9 +271,9 @@ class TestMain:
 
     def test_genai_retrieval_strategy(self):
         with patch('retrieval_strategies.GenaiStrategy.do_retrieval_strategy') as mock_retrieve:
-            with patch('main.get_connector', return_value=self.connector):
+            with patch.object(self.deployment.connection_pool, 'get_connector', return_value=self.connector):
                 with patch('main.InfoRetrievalDeployment.get_retrievers_arguments') as mock_get_retrievers_arguments:
-                    with patch('main.ManagerSearchClient.get_client') as mock_get_client:
+                    with patch.object(self.deployment.connection_pool, 'get_search_client') as mock_get_client:
                         mock_get_client.return_value = MagicMock()
                         mock_retrieve.return_value = documents_bm25
                         json_input = {
@@ -213,11 +299,74 @@ class TestMain:
                         assert len(rescored_docs) == 3
                         assert rescored_docs[2]['meta']['filename'] == "test-2"
 
+    def test_retrieval_result_cache(self):
+        json_input = {"indexation_conf": {"top_k": 3, "filters": {}, "query": "query", "index": "test",
+                                          "strategy": "genai_retrieval", "rescoring_function": "mean", "models": []},
+                      "project_conf": copy.deepcopy(self.headers)}
+        with patch('retrieval_strategies.GenaiStrategy.do_retrieval_strategy') as mock_retrieve, \
+                patch.object(self.deployment, 'retrieval_cache', RetrievalResultCache("memory")), \
+                patch.object(self.deployment.connection_pool, 'get_connector', return_value=self.connector), \
+                patch.object(self.deployment.connection_pool, 'get_search_client', return_value=MagicMock()), \
+                patch('main.InfoRetrievalDeployment.get_retrievers_arguments') as mock_get_retrievers_arguments:
+            mock_retrieve.return_value = documents_bm25
+            mock_get_retrievers_arguments.return_value = [(MagicMock(), MagicMock(), "query", "bm25--score")]
+
+            _, result, _ = self.deployment.process(copy.deepcopy(json_input))
+            assert result['cache_hit'] is False
+            _, cached, _ = self.deployment.process(copy.deepcopy(json_input))
+            assert cached['cache_hit'] is True and cached['docs'] == result['docs']
+            assert mock_retrieve.call_count == 1
+
+            # Other query is not served from the cache
+            other_input = copy.deepcopy(json_input)
+            other_input['indexation_conf']['query'] = "other query"
+            assert self.deployment.process(other_input)[1]['cache_hit'] is False
+
+            # A deletion in the index invalidates its results
+            self.deployment.invalidate_index_metadata("test")
+            assert self.deployment.process(copy.deepcopy(json_input))[1]['cache_hit'] is False
+            assert mock_retrieve.call_count == 3
+            assert self.deployment.retrieval_cache.get_stats()['hits'] == 1
+
+    def test_retrieval_result_cache_timeout(self):
+        json_input = {"indexation_conf": {"top_k": 3, "filters": {}, "query": "query", "index": "test",
+                                          "strategy": "genai_retrieval", "rescoring_function": "mean", "models": [],
+                                          "execution_mode": "concurrent"},
+                      "project_conf": copy.deepcopy(self.headers)}
+
+        async def slow_aretrieve(query_bundle):
+            await asyncio.sleep(1)
+            return []
+
+        async def aretrieve(query_bundle):
+            return [NodeWithScore(node=TextNode(text=doc.text, metadata=dict(doc.metadata)), score=doc.score)
+                    for doc in documents_bm25]
+
+        retrievers = [MagicMock(aretrieve=aretrieve), MagicMock(aretrieve=slow_aretrieve)]
+        with patch('retrieval_strategies.GenaiStrategy.get_retriever', side_effect=retrievers * 2), \
+                patch.dict(os.environ, {"RETRIEVAL_TIMEOUT": "0.05"}), \
+                patch.object(self.deployment, 'retrieval_cache', RetrievalResultCache("memory")), \
+                patch.object(self.deployment.connection_pool, 'get_connector', return_value=self.connector), \
+                patch.object(self.deployment.connection_pool, 'get_search_client', return_value=MagicMock()), \
+                patch('main.InfoRetrievalDeployment.get_retrievers_arguments') as mock_get_retrievers_arguments:
+            mock_get_retrievers_arguments.return_value = [(MagicMock(), MagicMock(), "query", "bm25--score"),
+                                                          (MagicMock(), MagicMock(), [0.1, 0.2], "ada--score")]
+
+            # The ranking without the retriever that timed out is not cached
+            _, result, _ = self.deployment.process(copy.deepcopy(json_input))
+            assert result['cache_hit'] is False and len(result['docs']) > 0
+            _, result, _ = self.deployment.process(copy.deepcopy(json_input))
+            assert result['cache_hit'] is False
+            assert self.deployment.retrieval_cache.get_stats()['hits'] == 0
+
+    def test_retrieval_result_cache_disabled(self):
+        assert not self.deployment.retrieval_cache.enabled
+
     def test_llamaindex_fusion_strategy(self):
         with patch('retrieval_strategies.LlamaIndexFusionStrategy.do_retrieval_strategy') as mock_retrieve:
-            with patch('main.get_connector', return_value=self.connector):
+            with patch.object(self.deployment.connection_pool, 'get_connector', return_value=self.connector):
                 with patch('main.InfoRetrievalDeployment.get_retrievers_arguments') as mock_get_retrievers_arguments:
-                    with patch('main.ManagerSearchClient.get_client') as mock_get_client:
+                    with patch.object(self.deployment.connection_pool, 'get_search_client') as mock_get_client:
                         mock_get_client.return_value = MagicMock()
                         mock_retrieve.return_value = documents_bm25
                         json_input = {
@@ -246,9 +395,9 @@ class TestMain:
 
     def test_recursive_genai_retrieval_strategy(self):
         with patch('retrieval_strategies.GenaiRecursiveStrategy.do_retrieval_strategy') as mock_retrieve:
-            with patch('main.get_connector', return_value=self.connector):
+            with patch.object(self.deployment.connection_pool, 'get_connector', return_value=self.connector):
                 with patch('main.InfoRetrievalDeployment.get_retrievers_arguments') as mock_get_retrievers_arguments:
-                    with patch('main.ManagerSearchClient.get_client') as mock_get_client:
+                    with patch.object(self.deployment.connection_pool, 'get_search_client') as mock_get_client:
                         mock_get_client.return_value = MagicMock()
                         mock_retrieve.return_value = documents_bm25
                         json_input = {
@@ -277,9 +426,9 @@ class TestMain:
 
     def test_surrounding_genai_retrieval_strategy(self):
         with patch('retrieval_strategies.GenaiSurroundingStrategy.do_retrieval_strategy') as mock_retrieve:
-            with patch('main.get_connector', return_value=self.connector):
+            with patch.object(self.deployment.connection_pool, 'get_connector', return_value=self.connector):
                 with patch('main.InfoRetrievalDeployment.get_retrievers_arguments') as mock_get_retrievers_arguments:
-                    with patch('main.ManagerSearchClient.get_client') as mock_get_client:
+                    with patch.object(self.deployment.connection_pool, 'get_search_client') as mock_get_client:
                         mock_get_client.return_value = MagicMock()
                         mock_retrieve.return_value = documents_bm25
                         json_input = {
@@ -317,7 +466,7 @@ def test_retrieve_documents(client):
         "index": "test",
         "filters": "{\"test_system_query_v\": {\"system\": \"$system\", \"user\": [{\"type\": \"text\", \"text\": \"Answer the question as youngster: \"},{\"type\": \"image_url\",\"image\": {\"url\": \"https://static-00.iconduck.com/assets.00/file-type-favicon-icon-256x256-6l0w7xol.png\",\"detail\": \"high\"}},\"$query\"]}}"
     }
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_get_connector.return_value = get_connector()
         response = client.post("/retrieve_documents", json=body)
         result = json.loads(response.text).get('result')
@@ -339,7 +488,7 @@ def test_retrieve_documents_exceptions(client):
         "filters": "{\"test_system_query_v\": {\"system\": \"$system\", \"user\": [{\"type\": \"text\", \"text\": \"Answer the question as youngster: \"},{\"type\": \"image_url\",\"image\": {\"url\": \"https://static-00.iconduck.com/assets.00/file-type-favicon-icon-256x256-6l0w7xol.png\",\"detail\": \"high\"}},\"$query\"]}}"
     }
 
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_connector = MagicMock()
         mock_get_connector.return_value = mock_connector
 
@@ -362,7 +511,7 @@ def test_retrieve_documents_exceptions(client):
 
 
 def test_retrieve_documents_filenames(client):
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_get_connector.return_value = get_connector()
         response = client.get("/get_documents_filenames?index=test")
         result = response.json.get('result')
@@ -376,7 +525,7 @@ def test_retrieve_documents_filenames(client):
     assert result.get('error_message') == "Missing parameter: index"
 
 def test_retrieve_documents_filenames_exceptions(client):
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_connector = MagicMock()
         mock_get_connector.return_value = mock_connector
 
@@ -414,7 +563,7 @@ def test_get_models(client):
 
 
 def test_delete_index(client):
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_get_connector.return_value = get_connector()
         response = client.delete("/delete_index?index=test")
         result = response.json.get('result')
@@ -425,7 +574,7 @@ def test_delete_index_exceptions(client):
     body = {
         "index": "test"
     }
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
 
         mock_connector = MagicMock()
         mock_get_connector.return_value = mock_connector
@@ -481,16 +630,23 @@ def test_delete_documents(client):
         }
     }
     query_params = f"?index={body['index']}&filename={body['delete']['filename'][0]}"
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_connector = MagicMock()
         mock_get_connector.return_value = mock_connector
 
         mock_connector.delete_documents.return_value = ("mocked_result", [], 1)
 
-        response = client.delete(f"/delete_documents{query_params}")
+        calls = MagicMock()
+        calls.attach_mock(mock_connector.delete_documents, "delete_documents")
+        with patch('main.deploy.invalidate_index_metadata') as mock_invalidate:
+            calls.attach_mock(mock_invalidate, "invalidate_index_metadata")
+            response = client.delete(f"/delete_documents{query_params}")
         result = response.json.get('result')
         assert response.status_code == 200
         assert result == "Documents that matched the filters were deleted for 'test'"
+        # The cached metadata and results are invalidated once the documents are deleted
+        assert [call[0] for call in calls.mock_calls][-1] == "invalidate_index_metadata"
+        mock_invalidate.assert_called_once_with("test")
 
 
 def test_delete_documents_exeception(client):
@@ -501,7 +657,7 @@ def test_delete_documents_exeception(client):
         }
     }
     query_params = f"?index={body['index']}&filename={body['delete']['filename'][0]}"
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
 
         mock_connector = MagicMock()
         mock_get_connector.return_value = mock_connector
@@ -533,9 +689,28 @@ def test_delete_documents_exeception(client):
 
 
 def test_list_indices(client):
-    with patch('endpoints.get_connector') as mock_get_connector:
+    with patch('main.deploy.connection_pool.get_connector') as mock_get_connector:
         mock_get_connector.return_value = get_connector()
         response = client.get("/list_indices")
         result = json.loads(response.text)
         assert response.status_code == 200
         assert len(result.get('indices')) == 2
+
+        # Served from the cache until an index is deleted
+        mock_get_connector.return_value.list_indices.return_value = []
+        response = client.get("/list_indices")
+        assert len(json.loads(response.text).get('indices')) == 2
+        client.delete("/delete_index?index=index1")
+        response = client.get("/list_indices")
+        assert len(json.loads(response.text).get('indices')) == 0
+
+
+def test_get_cache_stats(client):
+    response = client.get("/get_cache_stats")
+    result = json.loads(response.text)
+    assert response.status_code == 200
+    assert set(result['result']['query_embeddings']) >= {"size", "hits", "misses", "evictions"}
+    assert "connectors_reused" in result['result']['connection_pool']
+    assert "hit_ratio" in result['result']['index_metadata']
+    assert "max_weight" in result['result']['recursive_structures']
+    assert result['result']['retrieval_results']['backend'] == "disabled"
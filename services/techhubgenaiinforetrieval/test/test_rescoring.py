@@ -3,6 +3,8 @@
 
 # Native imports
 import re, copy, json
+import random
+from types import SimpleNamespace
 
 # Installed imports
 import pytest
@@ -10,7 +12,7 @@ from unittest.mock import MagicMock
 from unittest import mock
 
 # Local imports
-from rescoring import rescore_documents
+from rescoring import rescore_documents, RescoringEngine, mean, length, position, normalize, reciprocal_rank_fusion
 
 
 
@@ -113,4 +115,46 @@ class TestRescoring:
             doc.score = 0.0
         docs = rescore_documents(aux_docs, self.query, "rrf", self.model_formats, self.retrievers)
         assert 0.499999999975 == docs[0].score
-        assert docs[0].score != list(self.unique_docs.values())[0].score
\ No newline at end of file
+        assert docs[0].score != list(self.unique_docs.values())[0].score
+
+
+def get_random_docs(n_docs, retrievers, seed=0):
+    rng = random.Random(seed)
+    docs = {}
+    for i in range(n_docs):
+        # Rounded scores to have ties
+        metadata = {retriever_type: round(rng.random(), 2) for retriever_type in retrievers}
+        docs[f"doc_{i}"] = SimpleNamespace(metadata=metadata, score=0.0)
+    return docs
+
+
+@pytest.mark.parametrize("rescoring_function, reference", [
+    ("mean", lambda docs, query, mf, r: mean(docs, mf, r)),
+    ("length", lambda docs, query, mf, r: length(docs, query, mf, r)),
+    ("loglength", lambda docs, query, mf, r: length(docs, query, mf, r, log2=True)),
+    ("pos", lambda docs, query, mf, r: position(docs, mf, r)),
+    ("posnorm", lambda docs, query, mf, r: position(docs, mf, r, norm=True)),
+    ("norm", lambda docs, query, mf, r: normalize(docs, query, mf, r)),
+    ("nll", lambda docs, query, mf, r: normalize(docs, query, mf, r, loglength=True)),
+    ("rrf", lambda docs, query, mf, r: reciprocal_rank_fusion(docs, mf, r))
+])
+def test_vectorized_same_as_per_document(rescoring_function, reference):
+    retrievers = ["bm25--score", "text-embedding-ada-002--score", "cohere-english-v3--score"]
+    model_formats = {"bm25--score": "sparse"}
+    query = "Cuantas copas ha ganado el Real Zaragoza?"
+    docs = get_random_docs(300, retrievers)
+    expected_docs = copy.deepcopy(docs)
+
+    result = rescore_documents(docs, query, rescoring_function, model_formats, retrievers)
+    expected = reference(expected_docs, query, model_formats, retrievers)
+
+    assert [doc.score for doc in result] == [doc.score for doc in expected]
+    assert [doc.metadata for doc in result] == [doc.metadata for doc in expected]
+
+
+def test_rescoring_engine_empty():
+    engine = RescoringEngine.from_docs({}, {}, ["bm25--score"])
+    final_scores, _ = engine.rescore("norm", "query")
+    assert len(final_scores) == 0
+    with pytest.raises(ValueError):
+        RescoringEngine.from_docs(get_random_docs(2, ["bm25--score"]), {}, ["bm25--score"]).rescore("other", "")
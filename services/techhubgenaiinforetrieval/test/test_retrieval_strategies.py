@@ -1,4 +1,5 @@
 import unittest
+import asyncio
 
 import pytest
 from unittest.mock import MagicMock, patch, AsyncMock, Mock
@@ -14,6 +15,11 @@ from retrieval_strategies import (
 )
 from llama_index.core.schema import NodeWithScore, BaseNode, TextNode
 from common.errors.genaierrors import PrintableGenaiError
+from common.cache_utils import TTLCache
+from elasticsearch_adaption import ElasticsearchStoreAdaption
+from elasticsearch.helpers.vectorstore import AsyncBM25Strategy
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from types import SimpleNamespace
 
 
 ada_002_germany = {
@@ -243,6 +249,128 @@ def test_complete_empty_scores( mock_node_with_score, mock_vector_store, mock_em
     retriever.complete_empty_scores(mock_docs_by_retrieval, mock_unique_docs, retrievers_arguments, mock_input_object, mock_retrievers)
 
 
+def test_genai_strategy_concurrent_retrieval_same_result(mock_input_object, mock_vector_store, mock_embed_model):
+    def aretrieve_side_effect(retrieved):
+        async def aretrieve(query_bundle):
+            return retrieved
+        return aretrieve
+
+    retrievers_arguments = [
+        (mock_vector_store, mock_embed_model, [0.1, 0.2, 0.3], "ada--score"),
+        (mock_vector_store, mock_embed_model, "test query", "bm25--score")
+    ]
+    mock_input_object.rescoring_function = "mean"
+    results = {}
+    for mode in ["sequential", "concurrent"]:
+        mock_input_object.execution_mode = mode
+        mock_input_object.filters = {}
+        strategy = GenaiStrategy()
+        retrievers = [MagicMock(), MagicMock()]
+        for retriever, documents in zip(retrievers, [documents_ada, documents_bm25]):
+            documents = [NodeWithScore(node=TextNode(text=doc.text, metadata=dict(doc.metadata)), score=doc.score) for doc in documents]
+            retriever.retrieve.return_value = documents
+            retriever.aretrieve.side_effect = aretrieve_side_effect(documents)
+        strategy.get_retriever = MagicMock(side_effect=retrievers + [MagicMock(retrieve=MagicMock(return_value=[]),
+                                                                               aretrieve=AsyncMock(return_value=[]))] * 2)
+        result = strategy.do_retrieval_strategy(mock_input_object, retrievers_arguments)
+        results[mode] = [(doc.metadata['snippet_id'], doc.score) for doc in result]
+
+    assert results["sequential"] == results["concurrent"]
+
+
+def test_genai_strategy_concurrent_retrieval_timeout(mock_input_object, mock_vector_store, mock_embed_model):
+    async def slow_aretrieve(query_bundle):
+        await asyncio.sleep(1)
+        return documents_bm25
+
+    retrievers_arguments = [
+        (mock_vector_store, mock_embed_model, [0.1, 0.2, 0.3], "ada--score"),
+        (mock_vector_store, mock_embed_model, "test query", "bm25--score")
+    ]
+    mock_input_object.execution_mode = "concurrent"
+    mock_input_object.rescoring_function = "mean"
+    mock_input_object.filters = {}
+    strategy = GenaiStrategy()
+    strategy.retriever_timeout = 0.05
+    strategy.get_retriever = MagicMock(side_effect=[MagicMock(aretrieve=AsyncMock(return_value=documents_ada[:1])),
+                                                    MagicMock(aretrieve=slow_aretrieve)])
+
+    result = strategy.do_retrieval_strategy(mock_input_object, retrievers_arguments)
+
+    assert [doc.metadata['snippet_id'] for doc in result] == ["0"]
+    assert "bm25--score" not in result[0].metadata
+    assert strategy.timed_out_retrievers == ["bm25--score"]
+
+
+def test_genai_strategy_concurrent_retrieval_all_timeout(mock_input_object, mock_vector_store, mock_embed_model):
+    async def slow_aretrieve(query_bundle):
+        await asyncio.sleep(1)
+        return []
+
+    mock_input_object.execution_mode = "concurrent"
+    strategy = GenaiStrategy()
+    strategy.retriever_timeout = 0.01
+    strategy.get_retriever = MagicMock(return_value=MagicMock(aretrieve=slow_aretrieve))
+
+    with pytest.raises(PrintableGenaiError):
+        strategy.do_retrieval_strategy(mock_input_object, [(mock_vector_store, mock_embed_model, [0.1], "ada--score")])
+
+
+def get_hit(snippet_id, score):
+    node = TextNode(text=f"Text {snippet_id}", id_=snippet_id, metadata={"snippet_id": snippet_id})
+    return {"_id": snippet_id, "_score": score,
+            "_source": {"content": f"Text {snippet_id}", "metadata": node_to_metadata_dict(node, remove_text=True)}}
+
+
+def test_genai_strategy_msearch():
+    client = MagicMock()
+    client.options.return_value = client
+    client.msearch = AsyncMock(side_effect=[
+        {"responses": [{"hits": {"hits": [get_hit("s1", 8.0)]}}, {"hits": {"hits": [get_hit("s2", 0.9)]}}]},
+        {"responses": [{"hits": {"hits": [get_hit("s2", 0.0)]}}, {"hits": {"hits": [get_hit("s1", 0.7)]}}]}
+    ])
+    retrievers_arguments = [
+        (ElasticsearchStoreAdaption(index_name="test_ada", es_client=client, retrieval_strategy=AsyncBM25Strategy()),
+         MagicMock(), "query", "bm25--score"),
+        (ElasticsearchStoreAdaption(index_name="test_ada", es_client=client), MagicMock(), [0.1, 0.2], "ada--score")
+    ]
+    input_object = SimpleNamespace(query="query", filters={"filename": "a.pdf"}, top_k=1, rescoring_function="mean",
+                                   execution_mode="sequential", search_mode="msearch")
+
+    docs = GenaiStrategy().do_retrieval_strategy(input_object, retrievers_arguments)
+
+    # First retrieval and scores completion of both retrievers in two requests
+    assert client.msearch.call_count == 2
+    first_searches = client.msearch.call_args_list[0].kwargs['searches']
+    assert first_searches[0] == {"index": "test_ada"} and "match" in str(first_searches[1])
+    assert first_searches[3]["knn"]["query_vector"] == [0.1, 0.2] and first_searches[3]["size"] == 1
+    completion_searches = client.msearch.call_args_list[1].kwargs['searches']
+    assert "'metadata.snippet_id.keyword': 's2'" in str(completion_searches[1])
+    assert "'metadata.filename.keyword': 'a.pdf'" in str(completion_searches[1])
+    assert input_object.filters == {"filename": "a.pdf"}
+
+    assert [doc.metadata['snippet_id'] for doc in docs] == ["s1", "s2"]
+    assert docs[0].metadata["ada--score"] == 0.7
+    assert docs[1].metadata["bm25--score"] == 0.5  # expit(0)
+
+
+def test_genai_strategy_msearch_error():
+    client = MagicMock()
+    client.options.return_value = client
+    client.msearch = AsyncMock(return_value={"responses": [{"error": {"type": "index_not_found"}, "status": 404}]})
+    retrievers_arguments = [(ElasticsearchStoreAdaption(index_name="test_ada", es_client=client,
+                                                        retrieval_strategy=AsyncBM25Strategy()), MagicMock(), "query", "bm25--score")]
+    input_object = SimpleNamespace(query="query", filters={}, top_k=1, rescoring_function="mean",
+                                   execution_mode="sequential", search_mode="msearch")
+    with pytest.raises(PrintableGenaiError):
+        GenaiStrategy().do_retrieval_strategy(input_object, retrievers_arguments)
+
+
+def test_genai_strategy_msearch_not_elastic(mock_input_object, retrievers_arguments):
+    mock_input_object.search_mode = "msearch"
+    assert not GenaiStrategy.is_msearch(mock_input_object, retrievers_arguments)
+
+
 # Tests for GenaiRecursiveStrategy----------------------------
 def test_genai_recursive_strategy_recursive_retrieval(mock_embed_model):
     strategy = GenaiRecursiveStrategy(connector=MagicMock())
@@ -261,6 +389,22 @@ def test_genai_recursive_strategy_recursive_retrieval(mock_embed_model):
         )
         assert isinstance(result, list)
 
+def test_genai_recursive_retrieval_shared_nodes_not_changed(mock_embed_model):
+    strategy = GenaiRecursiveStrategy(connector=MagicMock())
+    shared_node = TextNode(text="Test", metadata={"filename": "test", "snippet_id": "0"})
+    with patch('llama_index.core.retrievers.RecursiveRetriever.retrieve') as mock_retriever, \
+        patch('retrieval_strategies.VectorStoreIndex'):
+        for score in [0.5, 0.8]:
+            mock_retriever.return_value = [NodeWithScore(node=shared_node, score=score)]
+            docs = {}
+            strategy.recursive_retrieval(embed_model=mock_embed_model, retriever_type="ada--score", top_k=1,
+                                         docs=docs, embed_query=None, query="test query", all_nodes_dict={},
+                                         all_nodes=[])
+            assert docs["0"].metadata["ada--score"] == score
+            assert docs["0"].node is not shared_node
+    assert "ada--score" not in shared_node.metadata
+
+
 def test_genai_recursive_do_retrieval_strategy():
     strategy = GenaiRecursiveStrategy(connector=get_connector())
     json_input = {
@@ -294,6 +438,40 @@ def test_genai_recursive_do_retrieval_strategy():
         result = strategy.do_retrieval_strategy(input_object=input_object, retrievers_arguments=retrievers_arguments)
 
 
+def test_genai_recursive_structure_cached():
+    connector = MagicMock()
+    connector.get_index_version.return_value = "v1"
+    node = TextNode(text="Test", embedding=[0.1, 0.2])
+    strategy = GenaiRecursiveStrategy(connector=connector, structures_cache=TTLCache(maxsize=10, max_weight=10**6))
+    strategy.get_all_nodes_parsed = MagicMock(return_value=({node.node_id: node}, [node]))
+    strategy.build_base_retriever = MagicMock(return_value="retriever")
+
+    for _ in range(2):
+        _, all_nodes, base_retriever = strategy.get_recursive_structure("index_ada", "ada--score", None, {"a": 1})
+        assert all_nodes == [node] and base_retriever == "retriever"
+    connector.get_full_index.assert_called_once()
+
+    # Different filters or a new version of the index (chunks indexed or deleted) rebuild the structure
+    strategy.get_recursive_structure("index_ada", "ada--score", None, {"a": 2})
+    connector.get_index_version.return_value = "v2"
+    strategy.get_recursive_structure("index_ada", "ada--score", None, {"a": 1})
+    assert connector.get_full_index.call_count == 3
+    assert strategy.build_base_retriever.call_count == 3
+
+
+def test_genai_recursive_structure_not_cached_without_version():
+    connector = MagicMock()
+    connector.get_index_version.return_value = None
+    strategy = GenaiRecursiveStrategy(connector=connector, structures_cache=TTLCache(maxsize=10))
+    strategy.get_all_nodes_parsed = MagicMock(return_value=({}, []))
+    strategy.build_base_retriever = MagicMock()
+
+    strategy.get_recursive_structure("index_ada", "ada--score", None, {})
+    strategy.get_recursive_structure("index_ada", "ada--score", None, {})
+    assert connector.get_full_index.call_count == 2
+    assert len(strategy.structures_cache) == 0
+
+
 
 # test for GenaiSurroundingStrategy-----------------------------------------
 
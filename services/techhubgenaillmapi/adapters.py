@@ -12,8 +12,6 @@ from PIL import Image
 from math import ceil
 
 # Installed imports
-import tiktoken
-from transformers import GPT2TokenizerFast
 import requests
 
 # Local imports
@@ -21,6 +19,7 @@ from common.services import GENAI_LLM_ADAPTERS
 from common.logging_handler import LoggerHandler
 from common.errors.genaierrors import PrintableGenaiError
 from common.utils import resize_image
+from tokenizer_registry import TokenizerRegistry
 
 
 class BaseAdapter(ABC):
@@ -35,8 +34,7 @@ class BaseAdapter(ABC):
         logger_handler = LoggerHandler(GENAI_LLM_ADAPTERS, level=os.environ.get('LOG_LEVEL', "INFO"))
         self.logger = logger_handler.logger
         self.message = message
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.encoding = TokenizerRegistry.get_tokenizer("gpt")
         self.max_img_size_mb = max_img_size_mb
         self.available_img_formats = ["JPEG", "PNG", "GIF", "WEBP"]
 
@@ -58,7 +56,7 @@ class BaseAdapter(ABC):
         """
         for message in messages:
             if isinstance(message['content'], str) and not message.get('n_tokens'):
-                message['n_tokens'] = len(self.encoding.encode(message['content']))
+                message['n_tokens'] = self.encoding.count(message['content'])
             elif isinstance(message['content'], list):
                 for item in message['content']:
                     if item['type'] in ["image_url", "image_b64"]:
@@ -75,7 +73,7 @@ class BaseAdapter(ABC):
         if text.get('n_tokens'):
             return
         else:
-            text['n_tokens'] = len(self.encoding.encode(text['text']))
+            text['n_tokens'] = self.encoding.count(text['text'])
 
 
     def _adapt_image(self, image_dict):
@@ -164,7 +162,7 @@ class GPT4VAdapter(BaseAdapter):
         """
         for message in messages:
             if isinstance(message['content'], str) and not message.get('n_tokens'):
-                message['n_tokens'] = len(self.encoding.encode(message['content']))
+                message['n_tokens'] = self.encoding.count(message['content'])
             elif isinstance(message['content'], list):
                 for item in message['content']:
                     if item['type'] in ["image_url", "image_b64"]:
@@ -181,7 +179,7 @@ class GPT4VAdapter(BaseAdapter):
         if text.get('n_tokens'):
             return
         else:
-            text['n_tokens'] = len(self.encoding.encode(text['text']))
+            text['n_tokens'] = self.encoding.count(text['text'])
 
 
     @staticmethod
@@ -261,7 +259,7 @@ class DalleAdapter(BaseAdapter):
         for message in messages:
             if not message.get('n_tokens'):
                 # Dalle is non-vision so it will be only text
-                message['n_tokens'] = len(self.encoding.encode(message['content']))
+                message['n_tokens'] = self.encoding.count(message['content'])
 
     @classmethod
     def is_adapter_type(cls, adapter_type: str):
@@ -282,7 +280,7 @@ class Claude3Adapter(BaseAdapter):
         :param message: Message like class
         """
         super().__init__(message, max_img_size_mb)
-        self.encoding = GPT2TokenizerFast.from_pretrained('Xenova/claude-tokenizer')
+        self.encoding = TokenizerRegistry.get_tokenizer("claude")
         self.message.substituted_query = self.message.preprocess()[-2:]
 
     def _adapt_messages(self, messages):
@@ -292,7 +290,7 @@ class Claude3Adapter(BaseAdapter):
         """
         for message in messages:
             if isinstance(message['content'], str) and not message.get('n_tokens'):
-                message['n_tokens'] = len(self.encoding.encode(message['content']))
+                message['n_tokens'] = self.encoding.count(message['content'])
             elif isinstance(message['content'], list):
                 for item in message['content']:
                     if item['type'] == "text":
@@ -308,7 +306,7 @@ class Claude3Adapter(BaseAdapter):
         if text.get('n_tokens'):
             return
         else:
-            text['n_tokens'] = len(self.encoding.encode(text['text']))
+            text['n_tokens'] = self.encoding.count(text['text'])
 
 
     @staticmethod
@@ -389,7 +387,7 @@ class NovaAdapter(BaseAdapter):
         """ Method to adapt text to nova-v format"""
         text.pop('type', None) # In nova no type param is needed
         if not text.get('n_tokens'):
-            text['n_tokens'] = len(self.encoding.encode(text['text']))
+            text['n_tokens'] = self.encoding.count(text['text'])
 
 
     @staticmethod
@@ -515,7 +513,7 @@ class GeminiAdapter(BaseAdapter):
         if isinstance(text, dict) and text.get('n_tokens'):
             return {"content": text['content'], "n_tokens": text['n_tokens']}
         else:
-            n_tokens = len(self.encoding.encode(text))
+            n_tokens = self.encoding.count(text)
             return {"content": text, "n_tokens": n_tokens}
 
     def _adapt_image(self, image_dict):
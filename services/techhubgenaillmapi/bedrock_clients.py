@@ -0,0 +1,122 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Installed imports
+import boto3
+from botocore.config import Config
+
+# Custom imports
+from common.logging_handler import LoggerHandler
+from common.services import GENAI_LLM_ENDPOINTS
+
+
+class BedrockClientCache(object):
+    """Process-wide cache of bedrock-runtime clients. Creating a client resolves the endpoint, looks up the
+    credentials and loads the botocore models, so every combination of region, credentials and configuration gets
+    a client that is reused between calls (botocore clients are thread-safe) and keeps its connections alive"""
+    SERVICE_NAME = "bedrock-runtime"
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_pool_connections: int = 10, retries: dict = None, max_clients: int = 32):
+        """
+        :param max_pool_connections: Maximum number of connections kept alive by every client
+        :param retries: Retry configuration of botocore ('mode' and 'max_attempts'), botocore default if not given
+        :param max_clients: Maximum number of clients cached, the least recently used is discarded
+        """
+        logger_handler = LoggerHandler(GENAI_LLM_ENDPOINTS, level=os.environ.get("LOG_LEVEL", "INFO"))
+        self.logger = logger_handler.logger
+
+        self.max_pool_connections = max_pool_connections
+        self.retries = retries
+        self.max_clients = max_clients
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "BedrockClientCache":
+        """Cache of the process, configured with the LLM_BEDROCK_* environment variables
+
+        :return: BedrockClientCache shared by all the platforms
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    retries = None
+                    if os.getenv("LLM_BEDROCK_RETRY_MODE") or os.getenv("LLM_BEDROCK_MAX_ATTEMPTS"):
+                        retries = {"mode": os.getenv("LLM_BEDROCK_RETRY_MODE", "legacy"),
+                                   "max_attempts": int(os.getenv("LLM_BEDROCK_MAX_ATTEMPTS", 1))}
+                    cls._instance = cls(
+                        max_pool_connections=int(os.getenv("LLM_BEDROCK_MAX_POOL_CONNECTIONS", 10)),
+                        retries=retries,
+                        max_clients=int(os.getenv("LLM_BEDROCK_MAX_CLIENTS", 32))
+                    )
+        return cls._instance
+
+    @staticmethod
+    def get_credentials_identity(credentials: dict = None) -> str:
+        """Identity of the credentials used in the key of the clients (the secrets are not kept in the key)
+
+        :param credentials: Arguments of the credentials of boto3.client (default credentials chain if not given)
+        :return: Hash of the credentials
+        """
+        if not credentials:
+            return "default"
+        values = "\n".join(f"{key}={credentials[key]}" for key in sorted(credentials))
+        return hashlib.sha256(values.encode()).hexdigest()
+
+    def get_key(self, region: str, timeout: int, credentials: dict = None) -> tuple:
+        """Key of the client of a region and credentials with the current configuration
+
+        :param region: Region of the model
+        :param timeout: Connect and read timeout of the requests
+        :param credentials: Arguments of the credentials of boto3.client
+        :return: Key of the client
+        """
+        retries = tuple(sorted(self.retries.items())) if self.retries else None
+        return region, self.get_credentials_identity(credentials), retries, timeout, self.max_pool_connections
+
+    def get_client(self, region: str, timeout: int, credentials: dict = None):
+        """Get the bedrock-runtime client of a region and credentials, created the first time it is used
+
+        :param region: Region of the model
+        :param timeout: Connect and read timeout of the requests
+        :param credentials: Arguments of the credentials of boto3.client (aws_access_key_id, aws_secret_access_key
+            and aws_session_token), default credentials chain if not given
+        :return: Bedrock runtime client
+        """
+        key = self.get_key(region, timeout, credentials)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is not None:
+                self.clients.move_to_end(key)
+                return client
+
+            # Created inside the lock, the default session of boto3 is not thread-safe
+            config = Config(
+                read_timeout=timeout,
+                connect_timeout=timeout,
+                region_name=region,
+                max_pool_connections=self.max_pool_connections,
+                retries=self.retries
+            )
+            client = boto3.client(service_name=self.SERVICE_NAME, config=config, **(credentials or {}))
+            self.clients[key] = client
+            self.logger.debug(f"Bedrock client created for region {region}")
+            if len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+            return client
+
+    def clear(self):
+        """Discard all the clients (the next calls create new ones)"""
+        with self.lock:
+            self.clients.clear()
+
+    def __len__(self) -> int:
+        return len(self.clients)
@@ -0,0 +1,112 @@
+### This code is property of the GGAO ###
+"""Benchmark of the per-call overhead of the bedrock-runtime client: a new boto3 client in every call (previous
+behaviour of BedrockPlatform) vs the clients cached by BedrockClientCache.
+
+botocore is stubbed in the 'before-send' event, so the requests are built, signed and parsed but never sent: the time
+measured is the one spent by boto3 (endpoint resolution, credentials, models loading...). The savings of reusing the
+connections (DNS, TCP and TLS setup to the Bedrock endpoint) are on top of this.
+
+Usage (from the service folder): python benchmarks/benchmark_bedrock_clients.py [--calls 200] [--threads 1 8]
+"""
+
+
+# Native imports
+import io
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', "WARNING")
+
+# Installed imports
+import boto3
+from botocore.config import Config
+from botocore.awsrequest import AWSResponse
+
+# Custom imports
+from bedrock_clients import BedrockClientCache
+
+
+REGION = "us-east-1"
+TIMEOUT = 30
+MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+CREDENTIALS = {"aws_access_key_id": "AKIABENCHMARK", "aws_secret_access_key": "benchmark"}
+DATA_CALL = json.dumps({"anthropic_version": "bedrock-2023-05-31", "max_tokens": 1000,
+                        "messages": [{"role": "user", "content": "What is NTT Data?"}]})
+ANSWER = json.dumps({"content": [{"type": "text", "text": "NTT Data is a global IT services company."}],
+                     "stop_reason": "end_turn", "usage": {"input_tokens": 12, "output_tokens": 10}}).encode()
+
+
+class FakeRawResponse(io.BytesIO):
+    """Raw http response of botocore (read by the streaming body, streamed by the rest)"""
+
+    def stream(self, **kwargs):
+        yield self.getvalue()
+
+
+def fake_send(request, **kwargs) -> AWSResponse:
+    """Answer of the stubbed bedrock endpoint (returning a response in 'before-send' skips the http request)"""
+    return AWSResponse(request.url, 200, {"content-type": "application/json"}, FakeRawResponse(ANSWER))
+
+
+def new_client():
+    """Client created in every call, as BedrockPlatform did before the cache"""
+    config = Config(read_timeout=TIMEOUT, connect_timeout=TIMEOUT, region_name=REGION)
+    return boto3.client(service_name="bedrock-runtime", config=config, **CREDENTIALS)
+
+
+def call(get_client) -> float:
+    """Time of a call to invoke_model, getting the client included"""
+    start = time.perf_counter()
+    answer = get_client().invoke_model(body=DATA_CALL, modelId=MODEL_ID)
+    json.loads(answer["body"].read())
+    return time.perf_counter() - start
+
+
+def run(get_client, calls: int, threads: int) -> dict:
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        times = sorted(executor.map(lambda _: call(get_client), range(calls)))
+        total = time.perf_counter() - start
+    return {"seconds": total, "mean_ms": sum(times) / len(times) * 1000, "p50_ms": times[len(times) // 2] * 1000,
+            "p99_ms": times[min(int(len(times) * 0.99), len(times) - 1)] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="Calls by mode and number of threads")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="Concurrent calls")
+    args = parser.parse_args()
+
+    boto3.setup_default_session()
+    boto3.DEFAULT_SESSION.events.register("before-send.bedrock-runtime", fake_send)
+    cache = BedrockClientCache()
+    modes = {
+        "new client": new_client,
+        "cached client": lambda: cache.get_client(REGION, TIMEOUT, dict(CREDENTIALS))
+    }
+
+    # The first client of the process loads the botocore models, measured apart
+    start = time.perf_counter()
+    new_client()
+    print(f"First client of the process: {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    print(f"{'mode':<15}{'threads':>8}{'calls':>7}{'seconds':>9}{'calls/s':>9}{'mean ms':>9}{'p50 ms':>8}{'p99 ms':>8}")
+    for threads in args.threads:
+        results = {}
+        for mode, get_client in modes.items():
+            result = run(get_client, args.calls, threads)
+            results[mode] = result
+            print(f"{mode:<15}{threads:>8}{args.calls:>7}{result['seconds']:>9.2f}"
+                  f"{args.calls / result['seconds']:>9.1f}{result['mean_ms']:>9.2f}{result['p50_ms']:>8.2f}"
+                  f"{result['p99_ms']:>8.2f}")
+        overhead = results["new client"]["mean_ms"] - results["cached client"]["mean_ms"]
+        print(f"{'':<15}{'':>8}  overhead of a new client by call: {overhead:.2f} ms\n")
+
+
+if __name__ == "__main__":
+    main()
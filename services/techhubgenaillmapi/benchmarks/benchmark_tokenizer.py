@@ -0,0 +1,82 @@
+### This code is property of the GGAO ###
+"""Benchmark of the token handling of the LLM API: truncation of a long context by encoding it entirely (previous
+behaviour of the query limiters) vs Tokenizer.truncate, and counting the tokens of a repeated prompt with and without
+the cache of the Tokenizer.
+
+The context is a synthetic text of about --context-tokens tokens (100k by default) mixing english, spanish and
+japanese, and the results of both truncations are checked to be the same.
+
+Usage (from the service folder): python benchmarks/benchmark_tokenizer.py [--context-tokens 100000] [--limits 1000 8000 32000] [--repeats 20]
+"""
+
+
+# Native imports
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', "WARNING")
+
+# Custom imports
+from tokenizer_registry import Tokenizer, TokenizerRegistry
+
+
+PARAGRAPHS = [
+    "NTT Data is a global IT services company headquartered in Tokyo, with offices in more than fifty countries. ",
+    "El Real Zaragoza nunca ha ganado la liga, pero ha ganado la Copa del Rey seis veces y una Recopa de Europa. ",
+    "レアル・サラゴサはリーグ優勝したことがないが、国王杯を6回制している。",
+    "def limit_tokens(context: str, max_tokens: int) -> str:\n    return context[:max_tokens * 4]\n"
+]
+
+
+def build_context(tokenizer: Tokenizer, n_tokens: int) -> str:
+    """Text with at least n_tokens tokens"""
+    block = "".join(PARAGRAPHS)
+    block_tokens = len(tokenizer.encode(block))
+    return block * (n_tokens // block_tokens + 1)
+
+
+def full_truncate(tokenizer: Tokenizer, text: str, max_tokens: int) -> str:
+    """Truncation encoding the whole text, as the query limiters did before"""
+    return tokenizer.decode(tokenizer.encode(text)[:max_tokens])
+
+
+def timeit(function, repeats: int) -> float:
+    """Mean milliseconds of a call"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--context-tokens", type=int, default=100000, help="Tokens of the context")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1000, 8000, 32000], help="Tokens to truncate to")
+    parser.add_argument("--repeats", type=int, default=20, help="Calls by measure")
+    args = parser.parse_args()
+
+    tokenizer = TokenizerRegistry.get_tokenizer("gpt")
+    context = build_context(tokenizer, args.context_tokens)
+    print(f"Context: {len(context)} characters, {len(tokenizer.encode(context))} tokens\n")
+
+    print(f"{'limit':>8}{'full encode ms':>16}{'truncate ms':>13}{'speedup':>9}")
+    for limit in args.limits:
+        assert tokenizer.truncate(context, limit) == full_truncate(tokenizer, context, limit)
+        full_ms = timeit(lambda: full_truncate(tokenizer, context, limit), args.repeats)
+        truncate_ms = timeit(lambda: tokenizer.truncate(context, limit), args.repeats)
+        print(f"{limit:>8}{full_ms:>16.2f}{truncate_ms:>13.2f}{full_ms / truncate_ms:>8.1f}x")
+
+    # The same long prompt counted in every call (system prompt, template or persistence)
+    print(f"\n{'count':<10}{'ms by call':>12}")
+    no_cache = Tokenizer("gpt", tokenizer.encoding, cache_size=0)
+    cached = Tokenizer("gpt", tokenizer.encoding)
+    for name, counter in [("no cache", no_cache), ("cache", cached)]:
+        print(f"{name:<10}{timeit(lambda: counter.count(context), args.repeats):>12.3f}")
+    print(f"\nCache: {cached.get_cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
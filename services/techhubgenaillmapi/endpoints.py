@@ -3,20 +3,21 @@
 
 # Native imports
 import os
+import json
 import time
 import requests
-from typing import List
+from typing import List, Iterator, Generator
 from string import Template
 from abc import ABC, abstractmethod
 
 # Installed imports
-import boto3
 import botocore
-from botocore.config import Config
 import urllib3
 
 # Custom imports
 from generatives import GenerativeModel
+from http_pool import HTTPSessionPool
+from bedrock_clients import BedrockClientCache
 from common.logging_handler import LoggerHandler
 from common.genai_controllers import provider
 from common.services import GENAI_LLM_ENDPOINTS
@@ -33,8 +34,30 @@ NOT_GENERATIVE_MODEL_PARAM = (
 ISE = "Internal server error"
 
 
+def iter_sse_data(answer: requests.Response) -> Iterator[dict]:
+    """Iterate over the json payloads of the data lines of a server-sent events response
+
+    :param answer: Streamed response of the endpoint
+    :return: Iterator of the payloads (until the '[DONE]' one)
+    """
+    # Decoded here, requests uses latin-1 for text/event-stream without charset
+    try:
+        for line in answer.iter_lines():
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            yield json.loads(data)
+    finally:
+        # Gives the connection back to the pool
+        answer.close()
+
+
 class Platform(ABC):
     MODEL_FORMAT = "Platform"
+    STREAMING = False
 
     def __init__(
         self,
@@ -60,7 +83,10 @@ class Platform(ABC):
         self.url = None
         self.headers = None
         self.timeout = timeout
+        self.session_pool = HTTPSessionPool.get_instance()
         self.num_retries = num_retries
+        # Chunks received in the last stream, to report the usage when it is interrupted
+        self.stream_chunks = []
 
         self.aws_credentials = aws_credentials
         self.models_urls = models_urls
@@ -78,6 +104,35 @@ class Platform(ABC):
     def call_model(self, delta=0) -> dict:
         """Method to send the query to the endpoint"""
 
+    def call_model_stream(self, delta=0) -> Generator[str, None, dict]:
+        """Method to send the query to the endpoint and relay the answer while it is generated
+
+        :param delta: Number of retries
+        :return: Generator of the text generated, returns the endpoint response (same format as call_model)
+        """
+        raise PrintableGenaiError(400, f"Streaming not supported in platform {self.MODEL_FORMAT}")
+
+    def relay_stream(self, chunks: Iterator[dict]) -> Generator[str, None, dict]:
+        """Relay the text of the chunks of the stream as they arrive
+
+        :param chunks: Iterator of the chunks of the stream
+        :return: Generator of the text generated, returns the endpoint response built with all the chunks
+        """
+        received = self.stream_chunks = []
+        for chunk in chunks:
+            if "error" in chunk:
+                # The stream has already started, so the status of the response is 200
+                self.logger.warning(f"Error in stream: {chunk}")
+                error = chunk["error"]
+                message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                return {"error": chunk, "msg": message, "status_code": 500}
+            received.append(chunk)
+            text = self.generative_model.get_stream_delta(chunk)
+            if text:
+                yield text
+        self.logger.info(f"Stream finished with {len(received)} chunks.")
+        return self.parse_response(self.generative_model.get_stream_response(received))
+
     @abstractmethod
     def set_model(self, generative_model: GenerativeModel):
         """Set the model and configure urls.
@@ -94,6 +149,7 @@ class Platform(ABC):
 
 class GPTPlatform(Platform):
     MODEL_FORMAT = "GPTPlatform"
+    STREAMING = True
 
     def __init__(
         self,
@@ -152,7 +208,7 @@ class GPTPlatform(Platform):
                 f"Calling {self.MODEL_FORMAT} service with data {data_call}"
             )
 
-            answer = requests.post(
+            answer = self.session_pool.post(
                 url=self.url, headers=self.headers, data=data_call, timeout=self.timeout
             )
 
@@ -214,6 +270,80 @@ class GPTPlatform(Platform):
             except Exception:
                 return {"error": ISE, "msg": ISE, "status_code": 500}
 
+    def call_model_stream(self, delta=0) -> Generator[str, None, dict]:
+        """Method to send the query to the endpoint and relay the answer while it is generated
+
+        :param delta: Number of retries
+        :return: Generator of the text generated, returns the endpoint response (same format as call_model)
+        """
+        try:
+            data_call = json.loads(self.generative_model.parse_data())
+            # The usage is sent in the last chunk
+            data_call.update(stream=True, stream_options={"include_usage": True})
+            self.logger.debug(
+                f"Calling {self.MODEL_FORMAT} service in streaming with data {data_call}"
+            )
+
+            answer = self.session_pool.post(
+                url=self.url, headers=self.headers, data=json.dumps(data_call), timeout=self.timeout, stream=True
+            )
+
+            if delta < self.num_retries:
+                if answer.status_code == 429:
+                    self.logger.warning(
+                        f"OpenAI rate limit exceeded, retrying, try {delta + 1}/{self.num_retries}"
+                    )
+                    raise ConnectionError("OpenAI rate limit exceeded")
+
+                if answer.status_code == 500 and ISE in answer.text:
+                    self.logger.warning(
+                        f"Internal server error, retrying, try {delta + 1}/{self.num_retries}"
+                    )
+                    raise ConnectionError(ISE)
+
+            if answer.status_code != 200:
+                self.logger.warning(f"Error: {answer.text}")
+                return {
+                    "error": answer.text,
+                    "msg": str(answer.text),
+                    "status_code": answer.status_code,
+                }
+
+            return (yield from self.relay_stream(iter_sse_data(answer)))
+
+        except requests.exceptions.Timeout:
+            self.logger.error(REQUEST_TIMED_OUT_MSG)
+            if delta < self.num_retries:
+                self.logger.warning(
+                    f"Timeout, retrying, try {delta + 1}/{self.num_retries}"
+                )
+                try:
+                    self.set_model_retry()
+                    time.sleep(5)
+                except Exception:
+                    return {
+                        "error": REQUEST_TIMED_OUT_MSG,
+                        "msg": REQUEST_TIMED_OUT_MSG,
+                        "status_code": 408,
+                    }
+                return (yield from self.call_model_stream(delta + 1))
+            else:
+                return {
+                    "error": REQUEST_TIMED_OUT_MSG,
+                    "msg": REQUEST_TIMED_OUT_MSG,
+                    "status_code": 408,
+                }
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"LLM response: {str(e)}.")
+            return {"error": e, "msg": str(e), "status_code": 500}
+        except ConnectionError:
+            try:
+                self.set_model_retry()
+                time.sleep(5)
+            except Exception:
+                return {"error": ISE, "msg": ISE, "status_code": 500}
+            return (yield from self.call_model_stream(delta + 1))
+
 
 class OpenAIPlatform(GPTPlatform):
     MODEL_FORMAT = "openai"
@@ -411,6 +541,7 @@ class AzurePlatform(GPTPlatform):
 
 class BedrockPlatform(Platform):
     MODEL_FORMAT = "bedrock"
+    STREAMING = True
 
     def __init__(
         self,
@@ -429,6 +560,7 @@ class BedrockPlatform(Platform):
         super().__init__(
             aws_credentials, models_urls, timeout, num_retries, models_config_manager
         )
+        self.bedrock_clients = BedrockClientCache.get_instance()
 
     def set_model_retry(self):
         """Set the model and configure urls when a retry has to be done."""
@@ -476,6 +608,18 @@ class BedrockPlatform(Platform):
         self.logger.debug(SETTING_MODEL_MSG)
         super().set_model(generative_model)
 
+    def get_client(self):
+        """Get the bedrock runtime client of the zone of the model (cached by the process)"""
+        credentials = None
+        if provider == "azure":
+            credentials = {
+                "aws_access_key_id": self.aws_credentials["access_key"],
+                "aws_secret_access_key": self.aws_credentials["secret_key"],
+            }
+            if os.getenv("TESTING", False):
+                credentials["aws_session_token"] = self.aws_credentials["token_id"]
+        return self.bedrock_clients.get_client(self.generative_model.zone, self.timeout, credentials)
+
     def call_model(self, delta=0) -> dict:
         """Method to send the query to the endpoint
 
@@ -493,29 +637,7 @@ class BedrockPlatform(Platform):
             self.logger.info(
                 f"Calling {self.MODEL_FORMAT} service with data {data_call}"
             )
-            config = Config(
-                read_timeout=self.timeout,
-                connect_timeout=self.timeout,
-                region_name=self.generative_model.zone,
-            )
-            if provider == "azure":
-                if os.getenv("TESTING", False):
-                    bedrock = boto3.client(
-                        service_name="bedrock-runtime",
-                        aws_access_key_id=self.aws_credentials["access_key"],
-                        aws_secret_access_key=self.aws_credentials["secret_key"],
-                        aws_session_token=self.aws_credentials["token_id"],
-                        config=config,
-                    )
-                else:
-                    bedrock = boto3.client(
-                        service_name="bedrock-runtime",
-                        aws_access_key_id=self.aws_credentials["access_key"],
-                        aws_secret_access_key=self.aws_credentials["secret_key"],
-                        config=config,
-                    )
-            else:
-                bedrock = boto3.client(service_name="bedrock-runtime", config=config)
+            bedrock = self.get_client()
             answer = bedrock.invoke_model(
                 body=data_call, modelId=self.generative_model.model_id
             )
@@ -561,9 +683,60 @@ class BedrockPlatform(Platform):
             except Exception:
                 return {"error": ISE, "msg": ISE, "status_code": 500}
 
+    @staticmethod
+    def iter_chunks(event_stream) -> Iterator[dict]:
+        """Iterate over the json chunks of the event stream of invoke_model_with_response_stream
+
+        :param event_stream: Body of the response
+        :return: Iterator of the chunks (an error chunk if the stream sends an exception)
+        """
+        for event in event_stream:
+            if "chunk" in event:
+                yield json.loads(event["chunk"]["bytes"])
+            else:
+                # Modeled exceptions of the stream (modelStreamErrorException, throttlingException...)
+                yield {"error": event}
+
+    def call_model_stream(self, delta=0) -> Generator[str, None, dict]:
+        """Method to send the query to the endpoint and relay the answer while it is generated
+
+        :param delta: Number of retries
+        :return: Generator of the text generated, returns the endpoint response (same format as call_model)
+        """
+        try:
+            if delta > self.num_retries:
+                return {
+                    "error": "Max retries reached",
+                    "msg": "Max retries reached",
+                    "status_code": 500,
+                }
+            data_call = self.generative_model.parse_data()
+            self.logger.info(
+                f"Calling {self.MODEL_FORMAT} service in streaming with data {data_call}"
+            )
+            bedrock = self.get_client()
+            answer = bedrock.invoke_model_with_response_stream(
+                body=data_call, modelId=self.generative_model.model_id
+            )
+            return (yield from self.relay_stream(self.iter_chunks(answer["body"])))
+
+        except urllib3.exceptions.ReadTimeoutError:
+            self.logger.error(REQUEST_TIMED_OUT_MSG)
+            return {
+                "error": REQUEST_TIMED_OUT_MSG,
+                "msg": REQUEST_TIMED_OUT_MSG,
+                "status_code": 408,
+            }
+        except botocore.exceptions.ClientError as error:
+            self.logger.error(f"Error calling botocore: {error}")
+            message = error.response["Error"]["Message"]
+            status_code = error.response["ResponseMetadata"]["HTTPStatusCode"]
+            return {"error": error, "msg": message, "status_code": status_code}
+
 
 class VertexPlatform(Platform):
     MODEL_FORMAT = "vertex"
+    STREAMING = True
 
     def __init__(
             self,
@@ -696,7 +869,7 @@ class VertexPlatform(Platform):
                 f"Calling {self.MODEL_FORMAT} service with data {data_call}"
             )
 
-            answer = requests.post(
+            answer = self.session_pool.post(
                 url=self.url, headers=self.headers, data=data_call, timeout=self.timeout
             )
             self.logger.info(f"LLM response: {answer}.")
@@ -737,6 +910,81 @@ class VertexPlatform(Platform):
             except Exception:
                 return {"error": ISE, "msg": ISE, "status_code": 500}
 
+    def build_stream_url(self) -> str:
+        """Build the url of the streaming method (server-sent events) from the one of the model
+
+        :return: Url to make the streaming request
+        """
+        url = self.url.replace(":generateContent", ":streamGenerateContent")
+        return url + ("&" if "?" in url else "?") + "alt=sse"
+
+    def call_model_stream(self, delta=0) -> Generator[str, None, dict]:
+        """Method to send the query to the endpoint and relay the answer while it is generated
+
+        :param delta: Number of retries
+        :return: Generator of the text generated, returns the endpoint response (same format as call_model)
+        """
+        started = False
+        try:
+            data_call = self.generative_model.parse_data()
+            self.logger.info(
+                f"Calling {self.MODEL_FORMAT} service in streaming with data {data_call}"
+            )
+
+            answer = self.session_pool.post(
+                url=self.build_stream_url(), headers=self.headers, data=data_call, timeout=self.timeout, stream=True
+            )
+            if delta < self.num_retries and (answer.status_code == 429 or answer.status_code >= 500):
+                self.logger.warning(
+                    f"Error {answer.status_code} before the stream started, retrying, try {delta + 1}/{self.num_retries}"
+                )
+                answer.close()
+                raise ConnectionError(f"Error {answer.status_code}")
+
+            if answer.status_code != 200:
+                self.logger.warning(f"Error: {answer.text}")
+                try:
+                    return self.parse_response(answer.json())
+                except ValueError:
+                    return {"error": answer.text, "msg": answer.text, "status_code": answer.status_code}
+
+            started = True
+            return (yield from self.relay_stream(iter_sse_data(answer)))
+
+        except requests.exceptions.Timeout:
+            self.logger.error(REQUEST_TIMED_OUT_MSG)
+            # Once the text is being relayed, the stream can not be started again
+            if delta < self.num_retries and not started:
+                self.logger.warning(
+                    f"Timeout, retrying, try {delta + 1}/{self.num_retries}"
+                )
+                try:
+                    self.set_model_retry()
+                    time.sleep(5)
+                except Exception:
+                    return {
+                        "error": REQUEST_TIMED_OUT_MSG,
+                        "msg": REQUEST_TIMED_OUT_MSG,
+                        "status_code": 408,
+                    }
+                return (yield from self.call_model_stream(delta + 1))
+            else:
+                return {
+                    "error": REQUEST_TIMED_OUT_MSG,
+                    "msg": REQUEST_TIMED_OUT_MSG,
+                    "status_code": 408,
+                }
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"LLM response: {str(e)}.")
+            return {"error": e, "msg": str(e), "status_code": 500}
+        except ConnectionError:
+            try:
+                self.set_model_retry()
+                time.sleep(5)
+            except Exception:
+                return {"error": ISE, "msg": ISE, "status_code": 500}
+            return (yield from self.call_model_stream(delta + 1))
+
 class TsuzumiPlatform(Platform):
     MODEL_FORMAT = "tsuzumi"
 
@@ -789,7 +1037,7 @@ class TsuzumiPlatform(Platform):
                 f"Calling {self.MODEL_FORMAT} service with data {data_call}"
             )
 
-            answer = requests.post(
+            answer = self.session_pool.post(
                 url=self.url, headers=self.headers, data=data_call, timeout=self.timeout
             )
 
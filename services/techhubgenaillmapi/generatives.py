@@ -38,6 +38,7 @@ class GenerativeModel(ABC):
     DEFAULT_TEMPLATE_NAME = "system_query"
     GENERATIVE_MODELS = None
     MODEL_QUERY_LIMITER = None
+    STREAMING = False
 
     def __init__(self, models_credentials, zone):
         """It is the object in charge of modifying whether the inputs and the outputs of the gpt models
@@ -81,6 +82,22 @@ class GenerativeModel(ABC):
         :return: Dict with the answer, tokens used and logprobs.
         """
 
+    def get_stream_delta(self, chunk: dict) -> str:
+        """ Method to get the text generated in a chunk of the stream of the endpoint.
+
+        :param chunk: Dict with a chunk of the stream.
+        :return: Text of the chunk (empty if it has no text).
+        """
+        raise PrintableGenaiError(400, f"Streaming not supported for model {self.model_name}")
+
+    def get_stream_response(self, chunks: List[dict]) -> dict:
+        """ Method to join the chunks of the stream of the endpoint.
+
+        :param chunks: List with all the chunks of the stream.
+        :return: Dict with the same format as the response without streaming (the one formatted by get_result).
+        """
+        raise PrintableGenaiError(400, f"Streaming not supported for model {self.model_name}")
+
     @classmethod
     def get_message_type(cls, message_type: str):
         """Check if the model_type is one of the possible ones.
@@ -0,0 +1,135 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import os
+import time
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+# Installed imports
+import requests
+from requests.adapters import HTTPAdapter
+
+# Custom imports
+from common.logging_handler import LoggerHandler
+from common.services import GENAI_LLM_ENDPOINTS
+
+
+class HTTPSessionPool(object):
+    """Process-wide pool of keep-alive connections for the calls to the HTTP platforms (Azure, OpenAI, Vertex,
+    tsuzumi). Every base url (scheme and host) gets its own HTTPAdapter, so the connections to an endpoint are reused
+    between calls instead of paying DNS, TCP and TLS setup in each one"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False):
+        """
+        :param pool_connections: Number of hosts whose connections are cached by every adapter
+        :param pool_maxsize: Maximum number of connections kept alive by base url
+        :param pool_block: Wait for a free connection when the pool of a base url is full (if not, an extra
+            connection is opened and discarded after the request)
+        """
+        logger_handler = LoggerHandler(GENAI_LLM_ENDPOINTS, level=os.environ.get("LOG_LEVEL", "INFO"))
+        self.logger = logger_handler.logger
+
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+
+        self.session = requests.Session()
+        # Shared by all the calls of the process (different api keys and tenants), so no cookie is kept
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.adapters = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "HTTPSessionPool":
+        """Pool of the process, configured with the LLM_HTTP_POOL_* environment variables
+
+        :return: HTTPSessionPool shared by all the platforms
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        pool_connections=int(os.getenv("LLM_HTTP_POOL_CONNECTIONS", 10)),
+                        pool_maxsize=int(os.getenv("LLM_HTTP_POOL_MAXSIZE", 10)),
+                        pool_block=eval(os.getenv("LLM_HTTP_POOL_BLOCK", "False"))
+                    )
+        return cls._instance
+
+    @staticmethod
+    def get_base_url(url: str) -> str:
+        """Scheme and host of an url, the key of its adapter and metrics
+
+        :param url: Url of the request
+        :return: Base url
+        """
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}/"
+
+    def get_adapter(self, base_url: str) -> HTTPAdapter:
+        """Adapter of a base url, mounted in the session the first time it is used
+
+        :param base_url: Base url of the endpoint
+        :return: Adapter of the endpoint
+        """
+        adapter = self.adapters.get(base_url)
+        if adapter is None:
+            with self.lock:
+                adapter = self.adapters.get(base_url)
+                if adapter is None:
+                    adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                                          pool_block=self.pool_block)
+                    self.session.mount(base_url, adapter)
+                    self.metrics[base_url] = {"requests": 0, "errors": 0, "seconds": 0.0}
+                    self.adapters[base_url] = adapter
+                    self.logger.debug(f"Connection pool created for {base_url}")
+        return adapter
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request through the pooled connections of its endpoint
+
+        :param url: Url of the request
+        :param kwargs: Arguments of requests.post (headers, data, timeout, stream...)
+        :return: Response of the endpoint
+        """
+        base_url = self.get_base_url(url)
+        self.get_adapter(base_url)
+        start = time.perf_counter()
+        error = False
+        try:
+            return self.session.post(url=url, **kwargs)
+        except requests.exceptions.RequestException:
+            error = True
+            raise
+        finally:
+            # With stream=True it is the time until the headers are received
+            seconds = time.perf_counter() - start
+            with self.lock:
+                metrics = self.metrics[base_url]
+                metrics["requests"] += 1
+                metrics["errors"] += error
+                metrics["seconds"] += seconds
+
+    def get_metrics(self) -> dict:
+        """Connection metrics of every endpoint called by the process
+
+        :return: Dict with the requests, errors, connections opened and reused and average time by base url
+        """
+        metrics = {}
+        with self.lock:
+            for base_url, adapter in self.adapters.items():
+                endpoint = dict(self.metrics[base_url])
+                # urllib3 counts the connections opened by the pools of the adapter (the proxy ones are not counted)
+                pools = [adapter.poolmanager.pools[key] for key in adapter.poolmanager.pools.keys()]
+                opened = sum(pool.num_connections for pool in pools)
+                endpoint["connections_opened"] = opened
+                endpoint["connections_reused"] = max(endpoint["requests"] - opened, 0)
+                endpoint["idle_connections"] = sum(conn is not None for pool in pools for conn in list(pool.pool.queue))
+                endpoint["avg_seconds"] = endpoint["seconds"] / endpoint["requests"] if endpoint["requests"] else 0.0
+                metrics[base_url] = endpoint
+        return metrics
@@ -209,6 +209,7 @@ class LLMMetadata(BaseModel):
     default_model: Optional[str] = None
     tools: Optional[list] = None
     show_token_details: Optional[bool] = False
+    stream: Optional[bool] = False
 
     class Config:
         extra = 'forbid' # To not allow extra fields in the object
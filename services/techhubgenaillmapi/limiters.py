@@ -6,12 +6,9 @@ import os
 from typing import List
 from abc import ABC
 
-# Installed imports
-import tiktoken
-from transformers import GPT2TokenizerFast
-
 # Local imports
 from messages import Message
+from tokenizer_registry import TokenizerRegistry
 from common.services import GENAI_LLM_LIMITERS
 from common.logging_handler import LoggerHandler
 from common.errors.genaierrors import PrintableGenaiError
@@ -39,8 +36,7 @@ class QueryLimiter(ABC):
         self.num_images = 0
         self.max_images = 10
 
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.encoding = TokenizerRegistry.get_tokenizer("gpt")
 
         logger_handler = LoggerHandler(GENAI_LLM_LIMITERS, level=os.environ.get('LOG_LEVEL', "INFO"))
         self.logger = logger_handler.logger
@@ -86,8 +82,7 @@ class QueryLimiter(ABC):
         :return: Message object with the reduced length.
         """
         if delta_token - self.MARGIN > 0:
-            encoded_input = self.encoding.encode(message.context)
-            message.context = self.encoding.decode(encoded_input[:delta_token - self.MARGIN])
+            message.context = self.encoding.truncate(message.context, delta_token - self.MARGIN)
             self.logger.debug(f"Context has been limited to {delta_token - self.MARGIN} tokens")
         else:
             message.context = ""
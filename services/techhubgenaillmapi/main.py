@@ -5,10 +5,10 @@
 import os
 import json
 import glob
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Generator, Union
 
 # Installed imports
-from flask import Flask, request
+from flask import Flask, Response, request, stream_with_context
 from pydantic import ValidationError
 
 # Local imports
@@ -26,6 +26,8 @@ from common.utils import load_secrets, get_error_word_from_exception
 from common.errors.genaierrors import PrintableGenaiError
 from common.models_manager import ManagerModelsConfig
 from endpoints import ManagerPlatform, Platform
+from http_pool import HTTPSessionPool
+from template_cache import TemplateCache
 from generatives import GenerativeModel
 from models.managergeneratives import ManagerModel
 from common.storage_manager import ManagerStorage
@@ -57,6 +59,9 @@ class LLMDeployment(BaseDeployment):
         self.storage_manager = ManagerStorage.get_file_storage(
             {"type": "LLMStorage", "workspace": self.workspace, "origin": self.origin}
         )
+        self.template_cache = TemplateCache(
+            self.storage_manager, ttl=float(os.getenv("LLM_TEMPLATE_CACHE_TTL", 60))
+        )
         self.available_pools = self.storage_manager.get_available_pools()
         self.available_models = self.storage_manager.get_available_models()
         self.default_models = self.storage_manager.get_default_models()
@@ -76,6 +81,8 @@ class LLMDeployment(BaseDeployment):
             set(model.DEFAULT_TEMPLATE_NAME for model in ManagerModel.MODEL_TYPES)
         )
         self.storage_manager.move_templates_to_langfuse("llm_template")
+        if eval(os.getenv("LLM_TEMPLATE_CACHE_WARMUP", "False")):
+            self.template_cache.warm_up()
         self.default_templates = self.load_default_templates(default_templates_names)
         if len(default_templates_names) != len(self.default_templates):
             raise PrintableGenaiError(400, f"Default templates not found: {default_templates_names}")
@@ -121,7 +128,7 @@ class LLMDeployment(BaseDeployment):
     def load_default_templates(self, default_templates_names: list):
         templates = {}
         for template_name in default_templates_names:
-            template = self.storage_manager.get_template(template_name)
+            template = self.template_cache.get_template(template_name)
             names = list(template.keys())
             names.sort(key=len)
             base_name = names[0]
@@ -156,7 +163,7 @@ class LLMDeployment(BaseDeployment):
             if lang:
                 template_name = f"{template_name_no_lang}_{lang}"
 
-            templates = self.storage_manager.get_template(template_name_no_lang)
+            templates = self.template_cache.get_template(template_name_no_lang)
 
             if template_name in templates:
                 return template_name, templates[template_name]
@@ -193,6 +200,8 @@ class LLMDeployment(BaseDeployment):
         )
         show_token_details =parsed_llm_metadata.get('show_token_details', False)
         parsed_llm_metadata.pop('show_token_details')
+        # Already used in /predict to choose between the streaming and the complete response
+        parsed_llm_metadata.pop('stream', None)
 
         parsed_llm_metadata["models_credentials"] = self.models_credentials.get(
             "api-keys"
@@ -305,83 +314,82 @@ class LLMDeployment(BaseDeployment):
             "status_code": 400,
         }
 
-    def process(self, json_input: dict) -> Tuple[bool, dict, str]:
-        """Entry point to the service
+    def prepare_call(self, json_input: dict) -> Tuple[GenerativeModel, Platform, str, bool]:
+        """Parse the input and set the model and the message in the platform
 
         :param json_input: Input data
-        :return: Tuple with output result
-
+        :return: Tuple with model, platform, report url and show token details
         """
-        self.logger.info(f"Request received. Data: {json_input}")
-        exc_info = get_exc_info()
-        queue_metadata = None
-
-        try:
-            # Adaptations for queue case
-            json_input, queue_metadata = adapt_input_queue(json_input)
-
-            # Parse and check input
-            query_metadata, model, platform, report_url, tools, show_token_details = self.parse_input(json_input)
+        # Parse and check input
+        query_metadata, model, platform, report_url, tools, show_token_details = self.parse_input(json_input)
 
-            # Set model
-            platform.set_model(model)
+        # Set model
+        platform.set_model(model)
 
-            # Set message in model
-            model.set_message(query_metadata)
+        # Set message in model
+        model.set_message(query_metadata)
+        return model, platform, report_url, show_token_details
 
-            # Call model
-            response = platform.call_model()
+    def report_usage(self, result: dict, model: GenerativeModel, platform: Platform, report_url: str):
+        """Report the tokens (or images) used by a call to the model
 
-            # Format result
-            result = model.get_result(response)
-            self.logger.info(f"Result: {result}")
-            result['show_token_details'] = show_token_details
-            if result["status_code"] == 200 and not eval(os.getenv("TESTING", "False")):
-                if model.MODEL_MESSAGE == "dalle":
-                    reporting_type = "images"
-                    n_tokens = 1
-                    resource = f"llmapi/{platform.MODEL_FORMAT}/{model.model_type}/{reporting_type}"
-                    self.report_api(
-                        n_tokens,
-                        "",
-                        report_url,
-                        resource,
-                        GENAI_LLM_SERVICE,
-                        reporting_type.upper(),
-                    )
-                else:
-                    token_fields = {
-                        "input_tokens": result["result"].get("input_tokens", 0),
-                        "output_tokens": result["result"].get("output_tokens", 0),
-                    }
-                    optional_fields = ["cache_read_tokens", "cache_write_tokens", "cached_tokens"]
-                    for key in optional_fields:
-                        value = result["result"].get(key, 0)
-                        if value > 0:
-                            token_fields[key] = value
-
-                    for reporting_type, tokens in token_fields.items():
-                        resource = f"llmapi/{platform.MODEL_FORMAT}/{model.model_type}/{reporting_type}"
-                        self.report_api(
-                            tokens,
-                            "",
-                            report_url,
-                            resource,
-                            GENAI_LLM_SERVICE,
-                            reporting_type.upper(),
-                        )
-
-        except ValidationError as ex:
+        :param result: Result of the model
+        :param model: Model called
+        :param platform: Platform of the model
+        :param report_url: Url to report
+        """
+        if model.MODEL_MESSAGE == "dalle":
+            reporting_type = "images"
+            n_tokens = 1
+            resource = f"llmapi/{platform.MODEL_FORMAT}/{model.model_type}/{reporting_type}"
+            self.report_api(
+                n_tokens,
+                "",
+                report_url,
+                resource,
+                GENAI_LLM_SERVICE,
+                reporting_type.upper(),
+            )
+        else:
+            token_fields = {
+                "input_tokens": result["result"].get("input_tokens", 0),
+                "output_tokens": result["result"].get("output_tokens", 0),
+            }
+            optional_fields = ["cache_read_tokens", "cache_write_tokens", "cached_tokens"]
+            for key in optional_fields:
+                value = result["result"].get(key, 0)
+                if value > 0:
+                    token_fields[key] = value
+
+            for reporting_type, tokens in token_fields.items():
+                resource = f"llmapi/{platform.MODEL_FORMAT}/{model.model_type}/{reporting_type}"
+                self.report_api(
+                    tokens,
+                    "",
+                    report_url,
+                    resource,
+                    GENAI_LLM_SERVICE,
+                    reporting_type.upper(),
+                )
+
+    def get_error_result(self, ex: Exception) -> dict:
+        """Get the result of a request that raised an exception
+
+        :param ex: Exception raised
+        :return: Result with the error
+        """
+        exc_info = get_exc_info()
+        if isinstance(ex, ValidationError):
             result = self.get_validation_error_response(ex.errors()[0])
             self.logger.error(
                 f"[Process] {result['error_message']}.", exc_info=exc_info
             )
-        except ValueError as ex:
+        elif isinstance(ex, ValueError):
             self.logger.error(
                 f"[Process] Error parsing JSON. Error: {ex}.", exc_info=exc_info
             )
             result = {"status": "error", "error_message": str(ex), "status_code": 400}
-        except PrintableGenaiError as ex:
+        elif isinstance(ex, PrintableGenaiError):
             self.logger.error(
                 f"[Process] Error while processing: {ex}.", exc_info=exc_info
             )
@@ -390,12 +398,129 @@ class LLMDeployment(BaseDeployment):
                 "error_message": str(ex),
                 "status_code": ex.status_code,
             }
-        except Exception as ex:
+        else:
             self.logger.error(f"[Process] Error while processing: {ex}.", exc_info=exc_info)
             result = {'status': 'error', 'error_message': str(ex), 'status_code': 500}
+        return result
+
+    def process(self, json_input: dict) -> Tuple[bool, dict, str]:
+        """Entry point to the service
+
+        :param json_input: Input data
+        :return: Tuple with output result
+
+        """
+        self.logger.info(f"Request received. Data: {json_input}")
+        queue_metadata = None
+
+        try:
+            # Adaptations for queue case
+            json_input, queue_metadata = adapt_input_queue(json_input)
+
+            model, platform, report_url, show_token_details = self.prepare_call(json_input)
+
+            # Call model
+            response = platform.call_model()
+
+            # Format result
+            result = model.get_result(response)
+            self.logger.info(f"Result: {result}")
+            result['show_token_details'] = show_token_details
+            if result["status_code"] == 200 and not eval(os.getenv("TESTING", "False")):
+                self.report_usage(result, model, platform, report_url)
+
+        except Exception as ex:
+            result = self.get_error_result(ex)
 
         return ResponseObject(**result).get_response_predict(queue_metadata)
 
+    @staticmethod
+    def get_sse_event(event: str, data: dict) -> str:
+        """Format a server-sent event
+
+        :param event: Name of the event
+        :param data: Data of the event
+        :return: Event to send
+        """
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def stream_deployment(self, json_input: dict) -> Union[Response, Tuple[dict, int]]:
+        """Deploy service streaming the answer as server-sent events. The input is checked before starting the
+        stream, so its errors are returned as in the non streaming mode
+
+        :param json_input: Input data
+        :return: Streamed response or error response
+        """
+        self.logger.info(f"Streaming request received. Data: {json_input}")
+        try:
+            model, platform, report_url, show_token_details = self.prepare_call(json_input)
+            if not (platform.STREAMING and model.STREAMING):
+                raise PrintableGenaiError(400, f"Streaming not supported for model '{model.model_type}' in "
+                                               f"platform '{platform.MODEL_FORMAT}'")
+        except Exception as ex:
+            return ResponseObject(**self.get_error_result(ex)).get_response_base()
+
+        events = self.stream_process(model, platform, report_url, show_token_details)
+        return Response(stream_with_context(events), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    def report_partial_usage(self, model: GenerativeModel, platform: Platform, report_url: str):
+        """Report the tokens used by a stream that has not finished, with the chunks received until it was
+        interrupted
+
+        :param model: Model with the message set
+        :param platform: Platform with the model set
+        :param report_url: Url to report
+        """
+        if not platform.stream_chunks or eval(os.getenv("TESTING", "False")):
+            return
+        try:
+            result = model.get_result(platform.parse_response(model.get_stream_response(platform.stream_chunks)))
+            if result["status_code"] == 200:
+                self.logger.warning(f"Stream interrupted after {len(platform.stream_chunks)} chunks, "
+                                    f"reporting the tokens used so far")
+                self.report_usage(result, model, platform, report_url)
+        except Exception as ex:
+            self.logger.warning(f"Usage of the interrupted stream not reported: {type(ex).__name__}; {ex.args}")
+
+    def stream_process(self, model: GenerativeModel, platform: Platform, report_url: str,
+                       show_token_details: bool) -> Generator[str, None, None]:
+        """Relay the text generated by the model as 'delta' events and, when the model finishes, send the result
+        (the same one as without streaming, with the complete answer and the tokens) as a 'result' event and
+        report the tokens used
+
+        :param model: Model with the message set
+        :param platform: Platform with the model set
+        :param report_url: Url to report
+        :param show_token_details: Show the details of the tokens in the result
+        :return: Generator of the events
+        """
+        try:
+            stream = platform.call_model_stream()
+            response = None
+            try:
+                while True:
+                    yield self.get_sse_event("delta", {"answer": next(stream)})
+            except StopIteration as stop:
+                response = stop.value
+            finally:
+                if response is None:
+                    # The client disconnected (GeneratorExit) or the relay failed, the provider has already
+                    # charged the tokens generated so far
+                    stream.close()
+                    self.report_partial_usage(model, platform, report_url)
+
+            result = model.get_result(response)
+            self.logger.info(f"Result: {result}")
+            result['show_token_details'] = show_token_details
+            if result["status_code"] == 200 and not eval(os.getenv("TESTING", "False")):
+                self.report_usage(result, model, platform, report_url)
+        except Exception as ex:
+            result = self.get_error_result(ex)
+
+        output, _ = ResponseObject(**result).get_response_base()
+        yield self.get_sse_event("result", output)
+
 
 app = Flask(__name__)
 deploy = LLMDeployment()
@@ -414,6 +539,8 @@ def sync_deployment() -> Tuple[str, int]:
     }
     json_input["project_conf"] = apigw_params
 
+    if (json_input.get("llm_metadata") or {}).get("stream") is True:
+        return deploy.stream_deployment(json_input)
     return deploy.sync_deployment(json_input)
 
 
@@ -422,10 +549,22 @@ def healthcheck() -> Dict:
     return {"status": "Service available"}
 
 
+@app.route("/connection_metrics", methods=["GET"])
+def connection_metrics() -> Tuple[str, int]:
+    deploy.logger.info("Connection metrics request received")
+    return ResponseObject(
+        **{
+            "status": "finished",
+            "result": HTTPSessionPool.get_instance().get_metrics(),
+            "status_code": 200,
+        }
+    ).get_response_base()
+
+
 @app.route("/list_templates", methods=["GET"])
 def list_available_templates() -> Tuple[str, int]:
     deploy.logger.info("List templates request received")
-    _, _, display_templates_with_files = deploy.storage_manager.get_templates(
+    _, _, display_templates_with_files = deploy.template_cache.get_templates(
         return_files=True
     )
     return ResponseObject(
@@ -520,6 +659,7 @@ def upload_prompt_template() -> Tuple[str, int]:
     deploy.logger.info("Upload prompt template request received")
     dat = request.get_json(force=True)
     response = deploy.storage_manager.upload_template(dat)
+    deploy.template_cache.invalidate(dat.get("name"))
     return ResponseObject(**response).get_response_base()
 
 
@@ -529,6 +669,7 @@ def delete_prompt_template() -> Tuple[str, int]:
     dat = {}
     dat.update(request.args)
     response = deploy.storage_manager.delete_template(dat)
+    deploy.template_cache.invalidate(dat.get("name"))
     return ResponseObject(**response).get_response_base()
 
 
@@ -45,7 +45,7 @@ class DalleMessage(Message):
         """
         n_tokens = 0
         for message in query:
-            n_tokens += len(self.adapter.encoding.encode(message['content']))
+            n_tokens += self.adapter.encoding.count(message['content'])
 
         return n_tokens
 
@@ -1,5 +1,6 @@
 
 # Native imports
+import io
 import json
 from typing import List
 
@@ -11,6 +12,7 @@ from limiters import ManagerQueryLimiter
 class ClaudeModel(GenerativeModel):
     MODEL_MESSAGE = None
     MODEL_QUERY_LIMITER = "bedrock"
+    STREAMING = True
 
     # Not contains default params, because is an encapsulator for ClaudeModels, so the default are in there
     def __init__(self, model, model_id, model_type, pool_name, max_input_tokens, max_tokens, bag_tokens, zone, api_version,
@@ -141,6 +143,52 @@ class ClaudeModel(GenerativeModel):
         }
         return result
 
+    def get_stream_delta(self, chunk: dict) -> str:
+        """ Method to get the text generated in a chunk of the stream of the endpoint.
+
+        :param chunk: Dict with a chunk of the stream.
+        :return: Text of the chunk (empty if it has no text).
+        """
+        if chunk.get('type') == "content_block_delta":
+            return chunk.get('delta', {}).get('text', "")
+        return ""
+
+    def get_stream_response(self, chunks: List[dict]) -> dict:
+        """ Method to join the chunks of the stream of the endpoint.
+
+        :param chunks: List with all the chunks of the stream.
+        :return: Dict with the same format as the response without streaming (the one formatted by get_result).
+        """
+        content = {}
+        tool_inputs = {}
+        usage = {}
+        stop_reason = None
+        for chunk in chunks:
+            chunk_type = chunk.get('type')
+            if chunk_type == "message_start":
+                usage.update(chunk.get('message', {}).get('usage', {}))
+            elif chunk_type == "content_block_start":
+                content[chunk['index']] = dict(chunk.get('content_block', {}))
+            elif chunk_type == "content_block_delta":
+                block = content.setdefault(chunk['index'], {"type": "text", "text": ""})
+                delta = chunk.get('delta', {})
+                if delta.get('type') == "input_json_delta":
+                    tool_inputs[chunk['index']] = tool_inputs.get(chunk['index'], "") + delta.get('partial_json', "")
+                else:
+                    block['text'] = block.get('text', "") + delta.get('text', "")
+            elif chunk_type == "message_delta":
+                stop_reason = chunk.get('delta', {}).get('stop_reason', stop_reason)
+                usage.update(chunk.get('usage', {}))
+
+        for index, tool_input in tool_inputs.items():
+            content[index]['input'] = json.loads(tool_input) if tool_input else {}
+        body = {
+            'content': [content[index] for index in sorted(content)],
+            'stop_reason': stop_reason,
+            'usage': usage
+        }
+        return {'body': io.BytesIO(json.dumps(body).encode())}
+
     def __repr__(self):
         """Return the model representation."""
         return f'{{model:{self.model_name}, ' \
@@ -11,6 +11,7 @@ from limiters import ManagerQueryLimiter
 class GeminiModel(GenerativeModel):
     MODEL_MESSAGE = None
     MODEL_QUERY_LIMITER = "vertex"
+    STREAMING = True
 
     # Not contains default params, because is an encapsulator for ClaudeModels, so the default are in there
     def __init__(self, model, model_id, model_type, pool_name, max_input_tokens, max_tokens, bag_tokens, zone, top_p,
@@ -131,6 +132,37 @@ class GeminiModel(GenerativeModel):
 
         return result
 
+    def get_stream_delta(self, chunk: dict) -> str:
+        """ Method to get the text generated in a chunk of the stream of the endpoint.
+
+        :param chunk: Dict with a chunk of the stream.
+        :return: Text of the chunk (empty if it has no text).
+        """
+        candidates = chunk.get('candidates') or [{}]
+        return "".join(part.get('text', "") for part in candidates[0].get('content', {}).get('parts', []))
+
+    def get_stream_response(self, chunks: List[dict]) -> dict:
+        """ Method to join the chunks of the stream of the endpoint.
+
+        :param chunks: List with all the chunks of the stream.
+        :return: Dict with the same format as the response without streaming (the one formatted by get_result).
+        """
+        text = ""
+        parts = []
+        usage = {}
+        for chunk in chunks:
+            # Every chunk has the usage until that moment
+            usage = chunk.get('usageMetadata') or usage
+            for candidate in (chunk.get('candidates') or [])[:1]:
+                for part in candidate.get('content', {}).get('parts', []):
+                    if 'text' in part:
+                        text += part['text']
+                    else:
+                        parts.append(part)
+        if text:
+            parts.insert(0, {'text': text})
+        return {'candidates': [{'content': {'role': "model", 'parts': parts}}], 'usageMetadata': usage}
+
     def __repr__(self):
         """Return the model representation."""
         return f'{{model:{self.model_name}, ' \
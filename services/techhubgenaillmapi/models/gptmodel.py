@@ -4,14 +4,12 @@ import json
 from typing import List
 import re
 
-# Installed imports
-import tiktoken
-
 # Local imports
 from generatives import GenerativeModel
 from common.errors.genaierrors import PrintableGenaiError
 from limiters import ManagerQueryLimiter
 from message.messagemanager import ManagerMessages
+from tokenizer_registry import TokenizerRegistry
 
 DEFAULT_STOP_MSG = "<|endoftext|>"
 
@@ -20,6 +18,7 @@ NOT_FOUND_MSG = "Not found"
 class GPTModel(GenerativeModel):
     MODEL_MESSAGE = None
     MODEL_QUERY_LIMITER = "azure"
+    STREAMING = True
 
     # Not contains default params, because is an encapsulator for GPTModels, so the default are in there
     def __init__(self, model, model_type, pool_name, max_input_tokens, max_tokens, bag_tokens, zone, api_version,
@@ -63,8 +62,7 @@ class GPTModel(GenerativeModel):
         self.top_p = top_p
         self.seed = seed
         self.response_format = response_format
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.encoding = TokenizerRegistry.get_tokenizer("gpt")
 
     def parse_data(self) -> json:
         """ Convert message and model data into json format.
@@ -182,6 +180,66 @@ class GPTModel(GenerativeModel):
             'status_code': 200
         }
 
+    def get_stream_delta(self, chunk: dict) -> str:
+        """ Method to get the text generated in a chunk of the stream of the endpoint.
+
+        :param chunk: Dict with a chunk of the stream.
+        :return: Text of the chunk (empty if it has no text).
+        """
+        # The first chunk (prompt filters in azure) and the last one (usage) have no choices
+        choices = chunk.get('choices') or [{}]
+        return choices[0].get('delta', {}).get('content') or ""
+
+    def get_prompt_tokens(self) -> int:
+        """ Method to count the tokens of the texts of the messages sent to the endpoint with the tokenizer of the
+        limiter (the images are not counted).
+
+        :return: Number of tokens of the prompt.
+        """
+        n_tokens = 0
+        for message in self.message.preprocess():
+            content = message.get('content')
+            if isinstance(content, str):
+                n_tokens += self.encoding.count(content)
+            elif isinstance(content, list):
+                n_tokens += sum(self.encoding.count(item.get('text', "")) for item in content if item.get('type') == "text")
+        return n_tokens
+
+    def get_stream_response(self, chunks: List[dict]) -> dict:
+        """ Method to join the chunks of the stream of the endpoint.
+
+        :param chunks: List with all the chunks of the stream.
+        :return: Dict with the same format as the response without streaming (the one formatted by get_result).
+        """
+        content = ""
+        tool_calls = {}
+        usage = None
+        for chunk in chunks:
+            usage = chunk.get('usage') or usage
+            for choice in chunk.get('choices') or []:
+                delta = choice.get('delta', {})
+                content += delta.get('content') or ""
+                # The tool calls are sent in pieces, by index
+                for tool_call in delta.get('tool_calls') or []:
+                    call = tool_calls.setdefault(tool_call.get('index', 0),
+                                                 {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                    call['id'] = tool_call.get('id') or call['id']
+                    call['function']['name'] += tool_call.get('function', {}).get('name') or ""
+                    call['function']['arguments'] += tool_call.get('function', {}).get('arguments') or ""
+
+        if usage is None:
+            self.logger.warning("Usage not sent in the stream (the api version must support stream_options), "
+                                "input and output tokens counted with tiktoken")
+            prompt_tokens = self.get_prompt_tokens()
+            output_tokens = self.encoding.count(content)
+            usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': output_tokens,
+                     'total_tokens': prompt_tokens + output_tokens, 'completion_tokens_details': {'reasoning_tokens': 0}}
+
+        message = {'role': "assistant", 'content': content}
+        if tool_calls:
+            message['tool_calls'] = [tool_calls[index] for index in sorted(tool_calls)]
+        return {'choices': [{'message': message}], 'usage': usage}
+
     def adapt_tools(self, tools):
 
         if not tools:
@@ -214,6 +272,7 @@ class GPTModel(GenerativeModel):
 class DalleModel(GPTModel):
     MODEL_MESSAGE = "dalle"
     GENERATIVE_MODELS = ["dalle3"]
+    STREAMING = False
 
     def __init__(self,
                  max_input_tokens: int = 4000,
@@ -483,8 +542,7 @@ class ChatGPTOModel(GPTModel):
             self.stop = stop if stop is not None else [DEFAULT_STOP_MSG]
         self.seed = seed
         self.response_format = response_format
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.encoding = TokenizerRegistry.get_tokenizer("gpt")
 
         self.is_vision = False
         self.max_completion_tokens = max_completion_tokens
@@ -653,8 +711,7 @@ class ChatGPTOVisionModel(GPTModel):
         self.stop = stop
         self.seed = seed
         self.response_format = response_format
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.encoding = TokenizerRegistry.get_tokenizer("gpt")
 
         self.is_vision = True
         self.max_img_size_mb = max_img_size_mb
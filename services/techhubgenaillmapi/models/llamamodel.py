@@ -1,6 +1,8 @@
 
 # Native imports
+import io
 import json
+from typing import List
 
 # Local imports
 from generatives import GenerativeModel
@@ -10,6 +12,7 @@ from limiters import ManagerQueryLimiter
 class LlamaModel(GenerativeModel):
     MODEL_MESSAGE = "chatLlama3"
     MODEL_QUERY_LIMITER = "bedrock"
+    STREAMING = True
     GENERATIVE_MODELS = ["llama3-70b-v1", "llama3-8b-v1", "llama3-1-405b-v1", "llama3-1-70b-v1", "llama3-1-8b-v1"]
 
     def __init__(self,
@@ -129,6 +132,29 @@ class LlamaModel(GenerativeModel):
         }
         return result
 
+    def get_stream_delta(self, chunk: dict) -> str:
+        """ Method to get the text generated in a chunk of the stream of the endpoint.
+
+        :param chunk: Dict with a chunk of the stream.
+        :return: Text of the chunk (empty if it has no text).
+        """
+        return chunk.get('generation') or ""
+
+    def get_stream_response(self, chunks: List[dict]) -> dict:
+        """ Method to join the chunks of the stream of the endpoint.
+
+        :param chunks: List with all the chunks of the stream.
+        :return: Dict with the same format as the response without streaming (the one formatted by get_result).
+        """
+        body = {'generation': "", 'prompt_token_count': 0, 'generation_token_count': 0, 'stop_reason': None}
+        for chunk in chunks:
+            body['generation'] += chunk.get('generation') or ""
+            # The prompt tokens are sent in the first chunk and the generation tokens are accumulated
+            body['prompt_token_count'] = chunk.get('prompt_token_count') or body['prompt_token_count']
+            body['generation_token_count'] = chunk.get('generation_token_count') or body['generation_token_count']
+            body['stop_reason'] = chunk.get('stop_reason') or body['stop_reason']
+        return {'body': io.BytesIO(json.dumps(body).encode())}
+
     def __repr__(self):
         """Return the model representation."""
         return f'{{model:{self.model_name}, ' \
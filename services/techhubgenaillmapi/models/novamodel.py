@@ -1,4 +1,5 @@
 # Native imports
+import io
 import json
 import re
 from typing import List
@@ -11,6 +12,7 @@ from limiters import ManagerQueryLimiter
 class NovaModel(GenerativeModel):
     MODEL_MESSAGE = None
     MODEL_QUERY_LIMITER = "nova"
+    STREAMING = True
 
     # Not contains default params, because is an encapsulator for ClaudeModels, so the default are in there
     def __init__(self, model, model_id, model_type, pool_name, max_input_tokens, max_tokens, bag_tokens, zone, top_p,
@@ -187,6 +189,52 @@ class NovaModel(GenerativeModel):
         }
         return result
 
+    def get_stream_delta(self, chunk: dict) -> str:
+        """ Method to get the text generated in a chunk of the stream of the endpoint.
+
+        :param chunk: Dict with a chunk of the stream.
+        :return: Text of the chunk (empty if it has no text).
+        """
+        return chunk.get('contentBlockDelta', {}).get('delta', {}).get('text', "")
+
+    def get_stream_response(self, chunks: List[dict]) -> dict:
+        """ Method to join the chunks of the stream of the endpoint.
+
+        :param chunks: List with all the chunks of the stream.
+        :return: Dict with the same format as the response without streaming (the one formatted by get_result).
+        """
+        content = {}
+        tool_inputs = {}
+        usage = {}
+        stop_reason = ""
+        for chunk in chunks:
+            if 'contentBlockStart' in chunk:
+                start = chunk['contentBlockStart']
+                if 'toolUse' in start.get('start', {}):
+                    content[start.get('contentBlockIndex', 0)] = {'toolUse': dict(start['start']['toolUse'])}
+            elif 'contentBlockDelta' in chunk:
+                index = chunk['contentBlockDelta'].get('contentBlockIndex', 0)
+                delta = chunk['contentBlockDelta'].get('delta', {})
+                if 'toolUse' in delta:
+                    tool_inputs[index] = tool_inputs.get(index, "") + delta['toolUse'].get('input', "")
+                else:
+                    block = content.setdefault(index, {'text': ""})
+                    block['text'] += delta.get('text', "")
+            elif 'messageStop' in chunk:
+                stop_reason = chunk['messageStop'].get('stopReason', "")
+            elif 'metadata' in chunk:
+                usage.update(chunk['metadata'].get('usage', {}))
+
+        for index, tool_input in tool_inputs.items():
+            content[index]['toolUse']['input'] = json.loads(tool_input) if tool_input else {}
+        usage.setdefault('totalTokens', usage.get('inputTokens', 0) + usage.get('outputTokens', 0))
+        body = {
+            'output': {'message': {'role': "assistant", 'content': [content[index] for index in sorted(content)]}},
+            'stopReason': stop_reason,
+            'usage': usage
+        }
+        return {'body': io.BytesIO(json.dumps(body).encode())}
+
     def __repr__(self):
         """Return the model representation."""
         return f'{{model:{self.model_name}, ' \
@@ -3,14 +3,12 @@ import json
 from typing import List
 import re
 
-# Installed imports
-import tiktoken
-
 # Local imports
 from generatives import GenerativeModel
 from common.errors.genaierrors import PrintableGenaiError
 from limiters import ManagerQueryLimiter
 from message.messagemanager import ManagerMessages
+from tokenizer_registry import TokenizerRegistry
 
 DEFAULT_STOP_MSG = "<|endoftext|>"
 
@@ -71,8 +69,7 @@ class TsuzumiModel(GenerativeModel):
         self.top_p = top_p
         self.seed = seed
         self.response_format = response_format
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.encoding = TokenizerRegistry.get_tokenizer("gpt")
         self.is_vision = False
         self.tools = False
 
@@ -0,0 +1,136 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import os
+import copy
+import time
+import threading
+
+# Custom imports
+from common.logging_handler import LoggerHandler
+from common.services import GENAI_LLM_SERVICE
+from common.storage_manager import BaseStorageManager
+
+
+class TemplateCache(object):
+    """In-memory cache of the prompt templates of the storage (or Langfuse), so the calls don't load and parse the
+    template file every time. Every template file is trusted during the ttl; after it, its version (etag and last
+    modification date) is checked and the file is only loaded again if it has changed. The prompts of Langfuse have
+    no version without fetching them, so they are loaded again after the ttl. The upload and delete of templates
+    must invalidate it"""
+
+    def __init__(self, storage_manager: BaseStorageManager, ttl: float = 60):
+        """
+        :param storage_manager: Storage manager of the templates
+        :param ttl: Seconds a template is used without checking its version (0 disables the cache)
+        """
+        logger_handler = LoggerHandler(GENAI_LLM_SERVICE, level=os.environ.get("LOG_LEVEL", "INFO"))
+        self.logger = logger_handler.logger
+
+        self.storage_manager = storage_manager
+        self.ttl = ttl
+        # name -> (templates of the file, version, time of the last check)
+        self.templates = {}
+        # return_files -> (result of get_templates, time of the load)
+        self.listings = {}
+        # Increased by every invalidation, so a load started before it is not kept
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidations": 0, "loads": 0}
+
+    def get_version(self, name: str):
+        """Version of a template file, None if it can't be got or in Langfuse (the file is loaded again)"""
+        try:
+            return self.storage_manager.get_template_version(name)
+        except Exception as ex:
+            self.logger.warning(f"Version of the template '{name}' not available: {ex}")
+            return None
+
+    def get_template(self, name: str) -> dict:
+        """Templates of a template file, from the cache if it has not changed
+
+        :param name: Name of the template file (without extension)
+        :return: Templates of the file
+        """
+        if self.ttl <= 0:
+            return self.storage_manager.get_template(name)
+
+        with self.lock:
+            entry = self.templates.get(name)
+            generation = self.generation
+        now = time.monotonic()
+        if entry is not None:
+            templates, version, checked = entry
+            if now - checked < self.ttl:
+                with self.lock:
+                    self.stats["hits"] += 1
+                return copy.deepcopy(templates)
+            current_version = self.get_version(name)
+            if current_version is not None and current_version == version:
+                with self.lock:
+                    self.stats["revalidations"] += 1
+                    if generation == self.generation:
+                        self.templates[name] = (templates, version, now)
+                return copy.deepcopy(templates)
+        else:
+            current_version = self.get_version(name)
+
+        # The version is got before loading, so a change in between is detected in the next check
+        templates = self.storage_manager.get_template(name)
+        self.logger.debug(f"Template '{name}' loaded with version {current_version}")
+        with self.lock:
+            self.stats["loads"] += 1
+            if generation == self.generation:
+                self.templates[name] = (templates, current_version, now)
+        return copy.deepcopy(templates)
+
+    def get_templates(self, return_files: bool = False) -> tuple:
+        """All the templates (get_templates of the storage manager), loaded again after the ttl
+
+        :param return_files: Return the templates of every file too
+        :return: Templates, names of the templates (and templates by file if return_files)
+        """
+        if self.ttl <= 0:
+            return self.storage_manager.get_templates(return_files=return_files)
+
+        with self.lock:
+            entry = self.listings.get(return_files)
+            generation = self.generation
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < self.ttl:
+            return copy.deepcopy(entry[0])
+
+        result = self.storage_manager.get_templates(return_files=return_files)
+        with self.lock:
+            if generation == self.generation:
+                self.listings[return_files] = (result, now)
+        return copy.deepcopy(result)
+
+    def invalidate(self, name: str = None):
+        """Discard a template file (all of them if no name) and the lists of templates
+
+        :param name: Name of the template file (without extension)
+        """
+        with self.lock:
+            self.generation += 1
+            if name is None:
+                self.templates.clear()
+            else:
+                self.templates.pop(name, None)
+            self.listings.clear()
+
+    def warm_up(self):
+        """Load all the template files, so the first calls don't wait for the storage"""
+        try:
+            names = self.storage_manager.get_template_names()
+        except Exception as ex:
+            self.logger.warning(f"Templates not preloaded, error listing them: {ex}")
+            return
+
+        for name in names:
+            try:
+                self.get_template(name)
+            except Exception as ex:
+                self.logger.warning(f"Template '{name}' not preloaded: {ex}")
+        self.logger.info(f"{len(self.templates)} template files preloaded")
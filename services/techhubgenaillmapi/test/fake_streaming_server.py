@@ -0,0 +1,66 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeStreamingServer(object):
+    """Local HTTP server that answers every POST with the configured chunks as server-sent events, like the
+    streaming APIs of Azure/OpenAI and Vertex"""
+
+    def __init__(self, chunks: list, status_code: int = 200, done: bool = True):
+        """
+        :param chunks: Dicts sent as the data of the events
+        :param status_code: Status of the response (the chunks are not sent if it is not 200)
+        :param done: Send the final '[DONE]' event
+        """
+        self.chunks = chunks
+        self.status_code = status_code
+        self.done = done
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._get_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def _get_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.requests.append({"path": self.path, "body": json.loads(body)})
+                if fake.status_code != 200:
+                    error = json.dumps({"error": {"code": fake.status_code, "message": "Fake error"}}).encode()
+                    self.send_response(fake.status_code)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(error)))
+                    self.end_headers()
+                    self.wfile.write(error)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for chunk in fake.chunks:
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+                    self.wfile.flush()
+                if fake.done:
+                    self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -282,7 +282,7 @@ class TestClaude3Adapter:
 
 
     @patch('PIL.Image.open')
-    @patch('transformers.GPT2TokenizerFast.from_pretrained')
+    @patch('adapters.TokenizerRegistry.get_tokenizer')
     @patch('os.remove')
     @patch('common.utils.get_image_size')
     @patch('common.utils.resize_image')
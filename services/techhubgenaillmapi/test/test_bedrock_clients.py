@@ -0,0 +1,78 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Local imports
+from bedrock_clients import BedrockClientCache
+
+
+credentials = {"aws_access_key_id": "346545", "aws_secret_access_key": "87968"}
+
+
+class TestBedrockClientCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = BedrockClientCache(max_pool_connections=25, retries={"mode": "standard", "max_attempts": 2},
+                                        max_clients=2)
+
+    @patch("boto3.client")
+    def test_client_reused(self, mock_client):
+        mock_client.side_effect = lambda **kwargs: MagicMock()
+        client = self.cache.get_client("us-east-1", 30, dict(credentials))
+
+        self.assertIs(self.cache.get_client("us-east-1", 30, dict(credentials)), client)
+        self.assertEqual(mock_client.call_count, 1)
+        kwargs = mock_client.call_args.kwargs
+        self.assertEqual(kwargs["service_name"], "bedrock-runtime")
+        self.assertEqual(kwargs["aws_access_key_id"], "346545")
+        self.assertEqual(kwargs["config"].max_pool_connections, 25)
+        self.assertEqual(kwargs["config"].retries, {"mode": "standard", "max_attempts": 2})
+        self.assertEqual((kwargs["config"].region_name, kwargs["config"].read_timeout), ("us-east-1", 30))
+
+    @patch("boto3.client")
+    def test_client_by_key(self, mock_client):
+        mock_client.side_effect = lambda **kwargs: MagicMock()
+        client = self.cache.get_client("us-east-1", 30, dict(credentials))
+
+        self.assertIsNot(self.cache.get_client("eu-west-1", 30, dict(credentials)), client)
+        self.assertIsNot(self.cache.get_client("us-east-1", 30, {**credentials, "aws_session_token": "token"}), client)
+        self.assertIsNot(self.cache.get_client("us-east-1", 30), client)
+        self.assertEqual(mock_client.call_count, 4)
+        # Least recently used discarded
+        self.assertEqual(len(self.cache), 2)
+        self.assertNotIn("346545", str(list(self.cache.clients)))
+
+    @patch("boto3.client")
+    def test_threads_share_client(self, mock_client):
+        mock_client.side_effect = lambda **kwargs: MagicMock()
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(self.cache.get_client("us-east-1", 30)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(mock_client.call_count, 1)
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    @patch("boto3.client")
+    def test_error_not_cached(self, mock_client):
+        mock_client.side_effect = [ConnectionError, MagicMock()]
+        with self.assertRaises(ConnectionError):
+            self.cache.get_client("us-east-1", 30)
+        self.assertEqual(len(self.cache), 0)
+        self.cache.get_client("us-east-1", 30)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_get_instance(self):
+        with patch.dict("os.environ", {"LLM_BEDROCK_MAX_POOL_CONNECTIONS": "50", "LLM_BEDROCK_MAX_ATTEMPTS": "3"}), \
+                patch.object(BedrockClientCache, "_instance", None):
+            cache = BedrockClientCache.get_instance()
+            self.assertIs(BedrockClientCache.get_instance(), cache)
+            self.assertEqual(cache.max_pool_connections, 50)
+            self.assertEqual(cache.retries, {"mode": "legacy", "max_attempts": 3})
@@ -21,6 +21,8 @@ from models.llamamodel import LlamaModel
 from models.novamodel import ChatNova, ChatNovaVision
 from models.geminimodel import ChatGeminiVision
 from models.tsuzumimodel import TsuzumiModel
+from bedrock_clients import BedrockClientCache
+from fake_streaming_server import FakeStreamingServer
 
 aws_credentials = {"access_key": "346545", "secret_key": "87968"}
 models_urls = {
@@ -128,6 +130,21 @@ message_dict_vision = {"query": [
 
 
 
+def consume_stream(stream) -> tuple:
+    """Texts relayed by a stream of a platform and the response returned at the end"""
+    texts = []
+    try:
+        while True:
+            texts.append(next(stream))
+    except StopIteration as stop:
+        return texts, stop.value
+
+
+def get_bedrock_events(chunks: list) -> list:
+    """Events of the body of invoke_model_with_response_stream"""
+    return [{"chunk": {"bytes": json.dumps(chunk).encode()}} for chunk in chunks]
+
+
 class TestManagerPlatform:
     conf = {'aws_credentials': aws_credentials, 'models_urls': models_urls, 'platform': ''}
 
@@ -222,7 +239,7 @@ class TestAzurePlatform:
 
 
     def test_call_model(self):
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_object = MagicMock()
             mock_object.json.return_value = {"choices": [{"message": {"content": "asdf"}}],
                                              "status_code": 200,
@@ -243,19 +260,19 @@ class TestAzurePlatform:
         generative_model = ChatGPTModel(**model)
         generative_model.set_message(message_dict)
         self.azure_platform.set_model(generative_model)
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = requests.exceptions.Timeout
             response = self.azure_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 408
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = requests.exceptions.RequestException
             response = self.azure_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 500
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.return_value.status_code = 500
             mock_func.return_value.text = "Internal server error"
             response = self.azure_platform.call_model()
@@ -263,7 +280,7 @@ class TestAzurePlatform:
         assert result['status_code'] == 500
         assert result['error_message'] == "Internal server error"
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.return_value.status_code = 429
             mock_func.return_value.text = "OpenAI rate limit exceeded"
             response = self.azure_platform.call_model()
@@ -271,12 +288,112 @@ class TestAzurePlatform:
         assert result['status_code'] == 429
         assert result['error_message'] == "OpenAI rate limit exceeded"
 
+    def test_call_model_stream(self):
+        chunks = [
+            {"choices": [], "prompt_filter_results": []},
+            {"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}}]},
+            {"choices": [{"index": 0, "delta": {"content": "Hola, "}}]},
+            {"choices": [{"index": 0, "delta": {"content": "¿qué tal?"}, "finish_reason": "stop"}]},
+            {"choices": [], "usage": {"total_tokens": 30, "completion_tokens": 5, "prompt_tokens": 25,
+                                      "prompt_tokens_details": {"cached_tokens": 10}}}
+        ]
+        generative_model = ChatGPTModel(**model)
+        generative_model.set_message(message_dict)
+        self.azure_platform.set_model(generative_model)
+        with FakeStreamingServer(chunks) as server:
+            self.azure_platform.url = server.url
+            texts, response = consume_stream(self.azure_platform.call_model_stream())
+
+        assert texts == ["Hola, ", "¿qué tal?"]
+        assert server.requests[0]["body"]["stream"] is True
+        assert server.requests[0]["body"]["stream_options"] == {"include_usage": True}
+        result = generative_model.get_result(response)
+        assert result['status_code'] == 200
+        assert result['result']['answer'] == "Hola, ¿qué tal?"
+        assert (result['result']['input_tokens'], result['result']['output_tokens']) == (25, 5)
+        assert result['result']['cached_tokens'] == 10
+
+    def test_call_model_stream_without_usage(self):
+        chunks = [{"choices": [{"index": 0, "delta": {"content": "Hola, "}}]},
+                  {"choices": [{"index": 0, "delta": {"content": "¿qué tal?"}, "finish_reason": "stop"}]}]
+        generative_model = ChatGPTModel(**model)
+        generative_model.set_message(message_dict)
+        self.azure_platform.set_model(generative_model)
+        with FakeStreamingServer(chunks) as server:
+            self.azure_platform.url = server.url
+            texts, response = consume_stream(self.azure_platform.call_model_stream())
+
+        # The api version does not send the usage, the prompt is counted with the tokenizer
+        encoding = generative_model.encoding
+        input_tokens = sum(encoding.count(message['content']) for message in server.requests[0]["body"]["messages"])
+        output_tokens = encoding.count("Hola, ¿qué tal?")
+        result = generative_model.get_result(response)
+        assert input_tokens > 0
+        assert (result['result']['input_tokens'], result['result']['output_tokens']) == (input_tokens, output_tokens)
+        assert result['result']['n_tokens'] == input_tokens + output_tokens
+
+    def test_call_model_stream_tool_calls(self):
+        chunks = [
+            {"choices": [{"index": 0, "delta": {"tool_calls": [
+                {"index": 0, "id": "call_1", "type": "function", "function": {"name": "get_weather", "arguments": ""}}]}}]},
+            {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": "{\"city\": "}}]}}]},
+            {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": "\"Madrid\"}"}}]}}]},
+            {"choices": [], "usage": {"total_tokens": 30, "completion_tokens": 5, "prompt_tokens": 25}}
+        ]
+        generative_model = ChatGPTModel(**model)
+        generative_model.set_message(message_dict)
+        self.azure_platform.set_model(generative_model)
+        with FakeStreamingServer(chunks) as server:
+            self.azure_platform.url = server.url
+            texts, response = consume_stream(self.azure_platform.call_model_stream())
+
+        assert texts == []
+        result = generative_model.get_result(response)
+        assert result['result']['tool_calls'] == [{"name": "get_weather", "id": "call_1", "inputs": {"city": "Madrid"}}]
+
+    def test_call_model_stream_errors(self):
+        generative_model = ChatGPTModel(**model)
+        generative_model.set_message(message_dict)
+        self.azure_platform.set_model(generative_model)
+        with FakeStreamingServer([], status_code=400) as server:
+            self.azure_platform.url = server.url
+            texts, response = consume_stream(self.azure_platform.call_model_stream())
+        assert texts == []
+        assert generative_model.get_result(response)['status_code'] == 400
+
+        # Error once the stream has started
+        chunks = [{"choices": [{"index": 0, "delta": {"content": "Hola"}}]},
+                  {"error": {"message": "The server had an error", "type": "server_error"}}]
+        with FakeStreamingServer(chunks, done=False) as server:
+            self.azure_platform.url = server.url
+            texts, response = consume_stream(self.azure_platform.call_model_stream())
+        assert texts == ["Hola"]
+        result = generative_model.get_result(response)
+        assert result['status_code'] == 500
+        assert result['error_message'] == "The server had an error"
+
+        with patch('requests.Session.post') as mock_func:
+            mock_func.side_effect = requests.exceptions.Timeout
+            with patch('time.sleep'):
+                texts, response = consume_stream(self.azure_platform.call_model_stream())
+        assert response['status_code'] == 408
+        assert mock_func.call_count == 2
+
+    def test_stream_not_supported(self):
+        assert AzurePlatform.STREAMING and not DalleModel.STREAMING
+        assert not TsuzumiPlatform.STREAMING
+        with pytest.raises(PrintableGenaiError, match="Streaming not supported in platform tsuzumi"):
+            TsuzumiPlatform(aws_credentials, models_urls).call_model_stream()
+
+
 class TestBedrockPlatform:
     def setup_method(self):
         models_config_manager = MagicMock()
         models_config_manager.get_different_model_from_pool.return_value = claude_model
         models_config_manager.get_model_api_key_by_zone.return_value = "mock_api"
         self.bedrock_platform = BedrockPlatform(aws_credentials, models_urls, timeout=60, num_retries=1, models_config_manager=models_config_manager)  # Initialize your class here
+        # Fresh cache, so every test gets the client of its boto3.client mock
+        self.bedrock_platform.bedrock_clients = BedrockClientCache()
 
     def test_init(self):
         assert self.bedrock_platform.aws_credentials == aws_credentials
@@ -397,6 +514,91 @@ class TestBedrockPlatform:
         assert result['error_message'] == "Max retries reached"
 
 
+    @patch("endpoints.provider", "aws")
+    def test_call_model_stream_claude(self):
+        chunks = [
+            {"type": "message_start", "message": {"usage": {"input_tokens": 454, "output_tokens": 1,
+                                                            "cache_read_input_tokens": 100}}},
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "as"}},
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "df"}},
+            {"type": "content_block_stop", "index": 0},
+            {"type": "content_block_start", "index": 1,
+             "content_block": {"type": "tool_use", "id": "tool_1", "name": "print_sentiment_scores", "input": {}}},
+            {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": "{\"positive"}},
+            {"type": "content_block_delta", "index": 1, "delta": {"type": "input_json_delta", "partial_json": "_score\": 0.9}"}},
+            {"type": "message_delta", "delta": {"stop_reason": "tool_use"}, "usage": {"output_tokens": 54}},
+            {"type": "message_stop", "amazon-bedrock-invocationMetrics": {"inputTokenCount": 454, "outputTokenCount": 54}}
+        ]
+        with patch('boto3.client') as mock_client:
+            mock_client.return_value.invoke_model_with_response_stream.return_value = {"body": get_bedrock_events(chunks)}
+            generative_model = ChatClaudeModel(**claude_model)
+            generative_model.set_message(message_dict)
+            self.bedrock_platform.set_model(generative_model)
+            texts, response = consume_stream(self.bedrock_platform.call_model_stream())
+
+        assert texts == ["as", "df"]
+        result = generative_model.get_result(response)
+        assert result['status_code'] == 200
+        assert result['result']['answer'] == "asdf"
+        assert result['result']['tool_calls'] == [{"name": "print_sentiment_scores", "id": "tool_1",
+                                                   "inputs": {"positive_score": 0.9}}]
+        assert (result['result']['input_tokens'], result['result']['output_tokens']) == (454, 54)
+        assert result['result']['cache_read_tokens'] == 100
+
+    @patch("endpoints.provider", "aws")
+    def test_call_model_stream_nova_and_llama(self):
+        nova_chunks = [
+            {"messageStart": {"role": "assistant"}},
+            {"contentBlockDelta": {"delta": {"text": "as"}, "contentBlockIndex": 0}},
+            {"contentBlockDelta": {"delta": {"text": "df"}, "contentBlockIndex": 0}},
+            {"contentBlockStop": {"contentBlockIndex": 0}},
+            {"messageStop": {"stopReason": "end_turn"}},
+            {"metadata": {"usage": {"inputTokens": 454, "outputTokens": 12}}}
+        ]
+        llama_chunks = [
+            {"generation": "as", "prompt_token_count": 454, "generation_token_count": 1, "stop_reason": None},
+            {"generation": "df", "prompt_token_count": None, "generation_token_count": 2, "stop_reason": "stop"}
+        ]
+        nova = copy.deepcopy(nova_model)
+        nova['pool_name'] = None
+        for generative_model, chunks in [(ChatNova(**nova), nova_chunks), (LlamaModel(**llama3_model), llama_chunks)]:
+            self.bedrock_platform.bedrock_clients.clear()
+            with patch('boto3.client') as mock_client:
+                mock_client.return_value.invoke_model_with_response_stream.return_value = {"body": get_bedrock_events(chunks)}
+                generative_model.set_message(message_dict)
+                self.bedrock_platform.set_model(generative_model)
+                texts, response = consume_stream(self.bedrock_platform.call_model_stream())
+
+            assert texts == ["as", "df"]
+            result = generative_model.get_result(response)
+            assert result['status_code'] == 200
+            assert result['result']['answer'] == "asdf"
+            assert result['result']['input_tokens'] == 454
+
+    @patch("endpoints.provider", "aws")
+    def test_call_model_stream_errors(self):
+        generative_model = ChatClaudeModel(**claude_model)
+        generative_model.set_message(message_dict)
+        self.bedrock_platform.set_model(generative_model)
+        with patch('boto3.client') as mock_client:
+            mock_client.return_value.invoke_model_with_response_stream.side_effect = botocore.exceptions.ClientError(
+                {"Error": {"Message": "Too many requests"}, "ResponseMetadata": {"HTTPStatusCode": 429}},
+                "InvokeModelWithResponseStream")
+            texts, response = consume_stream(self.bedrock_platform.call_model_stream())
+        assert generative_model.get_result(response)['status_code'] == 429
+
+        self.bedrock_platform.bedrock_clients.clear()
+        with patch('boto3.client') as mock_client:
+            events = get_bedrock_events([{"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": "as"}}])
+            events.append({"modelStreamErrorException": {"message": "Model stream error"}})
+            mock_client.return_value.invoke_model_with_response_stream.return_value = {"body": events}
+            texts, response = consume_stream(self.bedrock_platform.call_model_stream())
+        assert texts == ["as"]
+        assert generative_model.get_result(response)['status_code'] == 500
+
+
 class TestOpenAIPlatform:
     def setup_method(self):
         self.openai_platform = OpenAIPlatform(aws_credentials, models_urls, timeout=60)  # Initialize your class here
@@ -497,7 +699,7 @@ class TestVertexPlatform:
         assert self.vertex_platform.headers == {'Content-Type': "application/json"}
 
     def test_call_model(self):
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_object = MagicMock()
             mock_object.json.return_value = {
                 "candidates": [
@@ -544,37 +746,89 @@ class TestVertexPlatform:
         generative_model.set_message(message_dict)
         self.vertex_platform.set_model(generative_model)
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = requests.exceptions.Timeout
             response = self.vertex_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 500
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = requests.exceptions.RequestException
             response = self.vertex_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 500
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = ConnectionError
             response = self.vertex_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 500
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = urllib3.exceptions.ReadTimeoutError(None, None, "Read timed out")
             response = self.vertex_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 408
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.return_value.status_code = 500
             mock_func.return_value.json.return_value = {"error": {"message": "Internal server error"}}
             response = self.vertex_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 500
 
+    def test_call_model_stream(self):
+        chunks = [
+            {"candidates": [{"content": {"role": "model", "parts": [{"text": "as"}]}}],
+             "usageMetadata": {"promptTokenCount": 454}},
+            {"candidates": [{"content": {"role": "model", "parts": [{"text": "df"}]}, "finishReason": "STOP"}],
+             "usageMetadata": {"promptTokenCount": 454, "candidatesTokenCount": 12, "totalTokenCount": 466}}
+        ]
+        generative_model = ChatGeminiVision(**gemini_model)
+        generative_model.api_key = "mock_api_key"
+        generative_model.set_message(message_dict)
+        self.vertex_platform.set_model(generative_model)
+        with FakeStreamingServer(chunks, done=False) as server:
+            self.vertex_platform.url = f"{server.url}/v1beta/models/gemini-1.5-pro-002:generateContent?key=mock_api_key"
+            texts, response = consume_stream(self.vertex_platform.call_model_stream())
+
+        assert server.requests[0]["path"] == "/v1beta/models/gemini-1.5-pro-002:streamGenerateContent?key=mock_api_key&alt=sse"
+        assert texts == ["as", "df"]
+        result = generative_model.get_result(response)
+        assert result['result']['answer'] == "asdf"
+        assert (result['result']['input_tokens'], result['result']['output_tokens']) == (454, 12)
+
+        with FakeStreamingServer([], status_code=400) as server:
+            self.vertex_platform.url = f"{server.url}/v1beta/models/gemini-1.5-pro-002:generateContent?key=mock_api_key"
+            texts, response = consume_stream(self.vertex_platform.call_model_stream())
+        assert generative_model.get_result(response)['status_code'] == 400
+
+    def test_call_model_stream_retries(self):
+        generative_model = ChatGeminiVision(**gemini_model)
+        generative_model.api_key = "mock_api_key"
+        generative_model.set_message(message_dict)
+        self.vertex_platform.set_model(generative_model)
+
+        # The request is sent again on timeouts and rate limits before the stream starts, up to num_retries
+        with patch('requests.Session.post') as mock_func, patch('time.sleep'):
+            mock_func.side_effect = requests.exceptions.Timeout
+            texts, response = consume_stream(self.vertex_platform.call_model_stream())
+        assert response['status_code'] == 408
+        assert mock_func.call_count == 2
+
+        chunks = [{"candidates": [{"content": {"role": "model", "parts": [{"text": "asdf"}]}, "finishReason": "STOP"}],
+                   "usageMetadata": {"promptTokenCount": 454, "candidatesTokenCount": 12, "totalTokenCount": 466}}]
+        with FakeStreamingServer([], status_code=429) as failing, FakeStreamingServer(chunks, done=False) as server, \
+                patch.object(self.vertex_platform, 'set_model_retry',
+                             side_effect=lambda: setattr(self.vertex_platform, 'url', f"{server.url}/model:generateContent")), \
+                patch('time.sleep'):
+            self.vertex_platform.url = f"{failing.url}/model:generateContent"
+            texts, response = consume_stream(self.vertex_platform.call_model_stream())
+        assert len(failing.requests) == 1 and len(server.requests) == 1
+        assert texts == ["asdf"]
+        assert generative_model.get_result(response)['status_code'] == 200
+
+
 class TestTsuzumiPlatform:
     def setup_method(self):
         models_config_manager = MagicMock()
@@ -628,7 +882,7 @@ class TestTsuzumiPlatform:
         assert self.tsuzumi_platform.headers == {'Authorization': "Bearer mock_api_key", 'Content-Type': "application/json"}
 
     def test_call_model(self):
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_object = MagicMock()
             mock_object.json.return_value = {"choices": [{"message": {"content": "asdf"}}],
                                              "status_code": 200,
@@ -650,19 +904,19 @@ class TestTsuzumiPlatform:
         generative_model = TsuzumiModel(**tsuzumi_model)
         generative_model.set_message(message_dict)
         self.tsuzumi_platform.set_model(generative_model)
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = requests.exceptions.Timeout
             response = self.tsuzumi_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 408
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.side_effect = requests.exceptions.RequestException
             response = self.tsuzumi_platform.call_model()
             result = generative_model.get_result(response)
         assert result['status_code'] == 500
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.return_value.status_code = 500
             mock_func.return_value.text = "Unexpected format: Error 400: Tsuzumi format is not as expected: {}."
             response = self.tsuzumi_platform.call_model()
@@ -670,7 +924,7 @@ class TestTsuzumiPlatform:
         assert result['status_code'] == 500
         assert result['error_message'] == "Unexpected format: Error 400: Tsuzumi format is not as expected: {}."
 
-        with patch('requests.post') as mock_func:
+        with patch('requests.Session.post') as mock_func:
             mock_func.return_value.status_code = 500
             mock_func.return_value.text = "Unexpected format: Error 400: Tsuzumi format is not as expected: {}."
             response = self.tsuzumi_platform.call_model()
@@ -697,7 +951,7 @@ class TestTsuzumiPlatform:
         response_mock.status_code = 429
         response_mock.text = "Rate limit exceeded"
 
-        with patch('requests.post', return_value=response_mock):
+        with patch('requests.Session.post', return_value=response_mock):
             result = self.tsuzumi_platform.call_model()
             assert result['status_code'] == 429
             assert "Rate limit exceeded" in result['msg']
@@ -711,7 +965,7 @@ class TestTsuzumiPlatform:
         mock_response.status_code = 400
         mock_response.text = "Bad Request"
 
-        with patch('requests.post', return_value=mock_response):
+        with patch('requests.Session.post', return_value=mock_response):
             result = self.tsuzumi_platform.call_model()
             assert result['status_code'] == 400
             assert result['error'] == "Bad Request"
@@ -730,7 +984,7 @@ class TestTsuzumiPlatform:
         mock_response.status_code = 429
         mock_response.text = "Rate limit exceeded"
 
-        with patch('requests.post', return_value=mock_response), \
+        with patch('requests.Session.post', return_value=mock_response), \
                 patch.object(self.tsuzumi_platform.logger, 'warning') as mock_warning:
             self.tsuzumi_platform.call_model()
             mock_warning.assert_any_call("Tsuzumi rate limit exceeded, retrying, try 1/1")
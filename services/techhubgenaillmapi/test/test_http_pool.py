@@ -0,0 +1,80 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import json
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+# Installed imports
+import requests
+
+# Local imports
+from http_pool import HTTPSessionPool
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "affinity=1; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/openai/deployments/model/chat/completions"
+        self.pool = HTTPSessionPool(pool_maxsize=2)
+
+    def tearDown(self):
+        self.pool.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_reused(self):
+        for _ in range(3):
+            answer = self.pool.post(url=self.url, data=json.dumps({"query": "hi"}), timeout=5)
+            self.assertEqual(answer.json(), {"ok": True})
+
+        metrics = self.pool.get_metrics()[f"http://127.0.0.1:{self.server.server_port}/"]
+        self.assertEqual((metrics["requests"], metrics["errors"]), (3, 0))
+        self.assertEqual((metrics["connections_opened"], metrics["connections_reused"]), (1, 2))
+        self.assertEqual(metrics["idle_connections"], 1)
+        self.assertEqual(len(self.pool.session.cookies), 0)
+
+    def test_metrics_by_endpoint(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed_url = f"http://127.0.0.1:{sock.getsockname()[1]}/v1/chat/completions"
+        self.pool.post(url=self.url, data="{}", timeout=5)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.pool.post(url=closed_url, data="{}", timeout=5)
+
+        metrics = self.pool.get_metrics()
+        self.assertEqual(len(metrics), 2)
+        self.assertEqual(metrics[HTTPSessionPool.get_base_url(closed_url)]["errors"], 1)
+        self.assertEqual(metrics[HTTPSessionPool.get_base_url(self.url)]["errors"], 0)
+
+    def test_get_instance(self):
+        with patch.dict("os.environ", {"LLM_HTTP_POOL_MAXSIZE": "25", "LLM_HTTP_POOL_BLOCK": "True"}), \
+                patch.object(HTTPSessionPool, "_instance", None):
+            pool = HTTPSessionPool.get_instance()
+            self.assertIs(HTTPSessionPool.get_instance(), pool)
+            self.assertEqual((pool.pool_maxsize, pool.pool_block), (25, True))
+            adapter = pool.get_adapter(HTTPSessionPool.get_base_url(self.url))
+            self.assertEqual(adapter._pool_maxsize, 25)
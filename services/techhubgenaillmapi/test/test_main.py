@@ -15,6 +15,9 @@ from unittest.mock import MagicMock, patch
 # Local imports
 from common.errors.genaierrors import PrintableGenaiError
 from models.gptmodel import ChatGPTVision
+from bedrock_clients import BedrockClientCache
+from tokenizer_registry import TokenizerRegistry
+from fake_streaming_server import FakeStreamingServer
 
 
 gpt_v_model = {
@@ -289,7 +292,7 @@ class TestMain(unittest.TestCase):
 
     def test_process_request(self):
         with patch('main.LLMDeployment.report_api') as mock_func:
-            with patch('requests.post') as mock_post:
+            with patch('requests.Session.post') as mock_post:
                 mock_object = MagicMock()
                 mock_object.json.return_value = {"data": [{"b64_json": "asdf"}],
                                                  "status_code": 200,
@@ -298,6 +301,7 @@ class TestMain(unittest.TestCase):
                 mock_post.return_value = mock_object
                 _, result, _ = self.deploy.process({**dalle_call, 'project_conf': copy.deepcopy(self.headers)})
                 assert result['answer'] == "asdf"
+            BedrockClientCache.get_instance().clear()
             with patch('boto3.client') as mock_post:
                 body = MagicMock()
                 body.read.return_value = json.dumps(
@@ -406,17 +410,21 @@ def test_upload_prompt_template(client):
         "name": "test",
         "content": "{\"test_system_query_v\": {\"system\": \"$system\", \"user\": [{\"type\": \"text\", \"text\": \"Answer the question as youngster: \"},{\"type\": \"image_url\",\"image\": {\"url\": \"https://static-00.iconduck.com/assets.00/file-type-favicon-icon-256x256-6l0w7xol.png\",\"detail\": \"high\"}},\"$query\"]}}"
     }
-    response = client.put("/upload_prompt_template", json=body)
+    with patch('main.deploy.template_cache.invalidate') as mock_invalidate:
+        response = client.put("/upload_prompt_template", json=body)
     assert response.status_code == 200
+    mock_invalidate.assert_called_once_with("test")
 
 
 def test_delete_prompt_template(client):
-    response = client.delete("/delete_prompt_template?name=test_system_query_v")
+    with patch('main.deploy.template_cache.invalidate') as mock_invalidate:
+        response = client.delete("/delete_prompt_template?name=test_system_query_v")
     assert response.status_code == 200
+    mock_invalidate.assert_called_once_with("test_system_query_v")
 
 
 def test_predict(client):
-    with patch('requests.post') as mock_post:
+    with patch('requests.Session.post') as mock_post:
         mock_object = MagicMock()
         mock_object.json.return_value = {"choices": [{"message": {"content": "asdf"}}],
                                          "status_code": 200,
@@ -462,3 +470,104 @@ def test_get_exception(client):
         result = json.loads(response.text)
         assert response.status_code == 500
 
+
+def get_sse_events(response) -> list:
+    """Events (name and data) of a server-sent events response"""
+    events = []
+    for event in response.get_data(as_text=True).strip().split("\n\n"):
+        name, data = event.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+stream_call = {
+    "query_metadata": {
+        "query": "what is a seed?",
+        "template_name": "system_query"
+    },
+    "llm_metadata": {
+        "max_input_tokens": 1000,
+        "model": "techhubinc-GermanyWestCentral-gpt-4o-2024-05-13",
+        "stream": True
+    },
+    "platform_metadata": {
+        "platform": "azure"
+    }
+}
+
+
+def test_predict_stream(client):
+    call = copy.deepcopy(stream_call)
+    chunks = [
+        {"choices": [{"index": 0, "delta": {"role": "assistant", "content": "A seed "}}]},
+        {"choices": [{"index": 0, "delta": {"content": "makes it deterministic"}}]},
+        {"choices": [], "usage": {"total_tokens": 160, "completion_tokens": 6, "prompt_tokens": 154,
+                                  "prompt_tokens_details": {"cached_tokens": 100}}}
+    ]
+    with FakeStreamingServer(chunks) as server, \
+            patch("endpoints.AzurePlatform.build_url", return_value=server.url), \
+            patch("main.LLMDeployment.report_api") as mock_report:
+        response = client.post("/predict", json=call, headers=copy.deepcopy(TestMain.headers))
+        events = get_sse_events(response)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert events[:2] == [("delta", {"answer": "A seed "}), ("delta", {"answer": "makes it deterministic"})]
+    name, result = events[-1]
+    assert name == "result"
+    assert result['status'] == "finished"
+    assert result['result']['answer'] == "A seed makes it deterministic"
+    assert (result['result']['input_tokens'], result['result']['output_tokens']) == (154, 6)
+    assert "cached_tokens" not in result['result']
+    # The tokens are reported once the stream finishes
+    reported = {call.args[5]: call.args[0] for call in mock_report.call_args_list}
+    assert reported == {"INPUT_TOKENS": 154, "OUTPUT_TOKENS": 6, "CACHED_TOKENS": 100}
+
+
+def test_predict_stream_client_disconnect(client):
+    call = copy.deepcopy(stream_call)
+    chunks = [
+        {"choices": [{"index": 0, "delta": {"role": "assistant", "content": "A seed "}}]},
+        {"choices": [{"index": 0, "delta": {"content": "makes it deterministic"}}]},
+        {"choices": [], "usage": {"total_tokens": 160, "completion_tokens": 6, "prompt_tokens": 154}}
+    ]
+    with FakeStreamingServer(chunks) as server, \
+            patch("endpoints.AzurePlatform.build_url", return_value=server.url), \
+            patch("main.LLMDeployment.report_api") as mock_report:
+        response = client.post("/predict", json=call, headers=copy.deepcopy(TestMain.headers), buffered=False)
+        first_event = next(iter(response.response))
+        # The client closes the connection after the first delta
+        response.close()
+
+    assert b"A seed " in first_event
+    # The tokens of the chunks received before the disconnection are reported
+    reported = {call.args[5]: call.args[0] for call in mock_report.call_args_list}
+    assert reported["OUTPUT_TOKENS"] == TokenizerRegistry.get_tokenizer("gpt").count("A seed ")
+    assert reported["INPUT_TOKENS"] > 0
+
+
+def test_predict_stream_errors(client):
+    call = copy.deepcopy(stream_call)
+    # Errors of the endpoint are sent in the result event
+    with FakeStreamingServer([], status_code=400) as server, \
+            patch("endpoints.AzurePlatform.build_url", return_value=server.url), \
+            patch("main.LLMDeployment.report_api") as mock_report:
+        response = client.post("/predict", json=call, headers=copy.deepcopy(TestMain.headers))
+        name, result = get_sse_events(response)[-1]
+    assert result['status_code'] == 400
+    mock_report.assert_not_called()
+
+    # Errors before the stream starts are returned as in the non streaming mode
+    call = copy.deepcopy(stream_call)
+    call['llm_metadata']['model'] = "techhubinc-AustraliaEast-dall-e-3"
+    call['query_metadata'] = {"query": "A house with a red roof and a blue door"}
+    response = client.post("/predict", json=call, headers=copy.deepcopy(TestMain.headers))
+    assert response.status_code == 400
+    assert json.loads(response.text)['error_message'] == "Error 400: Streaming not supported for model 'dalle3' in platform 'azure'"
+
+
+def test_connection_metrics(client):
+    with patch('http_pool.HTTPSessionPool.get_metrics', return_value={"https://zone.openai.azure.com/": {"requests": 2}}):
+        response = client.get("/connection_metrics")
+    result = json.loads(response.text).get('result')
+    assert result == {"https://zone.openai.azure.com/": {"requests": 2}}
@@ -0,0 +1,121 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Local imports
+from template_cache import TemplateCache
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_manager = MagicMock()
+        self.storage_manager.get_template.side_effect = lambda name: {name: {"system": "$system", "user": "$query"}}
+        self.storage_manager.get_template_version.return_value = {"etag": "0x1", "last_modified": "2024-01-01"}
+        self.cache = TemplateCache(self.storage_manager, ttl=60)
+
+    def test_cached_during_ttl(self):
+        template = self.cache.get_template("system_query")
+        template["system_query"]["user"] = "changed by the caller"
+
+        self.assertEqual(self.cache.get_template("system_query"),
+                         {"system_query": {"system": "$system", "user": "$query"}})
+        self.assertEqual(self.storage_manager.get_template.call_count, 1)
+        self.assertEqual(self.storage_manager.get_template_version.call_count, 1)
+        self.assertEqual(self.cache.stats, {"hits": 1, "revalidations": 0, "loads": 1})
+
+    @patch("template_cache.time.monotonic")
+    def test_revalidated_after_ttl(self, mock_time):
+        mock_time.return_value = 0
+        self.cache.get_template("system_query")
+
+        # Same version, not loaded again
+        mock_time.return_value = 61
+        self.cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template.call_count, 1)
+        self.assertEqual(self.cache.stats["revalidations"], 1)
+
+        # The ttl starts again after the check
+        mock_time.return_value = 100
+        self.cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template_version.call_count, 2)
+
+        # New version
+        mock_time.return_value = 200
+        self.storage_manager.get_template_version.return_value = {"etag": "0x2", "last_modified": "2024-01-02"}
+        self.cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template.call_count, 2)
+
+        # Version not available
+        mock_time.return_value = 300
+        self.storage_manager.get_template_version.side_effect = Exception("Storage error")
+        self.cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template.call_count, 3)
+
+    @patch("template_cache.time.monotonic")
+    def test_without_version(self, mock_time):
+        # Langfuse prompts have no version, they are loaded once by ttl
+        self.storage_manager.get_template_version.return_value = None
+        mock_time.return_value = 0
+        self.cache.get_template("system_query")
+        mock_time.return_value = 30
+        self.cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template.call_count, 1)
+
+        mock_time.return_value = 61
+        self.cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template.call_count, 2)
+        self.assertEqual(self.cache.stats, {"hits": 1, "revalidations": 0, "loads": 2})
+
+    def test_invalidate(self):
+        self.cache.get_template("system_query")
+        self.cache.get_template("other_query")
+        self.cache.get_templates(return_files=True)
+
+        self.cache.invalidate("system_query")
+        self.assertEqual(list(self.cache.templates), ["other_query"])
+        self.assertEqual(self.cache.listings, {})
+        self.cache.invalidate()
+        self.assertEqual(self.cache.templates, {})
+
+    def test_load_before_invalidation_not_kept(self):
+        def get_template(name):
+            # Template uploaded while it is loaded
+            self.cache.invalidate(name)
+            return {name: {"user": "old"}}
+        self.storage_manager.get_template.side_effect = get_template
+
+        self.assertEqual(self.cache.get_template("system_query"), {"system_query": {"user": "old"}})
+        self.assertEqual(self.cache.templates, {})
+
+    def test_errors_not_cached(self):
+        self.storage_manager.get_template.side_effect = ValueError("Not found")
+        with self.assertRaises(ValueError):
+            self.cache.get_template("not_found")
+        self.assertEqual(self.cache.templates, {})
+
+    def test_get_templates(self):
+        self.storage_manager.get_templates.return_value = ({"system_query": {}}, ["system_query"],
+                                                           {"prompts.json": ["system_query"]})
+        self.cache.get_templates(return_files=True)
+        self.assertEqual(self.cache.get_templates(return_files=True)[2], {"prompts.json": ["system_query"]})
+        self.storage_manager.get_templates.assert_called_once_with(return_files=True)
+
+    def test_disabled(self):
+        cache = TemplateCache(self.storage_manager, ttl=0)
+        cache.get_template("system_query")
+        cache.get_template("system_query")
+        self.assertEqual(self.storage_manager.get_template.call_count, 2)
+        self.assertEqual(cache.templates, {})
+
+    def test_warm_up(self):
+        self.storage_manager.get_template_names.return_value = ["system_query", "malformed", "other_query"]
+        self.storage_manager.get_template.side_effect = lambda name: {}[name] if name == "malformed" else {name: {}}
+        self.cache.warm_up()
+        self.assertEqual(sorted(self.cache.templates), ["other_query", "system_query"])
+
+        self.storage_manager.get_template_names.side_effect = Exception("Storage error")
+        self.cache.warm_up()
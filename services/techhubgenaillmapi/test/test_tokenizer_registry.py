@@ -0,0 +1,85 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import unittest
+from unittest.mock import patch
+
+# Installed imports
+import tiktoken
+
+# Local imports
+from tokenizer_registry import Tokenizer, TokenizerRegistry
+
+
+texts = {
+    "en": "Real Zaragoza have never won the spanish league but they have won King's Cup six times. " * 400,
+    "es": "El Real Zaragoza nunca ha ganado la liga, pero ha ganado la Copa del Rey seis veces. " * 400,
+    "ja": "レアル・サラゴサはリーグ優勝したことがないが、国王杯を6回制している。" * 400
+}
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def setUp(self):
+        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.tokenizer = Tokenizer("gpt", self.encoding, cache_size=2, min_cache_chars=10)
+
+    def test_count_cached(self):
+        with patch.object(self.tokenizer, "encode", wraps=self.tokenizer.encode) as mock_encode:
+            self.assertEqual(self.tokenizer.count(texts["en"]), len(self.encoding.encode(texts["en"])))
+            self.assertEqual(self.tokenizer.count(texts["en"]), len(self.encoding.encode(texts["en"])))
+            self.assertEqual(mock_encode.call_count, 1)
+        self.assertEqual(self.tokenizer.get_cache_info(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_count_short_not_cached(self):
+        self.assertEqual(self.tokenizer.count("Hello"), 1)
+        self.assertEqual(self.tokenizer.get_cache_info(), {"hits": 0, "misses": 0, "entries": 0})
+
+    def test_count_lru(self):
+        self.tokenizer.count(texts["en"])
+        self.tokenizer.count(texts["es"])
+        self.tokenizer.count(texts["en"])
+        self.tokenizer.count(texts["ja"])
+        # The least recently used (es) is discarded
+        self.tokenizer.count(texts["en"])
+        self.tokenizer.count(texts["es"])
+        self.assertEqual(self.tokenizer.get_cache_info(), {"hits": 2, "misses": 4, "entries": 2})
+
+    def test_cache_disabled(self):
+        tokenizer = Tokenizer("gpt", self.encoding, cache_size=0)
+        tokenizer.count(texts["en"])
+        tokenizer.count(texts["en"])
+        self.assertEqual(tokenizer.get_cache_info(), {"hits": 0, "misses": 0, "entries": 0})
+
+    def test_truncate_same_as_full_encoding(self):
+        for language, text in texts.items():
+            tokens = self.encoding.encode(text)
+            for max_tokens in [1, 7, 100, 1000, len(tokens) - 1]:
+                self.assertEqual(self.tokenizer.truncate(text, max_tokens),
+                                 self.encoding.decode(tokens[:max_tokens]), f"{language} {max_tokens}")
+
+    def test_truncate_short_text(self):
+        text = texts["es"]
+        n_tokens = len(self.encoding.encode(text))
+        self.assertIs(self.tokenizer.truncate(text, n_tokens), text)
+        self.assertIs(self.tokenizer.truncate(text, n_tokens * 2), text)
+        self.assertEqual(self.tokenizer.truncate(text, 0), "")
+
+    def test_truncate_encodes_prefix(self):
+        with patch.object(self.tokenizer, "encode", wraps=self.tokenizer.encode) as mock_encode:
+            self.tokenizer.truncate(texts["en"], 100)
+        self.assertLess(max(len(call.args[0]) for call in mock_encode.call_args_list), len(texts["en"]) // 10)
+
+
+class TestTokenizerRegistry(unittest.TestCase):
+
+    def test_same_instance(self):
+        tokenizer = TokenizerRegistry.get_tokenizer("gpt")
+        self.assertIs(TokenizerRegistry.get_tokenizer(), tokenizer)
+        self.assertEqual(tokenizer.name, "gpt")
+        self.assertEqual(tokenizer.count("Hello world"), 2)
+
+    def test_wrong_tokenizer(self):
+        with self.assertRaises(ValueError):
+            TokenizerRegistry.get_tokenizer("wrong")
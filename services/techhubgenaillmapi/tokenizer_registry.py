@@ -0,0 +1,132 @@
+### This code is property of the GGAO ###
+
+
+# Native imports
+import os
+import hashlib
+import threading
+from contextlib import nullcontext
+from collections import OrderedDict
+from typing import List
+
+# Installed imports
+import tiktoken
+from transformers import GPT2TokenizerFast
+
+
+class Tokenizer(object):
+    """Tokenizer shared by all the requests of the process, with an LRU cache of the number of tokens of the texts
+    (the same system prompts, templates and contexts are counted in many calls)"""
+    # Characters by token of the first prefix tried when truncating (doubled until the limit is passed)
+    CHARS_PER_TOKEN = 4
+    # Tokens after the limit needed in a prefix, so the cut of the prefix doesn't change the tokens before the limit
+    BOUNDARY_TOKENS = 16
+
+    def __init__(self, name: str, encoding, cache_size: int = 4096, min_cache_chars: int = 256):
+        """
+        :param name: Name of the tokenizer in the registry
+        :param encoding: tiktoken encoding or transformers tokenizer
+        :param cache_size: Maximum number of texts whose number of tokens is kept
+        :param min_cache_chars: Texts shorter than this are counted without the cache (hashing costs like encoding)
+        """
+        self.name = name
+        self.encoding = encoding
+        self.cache_size = cache_size
+        self.min_cache_chars = min_cache_chars
+        self.counts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # The transformers tokenizers are not safe to share between threads, tiktoken ones are
+        self.encoding_lock = nullcontext() if isinstance(encoding, tiktoken.Encoding) else threading.Lock()
+
+    def encode(self, text: str) -> List[int]:
+        with self.encoding_lock:
+            return self.encoding.encode(text)
+
+    def decode(self, tokens: List[int]) -> str:
+        with self.encoding_lock:
+            return self.encoding.decode(tokens)
+
+    def count(self, text: str) -> int:
+        """Number of tokens of a text, from the cache if it has been counted before
+
+        :param text: Text to count
+        :return: Number of tokens
+        """
+        if self.cache_size <= 0 or len(text) < self.min_cache_chars:
+            return len(self.encode(text))
+
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self.lock:
+            n_tokens = self.counts.get(key)
+            if n_tokens is not None:
+                self.counts.move_to_end(key)
+                self.hits += 1
+                return n_tokens
+            self.misses += 1
+
+        n_tokens = len(self.encode(text))
+        with self.lock:
+            self.counts[key] = n_tokens
+            if len(self.counts) > self.cache_size:
+                self.counts.popitem(last=False)
+        return n_tokens
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """First max_tokens tokens of a text. Only a prefix a bit longer than the limit is encoded: its length is
+        doubled until it has more tokens than the limit, so a 100k tokens context cut to a few thousand tokens is not
+        encoded entirely
+
+        :param text: Text to truncate
+        :param max_tokens: Maximum number of tokens
+        :return: Truncated text (the same text if it doesn't have more tokens)
+        """
+        if max_tokens <= 0:
+            return ""
+
+        n_chars = max_tokens * self.CHARS_PER_TOKEN
+        while n_chars < len(text):
+            tokens = self.encode(text[:n_chars])
+            if len(tokens) > max_tokens + self.BOUNDARY_TOKENS:
+                return self.decode(tokens[:max_tokens])
+            n_chars *= 2
+
+        tokens = self.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.decode(tokens[:max_tokens])
+
+    def get_cache_info(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.counts)}
+
+
+class TokenizerRegistry(object):
+    """Tokenizers of the process, loaded once the first time they are used"""
+    LOADERS = {
+        "gpt": lambda: tiktoken.encoding_for_model("gpt-3.5-turbo"),
+        "claude": lambda: GPT2TokenizerFast.from_pretrained('Xenova/claude-tokenizer')
+    }
+    _tokenizers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_tokenizer(cls, name: str = "gpt") -> Tokenizer:
+        """Get a tokenizer of the registry
+
+        :param name: Name of the tokenizer ('gpt' or 'claude')
+        :return: Tokenizer shared by the process
+        """
+        tokenizer = cls._tokenizers.get(name)
+        if tokenizer is None:
+            if name not in cls.LOADERS:
+                raise ValueError(f"Tokenizer '{name}' not found. Possible values: {list(cls.LOADERS)}")
+            with cls._lock:
+                tokenizer = cls._tokenizers.get(name)
+                if tokenizer is None:
+                    tokenizer = Tokenizer(name, cls.LOADERS[name](),
+                                          cache_size=int(os.getenv("LLM_TOKEN_CACHE_SIZE", 4096)),
+                                          min_cache_chars=int(os.getenv("LLM_TOKEN_CACHE_MIN_CHARS", 256)))
+                    cls._tokenizers[name] = tokenizer
+        return tokenizer